@@ -0,0 +1,423 @@
+"""
+End-to-end benchmark of the G-code to steps pipeline.
+
+Feeds generated G-code through Gcode, GCodeProcessor.enqueue_many and the
+command queues to threads executing it, as Redeem does, and on through
+PathPlanner into the native path planner, which sends its steps to the
+emulated PRU. No Replicape is needed: the BeagleBone modules the G-code
+handlers import are replaced by empty ones where they aren't installed, so it
+runs on any Linux machine the native planner builds on.
+
+Each corpus runs in a process of its own, so its peak RSS is its own, and
+the results are printed as JSON to compare between releases:
+
+  redeem-benchmark --lines 20000 --output results.json
+
+License: GNU GPL v3: http://www.gnu.org/copyleft/gpl.html
+
+ Redeem is free software: you can redistribute it and/or modify
+ it under the terms of the GNU General Public License as published by
+ the Free Software Foundation, either version 3 of the License, or
+ (at your option) any later version.
+
+ Redeem is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ GNU General Public License for more details.
+
+ You should have received a copy of the GNU General Public License
+ along with Redeem.  If not, see <http://www.gnu.org/licenses/>.
+"""
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import importlib
+import json
+import logging
+import math
+import multiprocessing
+import platform
+import resource
+import sys
+import time
+import traceback
+import types
+from six.moves import queue
+from threading import Event, Thread
+from . import __long_version__
+from .CascadingConfigParser import CascadingConfigParser
+from .Delta import Delta
+from .Gcode import Gcode
+from .Path import Path
+from .PathPlanner import PathPlanner
+from .Printer import Printer
+from .StepperWatchdog import StepperWatchdog
+
+# The clock of the PRU, and of the emulated PRU's virtual clock
+PRU_CLOCK = 200000000.0
+
+MOVE_CODES = set(["G0", "G1", "G2", "G3"])
+
+# The modules only found on a BeagleBone that the G-code handlers and plugins
+# import, and the names they import from them
+HARDWARE_MODULES = {
+    "Adafruit_BBIO": [],
+    "Adafruit_BBIO.GPIO": [],
+    "Adafruit_BBIO.PWM": [],
+    "Adafruit_GPIO": [],
+    "Adafruit_GPIO.I2C": ["Device"],
+    "evdev": ["InputDevice", "ecodes"],
+}
+
+# Steps per mm (after microstepping), max speed in m/s and acceleration in m/s^2
+# of the X, Y, Z and E axes. Roughly a Prusa i3 and a Kossel mini.
+MACHINES = {
+    "cartesian": {
+        "axis_config": Printer.AXIS_CONFIG_XY,
+        "steps_pr_mm": [80.0, 80.0, 4000.0, 128.0],
+        "max_speeds": [0.2, 0.2, 0.003, 0.2],
+        "acceleration": [2.0, 2.0, 0.1, 5.0],
+    },
+    "delta": {
+        "axis_config": Printer.AXIS_CONFIG_DELTA,
+        "steps_pr_mm": [160.0, 160.0, 160.0, 192.0],
+        "max_speeds": [0.4, 0.4, 0.4, 0.4],
+        "acceleration": [2.0, 2.0, 2.0, 5.0],
+        "delta_l": 0.2156,
+        "delta_r": 0.1062,
+    },
+}
+
+
+class EmulatedStepper(object):
+  """ The parts of a Stepper the path planner uses, for a printer without steppers """
+
+  def __init__(self, name, steps_pr_mm):
+    self.name = name
+    self.steps_pr_mm = steps_pr_mm
+    self.in_use = True
+    self.enabled = True
+    self.current_enabled = True
+
+  def get_steps_pr_meter(self):
+    return self.steps_pr_mm * 1000.0
+
+
+def _perimeters(lines, center, min_radius, max_radius):
+  """ Circular perimeters in 0.2 mm segments, like a sliced curved model """
+  gcodes = ["G21", "G90", "M82", "G92 E0"]
+  layer = 0
+  while len(gcodes) < lines:
+    layer += 1
+    gcodes.append("G1 Z{:.2f} F600".format(layer * 0.2))
+    radius = min_radius + (max_radius - min_radius) * (0.5 + 0.5 * math.sin(layer * 0.3))
+    segments = int(2 * math.pi * radius / 0.2)
+    e = 0.0
+    for i in range(segments + 1):
+      angle = 2 * math.pi * i / segments
+      e += 0.2 * 0.033
+      x = center + radius * math.cos(angle)
+      y = center + radius * math.sin(angle)
+      gcodes.append("G1 X{:.3f} Y{:.3f} E{:.5f} F1800".format(x, y, e))
+    gcodes.append("G92 E0")
+  return gcodes[:lines]
+
+
+def cartesian_small_segments(lines):
+  return _perimeters(lines, 100.0, 10.0, 40.0)
+
+
+def delta_small_segments(lines):
+  return _perimeters(lines, 0.0, 10.0, 40.0)
+
+
+def arcs(lines):
+  """ Rings printed as pairs of clockwise and counter-clockwise half circles """
+  gcodes = ["G21", "G90", "M82", "G92 E0"]
+  layer = 0
+  while len(gcodes) < lines:
+    layer += 1
+    gcodes.append("G1 Z{:.2f} F600".format(layer * 0.2))
+    e = 0.0
+    for ring in range(20):
+      radius = 5.0 + ring * 1.5
+      arc = "G2" if ring % 2 == 0 else "G3"
+      e += math.pi * radius * 0.033
+      gcodes.append("G0 X{:.3f} Y100.000 F6000".format(100.0 + radius))
+      gcodes.append("{} X{:.3f} Y100.000 I{:.3f} J0 E{:.5f} F1800".format(
+          arc, 100.0 - radius, -radius, e))
+      e += math.pi * radius * 0.033
+      gcodes.append("{} X{:.3f} Y100.000 I{:.3f} J0 E{:.5f}".format(arc, 100.0 + radius, radius, e))
+    gcodes.append("G92 E0")
+  return gcodes[:lines]
+
+
+def retract_heavy(lines):
+  """ Many small islands, with a retract, Z hop and travel between each of them """
+  gcodes = ["G21", "G90", "M83"]
+  layer = 0
+  while len(gcodes) < lines:
+    layer += 1
+    z = layer * 0.2
+    for island in range(100):
+      x = 20.0 + (island % 10) * 15.0
+      y = 20.0 + (island // 10) * 15.0
+      gcodes.append("G1 E-1.0 F2400")
+      gcodes.append("G1 Z{:.2f} F3000".format(z + 0.4))
+      gcodes.append("G0 X{:.3f} Y{:.3f} F9000".format(x, y))
+      gcodes.append("G1 Z{:.2f} F3000".format(z))
+      gcodes.append("G1 E1.0 F2400")
+      for dx, dy in ((2.0, 0.0), (2.0, 2.0), (0.0, 2.0), (0.0, 0.0)):
+        gcodes.append("G1 X{:.3f} Y{:.3f} E0.06600 F1200".format(x + dx, y + dy))
+  return gcodes[:lines]
+
+
+# (name, machine, generator)
+CORPORA = [
+    ("cartesian_small_segments", "cartesian", cartesian_small_segments),
+    ("delta", "delta", delta_small_segments),
+    ("arcs", "cartesian", arcs),
+    ("retract_heavy", "cartesian", retract_heavy),
+]
+
+
+def replace_missing_hardware_modules():
+  """
+  Put empty modules in place of the hardware modules that can't be imported,
+  so the G-code handlers load. Nothing the benchmark runs uses them.
+  """
+  for name in sorted(HARDWARE_MODULES):
+    try:
+      importlib.import_module(name)
+    except ImportError:
+      module = types.ModuleType(name)
+      for attribute in HARDWARE_MODULES[name]:
+        setattr(module, attribute, None)
+      sys.modules[name] = module
+      parent, _, child = name.rpartition(".")
+      if parent:
+        setattr(sys.modules[parent], child, module)
+
+
+def make_printer(machine, emulated_pru_speed=0.0):
+  """ Make a printer with the machine's settings that sends its steps to an emulated PRU """
+  settings = MACHINES[machine]
+
+  # importing them imports the G-code handlers and plugins, which need the hardware modules
+  replace_missing_hardware_modules()
+  from .GCodeProcessor import CommandQueue, GCodeProcessor
+  from .PluginsController import PluginsController
+
+  printer = Printer()
+  printer.config = CascadingConfigParser([])
+  printer.config.add_section("System")
+  printer.config.set("System", "plugins", "")
+  printer.plugins = PluginsController(printer)
+  printer.axis_config = settings["axis_config"]
+  printer.emulate_pru = True
+  printer.emulated_pru_speed = emulated_pru_speed
+  printer.swd = StepperWatchdog(printer)
+  for i, axis in enumerate("XYZE"):
+    printer.steppers[axis] = EmulatedStepper(axis, settings["steps_pr_mm"][i])
+    printer.max_speeds[i] = settings["max_speeds"][i]
+    printer.acceleration[i] = settings["acceleration"][i]
+
+  if printer.axis_config == Printer.AXIS_CONFIG_DELTA:
+    Delta.L = settings["delta_l"]
+    Delta.r = settings["delta_r"]
+
+  Path.printer = printer
+  Gcode.printer = printer
+
+  printer.path_planner = PathPlanner(printer, None)
+  printer.processor = GCodeProcessor(printer)
+  printer.commands = CommandQueue(10)
+  printer.unbuffered_commands = queue.Queue(10)
+  return printer
+
+
+def _parse(lines, move_count):
+  """ Parse the lines that aren't empty or comments, counting the moves in move_count[0] """
+  for line in lines:
+    if line and not line.startswith(";"):
+      gcode = Gcode({"message": line, "prot": "Benchmark"})
+      if gcode.code() in MOVE_CODES:
+        move_count[0] += 1
+      yield gcode
+
+
+def _start_consumer(processor, the_queue, name, running, errors):
+  """ Execute the G-codes on the_queue in a thread of its own like Redeem.loop """
+
+  def consume():
+    try:
+      processor.consume(the_queue, name, running.is_set)
+    except Exception:
+      errors.append(traceback.format_exc())
+
+  consumer = Thread(target=consume, name=name)
+  consumer.daemon = True
+  consumer.start()
+  return consumer
+
+
+def _wait_until_executed(the_queue, consumer):
+  """ Wait until every G-code put on the_queue has been executed, or its consumer died """
+  with the_queue.all_tasks_done:
+    while the_queue.unfinished_tasks and consumer.is_alive():
+      the_queue.all_tasks_done.wait(0.1)
+
+
+def run(name, machine, gcodes, emulated_pru_speed=0.0):
+  """
+  Run the G-code lines through a new printer and return the results. The
+  stage times are the totals of the latency histograms of the processor and
+  the native planner, and the time the planner took to finish the steps
+  after the last G-code ran.
+  """
+  printer = make_printer(machine, emulated_pru_speed)
+  processor = printer.processor
+  planner = printer.path_planner
+
+  running = Event()
+  running.set()
+  errors = []
+  queues = [(printer.commands, "buffered"), (printer.unbuffered_commands, "unbuffered")]
+  consumers = [
+      _start_consumer(processor, q, queue_name, running, errors) for q, queue_name in queues
+  ]
+  move_count = [0]
+
+  start = time.time()
+  processor.enqueue_many(_parse(gcodes, move_count))
+  for (the_queue, _), consumer in zip(queues, consumers):
+    _wait_until_executed(the_queue, consumer)
+
+  t0 = time.time()
+  planner.wait_until_done()
+  drain_time = time.time() - t0
+  wall_time = time.time() - start
+
+  running.clear()
+  for consumer in consumers:
+    consumer.join()
+  if errors:
+    raise RuntimeError("A G-code queue consumer failed:\n" + errors[0])
+
+  stats = planner.pru_emulator.getStats()
+  step_counts = planner.pru_emulator.getStepCounts()
+  histograms = processor.counters.histograms() + planner.get_latency_histograms()
+  planner.native_planner.stopThread(True)
+
+  stages = dict((stage, histogram.total_time) for stage, histogram in histograms)
+  stages["drain"] = drain_time
+  moves = move_count[0]
+  # ru_maxrss is in kilobytes on Linux
+  peak_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+  return {
+      "corpus": name,
+      "machine": machine,
+      "lines": len(gcodes),
+      "moves": moves,
+      "step_commands": stats.commands,
+      "steps": int(sum(step_counts)),
+      "wall_time": wall_time,
+      "lines_per_second": len(gcodes) / wall_time,
+      "moves_per_second": moves / wall_time,
+      "step_commands_per_second": stats.commands / wall_time,
+      "print_time": stats.virtualTime / PRU_CLOCK,
+      "underruns": stats.underruns,
+      "stage_time": stages,
+      "peak_rss_kb": peak_rss_kb,
+  }
+
+
+def _run_in_process(results, name, machine, gcodes, emulated_pru_speed):
+  try:
+    results.put((True, run(name, machine, gcodes, emulated_pru_speed)))
+  except Exception:
+    results.put((False, traceback.format_exc()))
+
+
+def run_in_process(name, machine, gcodes, emulated_pru_speed=0.0):
+  """
+  Run a corpus in a process of its own, so it starts from scratch and has its
+  own peak RSS. Raises RuntimeError if the run raised or the process died.
+  """
+  results = multiprocessing.Queue()
+  process = multiprocessing.Process(
+      target=_run_in_process, args=(results, name, machine, gcodes, emulated_pru_speed))
+  process.start()
+
+  # the native planner aborts the process if an assertion fails, before it can put a result
+  while True:
+    try:
+      succeeded, result = results.get(timeout=1)
+      break
+    except queue.Empty:
+      if not process.is_alive():
+        process.join()
+        raise RuntimeError("Running {} failed with exit code {}".format(name, process.exitcode))
+
+  process.join()
+  if not succeeded:
+    raise RuntimeError("Running {} failed:\n{}".format(name, result))
+  return result
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description="Benchmark the G-code to steps pipeline")
+  parser.add_argument(
+      "--corpus",
+      action="append",
+      choices=[name for name, _, _ in CORPORA],
+      help="corpus to run, can be repeated (default: all of them)")
+  parser.add_argument("--file", help="run the G-code in this file instead of the generated corpora")
+  parser.add_argument(
+      "--machine",
+      default="cartesian",
+      choices=sorted(MACHINES.keys()),
+      help="machine to run --file on (default: cartesian)")
+  parser.add_argument(
+      "--lines", type=int, default=20000, help="lines per generated corpus (default: 20000)")
+  parser.add_argument(
+      "--speed",
+      type=float,
+      default=0.0,
+      help="pace the emulated PRU to this many times real time (default: as fast as it can)")
+  parser.add_argument("--output", help="write the results to this file instead of stdout")
+  args = parser.parse_args(argv)
+
+  logging.basicConfig(level=logging.WARNING)
+
+  if args.file:
+    with open(args.file) as f:
+      runs = [(args.file, args.machine, f.read().splitlines())]
+  else:
+    names = args.corpus or [name for name, _, _ in CORPORA]
+    runs = [(name, machine, generator(args.lines)) for name, machine, generator in CORPORA
+            if name in names]
+
+  results = {
+      "version": __long_version__,
+      "python": platform.python_version(),
+      "platform": platform.platform(),
+      "lines_per_corpus": args.lines,
+      "emulated_pru_speed": args.speed,
+      "corpora": [],
+  }
+  for name, machine, gcodes in runs:
+    logging.warning("Running {} ({} lines)".format(name, len(gcodes)))
+    results["corpora"].append(run_in_process(name, machine, gcodes, args.speed))
+
+  output = json.dumps(results, indent=2, sort_keys=True)
+  if args.output:
+    with open(args.output, "w") as f:
+      f.write(output + "\n")
+  else:
+    print(output)
+
+
+if __name__ == '__main__':
+  main(sys.argv[1:])
@@ -21,16 +21,25 @@ License: GNU GPL v3: http://www.gnu.org/copyleft/gpl.html
 """
 from __future__ import absolute_import
 
+import collections
 import importlib
 import inspect
 import logging
 import re
 import sys
+import time
 import traceback
 from six import iteritems
+from six.moves import queue
 from threading import Event
+try:
+  from time import monotonic
+except ImportError:
+  # Python 2 has no monotonic clock, its Queue.Queue waits on time.time too
+  from time import time as monotonic
 from . import Sync
 from .Gcode import Gcode
+from .LatencyHistogram import LatencyHistogram
 from .gcodes.GCodeCommand import GCodeCommand
 from .PathPlanner import SyncCallback
 
@@ -39,6 +48,84 @@ class GCodePerformanceCounters:
   def __init__(self):
     self.gcodes_executed = 0
     self.start_time = 0
+    # time to parse each enqueued G-code
+    self.parse = LatencyHistogram()
+    # time waiting for room on printer.commands
+    self.enqueue_wait = LatencyHistogram()
+    # time from putting a G-code on printer.commands to taking it off, including the wait for room
+    self.queue_residency = LatencyHistogram()
+    # time taken by the handlers of G-codes
+    self.execute = LatencyHistogram()
+
+  def histograms(self):
+    """ The histograms as a list of (name, histogram) in the order G-codes pass through them """
+    return [("parse", self.parse), ("enqueue_wait", self.enqueue_wait),
+            ("queue_residency", self.queue_residency), ("execute", self.execute)]
+
+  def reset_histograms(self):
+    for name, histogram in self.histograms():
+      histogram.reset()
+
+
+class CommandQueue(queue.Queue):
+  """
+  A queue of gcodes whose maxsize counts gcodes rather than items, where a
+  list of gcodes put by enqueue_many counts as each of the gcodes in it.
+  The gcodes of an item taken off the queue keep counting until task_done
+  says they were executed, so no more than maxsize gcodes are buffered
+  however they are batched. put waits until all of the gcodes in the item
+  fit.
+  """
+
+  def _init(self, maxsize):
+    queue.Queue._init(self, maxsize)
+    # gcodes on the queue
+    self.gcodes = 0
+    # gcodes on the queue or taken off it and not done yet
+    self.outstanding = 0
+    # the number of gcodes in each item taken off the queue and not done yet
+    self.taken = collections.deque()
+
+  @staticmethod
+  def _count(item):
+    return len(item) if isinstance(item, list) else 1
+
+  def _qsize(self):
+    return self.gcodes
+
+  def _put(self, item):
+    self.queue.append(item)
+    self.gcodes += self._count(item)
+    self.outstanding += self._count(item)
+
+  def _get(self):
+    item = self.queue.popleft()
+    self.gcodes -= self._count(item)
+    self.taken.append(self._count(item))
+    return item
+
+  def put(self, item, block=True, timeout=None):
+    count = self._count(item)
+    with self.not_full:
+      if self.maxsize > 0:
+        end = None if timeout is None else monotonic() + timeout
+        # an item bigger than the queue still goes in once nothing is outstanding
+        while self.outstanding and self.outstanding + count > self.maxsize:
+          remaining = None if end is None else end - monotonic()
+          if not block or (remaining is not None and remaining <= 0):
+            raise queue.Full
+          self.not_full.wait(remaining)
+      self._put(item)
+      self.unfinished_tasks += 1
+      self.not_empty.notify()
+
+  def task_done(self):
+    """ Indicate that the gcodes of the item taken off the queue first have been executed """
+    with self.not_full:
+      if self.taken:
+        self.outstanding -= self.taken.popleft()
+        self.not_full.notify_all()
+    queue.Queue.task_done(self)
 
 
 class GCodeProcessor:
@@ -115,47 +202,197 @@ class GCodeProcessor:
       return
 
     self.counters.gcodes_executed += 1
-
+    if gcode.command.is_buffered():
+      # the moves it queues report its line if the PRU runs out of steps after them
+      line = gcode.crc_line_number
+      if line is None:
+        line = self.counters.gcodes_executed
+      self.printer.path_planner.set_gcode_line(line)
+
+    start = time.time()
     try:
       gcode.command.execute(gcode)
     except Exception as e:
       logging.error("Error while executing " + gcode.code() + ": " + str(e))
       logging.error(traceback.format_exc(sys.exc_info()[2]))
+    self.counters.execute.record(time.time() - start)
     return gcode
 
+  def is_linear_move(self, gcode):
+    command = getattr(gcode, 'command', None)
+    return command is not None and command.is_linear_move() and not gcode.is_info_command()
+
+  def split_linear_moves(self, gcodes):
+    """
+    Split gcodes into lists of consecutive G0/G1 moves, for
+    execute_linear_moves, and lists of a single other gcode.
+    """
+    moves = []
+    for gcode in gcodes:
+      if self.is_linear_move(gcode):
+        moves.append(gcode)
+        continue
+      if moves:
+        yield moves
+        moves = []
+      yield [gcode]
+    if moves:
+      yield moves
+
+  def execute_linear_moves(self, gcodes):
+    """
+    Execute a list of G0/G1 moves like execute, but queue them with a single
+    PathPlanner.add_linear_moves call. The moves are tagged with the line of
+    the first of them.
+    """
+    line = gcodes[0].crc_line_number
+    if line is None:
+      line = self.counters.gcodes_executed + 1
+    self.counters.gcodes_executed += len(gcodes)
+    self.printer.path_planner.set_gcode_line(line)
+
+    start = time.time()
+    moves = []
+    for gcode in gcodes:
+      try:
+        move = gcode.command.get_linear_move(gcode)
+      except Exception as e:
+        logging.error("Error while executing " + gcode.code() + ": " + str(e))
+        logging.error(traceback.format_exc(sys.exc_info()[2]))
+        continue
+      if move is not None:
+        moves.append(move)
+    if moves:
+      try:
+        self.printer.path_planner.add_linear_moves(moves)
+      except Exception as e:
+        logging.error("Error while queueing " + str(len(moves)) + " moves: " + str(e))
+        logging.error(traceback.format_exc(sys.exc_info()[2]))
+    elapsed = (time.time() - start) / len(gcodes)
+    for gcode in gcodes:
+      self.counters.execute.record(elapsed)
+
+  def execute_macro(self, gcodes):
+    """
+    Execute the resolved gcodes of a macro in order, waiting for the moves of
+    each one to finish before the next. Consecutive G0/G1 moves are queued
+    together and waited for once.
+    """
+    path_planner = self.printer.path_planner
+    path_planner.wait_until_done()
+    for run in self.split_linear_moves(gcodes):
+      if len(run) > 1:
+        self.execute_linear_moves(run)
+      else:
+        self.execute(run[0])
+      path_planner.wait_until_done()
+
   def enqueue(self, gcode):
-    self.resolve(gcode)
-    if gcode.command is None:
-      logging.warning("tried to enqueue an unknown gcode: " + gcode.code())
-      gcode.set_answer("ok Unknown GCode: " + gcode.code())
-      self.printer.reply(gcode)
-      return
+    self.enqueue_many((gcode, ))
 
-    # If an M116 is running, peek at the incoming Gcode
-    if self.peek(gcode):
+  def enqueue_many(self, gcodes, max_run_length=16):
+    """
+    Enqueue a sequence of gcodes in order. This behaves like calling
+    enqueue for each of them, except that consecutive buffered gcodes
+    are put on the buffered queue as one list of up to max_run_length
+    gcodes, so the queue is locked once per run rather than once per gcode.
+    Runs are no longer than the buffered queue holds, which counts the
+    gcodes in them, so batching doesn't make it buffer more gcodes.
+    """
+    maxsize = self.printer.commands.maxsize
+    if maxsize > 0:
+      max_run_length = min(max_run_length, maxsize)
+    run = []
+    for gcode in gcodes:
+      self.counters.parse.record(gcode.parse_time)
+      self.resolve(gcode)
+      if gcode.command is None:
+        logging.warning("tried to enqueue an unknown gcode: " + gcode.code())
+        gcode.set_answer("ok Unknown GCode: " + gcode.code())
+        self.printer.reply(gcode)
+        continue
+
+      # If an M116 is running, peek at the incoming Gcode
+      if self.peek(gcode):
+        continue
+      if gcode.command.is_async():
+        self._put_buffered_run(run)
+        self.sync_event_needed = True
+        self.execute(gcode)
+        self.printer.reply(gcode)
+      elif gcode.command.is_buffered():
+        # if we previously queued an async code, we need to queue an event to get back into sync
+        if self.sync_event_needed:
+          self._put_buffered_run(run)
+          logging.info("adding sync before " + gcode.message)
+          self._make_buffered_queue_wait_for_async_queue()
+          self.sync_event_needed = False
+        run.append(gcode)
+        if len(run) >= max_run_length:
+          self._put_buffered_run(run)
+      else:
+        self._put_buffered_run(run)
+        self.printer.unbuffered_commands.put(gcode)
+      if gcode.code() in ["M109", "M190"]:
+        self._put_buffered_run(run)
+        self._make_async_queue_wait_for_buffered_queue()
+    self._put_buffered_run(run)
+
+  def _put_buffered_run(self, run):
+    """ Put a run of buffered gcodes on the buffered queue and empty it """
+    if not run:
       return
-    if gcode.command.is_async():
-      self.sync_event_needed = True
-      self.execute(gcode)
-      self.printer.reply(gcode)
-    elif gcode.command.is_buffered():
-      # if we previously queued an async code, we need to queue an event to get back into sync
-      if self.sync_event_needed:
-        logging.info("adding sync before " + gcode.message)
-        self._make_buffered_queue_wait_for_async_queue()
-        self.sync_event_needed = False
-      self.printer.commands.put(gcode)
+    start = time.time()
+    for gcode in run:
+      gcode.queued_time = start
+    if len(run) == 1:
+      self.printer.commands.put(run[0])
     else:
-      self.printer.unbuffered_commands.put(gcode)
-    if gcode.code() in ["M109", "M190"]:
-      self._make_async_queue_wait_for_buffered_queue()
+      self.printer.commands.put(list(run))
+    self.counters.enqueue_wait.record(time.time() - start)
+    del run[:]
+
+  def consume(self, the_queue, name, is_running, execute=None):
+    """
+    Execute and reply to the gcodes put on the_queue by enqueue_many until
+    is_running returns False. Each gcode is run by execute, which defaults
+    to self.execute, except for runs of G0/G1 moves, which are queued
+    together by execute_linear_moves.
+    """
+    execute = execute or self.execute
+    residency = self.counters.queue_residency
+    while is_running():
+      try:
+        item = the_queue.get(block=True, timeout=1)
+      except queue.Empty:
+        continue
+      # enqueue_many puts runs of buffered gcodes as a list
+      gcodes = item if isinstance(item, list) else (item, )
+      now = time.time()
+      for gcode in gcodes:
+        if gcode.queued_time is not None:
+          residency.record(now - gcode.queued_time)
+      for run in self.split_linear_moves(gcodes):
+        for gcode in run:
+          logging.debug("Executing " + gcode.code() + " from " + name + " " + gcode.message)
+        if len(run) > 1:
+          self.execute_linear_moves(run)
+        else:
+          execute(run[0])
+        for gcode in run:
+          self.printer.reply(gcode)
+          logging.debug("Completed " + gcode.code() + " from " + name + " " + gcode.message)
+      the_queue.task_done()
 
   def peek(self, gcode):
     if self.printer.running_M116 and gcode.code() in ["M108", "M104", "M140"]:
       self.execute(gcode)
       return True
     elif gcode.code() == "M1500":
+      # report right away rather than after the gcodes already queued
       gcode.command.execute_custom(gcode, self.counters)
+      self.printer.reply(gcode)
+      return True
     return False
 
   def get_long_description(self, gcode):
@@ -24,69 +24,149 @@ License: GNU GPL v3: http://www.gnu.org/copyleft/gpl.html
 
 import logging
 import re
-
-
-class Gcode:
+import time
+
+try:
+  from redeem.path_planner.GcodeTokenizerNative import tokenize as _native_tokenize
+except ImportError:
+  _native_tokenize = None
+
+_comment_re = re.compile(r"\(.*\)")
+_token_re = re.compile(
+    r"^M117(?![A-Z])|[A-Z][-+]?[0-9]*\.?[0-9]*\??")    # note syntax exception for M117
+_digits_re = re.compile(r"\d+")
+
+
+def _token_value(token):
+  """ Parse the value after the letter of a token """
+  try:
+    return float(token[1:])
+  except ValueError:
+    return 0.0
+
+
+def _letter_slot(letter):
+  """ Index of an upper case letter in the per-letter token index, or None """
+  slot = ord(letter) - 65 if len(letter) == 1 else -1
+  return slot if 0 <= slot < 26 else None
+
+
+def _checksum(cmd):
+  """ Compute a Checksum of the letters in the command """
+  cs = 0
+  for c in cmd:
+    cs ^= ord(c)
+  return cs
+
+
+def _regex_tokenize(raw):
+  """ Regex based tokenizer, used when the native tokenizer is unavailable """
+  message = raw.strip().split(";")[0]
+  message = message.strip(' \t\n\r')
+  if len(message) == 0:
+    return message, None, [], [], None
+
+  # strip gcode comments
+  message = _comment_re.sub("", message)
+  tokens = _token_re.findall(message.replace(' ', '').upper())
+
+  # process line numbers and checksum, if present
+  line_number = None
+  if tokens[0][0] == "N":    # Ok, checksum
+    line_num = _digits_re.findall(tokens[0])[0]
+    cmd = raw.split("*")[0]    # message
+    csc = int(raw.split("*")[1].split(";")[0])    # checksum to compare with
+    if int(csc) != _checksum(cmd):
+      raise ValueError('GCODE message failed CRC check')
+    line_number = int(line_num)
+    tokens.pop(0)    # remove the line number token
+    # Remove crc stuff from messages
+    message = message.split("*")[0][(1 + len(line_num))::].strip(" ")
+
+  command = tokens.pop(0).replace('.', '_')
+  return message, command, tokens, [_token_value(t) for t in tokens], line_number
+
+
+def tokenize(raw):
+  """
+  Tokenize gcode "words" per RS274/NFC v3
+
+  Returns (message, command, tokens, values, line_number), where message is
+  the raw message minus line number, CRC and comments, command is the primary
+  word or None for an empty line and values are the parsed token values.
+  line_number is None unless the line was numbered and passed its CRC check.
+  Raises an exception for malformed lines.
+
+  Redeem's built-in help '?' after a primary word is also supported.
+
+  M117 Exception: Text supplied to legacy malformed M117 should not
+  be capitalized or stripped of its whitespace. The first leading
+  space after M117 is optional (and ignored) so long as the first
+  charcter is not a digit (0-9) or a period (.). Example: M117this
+  will work.
+
+  CRC (*nn), "(comment)"s are also removed.
+
+  The primary gcode has any '.' exchanged for '_' for Python
+  class name compliance. Example: G29_1
+  """
+  if _native_tokenize is not None:
+    result = _native_tokenize(raw)
+    if result is not None:
+      return result
+  return _regex_tokenize(raw)
+
+
+class Gcode(object):
   """ A command received from pronterface or whatever """
+  __slots__ = ("message", "parent", "prot", "has_crc", "answer", "gcode", "command", "tokens",
+               "values", "crc_line_number", "_letters", "parse_time", "queued_time")
   line_number = 0
 
   def __init__(self, packet):
     """ Init; parse the token """
+    start = time.time()
+    self.queued_time = None
     try:
-      self.message = packet["message"].strip().split(";")[0]
-      self.message = self.message.strip(' \t\n\r')
+      self.message = packet["message"]
       self.parent = packet["parent"] if "parent" in packet else None
       self.prot = packet["prot"] if "prot" in packet else None
       if self.prot is None:
         self.prot = self.parent.prot if self.parent else "None"
       self.has_crc = False
       self.answer = "ok"
-      if len(self.message) == 0:
+      self.crc_line_number = None
+      self.message, gcode, tokens, values, line_number = tokenize(packet["message"])
+      self._set_tokens(tokens, values)
+      if gcode is None:
         #logging.debug("Empty message")
         self.gcode = "No-Gcode"
         return
-      """
-      Tokenize gcode "words" per RS274/NFC v3
-
-      Redeem's built-in help '?' after a primary word is also supported.
-
-      M117 Exception: Text supplied to legacy malformed M117 should not
-      be capitalized or stripped of its whitespace. The first leading
-      space after M117 is optional (and ignored) so long as the first
-      charcter is not a digit (0-9) or a period (.). Example: M117this
-      will work.
-
-      CRC (*nn), "(comment)"s are also removed.
-      """
-      # strip gcode comments
-      self.message = re.sub(r"\(.*\)", "", self.message)
-      self.tokens = re.findall(
-          r"^M117(?![A-Z])|[A-Z][-+]?[0-9]*\.?[0-9]*\??",    # note syntax exception for M117
-          self.message.replace(' ', '').upper())
-
-      # process line numbers and checksum, if present
-      if self.tokens[0][0] == "N":    # Ok, checksum
-        line_num = re.findall(r"\d+", self.tokens[0])[0]
-        cmd = packet["message"].split("*")[0]    # message
-        csc = int(packet["message"].split("*")[1].split(";")[0])    # checksum to compare with
-        if int(csc) != self._getCS(cmd):
-          raise ValueError('GCODE message failed CRC check')
-        self.line_number = int(line_num)    # Set the line number
+      if line_number is not None:
+        self.crc_line_number = line_number    # Set the line number
         Gcode.line_number += 1    # Increase the global counter
         self.has_crc = True
-        self.tokens.pop(0)    # remove the line number token
-        # Remove crc stuff from messages
-        self.message = self.message.\
-            split("*")[0][(1+len(line_num))::].strip(" ")
-      """
-      Retrieve primary gcode, exchanging any '.' for '_' for Python
-      class name compliance. Example: G29_1
-      """
-      self.gcode = self.tokens.pop(0).replace('.', '_')
+      self.gcode = gcode
 
     except Exception as e:
       self.gcode = "No-Gcode"
       logging.exception("Ooops: ")
+    finally:
+      self.parse_time = time.time() - start
+
+  def _set_tokens(self, tokens, values):
+    """
+    Store the tokens, their parsed values and a letter index.
+    _letters holds, for each letter A-Z, the index of the first token with
+    that letter, or None if there is no such token.
+    """
+    self.tokens = tokens
+    self.values = values
+    self._letters = letters = [None] * 26
+    for i in range(len(tokens) - 1, -1, -1):
+      slot = _letter_slot(tokens[i][:1])
+      if slot is not None:
+        letters[slot] = i
 
   def code(self):
     """ The machinecode """
@@ -101,15 +181,11 @@ class Gcode:
 
   def token_value(self, index):
     """ Get the value after the letter """
-    try:
-      t = self.tokens[index]
-      return float(t[1:])
-    except ValueError:
-      return 0.0
+    return self.values[index]
 
   def token_distance(self, index):
     """ Return a token's value, factoring in current G20/21 unit. """
-    return self.token_value(index) * self.printer.unit_factor
+    return self.values[index] * self.printer.unit_factor
 
   def get_tokens(self):
     """ Return the tokens """
@@ -117,7 +193,7 @@ class Gcode:
 
   def set_tokens(self, tokens):
     """ Set the tokens """
-    self.tokens = tokens
+    self._set_tokens(tokens, [_token_value(t) for t in tokens])
 
   def get_message(self):
     """ 
@@ -128,10 +204,7 @@ class Gcode:
 
   def has_letter(self, letter):
     """ Check if the letter exists as token """
-    for token in self.tokens:
-      if token[0] == letter:
-        return True
-    return False
+    return self.get_token_index_by_letter(letter) is not None
 
   def has_value(self, index):
     try:
@@ -142,42 +215,49 @@ class Gcode:
     return False
 
   def get_token_index_by_letter(self, letter):
+    slot = _letter_slot(letter)
+    if slot is not None:
+      return self._letters[slot]
     for i in range(len(self.tokens)):
-      if self.tokens[i][0] == letter:
+      if self.tokens[i][:1] == letter:
         return i
     return None
 
   def get_float_by_letter(self, letter, default=0.0):
     """ Get a float or return a default value. """
-    val = default
     index = self.get_token_index_by_letter(letter)
-    if index != None and self.has_value(index):
-      val = self.token_value(index)
-    return val
+    if index is not None and len(self.tokens[index]) > 1:
+      return self.values[index]
+    return default
 
   def get_distance_by_letter(self, letter, default=0.0):
     """ Get a float or return a default value. Factor in curent G20/21 unit setting. """
-    val = default
     index = self.get_token_index_by_letter(letter)
-    if index != None:
-      val = self.token_distance(index)
-    return val
+    if index is not None:
+      return self.values[index] * self.printer.unit_factor
+    return default
 
   def get_int_by_letter(self, letter, default=0):
     """ Get an int or return a default value. """
     return int(self.get_float_by_letter(letter, default=default))
 
   def has_letter_value(self, letter):
-    for token in self.tokens:
-      if token[0] == letter:
-        if len(token) > 1:
-          return True
+    index = self.get_token_index_by_letter(letter)
+    if index is None:
+      return False
+    for token in self.tokens[index:]:
+      if token[:1] == letter and len(token) > 1:
+        return True
     return False
 
   def remove_token_by_letter(self, letter):
+    if self.get_token_index_by_letter(letter) is None:
+      return
     for i, token in enumerate(self.tokens):
       if token[0] == letter:
         self.tokens.pop(i)
+        self.values.pop(i)
+    self._set_tokens(self.tokens, self.values)
 
   def num_tokens(self):
     return len(self.tokens)
@@ -192,10 +272,7 @@ class Gcode:
 
   def _getCS(self, cmd):
     """ Compute a Checksum of the letters in the command """
-    cs = 0
-    for c in cmd:
-      cs ^= ord(c)
-    return cs
+    return _checksum(cmd)
 
   def is_crc(self):
     """ Return True if this segment was a numbered line """
@@ -0,0 +1,89 @@
+"""
+Histograms of the time taken by the stages G-codes go through on their way
+to the PRU.
+
+License: GNU GPL v3: http://www.gnu.org/copyleft/gpl.html
+
+ Redeem is free software: you can redistribute it and/or modify
+ it under the terms of the GNU General Public License as published by
+ the Free Software Foundation, either version 3 of the License, or
+ (at your option) any later version.
+
+ Redeem is distributed in the hope that it will be useful,
+ but WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ GNU General Public License for more details.
+
+ You should have received a copy of the GNU General Public License
+ along with Redeem.  If not, see <http://www.gnu.org/licenses/>.
+"""
+from __future__ import absolute_import, division
+
+# Must match LATENCY_HISTOGRAM_BUCKETS in path_planner/config.h
+BUCKETS = 32
+
+
+class LatencyHistogram(object):
+  """
+  Counts durations in buckets that double in width, the same way as the
+  histograms of the native path planner: buckets[0] counts durations under
+  1 us, buckets[i] those from 2^(i-1) up to 2^i us and the last bucket also
+  takes everything longer. Recording doesn't take a lock, so it is cheap
+  enough to do for every G-code. Recording from two threads at once may
+  rarely lose a count, which doesn't matter for statistics.
+  """
+  __slots__ = ("count", "total_time", "max_time", "buckets")
+
+  def __init__(self):
+    self.reset()
+
+  @classmethod
+  def from_native(cls, stats):
+    """ Make a histogram from the LatencyHistogramStats of the native path planner """
+    histogram = cls()
+    histogram.count = int(stats.count)
+    histogram.total_time = stats.totalTime / 1e9
+    histogram.max_time = stats.maxTime / 1e9
+    histogram.buckets = [int(count) for count in stats.buckets]
+    return histogram
+
+  def reset(self):
+    self.count = 0
+    self.total_time = 0.0
+    self.max_time = 0.0
+    self.buckets = [0] * BUCKETS
+
+  def record(self, seconds):
+    """ Count a duration in seconds """
+    seconds = max(seconds, 0.0)
+    self.buckets[min(int(seconds * 1000000).bit_length(), BUCKETS - 1)] += 1
+    self.count += 1
+    self.total_time += seconds
+    if seconds > self.max_time:
+      self.max_time = seconds
+
+  def mean(self):
+    """ The mean duration in seconds """
+    return self.total_time / self.count if self.count else 0.0
+
+  def percentile(self, fraction):
+    """
+    The upper bound in seconds of the bucket holding the given fraction of
+    the durations, so at least that fraction took no longer than it.
+    """
+    if self.count == 0:
+      return 0.0
+    total = 0
+    for i, count in enumerate(self.buckets):
+      total += count
+      if total >= fraction * self.count:
+        break
+    if i == BUCKETS - 1:
+      return self.max_time
+    return min((1 << i) / 1e6, self.max_time)
+
+  def summary(self):
+    """ A one line summary with the times in microseconds """
+    times = [self.mean(), self.percentile(0.5), self.percentile(0.99), self.max_time]
+    return "n={} mean={:.0f}us p50<={:.0f}us p99<={:.0f}us max={:.0f}us".format(
+        self.count, *[time * 1e6 for time in times])
@@ -41,6 +41,14 @@ class Path:
   # Numpy array type used throughout
   DTYPE = np.float64
 
+  # Flags for PathPlannerNative.queueMoves, these must match MOVE_FLAG_* in path_planner/config.h
+  MOVE_FLAG_CANCELABLE = 1 << 0
+  MOVE_FLAG_OPTIMIZE = 1 << 1
+  MOVE_FLAG_SOFT_ENDSTOPS = 1 << 2
+  MOVE_FLAG_BED_MATRIX = 1 << 3
+  MOVE_FLAG_BACKLASH_COMPENSATION = 1 << 4
+  MOVE_FLAG_PROBE = 1 << 5
+
   # http://www.manufacturinget.org/2011/12/cnc-g-code-g17-g18-and-g19/
   X_Y_ARC_PLANE = 0
   X_Z_ARC_PLANE = 1
@@ -94,11 +102,6 @@ class Path:
     """ Return true if this is a arc movement"""
     return self.movement == Path.G2 or self.movement == Path.G3
 
-  def get_segments(self):
-    """ Returns split segments for delta or arcs """
-    if self.movement == Path.G2 or self.movement == Path.G3:
-      return self.get_arc_segments()
-
   def _get_point_on_plane(self, point):
     """ Returns the two dimensions that are relevant for the active arc plane """
     if self.printer.arc_plane == Path.X_Y_ARC_PLANE:
@@ -108,15 +111,6 @@ class Path:
     # if Path.Y_Z_ARC_PLANE
     return point[1], point[2]
 
-  def _get_axes_point(self, point):
-    """ Identifies the point as dimensions along the active arc plane"""
-    if self.printer.arc_plane == Path.X_Y_ARC_PLANE:
-      return {'X': point[0], 'Y': point[1]}
-    if self.printer.arc_plane == Path.X_Z_ARC_PLANE:
-      return {'X': point[0], 'Z': point[1]}
-    # if Path.Y_Z_ARC_PLANE
-    return {'Y': point[0], 'Z': point[1]}
-
   def _get_offset_on_plane(self):
     """ Returns the two offset dimensions that are relevant for the active arc plane """
     if self.printer.arc_plane == Path.X_Y_ARC_PLANE:
@@ -126,21 +120,6 @@ class Path:
     # Path.Y_Z_ARC_PLANE
     return self.J, self.K
 
-  def _get_linear_dimensions(self, point):
-    linears = {}
-    if 'E' in self.axes:
-      linears['E'] = point[self.printer.axes_absolute.index('E')]
-    if 'H' in self.axes:
-      linears['H'] = point[self.printer.axes_absolute.index('H')]
-    if self.printer.arc_plane == Path.X_Y_ARC_PLANE and 'Z' in self.axes:
-      linears['Z'] = point[self.printer.axes_absolute.index('Z')]
-    elif self.printer.arc_plane == Path.X_Z_ARC_PLANE and 'Y' in self.axes:
-      linears['Y'] = point[self.printer.axes_absolute.index('Y')]
-    elif self.printer.arc_plane == Path.Y_Z_ARC_PLANE and 'X' in self.axes:
-      linears['X'] = point[self.printer.axes_absolute.index('X')]
-
-    return linears
-
   def _find_circle_center(self, start0, start1, end0, end1, radius):
     """each circle defines all possible coordinates the arc center could be
         the two circles intersect at the possible centers of the arc radius"""
@@ -157,94 +136,22 @@ class Path:
       return intersection[0].x, intersection[0].y
     return intersection[1].x, intersection[1].y    # "negative" radius center point
 
-  # If performance is an issue, move functionality to `PathPlannerNative`
-  def get_arc_segments(self):
-    """Returns paths that approximate an arc"""
+  def get_arc_center(self):
+    """ Returns the center of the arc on the active arc plane and its radius """
     #  reference : http://www.manufacturinget.org/2011/12/cnc-g-code-g02-and-g03/
 
     # isolate dimensions relevant for the active plane (eg X,Y for XY plane)
     start0, start1 = self._get_point_on_plane(self.prev.ideal_end_pos)
-    end0, end1 = self._get_point_on_plane(self.ideal_end_pos)
-    logging.debug("end pos: {}".format(self.ideal_end_pos))
-    logging.debug("start point: {}, end point: {}".format([start0, start1], [end0, end1]))
 
     # 'R' variant gives radius, need to calculate circle center
     if hasattr(self, 'R'):
-      radius = self.R
-      circle0, circle1 = self._find_circle_center(start0, start1, end0, end1, radius)
-    # I/J/K gives offset, need to calculate radius and circle center
-    else:
-      offset0, offset1 = self._get_offset_on_plane()
-      radius = np.sqrt(offset0**2 + offset1**2)
-
-      # calculate the arc center
-      circle0, circle1 = start0 + offset0, start1 + offset1
-
-    # arctan2 defined with center of circle at 0,0. adjust other dimensions to match
-    origin1 = (start1 - circle1, end1 - circle1)
-    origin0 = (start0 - circle0, end0 - circle0)
-
-    # determine the start and end angle (in radians)
-    start_theta, end_theta = np.arctan2(origin1, origin0)
-
-    # clockwise angles are always increasing, adjust for using +/- pi modulus
-    if start_theta <= end_theta and self.movement is Path.G2:
-      start_theta = np.pi + abs(-np.pi - start_theta)
-
-    # counter-clockwise angles are always decreasing, adjust for using +/- pi modulus
-    if start_theta >= end_theta and self.movement is Path.G3:
-      start_theta = -np.pi - abs(np.pi - start_theta)
+      end0, end1 = self._get_point_on_plane(self.ideal_end_pos)
+      circle0, circle1 = self._find_circle_center(start0, start1, end0, end1, self.R)
+      return float(circle0), float(circle1), abs(self.R)
 
-    logging.debug("start theta: {}, end theta: {}".format(start_theta, end_theta))
-
-    # determine the length of the arc in order to determine how many segments to split into
-    arc_length = radius * abs(end_theta - start_theta)
-    num_segments = int(arc_length / self.printer.config.getfloat('Planner', 'arc_segment_length'))
-
-    # create equally spaced angles (in radians) from start to end
-    arc_thetas = np.linspace(start_theta + 2 * np.pi, end_theta + 2 * np.pi, num_segments)
-
-    # calculate all the points along the arc
-    arc_0 = circle0 + radius * np.cos(arc_thetas)
-    arc_1 = circle1 + radius * np.sin(arc_thetas)
-
-    # handle non-arc (linear) dimensional movements
-    start_linears = self._get_linear_dimensions(self.prev.ideal_end_pos)
-    end_linears = self._get_linear_dimensions(self.ideal_end_pos)
-
-    things_to_zip = [arc_0, arc_1]
-
-    linear_dims = {}
-
-    for key in start_linears.keys():
-      linear_dims[key] = np.linspace(start_linears[key], end_linears[key], num_segments)
-
-    zipped_dim_dicts = list(
-        zip(*[[{
-            key: value
-        } for value in values] for key, values in linear_dims.items()]))
-
-    path_segments = []
-
-    # for each coordinate along the arc, create a segment
-    for index, segment in enumerate(zip(arc_0, arc_1)):
-      segment_end = self._get_axes_point(segment)
-      if len(zipped_dim_dicts):
-        for dim in zipped_dim_dicts[index]:
-          segment_end.update(dim)
-      logging.debug("segment point: {}".format(segment_end))
-      path = AbsolutePath(segment_end, self.speed, self.accel, self.cancelable, self.use_bed_matrix,
-                          False)
-      # in order to set previous, printer attribute needs to be set based on the original path's printer
-      path.printer = self.printer
-      if index is not 0:
-        path.set_prev(path_segments[-1])
-      else:
-        path.set_prev(self.prev)
-
-      path_segments.append(path)
-
-    return path_segments
+    # I/J/K gives offset, need to calculate radius and circle center
+    offset0, offset1 = self._get_offset_on_plane()
+    return start0 + offset0, start1 + offset1, np.sqrt(offset0**2 + offset1**2)
 
   def __str__(self):
     """ The vector representation of this path segment """
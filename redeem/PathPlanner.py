@@ -34,12 +34,13 @@ from .Alarm import Alarm
 from .BedCompensation import BedCompensation
 from .Delta import Delta
 from .DeltaAutoCalibration import delta_auto_calibration
+from .LatencyHistogram import LatencyHistogram
 from .Path import Path, AbsolutePath, RelativePath, G92Path
 from .Printer import Printer
 from .PruInterface import PruInterface
 
 try:
-  from redeem.path_planner.PathPlannerNative import PathPlannerNative, AlarmCallbackNative, SyncCallbackNative
+  from redeem.path_planner.PathPlannerNative import PathPlannerNative, AlarmCallbackNative, SyncCallbackNative, PruEmulatorNative
 except Exception as e:
   logging.error("You have to compile the native path planner before running"
                 " Redeem. Make sure you have swig installed (apt-get "
@@ -49,18 +50,21 @@ except Exception as e:
 
 
 class AlarmWrapper(AlarmCallbackNative):
-  def __init__(self):
+  def __init__(self, emulated=False):
     AlarmCallbackNative.__init__(self)
+    self.emulated = emulated
 
   def call(self, type, message, short_message):
     if type == 8:
       logging.error("{}, {}".format(message, short_message))
     else:
-      endstop = PruInterface.get_endstop_triggered()
-      endstop_idx = int(np.log2([endstop])[0] + 1)
-      if (endstop_idx < 0) or (endstop_idx > 6):
-        endstop_idx = 0
-      message += ": " + ["unknown", "X1", "Y1", "Z1", "X2", "Y2", "Z2"][endstop_idx]
+      # The emulated PRU has no end stop switches to read back
+      if not self.emulated:
+        endstop = PruInterface.get_endstop_triggered()
+        endstop_idx = int(np.log2([endstop])[0] + 1)
+        if (endstop_idx < 0) or (endstop_idx > 6):
+          endstop_idx = 0
+        message += ": " + ["unknown", "X1", "Y1", "Z1", "X2", "Y2", "Z2"][endstop_idx]
       logging.error("Native path planner alarm: {} {} {}".format(type, message, short_message))
     try:
       a = Alarm(int(type), message, short_message)
@@ -78,11 +82,23 @@ class SyncCallback(SyncCallbackNative):
 
 
 class PathPlanner:
+  # Stages of PathPlannerNative.getLatencyHistogram, these must match LATENCY_* in path_planner/config.h
+  LATENCY_STAGES = [("queue_move", 0), ("optimizer", 1), ("step_generation", 2),
+                    ("push_block_wait", 3), ("pru_completion", 4)]
+  # Causes of PathPlannerNative.getUnderrunEvents, these must match UNDERRUN_* in path_planner/config.h
+  UNDERRUN_CAUSES = {0: "path_queue", 1: "pru"}
+  # The clock of the PRU, which the queued move times are counted in (F_CPU in path_planner/config.h)
+  PRU_CLOCK = 200000000.0
+  # Real-time scheduling policies and threads, these must match THREAD_* in path_planner/config.h
+  THREAD_POLICIES = {"fifo": 0, "rr": 1}
+  THREADS = [("planner", 0), ("pru", 1)]
+
   def __init__(self, printer, pru_firmware):
     """ Init the planner """
     self.printer = printer
     self.steppers = printer.steppers
     self.pru_firmware = pru_firmware
+    self.pru_emulator = None
 
     self.printer.path_planner = self
 
@@ -119,43 +135,93 @@ class PathPlanner:
     }, 0)
     self.prev.set_prev(None)
 
-    if pru_firmware:
+    # True if moves were queued with add_linear_move since self.prev was last updated
+    self.prev_is_stale = False
+    self.native_axis_config = None
+    self.native_bed_matrix = None
+
+    if self.printer.emulate_pru:
+      self.pru_emulator = PruEmulatorNative()
+      self.pru_emulator.setSpeed(float(self.printer.emulated_pru_speed))
+
+    if pru_firmware or self.pru_emulator:
       self._init_path_planner()
     else:
       self.native_planner = None
 
   def _init_path_planner(self):
-    self.alarm_wrapper = AlarmWrapper()
-    self.native_planner = PathPlannerNative(int(self.printer.move_cache_size), self.alarm_wrapper)
+    self._sync_prev()
+    self.native_axis_config = None
+    self.native_bed_matrix = None
+    if self.pru_emulator:
+      self.alarm_wrapper = AlarmWrapper(emulated=True)
+      self.native_planner = PathPlannerNative(
+          int(self.printer.move_cache_size), self.alarm_wrapper, self.pru_emulator)
+    else:
+      self.alarm_wrapper = AlarmWrapper()
+      self.native_planner = PathPlannerNative(int(self.printer.move_cache_size), self.alarm_wrapper)
 
-    fw0 = self.pru_firmware.get_firmware(0)
-    fw1 = self.pru_firmware.get_firmware(1)
+      fw0 = self.pru_firmware.get_firmware(0)
+      fw1 = self.pru_firmware.get_firmware(1)
 
-    if fw0 is None or fw1 is None:
-      return
+      if fw0 is None or fw1 is None:
+        return
 
-    self.native_planner.initPRU(fw0, fw1)
+      self.native_planner.initPRU(fw0, fw1)
 
     self.native_planner.setAxisStepsPerMeter(tuple(self.printer.get_steps_pr_meter()))
     self.native_planner.setMaxSpeeds(tuple(self.printer.max_speeds))
     self.native_planner.setAcceleration(tuple(self.printer.acceleration))
+    self.native_planner.setJerk(tuple(self.printer.s_curve_jerk))
     self.native_planner.setMaxSpeedJumps(tuple(self.printer.max_speed_jumps))
+    self.native_planner.setJunctionDeviation(float(self.printer.junction_deviation))
+    self.native_planner.setIncrementalStepTiming(bool(self.printer.incremental_step_timing))
+    self.native_planner.setStepGeneration(
+        int(self.printer.step_generation_workers), int(self.printer.step_generation_depth))
+    self.native_planner.setStepCommandRepeats(bool(self.printer.repeat_step_commands))
+    self.native_planner.setBufferTelemetry(
+        float(self.printer.buffer_telemetry_interval), int(self.printer.buffer_telemetry_samples))
+    self._init_thread_scheduling()
+    self.update_input_shapers()
+    self.update_pressure_advance()
     #    self.native_planner.setPrintMoveBufferWait(int(self.printer.print_move_buffer_wait))
     #    self.native_planner.setMaxBufferedMoveTime(int(self.printer.max_buffered_move_time))
     self.native_planner.setSoftEndstopsMin(tuple(self.printer.soft_min))
     self.native_planner.setSoftEndstopsMax(tuple(self.printer.soft_max))
     self.native_planner.setSoftEndstopsMax(tuple(self.printer.soft_max))
     self.native_planner.setBedCompensationMatrix(tuple(np.identity(3).ravel()))
-    self.native_planner.setAxisConfig(self.printer.axis_config)
+    self._update_axis_config()
+    self.native_planner.setArcChordTolerance(float(self.printer.arc_chord_tolerance))
+    self.native_planner.setArcSegmentLength(float(self.printer.arc_segment_length))
+    self.native_planner.setMoveCoalescing(
+        float(np.radians(self.printer.coalesce_max_angle)),
+        float(self.printer.coalesce_max_extrusion_error), int(self.printer.coalesce_max_moves))
     self.native_planner.delta_bot.setMainDimensions(Delta.L, Delta.r)
     self.native_planner.delta_bot.setRadialError(Delta.A_radial, Delta.B_radial, Delta.C_radial)
     self.native_planner.delta_bot.setAngularError(Delta.A_angular, Delta.B_angular, Delta.C_angular)
     self.configure_slaves()
     self.native_planner.setBacklashCompensation(tuple(self.printer.backlash_compensation))
     self.native_planner.setState(self.prev.end_pos)
+    self.native_planner.setIdealState(tuple(self.prev.ideal_end_pos))
     self.printer.plugins.path_planner_initialized(self)
     self.native_planner.runThread()
 
+  def _init_thread_scheduling(self):
+    policy = PathPlanner.THREAD_POLICIES.get(self.printer.realtime_policy)
+    if policy is None:
+      logging.error("Unknown realtime_policy '{}', using fifo".format(self.printer.realtime_policy))
+      policy = PathPlanner.THREAD_POLICIES["fifo"]
+
+    priorities = {
+        "planner": self.printer.planner_thread_priority,
+        "pru": self.printer.pru_thread_priority
+    }
+    cpus = {"planner": self.printer.planner_thread_cpu, "pru": self.printer.pru_thread_cpu}
+    for name, thread in PathPlanner.THREADS:
+      self.native_planner.setThreadScheduling(thread, policy, int(priorities[name]),
+                                              int(cpus[name]))
+    self.native_planner.setMemoryLocking(bool(self.printer.lock_memory))
+
   def configure_slaves(self):
     self.native_planner.enableSlaves(self.printer.has_slaves)
     if self.printer.has_slaves:
@@ -167,6 +233,26 @@ class PathPlanner:
           self.native_planner.addSlave(int(master_index), int(slave_index))
           logging.debug("Axis " + str(slave_index) + " is slaved to axis " + str(master_index))
 
+  def _sync_prev(self):
+    """ Update self.prev with the position of moves queued by add_linear_move """
+    if self.prev_is_stale:
+      self.prev.ideal_end_pos = np.array(self.native_planner.getIdealState(), dtype=Path.DTYPE)
+      self.prev.end_pos = self.native_planner.getState()
+      self.prev_is_stale = False
+
+  def _update_axis_config(self):
+    """ Pass the axis config on to the native planner if it has changed """
+    if self.printer.axis_config != self.native_axis_config:
+      self.native_planner.setAxisConfig(int(self.printer.axis_config))
+      self.native_axis_config = self.printer.axis_config
+
+  def _update_bed_matrix(self):
+    """ Pass the bed matrix used by add_linear_move and arcs on to the native planner if it has changed """
+    if self.printer.matrix_bed_comp is not self.native_bed_matrix:
+      self.native_planner.setLinearMoveBedCompensationMatrix(
+          tuple(np.ravel(self.printer.matrix_bed_comp)))
+      self.native_bed_matrix = self.printer.matrix_bed_comp
+
   def restart(self):
     self.native_planner.stopThread(True)
     self._init_path_planner()
@@ -175,6 +261,82 @@ class PathPlanner:
     """ Update steps pr meter from the path """
     self.native_planner.setAxisStepsPerMeter(tuple(self.printer.get_steps_pr_meter()))
 
+  def update_input_shapers(self):
+    """ Pass the input shapers on to the native planner """
+    shapers = list(
+        zip(self.printer.input_shaper, self.printer.input_shaper_frequency,
+            self.printer.input_shaper_damping))
+
+    # the shapers act on the steppers, which all move X and Y on CoreXY and H-belt
+    # machines and X, Y and Z on deltas, so those axes have to share a shaper
+    if self.printer.axis_config == Printer.AXIS_CONFIG_CORE_XY or \
+            self.printer.axis_config == Printer.AXIS_CONFIG_H_BELT:
+      shapers[1] = shapers[0]
+    elif self.printer.axis_config == Printer.AXIS_CONFIG_DELTA:
+      shapers[1] = shapers[0]
+      shapers[2] = shapers[0]
+
+    for axis, (shaper, frequency, damping) in enumerate(shapers):
+      self.native_planner.setInputShaper(axis, int(shaper), float(frequency), float(damping))
+
+  def update_pressure_advance(self):
+    """ Pass the pressure advance of the extruders on to the native planner """
+    for axis in Printer.AXES[3:]:
+      i = Printer.axis_to_index(axis)
+      self.native_planner.setPressureAdvance(i, float(self.printer.pressure_advance[i]),
+                                             float(self.printer.pressure_advance_smooth_time[i]))
+
+  def get_latency_histograms(self):
+    """ The histograms of the native planner as a list of (name, LatencyHistogram) """
+    if self.native_planner is None:
+      return []
+    return [(name, LatencyHistogram.from_native(self.native_planner.getLatencyHistogram(stage)))
+            for name, stage in PathPlanner.LATENCY_STAGES]
+
+  def get_pru_completion_stats(self):
+    """ The PruCompletionStats of the native planner, or None if there's no native planner """
+    if self.native_planner is None:
+      return None
+    return self.native_planner.getPruCompletionStats()
+
+  def reset_latency_histograms(self):
+    if self.native_planner is not None:
+      self.native_planner.resetLatencyHistograms()
+
+  def measure_wakeup_latency(self, interval, wakeups):
+    """
+    How late threads scheduled like the planner and PRU threads wake up from sleeping until
+    wakeups points in time interval seconds apart, as a list of (name, LatencyHistogram).
+    Takes interval * wakeups seconds for each thread.
+    """
+    if self.native_planner is None:
+      return []
+    return [(name,
+             LatencyHistogram.from_native(
+                 self.native_planner.measureWakeupLatency(thread, float(interval), int(wakeups))))
+            for name, thread in PathPlanner.THREADS]
+
+  def set_gcode_line(self, line):
+    """ Tag the moves queued from now on with a G-code line, for the underrun events """
+    if self.native_planner is not None:
+      self.native_planner.setGcodeLine(int(line))
+
+  def get_buffer_telemetry(self):
+    """
+    The buffer telemetry of the native planner as (stats, samples, underruns): its
+    BufferTelemetryStats, BufferSamples and UnderrunEvents, oldest first. None if there's
+    no native planner.
+    """
+    if self.native_planner is None:
+      return None
+    return (self.native_planner.getBufferTelemetryStats(),
+            list(self.native_planner.getBufferSamples()),
+            list(self.native_planner.getUnderrunEvents()))
+
+  def reset_buffer_telemetry(self):
+    if self.native_planner is not None:
+      self.native_planner.resetBufferTelemetry()
+
   def update_backlash(self):
     """ Update steps pr meter from the path """
     self.native_planner.setBacklashCompensation(tuple(self.printer.backlash_compensation))
@@ -187,6 +349,7 @@ class PathPlanner:
       scale = 1.0
     state = self.native_planner.getState()
     if ideal:
+      self._sync_prev()
       state = self.prev.ideal_end_pos
     pos = {}
     for index, axis in enumerate(Printer.AXES[:Printer.MAX_AXES]):
@@ -484,6 +647,7 @@ class PathPlanner:
     """ Add a path segment to the path planner """
     """ This code, and the native planner, needs to be updated for reach. """
     # Link to the previous segment in the chain
+    self._sync_prev()
     new.set_prev(self.prev)
 
     # NOTE: printing the added path slows things down SIGNIFICANTLY
@@ -493,14 +657,20 @@ class PathPlanner:
     new.end_pos[2] += self.printer.offset_z
 
     if new.is_G92():
-      self.native_planner.setAxisConfig(int(self.printer.axis_config))
+      self._update_axis_config()
       self.native_planner.setState(tuple(new.end_pos))
     elif new.needs_splitting():
-      # G2 or G3 movements (arc movements ) need to convert it to linear segments before feeding to the queue
-      # These movements seem only to be used by CNC mills/lathes which have lower gcode throughput
-      # Performance may be acceptable. If it is an issue, move `Path` functionality into `PathPlannerNative`
-      for seg in new.get_segments():
-        self.add_path(seg)
+      # G2 or G3 movements (arc movements) are split into linear segments by the native planner
+      self.printer.ensure_steppers_enabled()
+      self._update_axis_config()
+      self._update_bed_matrix()
+
+      center0, center1, radius = new.get_arc_center()
+      tool_axis = Printer.axis_to_index(self.printer.current_tool)
+
+      self.native_planner.queueArc(
+          tuple(new.ideal_end_pos), center0, center1, radius, int(self.printer.arc_plane),
+          new.movement == Path.G2, new.speed, new.accel, self.printer.offset_z, int(tool_axis))
 
     else:
       self.printer.ensure_steppers_enabled()
@@ -508,7 +678,7 @@ class PathPlanner:
       optimize = new.movement != Path.RELATIVE
       tool_axis = Printer.axis_to_index(self.printer.current_tool)
 
-      self.native_planner.setAxisConfig(int(self.printer.axis_config))
+      self._update_axis_config()
 
       self.native_planner.queueMove(
           tuple(new.end_pos),
@@ -532,6 +702,71 @@ class PathPlanner:
       # in memory, so we keep only the last path.
       # make sure that the current state of the printer is correct
       self.prev.end_pos = self.native_planner.getState()
+      self.native_planner.setIdealState(tuple(self.prev.ideal_end_pos))
+
+  def add_linear_move(self, axis_mask, values, relative_mask, feed_rate, accel):
+    """
+    Add a G0/G1 move without creating a Path. values holds the position, or
+    the distance for axes in relative_mask, in meters for each axis in
+    axis_mask. The native planner keeps track of the ideal position.
+    """
+    self.printer.ensure_steppers_enabled()
+    self._update_axis_config()
+
+    self._update_bed_matrix()
+
+    tool_axis = Printer.axis_to_index(self.printer.current_tool)
+
+    self.native_planner.queueLinearMove(
+        axis_mask, values, relative_mask, feed_rate, self.printer.speed_factor, accel,
+        self.printer.extrude_factor, self.printer.offset_z, tool_axis)
+    self.prev_is_stale = True
+
+  def add_linear_moves(self, moves):
+    """
+    Add a list of G0/G1 moves, each given as the arguments of add_linear_move,
+    with a single queueMoves call. Unlike add_linear_move, each move continues
+    from the ideal position of the move before it, even if that one was too
+    short to be queued. Returns an array with True for each move that failed.
+    """
+    self.printer.ensure_steppers_enabled()
+    self._update_axis_config()
+
+    ideal_pos = np.array(self.native_planner.getIdealState(), dtype=Path.DTYPE)
+    ideal_positions = np.empty((len(moves), Printer.MAX_AXES), dtype=Path.DTYPE)
+    speeds = np.empty(len(moves), dtype=Path.DTYPE)
+    accels = np.empty(len(moves), dtype=Path.DTYPE)
+    flags = np.empty(len(moves), dtype=np.intc)
+    all_relative = (1 << Printer.MAX_AXES) - 1
+    for i, (axis_mask, values, relative_mask, feed_rate, accel) in enumerate(moves):
+      for axis in range(Printer.MAX_AXES):
+        if axis_mask & (1 << axis):
+          # E, H, A, B and C are extruders
+          value = values[axis] * self.printer.extrude_factor if axis >= 3 else values[axis]
+          if relative_mask & (1 << axis):
+            ideal_pos[axis] += value
+          else:
+            ideal_pos[axis] = value
+      ideal_positions[i] = ideal_pos
+      speeds[i] = feed_rate * self.printer.speed_factor
+      accels[i] = accel
+      flags[i] = Path.MOVE_FLAG_SOFT_ENDSTOPS | Path.MOVE_FLAG_BACKLASH_COMPENSATION
+      if relative_mask != all_relative:
+        flags[i] |= Path.MOVE_FLAG_OPTIMIZE
+
+    # The same bed compensation and babystepping as add_linear_move
+    positions = ideal_positions.copy()
+    positions[:, :3] = ideal_positions[:, :3].dot(self.printer.matrix_bed_comp)
+    positions[:, 2] += self.printer.offset_z
+
+    status = self.native_planner.queueMoves(positions, speeds, accels, flags,
+                                            int(Printer.axis_to_index(self.printer.current_tool)))
+
+    queued = np.flatnonzero(np.logical_not(status))
+    if len(queued):
+      self.native_planner.setIdealState(tuple(ideal_positions[queued[-1]]))
+    self.prev_is_stale = True
+    return status
 
   def set_extruder(self, ext_nr):
     """
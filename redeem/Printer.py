@@ -42,6 +42,9 @@ class Printer:
   AXIS_CONFIG_CORE_XY = 2
   AXIS_CONFIG_DELTA = 3
 
+  # in the order of the INPUT_SHAPER_* types in path_planner/config.h
+  INPUT_SHAPERS = ["none", "zv", "mzv", "ei"]
+
   def __init__(self):
     self.steppers = {}
     self.heaters = {}
@@ -73,6 +76,11 @@ class Printer:
     self.move_cache_size = 128
     self.print_move_buffer_wait = 250
     self.max_buffered_move_time = 1000
+    self.arc_chord_tolerance = 0.00001
+    self.arc_segment_length = 0.001
+    self.coalesce_max_moves = 0
+    self.coalesce_max_angle = 0.5
+    self.coalesce_max_extrusion_error = 0.05
 
     self.probe_points = []
     self.probe_heights = [0, 0, 0]
@@ -83,7 +91,28 @@ class Printer:
 
     self.max_speeds = np.ones(self.num_axes)
     self.max_speed_jumps = np.ones(self.num_axes) * 0.01
+    self.junction_deviation = 0.0
+    self.incremental_step_timing = False
+    self.step_generation_workers = 0
+    self.step_generation_depth = 4
+    self.repeat_step_commands = False
+    self.buffer_telemetry_interval = 0.1
+    self.buffer_telemetry_samples = 600
+    self.realtime_policy = "fifo"
+    self.planner_thread_priority = 0
+    self.pru_thread_priority = 0
+    self.planner_thread_cpu = -1
+    self.pru_thread_cpu = -1
+    self.lock_memory = False
+    self.emulate_pru = False
+    self.emulated_pru_speed = 0.0
     self.acceleration = [0.3] * self.num_axes
+    self.s_curve_jerk = [0.0] * self.num_axes
+    self.input_shaper = [0] * self.num_axes
+    self.input_shaper_frequency = [0.0] * self.num_axes
+    self.input_shaper_damping = [0.0] * self.num_axes
+    self.pressure_advance = [0.0] * self.num_axes
+    self.pressure_advance_smooth_time = [0.04] * self.num_axes
     self.home_speed = np.ones(self.num_axes)
     self.home_backoff_speed = np.ones(self.num_axes)
     self.home_backoff_offset = np.zeros(self.num_axes)
@@ -48,7 +48,7 @@ from .Extruder import Extruder, HBP
 from .Fan import Fan
 from .FilamentSensor import *
 from .Gcode import Gcode
-from .GCodeProcessor import GCodeProcessor
+from .GCodeProcessor import CommandQueue, GCodeProcessor
 from .IOManager import IOManager
 from .Key_pin import Key_pin, Key_pin_listener
 from .Mosfet import Mosfet
@@ -425,8 +425,8 @@ class Redeem:
         sensor.alarm_level = alarm_level
         printer.filament_sensors.append(sensor)
 
-    # Make a queue of commands
-    self.printer.commands = queue.Queue(10)
+    # Make a queue of commands, holding 10 of them however enqueue_many batches them
+    self.printer.commands = CommandQueue(10)
 
     # Make a queue of commands that should not be buffered
     self.printer.unbuffered_commands = queue.Queue(10)
@@ -451,16 +451,42 @@ class Redeem:
 
     dirname = os.path.dirname(os.path.realpath(__file__))
 
-    # Create the firmware compiler
-    pru_firmware = PruFirmware(
-        dirname + "/firmware/firmware_runtime.c", dirname + "/firmware/firmware_runtime.bin",
-        dirname + "/firmware/firmware_endstops.c", dirname + "/firmware/firmware_endstops.bin",
-        self.printer, "/usr/bin/clpru", dirname + "/firmware/AM335x_PRU.cmd",
-        dirname + "/firmware/image.cmd")
+    printer.emulate_pru = printer.config.getboolean('Planner', 'emulate_pru')
+    printer.emulated_pru_speed = printer.config.getfloat('Planner', 'emulated_pru_speed')
+
+    # Create the firmware compiler, unless the steps are sent to an emulated PRU
+    pru_firmware = None
+    if not printer.emulate_pru:
+      pru_firmware = PruFirmware(
+          dirname + "/firmware/firmware_runtime.c", dirname + "/firmware/firmware_runtime.bin",
+          dirname + "/firmware/firmware_endstops.c", dirname + "/firmware/firmware_endstops.bin",
+          self.printer, "/usr/bin/clpru", dirname + "/firmware/AM335x_PRU.cmd",
+          dirname + "/firmware/image.cmd")
 
     printer.move_cache_size = printer.config.getfloat('Planner', 'move_cache_size')
     printer.print_move_buffer_wait = printer.config.getfloat('Planner', 'print_move_buffer_wait')
     printer.max_buffered_move_time = printer.config.getfloat('Planner', 'max_buffered_move_time')
+    printer.junction_deviation = printer.config.getfloat('Planner', 'junction_deviation')
+    printer.incremental_step_timing = printer.config.getboolean('Planner',
+                                                                'incremental_step_timing')
+    printer.step_generation_workers = printer.config.getint('Planner', 'step_generation_workers')
+    printer.step_generation_depth = printer.config.getint('Planner', 'step_generation_depth')
+    printer.repeat_step_commands = printer.config.getboolean('Planner', 'repeat_step_commands')
+    printer.buffer_telemetry_interval = printer.config.getfloat('Planner',
+                                                                'buffer_telemetry_interval')
+    printer.buffer_telemetry_samples = printer.config.getint('Planner', 'buffer_telemetry_samples')
+    printer.realtime_policy = printer.config.get('Planner', 'realtime_policy')
+    printer.planner_thread_priority = printer.config.getint('Planner', 'planner_thread_priority')
+    printer.pru_thread_priority = printer.config.getint('Planner', 'pru_thread_priority')
+    printer.planner_thread_cpu = printer.config.getint('Planner', 'planner_thread_cpu')
+    printer.pru_thread_cpu = printer.config.getint('Planner', 'pru_thread_cpu')
+    printer.lock_memory = printer.config.getboolean('Planner', 'lock_memory')
+    printer.arc_chord_tolerance = printer.config.getfloat('Planner', 'arc_chord_tolerance')
+    printer.arc_segment_length = printer.config.getfloat('Planner', 'arc_segment_length')
+    printer.coalesce_max_moves = printer.config.getint('Planner', 'coalesce_max_moves')
+    printer.coalesce_max_angle = printer.config.getfloat('Planner', 'coalesce_max_angle')
+    printer.coalesce_max_extrusion_error = printer.config.getfloat('Planner',
+                                                                   'coalesce_max_extrusion_error')
 
     self.printer.processor = GCodeProcessor(self.printer)
     self.printer.plugins = PluginsController(self.printer)
@@ -474,6 +500,19 @@ class Redeem:
     for axis in printer.steppers.keys():
       printer.acceleration[Printer.axis_to_index(axis)] = printer.config.getfloat(
           'Planner', 'acceleration_' + axis.lower())
+      printer.s_curve_jerk[Printer.axis_to_index(axis)] = printer.config.getfloat(
+          'Planner', 's_curve_jerk_' + axis.lower())
+      printer.input_shaper[Printer.axis_to_index(axis)] = Printer.INPUT_SHAPERS.index(
+          printer.config.get('Planner', 'input_shaper_' + axis.lower()).lower())
+      printer.input_shaper_frequency[Printer.axis_to_index(axis)] = printer.config.getfloat(
+          'Planner', 'input_shaper_frequency_' + axis.lower())
+      printer.input_shaper_damping[Printer.axis_to_index(axis)] = printer.config.getfloat(
+          'Planner', 'input_shaper_damping_' + axis.lower())
+      if axis in Printer.AXES[3:]:
+        printer.pressure_advance[Printer.axis_to_index(axis)] = printer.config.getfloat(
+            'Planner', 'pressure_advance_' + axis.lower())
+        printer.pressure_advance_smooth_time[Printer.axis_to_index(axis)] = printer.config.getfloat(
+            'Planner', 'pressure_advance_smooth_time_' + axis.lower())
 
     self.printer.path_planner = PathPlanner(self.printer, pru_firmware)
     for axis in printer.steppers.keys():
@@ -584,16 +623,7 @@ class Redeem:
   def loop(self, the_queue, name):
     """ When a new gcode comes in, execute it """
     try:
-      while RedeemIsRunning:
-        try:
-          gcode = the_queue.get(block=True, timeout=1)
-        except queue.Empty:
-          continue
-        logging.debug("Executing " + gcode.code() + " from " + name + " " + gcode.message)
-        self._execute(gcode)
-        self.printer.reply(gcode)
-        the_queue.task_done()
-        logging.debug("Completed " + gcode.code() + " from " + name + " " + gcode.message)
+      self.printer.processor.consume(the_queue, name, lambda: RedeemIsRunning, self._execute)
     except Exception:
       logging.exception("Exception in {} loop: ".format(name))
 
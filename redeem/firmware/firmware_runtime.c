@@ -105,6 +105,8 @@ int main(void)
 
             uint32_t numCommands = *ddr_addr;
             SteppersCommand* curCommand = (SteppersCommand*)(ddr_addr + 1);
+            // The upper five bits of the options are how many more times to run the command
+            uint8_t repeatsLeft = curCommand->options >> 3;
 
             if(!(curCommand->options & 0x04))
             {
@@ -253,8 +255,16 @@ int main(void)
 
                 delay(minimumWait > curCommand->delay ? minimumWait : curCommand->delay);
 
+                if (repeatsLeft)
+                {
+                    // The same steps again - the sync options only apply once the command is done
+                    repeatsLeft--;
+                    continue;
+                }
+
                 numCommands--;
                 curCommand++;
+                repeatsLeft = curCommand->options >> 3;
 
                 if (curCommand->options & 0x01) // synchronize
                 {
@@ -10,41 +10,57 @@ from __future__ import absolute_import
 
 import logging
 from .GCodeCommand import GCodeCommand
-from redeem.Path import Path, RelativePath, AbsolutePath, MixedPath
+from redeem.Path import Path
+from redeem.Printer import Printer
 
 
 class G0(GCodeCommand):
   def execute(self, g):
+    move = self.get_linear_move(g)
+    if move is not None:
+      # Add the move. This blocks until the path planner has capacity
+      self.printer.path_planner.add_linear_move(*move)
+
+  def get_linear_move(self, g):
+    """
+    Update the feed rate and acceleration from g and return its move as the
+    (axis_mask, values, relative_mask, feed_rate, accel) arguments of
+    PathPlanner.add_linear_move, or None if it can't be made.
+    """
     if g.has_letter("F"):    # Get the feed rate & convert from mm/min to SI unit m/s
       self.printer.feed_rate = g.get_distance_by_letter("F") / 60000.
       g.remove_token_by_letter("F")
     if g.has_letter("Q"):    # Get the Accel & convert from mm/min^2 to SI unit m/s^2
       self.printer.accel = g.get_distance_by_letter("Q") / 3600000.
       g.remove_token_by_letter("Q")
-    smds = {}
-    for i in range(g.num_tokens()):
-      axis = self.printer.movement_axis(g.token_letter(i))
-
-      # Get the value, new position or vector
-      value = float(g.token_distance(i)) / 1000.0    # mm to SI unit m
-      if axis in ('E', 'H', 'A', 'B', 'C'):
-        value *= self.printer.extrude_factor
-      smds[axis] = value
-
     if self.printer.movement == Path.ABSOLUTE:
-      path = AbsolutePath(smds, self.printer.feed_rate * self.printer.speed_factor,
-                          self.printer.accel)
+      relative_mask = 0
     elif self.printer.movement == Path.RELATIVE:
-      path = RelativePath(smds, self.printer.feed_rate * self.printer.speed_factor,
-                          self.printer.accel)
+      relative_mask = (1 << Printer.MAX_AXES) - 1
     elif self.printer.movement == Path.MIXED:
-      path = MixedPath(smds, self.printer.feed_rate * self.printer.speed_factor, self.printer.accel)
+      relative_mask = 0
+      for axis in self.printer.axes_relative:
+        relative_mask |= 1 << Printer.axis_to_index(axis)
     else:
       logging.error("invalid movement: " + str(self.printer.movement))
-      return
+      return None
 
-    # Add the path. This blocks until the path planner has capacity
-    self.printer.path_planner.add_path(path)
+    axis_mask = 0
+    values = [0.0] * Printer.MAX_AXES
+    for i in range(g.num_tokens()):
+      axis = self.printer.movement_axis(g.token_letter(i))
+      index = Printer.AXES.find(axis)
+      if index < 0:
+        continue
+      if self.printer.movement == Path.MIXED and axis not in self.printer.axes_relative \
+              and axis not in self.printer.axes_absolute:
+        continue
+
+      # Get the value, new position or vector
+      values[index] = float(g.token_distance(i)) / 1000.0    # mm to SI unit m
+      axis_mask |= 1 << index
+
+    return (axis_mask, tuple(values), relative_mask, self.printer.feed_rate, self.printer.accel)
 
   def get_description(self):
     return "Control the printer head position as well as the currently " \
@@ -66,6 +82,9 @@ class G0(GCodeCommand):
   def is_buffered(self):
     return True
 
+  def is_linear_move(self):
+    return True
+
   def is_async(self):
     return True
 
@@ -22,7 +22,7 @@ from redeem.Alarm import Alarm
 class G29(GCodeCommand):
   def execute(self, g):
     gcodes = self.printer.config.get("Macros", "G29").split("\n")
-    self.printer.path_planner.wait_until_done()
+    macro = []
     for gcode in gcodes:
       # If 'S' (imulate) remove M561 and M500 codes
       if (g.has_letter("S")) and ("RFS" in gcode):
@@ -30,8 +30,8 @@ class G29(GCodeCommand):
       else:    # Execute the code
         G = Gcode({"message": gcode, "parent": g})
         self.printer.processor.resolve(G)
-        self.printer.processor.execute(G)
-        self.printer.path_planner.wait_until_done()
+        macro.append(G)
+    self.printer.processor.execute_macro(macro)
 
     probe_data = copy.deepcopy(self.printer.probe_points)
     bed_data = {
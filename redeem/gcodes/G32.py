@@ -16,12 +16,12 @@ from redeem.Gcode import Gcode
 class G32(GCodeCommand):
   def execute(self, g):
     gcodes = self.printer.config.get("Macros", "G32").split("\n")
-    self.printer.path_planner.wait_until_done()
+    macro = []
     for gcode in gcodes:
       G = Gcode({"message": gcode, "parent": g})
       self.printer.processor.resolve(G)
-      self.printer.processor.execute(G)
-      self.printer.path_planner.wait_until_done()
+      macro.append(G)
+    self.printer.processor.execute_macro(macro)
 
   def get_description(self):
     return "Undock sled"
@@ -36,12 +36,12 @@ class G33(GCodeCommand):
 
     # we reuse the G29 macro for the autocalibration purposes
     gcodes = self.printer.config.get("Macros", "G29").split("\n")
-    self.printer.path_planner.wait_until_done()
+    macro = []
     for gcode in gcodes:
       G = Gcode({"message": gcode, "parent": g})
       self.printer.processor.resolve(G)
-      self.printer.processor.execute(G)
-      self.printer.path_planner.wait_until_done()
+      macro.append(G)
+    self.printer.processor.execute_macro(macro)
 
     # adjust probe heights
     print_head_zs = np.array(self.printer.probe_heights[:len(self.printer.probe_points)])
@@ -50,6 +50,10 @@ class GCodeCommand(object):
     """ Return true if the command executes asynchronously (such as a movement command that queues in the native path planner) """
     return False
 
+  def is_linear_move(self):
+    """ Return true if the command is a G0/G1 move that has get_linear_move, so runs of them can be queued together """
+    return False
+
   def __str__(self):
     """ The class name of the gcode """
     return type(self).__name__
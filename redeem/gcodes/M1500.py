@@ -0,0 +1,48 @@
+"""
+GCode M1500
+Report the time taken by each stage of the G-code pipeline
+
+Example: M1500 R
+
+License: CC BY-SA: http://creativecommons.org/licenses/by-sa/2.0/
+"""
+from __future__ import absolute_import
+
+from .GCodeCommand import GCodeCommand
+
+
+class M1500(GCodeCommand):
+  def execute(self, g):
+    self.execute_custom(g, self.printer.processor.counters)
+
+  def execute_custom(self, g, counters):
+    """ Report the histograms, called by GCodeProcessor as soon as the M1500 is enqueued """
+    histograms = counters.histograms() + self.printer.path_planner.get_latency_histograms()
+    for name, histogram in histograms:
+      self.printer.send_message(g.prot, "{}: {}".format(name, histogram.summary()))
+
+    completions = self.printer.path_planner.get_pru_completion_stats()
+    if completions is not None:
+      self.printer.send_message(
+          g.prot, "pru_completion_batches: {} blocks in {} wake-ups, at most {} at once".format(
+              completions.blocks, completions.wakeups, completions.maxBatch))
+
+    if g.has_letter("R"):
+      counters.reset_histograms()
+      self.printer.path_planner.reset_latency_histograms()
+
+    g.set_answer("ok G-codes executed: {}".format(counters.gcodes_executed))
+
+  def get_description(self):
+    return "Report the time taken by each stage of the G-code pipeline"
+
+  def get_long_description(self):
+    return ("Report the number of G-codes executed, and the number, mean, median, 99th "
+            "percentile and maximum of the time taken by each stage that G-codes go through: "
+            "parsing, waiting for room in the command queue, waiting in the command queue, "
+            "executing, and in the native path planner queueing moves, optimizing the queue, "
+            "generating steps, waiting for the PRU to take them and retiring the blocks the PRU "
+            "finished. Also reports how many finished blocks were retired at each wake-up. The "
+            "percentiles are upper bounds, rounded up to a power of two microseconds.\n"
+            "R resets the histograms after reporting them.\n"
+            "Example: M1500 R")
@@ -0,0 +1,80 @@
+"""
+GCode M1501
+Report how full the buffers between the G-codes and the PRU are
+
+Example: M1501 S R
+
+License: CC BY-SA: http://creativecommons.org/licenses/by-sa/2.0/
+"""
+from __future__ import absolute_import, division
+
+from .GCodeCommand import GCodeCommand
+from redeem.PathPlanner import PathPlanner
+
+
+def _min_mean_max(values):
+  if not values:
+    return (0, 0, 0)
+  return (min(values), sum(values) / len(values), max(values))
+
+
+class M1501(GCodeCommand):
+  def execute(self, g):
+    telemetry = self.printer.path_planner.get_buffer_telemetry()
+    if telemetry is None:
+      g.set_answer("ok There is no native path planner to report on")
+      return
+    stats, samples, underruns = telemetry
+
+    self.printer.send_message(
+        g.prot,
+        "Underruns: {} waiting for moves, {} waiting for steps. Path queue emptied {} times".format(
+            stats.pathQueueUnderruns, stats.pruUnderruns, stats.pathQueueUnderflows))
+
+    depths = [sample.pathQueueDepth for sample in samples]
+    move_times = [sample.queuedMoveTime / PathPlanner.PRU_CLOCK * 1000 for sample in samples]
+    memory = [sample.pruMemoryUsed for sample in samples]
+    self.printer.send_message(
+        g.prot, "Samples: {} of {} kept (min/mean/max)".format(len(samples), stats.samples))
+    self.printer.send_message(
+        g.prot, "Path queue depth: {:.0f}/{:.1f}/{:.0f} moves".format(*_min_mean_max(depths)))
+    self.printer.send_message(
+        g.prot, "PRU queued move time: {:.1f}/{:.1f}/{:.1f} ms".format(*_min_mean_max(move_times)))
+    self.printer.send_message(
+        g.prot, "PRU memory used: {:.0f}/{:.0f}/{:.0f} bytes".format(*_min_mean_max(memory)))
+
+    for underrun in underruns:
+      self.printer.send_message(
+          g.prot, "Underrun at {:.3f}s: {} after line {}".format(
+              underrun.time, PathPlanner.UNDERRUN_CAUSES.get(underrun.cause, underrun.cause),
+              underrun.gcodeLine))
+
+    if g.has_letter("S"):
+      for sample, move_time in zip(samples, move_times):
+        self.printer.send_message(
+            g.prot, "Sample at {:.3f}s: {} moves, {:.1f} ms, {} bytes".format(
+                sample.time, sample.pathQueueDepth, move_time, sample.pruMemoryUsed))
+
+    if g.has_letter("R"):
+      self.printer.path_planner.reset_buffer_telemetry()
+
+  def get_description(self):
+    return "Report how full the buffers between the G-codes and the PRU are"
+
+  def get_long_description(self):
+    return ("Report the number of times the PRU ran out of steps, the minimum, mean and maximum "
+            "of the sampled number of moves in the path queue, move time queued in the PRU and "
+            "PRU memory in use, and the last underruns with the line of the G-code whose move "
+            "the PRU ran last. The line is the N line number if the G-code had one, and the "
+            "count of G-codes executed otherwise. An underrun 'waiting for moves' "
+            "(path_queue) means the G-codes didn't arrive fast enough, which also happens at the "
+            "end of a print that doesn't wait for its moves to finish with M400. An underrun "
+            "'waiting for steps' (pru) means the planner didn't generate the steps fast enough. "
+            "Sampling is set with buffer_telemetry_interval and buffer_telemetry_samples in the "
+            "[Planner] section.\n"
+            "S also lists every sample kept.\n"
+            "R resets the telemetry after reporting it.\n"
+            "Example: M1501 S R")
+
+  def is_buffered(self):
+    return False
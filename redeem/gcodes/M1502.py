@@ -0,0 +1,47 @@
+"""
+GCode M1502
+Measure how late the planner and PRU threads wake up
+
+Example: M1502 P2000 I0.5
+
+License: CC BY-SA: http://creativecommons.org/licenses/by-sa/2.0/
+"""
+from __future__ import absolute_import
+
+from .GCodeCommand import GCodeCommand
+
+
+class M1502(GCodeCommand):
+  def execute(self, g):
+    wakeups = g.get_int_by_letter("P", 1000)
+    interval = g.get_float_by_letter("I", 1.0)
+    if wakeups <= 0 or interval <= 0:
+      g.set_answer("ok P and I must be positive")
+      return
+
+    histograms = self.printer.path_planner.measure_wakeup_latency(interval / 1000.0, wakeups)
+    if not histograms:
+      g.set_answer("ok There is no native path planner to measure")
+      return
+
+    for name, histogram in histograms:
+      self.printer.send_message(g.prot, "{} thread wake-up latency: {}".format(
+          name, histogram.summary()))
+
+  def get_description(self):
+    return "Measure how late the planner and PRU threads wake up"
+
+  def get_long_description(self):
+    return ("Start a thread scheduled like the planner thread, then one scheduled like the PRU "
+            "thread, with the real-time priority and CPU set in the [Planner] section, and "
+            "report how late each wakes up from sleeping until P points in time I milliseconds "
+            "apart: the number of wake-ups, and the mean, median, 99th percentile and maximum "
+            "latency. The spread between them is the scheduling jitter the threads see. Takes "
+            "P times I milliseconds for each thread, so measure while printing to see the jitter "
+            "under load.\n"
+            "P is the number of wake-ups, 1000 by default.\n"
+            "I is the interval in milliseconds, 1 by default.\n"
+            "Example: M1502 P2000 I0.5")
+
+  def is_buffered(self):
+    return False
@@ -287,12 +287,9 @@ class M24(GCodeCommand):
     profile = cProfile.Profile()
     self.printer.sd_card_manager.set_status(True)
     profile.enable()
-    for line in self.printer.sd_card_manager:
-      line = line.strip()
-      if not line or line.startswith(';'):
-        continue
-      file_g = Gcode({"message": line})
-      self.printer.processor.enqueue(file_g)
+    lines = (line.strip() for line in self.printer.sd_card_manager)
+    gcodes = (Gcode({"message": line}) for line in lines if line and not line.startswith(';'))
+    self.printer.processor.enqueue_many(gcodes)
     if self.printer.sd_card_manager.get_status():
       logging.info("M24: Print from file complete")
     self.printer.sd_card_manager.set_status(False)
@@ -44,8 +44,9 @@ class M569(GCodeCommand):
 
       self.printer.path_planner.wait_until_done()
 
-      # Recompile the firmware
-      self.printer.path_planner.pru_firmware.produce_firmware(unconditionally=True)
+      # Recompile the firmware, if there is one - an emulated PRU doesn't have it
+      if self.printer.path_planner.pru_firmware:
+        self.printer.path_planner.pru_firmware.produce_firmware(unconditionally=True)
 
       # Restart the path planner.
       self.printer.path_planner.restart()
@@ -0,0 +1,62 @@
+"""
+GCode M572
+Set or get pressure advance
+
+Example: M572 E0.05 S0.04
+
+License: CC BY-SA: http://creativecommons.org/licenses/by-sa/2.0/
+"""
+from __future__ import absolute_import
+
+import logging
+from .GCodeCommand import GCodeCommand
+
+
+class M572(GCodeCommand):
+  def execute(self, g):
+    extruders = self.printer.AXES[3:]
+
+    if g.num_tokens() == 0:
+      advances = zip(extruders, self.printer.pressure_advance[3:],
+                     self.printer.pressure_advance_smooth_time[3:])
+      g.set_answer("ok " + ", ".join([
+          "{}: {}s smoothed over {}s".format(axis, advance, smooth_time)
+          for axis, advance, smooth_time in advances
+      ]))
+      return
+
+    axes = [axis for axis in extruders if g.has_letter(axis)]
+    for axis in axes:
+      if g.get_float_by_letter(axis) < 0.0:
+        logging.warning("M572: Invalid pressure advance for %s: %f", axis,
+                        g.get_float_by_letter(axis))
+        return
+
+    smooth_time = g.get_float_by_letter("S", 0.0)
+    if g.has_letter("S") and smooth_time <= 0.0:
+      logging.warning("M572: Invalid smooth time: %f", smooth_time)
+      return
+
+    for axis in axes:
+      self.printer.pressure_advance[self.printer.axis_to_index(axis)] = g.get_float_by_letter(axis)
+
+    if g.has_letter("S"):
+      for axis in (axes or extruders):
+        self.printer.pressure_advance_smooth_time[self.printer.axis_to_index(axis)] = smooth_time
+
+    # the planner advances the steps it is generating, so let it finish those first
+    self.printer.path_planner.wait_until_done()
+    self.printer.path_planner.update_pressure_advance()
+
+  def get_description(self):
+    return "Set or get pressure advance"
+
+  def get_long_description(self):
+    return ("Set the pressure advance of the given extruders in seconds, 0 disables it.\n"
+            "S sets the time the extruder speed is averaged over in seconds, for the given "
+            "extruders or for all of them if none are given.\n"
+            "Example: M572 E0.05 H0.03 S0.04\n"
+            "Without any parameters, return the pressure advance of all extruders.")
+
+  def is_buffered(self):
+    return True
@@ -35,8 +35,9 @@ class M574(GCodeCommand):
       # Update the config.
       self.printer.config.set('Endstops', 'end_stop_' + es + '_stops', config)
 
-      # Recompile the firmware
-      self.printer.path_planner.pru_firmware.produce_firmware(unconditionally=True)
+      # Recompile the firmware, if there is one - an emulated PRU doesn't have it
+      if self.printer.path_planner.pru_firmware:
+        self.printer.path_planner.pru_firmware.produce_firmware(unconditionally=True)
 
       # Restart the path planner.
       self.printer.path_planner.restart()
@@ -0,0 +1,67 @@
+"""
+GCode M593
+Set or get input shaping
+
+Example: M593 X Y P1 F40 D0.1
+
+License: CC BY-SA: http://creativecommons.org/licenses/by-sa/2.0/
+"""
+from __future__ import absolute_import
+
+import logging
+from .GCodeCommand import GCodeCommand
+
+
+class M593(GCodeCommand):
+  def execute(self, g):
+    if not (g.has_letter("P") or g.has_letter("F") or g.has_letter("D")):
+      shapers = zip(self.printer.AXES, self.printer.input_shaper,
+                    self.printer.input_shaper_frequency, self.printer.input_shaper_damping)
+      g.set_answer("ok " + ", ".join([
+          "{}: {} {}Hz damping {}".format(axis, self.printer.INPUT_SHAPERS[shaper], frequency,
+                                          damping) for axis, shaper, frequency, damping in shapers
+      ]))
+      return
+
+    axes = [axis for axis in self.printer.AXES if g.has_letter(axis)]
+    if not axes:
+      axes = ["X", "Y"]
+
+    shaper = g.get_int_by_letter("P", -1)
+    if g.has_letter("P") and not 0 <= shaper < len(self.printer.INPUT_SHAPERS):
+      logging.warning("M593: Invalid input shaper: %d", shaper)
+      return
+
+    damping = g.get_float_by_letter("D", 0.0)
+    if g.has_letter("D") and not 0.0 <= damping < 1.0:
+      logging.warning("M593: Invalid damping ratio: %f", damping)
+      return
+
+    for axis in axes:
+      i = self.printer.axis_to_index(axis)
+      if g.has_letter("P"):
+        self.printer.input_shaper[i] = shaper
+      if g.has_letter("F"):
+        self.printer.input_shaper_frequency[i] = max(g.get_float_by_letter("F"), 0.0)
+      if g.has_letter("D"):
+        self.printer.input_shaper_damping[i] = damping
+
+    # the planner shapes the steps it is generating, so let it finish those first
+    self.printer.path_planner.wait_until_done()
+    self.printer.path_planner.update_input_shapers()
+
+  def get_description(self):
+    return "Set or get input shaping"
+
+  def get_long_description(self):
+    return ("Set the input shaper of the given axes, or of X and Y if no axes are given.\n"
+            "P is the shaper: 0 for none, 1 for ZV, 2 for MZV and 3 for EI.\n"
+            "F is the frequency of the resonance to cancel in Hz, 0 disables shaping.\n"
+            "D is the damping ratio of the resonance, from 0 up to but excluding 1.\n"
+            "Example: M593 X Y P2 F40 D0.1\n"
+            "For CoreXY and H-belt machines, Y uses the shaper of X. "
+            "For Delta machines, Y and Z use the shaper of X. "
+            "Without P, F or D, return the shapers of all axes.")
+
+  def is_buffered(self):
+    return True
@@ -0,0 +1,67 @@
+#include "Arc.h"
+
+#include <algorithm>
+#include <cmath>
+
+Arc::Arc(const VectorN& start, const VectorN& end,
+    double center0, double center1, double radius,
+    int plane, bool clockwise,
+    double chordTolerance, double maxSegmentLength)
+    : start(start)
+    , end(end)
+    , center0(center0)
+    , center1(center1)
+    , radius(std::abs(radius))
+    , axis0(plane == ARC_PLANE_YZ ? 1 : 0)
+    , axis1(plane == ARC_PLANE_XY ? 1 : 2)
+{
+    startAngle = std::atan2(start[axis1] - center1, start[axis0] - center0);
+    const double endAngle = std::atan2(end[axis1] - center1, end[axis0] - center0);
+
+    // clockwise arcs have a decreasing angle, counter-clockwise arcs an increasing one
+    sweep = endAngle - startAngle;
+    if (clockwise && sweep >= 0)
+    {
+        sweep -= 2 * M_PI;
+    }
+    else if (!clockwise && sweep <= 0)
+    {
+        sweep += 2 * M_PI;
+    }
+
+    // a chord spanning angle a deviates r * (1 - cos(a / 2)) from the arc
+    double segments = 1;
+    if (chordTolerance > 0 && chordTolerance < this->radius)
+    {
+        const double maxAngle = 2 * std::acos(1 - chordTolerance / this->radius);
+        segments = std::max(segments, std::ceil(std::abs(sweep) / maxAngle));
+    }
+    if (maxSegmentLength > 0)
+    {
+        segments = std::max(segments, std::ceil(std::abs(sweep) * this->radius / maxSegmentLength));
+    }
+
+    numSegments = static_cast<int>(segments);
+}
+
+int Arc::getNumSegments() const
+{
+    return numSegments;
+}
+
+VectorN Arc::getSegmentEnd(int segment) const
+{
+    if (segment >= numSegments)
+    {
+        return end;
+    }
+
+    const double fraction = static_cast<double>(segment) / numSegments;
+    const double angle = startAngle + sweep * fraction;
+
+    VectorN segmentEnd = start + (end - start) * fraction;
+    segmentEnd[axis0] = center0 + radius * std::cos(angle);
+    segmentEnd[axis1] = center1 + radius * std::sin(angle);
+
+    return segmentEnd;
+}
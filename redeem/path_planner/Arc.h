@@ -0,0 +1,47 @@
+#pragma once
+
+#include "config.h"
+#include "vectorN.h"
+
+/**
+ * A G2/G3 arc split into straight segments. The segment count is chosen so that no
+ * segment strays further than chordTolerance from the arc and, if maxSegmentLength
+ * is positive, no segment is longer than maxSegmentLength. Axes outside of the arc
+ * plane (the helical axis and the extruders) move linearly from start to end.
+ */
+class Arc
+{
+private:
+    VectorN start;
+    VectorN end;
+    double center0;
+    double center1;
+    double radius;
+    int axis0;
+    int axis1;
+    double startAngle;
+    double sweep;
+    int numSegments;
+
+public:
+    /**
+     * @param start The start position of the arc
+     * @param end The end position of the arc
+     * @param center0 The center of the arc on the first axis of the plane
+     * @param center1 The center of the arc on the second axis of the plane
+     * @param radius The radius of the arc
+     * @param plane ARC_PLANE_XY, ARC_PLANE_XZ or ARC_PLANE_YZ
+     * @param clockwise True for G2, false for G3. An arc ending where it starts is a full circle.
+     * @param chordTolerance The maximum distance between a segment and the arc
+     * @param maxSegmentLength The maximum length of a segment along the arc, or 0 for no limit
+     */
+    Arc(const VectorN& start, const VectorN& end,
+        double center0, double center1, double radius,
+        int plane, bool clockwise,
+        double chordTolerance, double maxSegmentLength);
+
+    int getNumSegments() const;
+
+    /// The end position of segment 1 to getNumSegments(). The last segment ends exactly at end.
+    VectorN getSegmentEnd(int segment) const;
+};
@@ -0,0 +1,137 @@
+#include "BufferTelemetry.h"
+
+#include <algorithm>
+
+BufferTelemetry::BufferTelemetry()
+{
+    configure(0.1, 0);
+}
+
+double BufferTelemetry::secondsSinceStart(Clock::time_point time) const
+{
+    return std::chrono::duration<double>(time - startTime).count();
+}
+
+void BufferTelemetry::configure(double interval, size_t maxSamples)
+{
+    {
+        std::unique_lock<std::mutex> lock(mutex);
+
+        sampleInterval = std::chrono::duration_cast<Clock::duration>(std::chrono::duration<double>(std::max(interval, 0.0)));
+        this->maxSamples = maxSamples;
+    }
+
+    reset();
+}
+
+bool BufferTelemetry::isSampleDue(Clock::time_point now)
+{
+    std::unique_lock<std::mutex> lock(mutex);
+
+    return maxSamples != 0 && now >= nextSampleTime;
+}
+
+void BufferTelemetry::addSample(Clock::time_point now, uint64_t pathQueueDepth, uint64_t queuedMoveTime, uint64_t pruMemoryUsed)
+{
+    std::unique_lock<std::mutex> lock(mutex);
+
+    if (maxSamples == 0)
+    {
+        return;
+    }
+
+    const BufferSample sample = { secondsSinceStart(now), pathQueueDepth, queuedMoveTime, pruMemoryUsed };
+
+    if (samples.size() < maxSamples)
+    {
+        samples.push_back(sample);
+    }
+    else
+    {
+        samples[nextSample] = sample;
+    }
+
+    nextSample = (nextSample + 1) % maxSamples;
+    nextSampleTime = now + sampleInterval;
+
+    stats.samples++;
+    stats.maxPathQueueDepth = std::max(stats.maxPathQueueDepth, pathQueueDepth);
+    stats.maxQueuedMoveTime = std::max(stats.maxQueuedMoveTime, queuedMoveTime);
+    stats.maxPruMemoryUsed = std::max(stats.maxPruMemoryUsed, pruMemoryUsed);
+}
+
+void BufferTelemetry::addUnderrun(Clock::time_point now, int cause, int64_t gcodeLine)
+{
+    std::unique_lock<std::mutex> lock(mutex);
+
+    const UnderrunEvent underrun = { secondsSinceStart(now), cause, gcodeLine };
+
+    if (underruns.size() < BUFFER_TELEMETRY_UNDERRUN_EVENTS)
+    {
+        underruns.push_back(underrun);
+    }
+    else
+    {
+        underruns[nextUnderrun] = underrun;
+    }
+
+    nextUnderrun = (nextUnderrun + 1) % BUFFER_TELEMETRY_UNDERRUN_EVENTS;
+
+    if (cause == UNDERRUN_PATH_QUEUE)
+    {
+        stats.pathQueueUnderruns++;
+    }
+    else
+    {
+        stats.pruUnderruns++;
+    }
+}
+
+void BufferTelemetry::addPathQueueUnderflow()
+{
+    std::unique_lock<std::mutex> lock(mutex);
+
+    stats.pathQueueUnderflows++;
+}
+
+BufferTelemetryStats BufferTelemetry::getStats()
+{
+    std::unique_lock<std::mutex> lock(mutex);
+
+    return stats;
+}
+
+std::vector<BufferSample> BufferTelemetry::getSamples()
+{
+    std::unique_lock<std::mutex> lock(mutex);
+
+    // until the ring is full, nextSample is its end and the samples are in order already
+    std::vector<BufferSample> oldestFirst(samples.begin() + nextSample, samples.end());
+    oldestFirst.insert(oldestFirst.end(), samples.begin(), samples.begin() + nextSample);
+
+    return oldestFirst;
+}
+
+std::vector<UnderrunEvent> BufferTelemetry::getUnderruns()
+{
+    std::unique_lock<std::mutex> lock(mutex);
+
+    std::vector<UnderrunEvent> oldestFirst(underruns.begin() + nextUnderrun, underruns.end());
+    oldestFirst.insert(oldestFirst.end(), underruns.begin(), underruns.begin() + nextUnderrun);
+
+    return oldestFirst;
+}
+
+void BufferTelemetry::reset()
+{
+    std::unique_lock<std::mutex> lock(mutex);
+
+    startTime = Clock::now();
+    nextSampleTime = startTime;
+    samples.clear();
+    samples.reserve(maxSamples);
+    nextSample = 0;
+    underruns.clear();
+    nextUnderrun = 0;
+    stats = BufferTelemetryStats();
+}
@@ -0,0 +1,95 @@
+#pragma once
+
+#include <chrono>
+#include <cstdint>
+#include <mutex>
+#include <vector>
+
+#include "config.h"
+
+struct BufferSample
+{
+    double time; /// Seconds since the telemetry was configured or reset
+    uint64_t pathQueueDepth; /// Paths waiting in the path queue, including the open path
+    uint64_t queuedMoveTime; /// PRU cycles of moves the PRU has yet to run
+    uint64_t pruMemoryUsed; /// Bytes of the PRU's memory holding step commands
+};
+
+struct UnderrunEvent
+{
+    double time; /// Seconds since the telemetry was configured or reset
+    int cause; /// UNDERRUN_PATH_QUEUE or UNDERRUN_PRU
+    int64_t gcodeLine; /// The line of the G-code that queued the last move the PRU ran before it
+};
+
+struct BufferTelemetryStats
+{
+    uint64_t samples; /// Samples taken, including those that were dropped to make room
+    uint64_t pathQueueUnderruns; /// Underruns with cause UNDERRUN_PATH_QUEUE
+    uint64_t pruUnderruns; /// Underruns with cause UNDERRUN_PRU
+    uint64_t pathQueueUnderflows; /// Paths sent with none queued behind them, whether or not the PRU ran out
+    uint64_t maxPathQueueDepth; /// The most of each sampled value
+    uint64_t maxQueuedMoveTime;
+    uint64_t maxPruMemoryUsed;
+};
+
+/**
+ * Keeps the last samples of how full the buffers between the G-code and the PRU are, taken at
+ * most once per sample interval, and the last underrun events. The planner thread adds them, at
+ * most once per block, so a plain mutex is cheap enough and lets any thread read them.
+ */
+class BufferTelemetry
+{
+public:
+    typedef std::chrono::steady_clock Clock;
+
+private:
+    std::mutex mutex;
+    Clock::time_point startTime;
+    Clock::time_point nextSampleTime;
+    Clock::duration sampleInterval;
+    size_t maxSamples;
+
+    // both are rings once they are full, with the oldest entry at the index after the newest
+    std::vector<BufferSample> samples;
+    size_t nextSample;
+    std::vector<UnderrunEvent> underruns;
+    size_t nextUnderrun;
+
+    BufferTelemetryStats stats;
+
+    double secondsSinceStart(Clock::time_point time) const;
+
+public:
+    BufferTelemetry();
+
+    BufferTelemetry(const BufferTelemetry&) = delete;
+    BufferTelemetry& operator=(const BufferTelemetry&) = delete;
+
+    /**
+     * @brief Set how often to sample and how many samples to keep, and reset the telemetry
+     * @param interval The least time between samples in seconds
+     * @param maxSamples The number of samples kept, or 0 to not sample
+     */
+    void configure(double interval, size_t maxSamples);
+
+    /// Whether a sample taken now would be kept
+    bool isSampleDue(Clock::time_point now);
+
+    void addSample(Clock::time_point now, uint64_t pathQueueDepth, uint64_t queuedMoveTime, uint64_t pruMemoryUsed);
+
+    void addUnderrun(Clock::time_point now, int cause, int64_t gcodeLine);
+
+    /// Count a path that was sent to the PRU with no path queued behind it
+    void addPathQueueUnderflow();
+
+    BufferTelemetryStats getStats();
+
+    /// The samples kept, oldest first
+    std::vector<BufferSample> getSamples();
+
+    /// The underrun events kept, oldest first
+    std::vector<UnderrunEvent> getUnderruns();
+
+    void reset();
+};
@@ -31,8 +31,6 @@
 #include <assert.h>
 #include <math.h>
 
-void calculateLinearMove(const int axis, const int startStep, const int endStep, const double time, std::vector<Step>& steps);
-
 Delta::Delta()
 {
     L = 0.0;
@@ -209,7 +207,7 @@ void Delta::verticalOffset(double Az, double Bz, double Cz, double* offset) cons
     return;
 }
 
-DeltaPathConstants Delta::calculatePathConstants(int axis, const IntVector3& deltaMotorStart, const IntVector3& deltaMotorEnd, const Vector3& stepsPerM, double time) const
+DeltaPathConstants Delta::calculatePathConstants(const IntVector3& deltaMotorStart, const IntVector3& deltaMotorEnd, const Vector3& stepsPerM, double time) const
 {
     DeltaPathConstants result;
     result.deltaMotorStart = deltaMotorStart;
@@ -245,23 +243,27 @@ DeltaPathConstants Delta::calculatePathConstants(int axis, const IntVector3& del
 
     const double L2 = L * L;
 
-    const double& towerX = c.towerX[axis];
-    const double& towerY = c.towerY[axis];
-    const double& towerX2 = c.towerX2[axis];
-    const double& towerY2 = c.towerY2[axis];
+    for (int axis = 0; axis < 3; axis++)
+    {
+        const double& towerX = c.towerX[axis];
+        const double& towerY = c.towerY[axis];
+        const double& towerX2 = c.towerX2[axis];
+        const double& towerY2 = c.towerY2[axis];
 
-    result.axisCore1 = (-Yd2 - Xd2) * Zo2 + (2 * Yd * Yo - 2 * towerY * Yd + 2 * Xd * Xo - 2 * towerX * Xd) * Zd * Zo + (-Yo2 + 2 * towerY * Yo - Xo2 + 2 * towerX * Xo + L2 - towerY2 - towerX2) * Zd2 - Xd2 * Yo2 + ((2 * Xd * Xo - 2 * towerX * Xd) * Yd + 2 * towerY * Xd2) * Yo + (-Xo2 + 2 * towerX * Xo + L2 - towerX2) * Yd2 + (2 * towerX * towerY * Xd - 2 * towerY * Xd * Xo) * Yd + (L2 - towerY2) * Xd2;
+        result.axisCore1[axis] = (-Yd2 - Xd2) * Zo2 + (2 * Yd * Yo - 2 * towerY * Yd + 2 * Xd * Xo - 2 * towerX * Xd) * Zd * Zo + (-Yo2 + 2 * towerY * Yo - Xo2 + 2 * towerX * Xo + L2 - towerY2 - towerX2) * Zd2 - Xd2 * Yo2 + ((2 * Xd * Xo - 2 * towerX * Xd) * Yd + 2 * towerY * Xd2) * Yo + (-Xo2 + 2 * towerX * Xo + L2 - towerX2) * Yd2 + (2 * towerX * towerY * Xd - 2 * towerY * Xd * Xo) * Yd + (L2 - towerY2) * Xd2;
 
-    result.axisCore2 = ((2 * Yd2 + 2 * Xd2) * Zo + (-2 * Yd * Yo + 2 * towerY * Yd - 2 * Xd * Xo + 2 * towerX * Xd) * Zd);
+        result.axisCore2[axis] = ((2 * Yd2 + 2 * Xd2) * Zo + (-2 * Yd * Yo + 2 * towerY * Yd - 2 * Xd * Xo + 2 * towerX * Xd) * Zd);
+    }
 
     result.time = time;
     return result;
 }
 
-void Delta::calculateMove(const IntVector3& deltaStart, const IntVector3& deltaEnd, const Vector3& stepsPerM, double time, std::array<std::vector<Step>, NUM_AXES>& steps) const
+void Delta::calculateMove(const IntVector3& deltaStart, const IntVector3& deltaEnd, const Vector3& stepsPerM, double time, DeltaPathConstants& constants, std::array<AxisSteps, NUM_AXES>& steps) const
 {
     auto const timestamp = std::chrono::system_clock::now();
-    const DeltaPathConstants c = calculatePathConstants(0, deltaStart, deltaEnd, stepsPerM, time);
+    constants = calculatePathConstants(deltaStart, deltaEnd, stepsPerM, time);
+    const DeltaPathConstants& c = constants;
 
     if (deltaStart == deltaEnd)
     {
@@ -274,7 +276,7 @@ void Delta::calculateMove(const IntVector3& deltaStart, const IntVector3& deltaE
         for (int axis = 0; axis < 3; axis++)
         {
             LOG("no XY move - calculating Z move as linear" << std::endl);
-            calculateLinearMove(axis, deltaStart[axis], deltaEnd[axis], time, steps[axis]);
+            steps[axis].addLeg(axis, deltaStart[axis], deltaEnd[axis], 0, time, false);
         }
     }
     else
@@ -283,7 +285,6 @@ void Delta::calculateMove(const IntVector3& deltaStart, const IntVector3& deltaE
 
         for (int axis = 0; axis < 3; axis++)
         {
-            const DeltaPathConstants c = calculatePathConstants(axis, deltaStart, deltaEnd, stepsPerM, time);
             calculateSteps(axis, c, steps[axis]);
         }
     }
@@ -292,71 +293,32 @@ void Delta::calculateMove(const IntVector3& deltaStart, const IntVector3& deltaE
     LOG("calculating move took " << std::chrono::duration_cast<std::chrono::milliseconds>(timeTaken).count() << " ms" << std::endl);
 }
 
-void Delta::calculateSteps(int axis, const DeltaPathConstants& c, std::vector<Step>& steps) const
+void Delta::calculateSteps(int axis, const DeltaPathConstants& c, AxisSteps& steps) const
 {
     assert(axis >= 0 && axis <= 2);
 
-    const double towerX = (axis == 0 ? Avx : (axis == 1 ? Bvx : Cvx));
-    const double towerY = (axis == 0 ? Avy : (axis == 1 ? Bvy : Cvy));
-
     const double criticalPointTime = calculateCriticalPointTimeForAxis(axis, c);
 
-    assert(steps.empty());
+    const int startStep = std::lroundl(c.deltaStart[axis] * c.stepsPerM[axis]); // m * (steps/m) = step
+    const int endStep = std::lroundl(c.deltaEnd[axis] * c.stepsPerM[axis]);
 
     if (std::isnan(criticalPointTime) || criticalPointTime <= 0 || criticalPointTime >= c.time)
     {
-        LOG("axis " << axis << " has no critical point - calculating steps from " << c.deltaStart[axis] << " to " << c.deltaEnd[axis] << std::endl);
+        LOG("axis " << axis << " has no critical point - steps go from " << c.deltaStart[axis] << " to " << c.deltaEnd[axis] << std::endl);
         // easy case - axis has no critical point
-        steps.reserve(std::abs(c.deltaMotorEnd[axis] - c.deltaMotorStart[axis]));
-
-        calculateStepsInOneDirection(axis, c, 0, c.time,
-            towerX, towerY, c.deltaStart[axis], c.deltaEnd[axis], steps);
+        steps.addLeg(axis, startStep, endStep, 0, c.time, true);
     }
     else
     {
         const Vector3 criticalPointCartesianPosition = c.worldStart + (c.axisSpeeds * criticalPointTime);
         const Vector3 criticalPointDeltaPosition = worldToDelta(criticalPointCartesianPosition);
         const double criticalPointHeight = criticalPointDeltaPosition[axis];
-        const long criticalPointMotorPos = std::lround(criticalPointHeight * c.stepsPerM[axis]);
+        const int criticalPointStep = std::lroundl(criticalPointHeight * c.stepsPerM[axis]);
 
-        LOG("axis " << axis << " has a critical point at " << criticalPointTime << " - calculating steps from " << c.deltaStart[axis] << " to " << criticalPointHeight << " to " << c.deltaEnd[axis] << std::endl);
-        steps.reserve(std::abs(c.deltaMotorStart[axis] - criticalPointMotorPos) + std::abs(criticalPointMotorPos - c.deltaMotorEnd[axis]));
+        LOG("axis " << axis << " has a critical point at " << criticalPointTime << " - steps go from " << c.deltaStart[axis] << " to " << criticalPointHeight << " to " << c.deltaEnd[axis] << std::endl);
 
-        calculateStepsInOneDirection(axis, c, 0, criticalPointTime,
-            towerX, towerY, c.deltaStart[axis], criticalPointHeight, steps);
-
-        calculateStepsInOneDirection(axis, c, criticalPointTime, c.time,
-            towerX, towerY, criticalPointHeight, c.deltaEnd[axis], steps);
-    }
-}
-
-void Delta::calculateStepsInOneDirection(int axis, const DeltaPathConstants& c, double startTime, double endTime, double towerX, double towerY, double startHeight, double endHeight, std::vector<Step>& steps) const
-{
-    const bool direction = startHeight < endHeight;
-
-    const int startStep = std::lroundl(startHeight * c.stepsPerM[axis]); // m * (steps/m) = step
-    const int endStep = std::lroundl(endHeight * c.stepsPerM[axis]);
-
-    const int stepIncrement = direction ? 1 : -1;
-    const double stepOffset = stepIncrement / 2.0;
-
-    int step = startStep;
-    double time = startTime;
-
-    while (step != endStep)
-    {
-        const double height = (step + stepOffset) / c.stepsPerM[axis];
-
-        time = calculateStepTime(axis, c, height, time, endTime);
-
-        assert(steps.empty() || time > steps.back().time);
-
-        steps.emplace_back(Step(time, axis, direction));
-
-        assert(!std::isnan(time));
-        assert(time <= endTime);
-
-        step += stepIncrement;
+        steps.addLeg(axis, startStep, criticalPointStep, 0, criticalPointTime, true);
+        steps.addLeg(axis, criticalPointStep, endStep, criticalPointTime, c.time, true);
     }
 }
 
@@ -410,7 +372,7 @@ double Delta::calculateCriticalPointTimeForAxis(int axis, const DeltaPathConstan
     }
 }
 
-double Delta::calculateStepTime(int axis, const DeltaPathConstants& c, double towerZ, double minTime, double maxTime) const
+double Delta::calculateStepTime(int axis, const DeltaPathConstants& c, double towerZ, double minTime, double maxTime)
 {
     const double& Xo = c.worldStart.x;
     const double& Yo = c.worldStart.y;
@@ -474,7 +436,7 @@ double Delta::calculateStepTime(int axis, const DeltaPathConstants& c, double to
 
   */
 
-    const double core = std::sqrt(c.axisCore1 + c.axisCore2 * towerZ - (Xd2 + Yd2) * towerZ2);
+    const double core = std::sqrt(c.axisCore1[axis] + c.axisCore2[axis] * towerZ - (Xd2 + Yd2) * towerZ2);
 
     const double denominator = (Zd2 + Yd2 + Xd2);
 
@@ -504,3 +466,78 @@ double Delta::calculateStepTime(int axis, const DeltaPathConstants& c, double to
         return largerTime;
     }
 }
+
+void Delta::calculateStepTimes(int axis, const DeltaPathConstants& c, double firstPosition, double positionIncrement, int count, double minTime, double maxTime, double* times)
+{
+    const double& Xo = c.worldStart.x;
+    const double& Yo = c.worldStart.y;
+    const double& Zo = c.worldStart.z;
+    const double& Xd = c.axisSpeeds.x;
+    const double& Yd = c.axisSpeeds.y;
+    const double& Zd = c.axisSpeeds.z;
+    const double& Xd2 = c.axisSpeeds2.x;
+    const double& Yd2 = c.axisSpeeds2.y;
+    const double& Zd2 = c.axisSpeeds2.z;
+
+    const double& towerX = c.towerX[axis];
+    const double& towerY = c.towerY[axis];
+    const double& axisCore1 = c.axisCore1[axis];
+    const double& axisCore2 = c.axisCore2[axis];
+    const double& stepsPerM = c.stepsPerM[axis];
+
+    const double denominator = (Zd2 + Yd2 + Xd2);
+
+    // The two times a tower reaches each height don't depend on the other steps, so they're
+    // computed in a branchless loop the compiler can vectorize. Picking the time that follows
+    // the step before is the only serial part. The math is the same as calculateStepTime's.
+    const int batchSize = 32;
+    double firstTimes[batchSize];
+    double secondTimes[batchSize];
+
+    for (int batchStart = 0; batchStart < count; batchStart += batchSize)
+    {
+        const int batchCount = std::min(batchSize, count - batchStart);
+
+        for (int i = 0; i < batchCount; i++)
+        {
+            const double towerZ = (firstPosition + (batchStart + i) * positionIncrement) / stepsPerM;
+            const double towerZ2 = towerZ * towerZ;
+
+            const double core = std::sqrt(axisCore1 + axisCore2 * towerZ - (Xd2 + Yd2) * towerZ2);
+
+            firstTimes[i] = -(core + Zd * Zo - towerZ * Zd + Yd * Yo - towerY * Yd + Xd * Xo - towerX * Xd) / denominator;
+            secondTimes[i] = (core + -Zd * Zo + towerZ * Zd - Yd * Yo + towerY * Yd - Xd * Xo + towerX * Xd) / denominator;
+        }
+
+        for (int i = 0; i < batchCount; i++)
+        {
+            const double firstTime = firstTimes[i];
+            const double secondTime = secondTimes[i];
+
+            assert(!std::isnan(firstTime) && !std::isnan(secondTime));
+
+            const double smallerTime = std::min(firstTime, secondTime);
+            const double largerTime = std::max(firstTime, secondTime);
+
+            if (std::isnan(firstTime))
+            {
+                minTime = secondTime;
+            }
+            else if (std::isnan(secondTime))
+            {
+                minTime = firstTime;
+            }
+            else if (smallerTime > minTime)
+            {
+                assert(largerTime > maxTime);
+                minTime = smallerTime;
+            }
+            else
+            {
+                minTime = largerTime;
+            }
+
+            times[batchStart + i] = minTime;
+        }
+    }
+}
@@ -31,29 +31,6 @@ along with Redeem.  If not, see <http://www.gnu.org/licenses/>.
 #include "config.h"
 #include "vector3.h"
 
-struct DeltaPathConstants
-{
-    IntVector3 deltaMotorStart;
-    IntVector3 deltaMotorEnd;
-    Vector3 deltaStart;
-    Vector3 deltaEnd;
-    Vector3 worldStart;
-    Vector3 worldEnd;
-    Vector3 worldStart2;
-    Vector3 stepsPerM;
-    Vector3 axisSpeeds;
-    Vector3 axisSpeeds2;
-    Vector3 axisSpeeds3;
-    Vector3 axisSpeeds4;
-    Vector3 towerX;
-    Vector3 towerY;
-    Vector3 towerX2;
-    Vector3 towerY2;
-    double time;
-    double axisCore1;
-    double axisCore2;
-};
-
 class Delta
 {
 private:
@@ -65,11 +42,9 @@ private:
     double A_angular, B_angular, C_angular;
 
     void recalculate();
-    DeltaPathConstants calculatePathConstants(int axis, const IntVector3& deltaMotorStart, const IntVector3& deltaMotorEnd, const Vector3& stepsPerM, double time) const;
-    void calculateSteps(int axis, const DeltaPathConstants& constants, std::vector<Step>& steps) const;
-    void calculateStepsInOneDirection(int axis, const DeltaPathConstants& constants, double startTime, double endTime, double towerX, double towerY, double startHeight, double endHeight, std::vector<Step>& steps) const;
+    DeltaPathConstants calculatePathConstants(const IntVector3& deltaMotorStart, const IntVector3& deltaMotorEnd, const Vector3& stepsPerM, double time) const;
+    void calculateSteps(int axis, const DeltaPathConstants& constants, AxisSteps& steps) const;
     double calculateCriticalPointTimeForAxis(int axis, const DeltaPathConstants& constants) const;
-    double calculateStepTime(int axis, const DeltaPathConstants& constants, double towerZ, double minTime, double maxTime) const;
 
 public:
     Delta();
@@ -85,7 +60,17 @@ public:
     void deltaToWorld(double Az, double Bz, double Cz, double* X, double* Y, double* Z);
     IntVector3 worldToDeltaMotorPos(const Vector3& pos, const Vector3& stepsPerM);
     void verticalOffset(double Az, double Bz, double Cz, double* offset) const;
-    void calculateMove(const IntVector3& deltaStart, const IntVector3& deltaEnd, const Vector3& stepsPerM, double speed, std::array<std::vector<Step>, NUM_AXES>& steps) const;
+    void calculateMove(const IntVector3& deltaStart, const IntVector3& deltaEnd, const Vector3& stepsPerM, double time, DeltaPathConstants& constants, std::array<AxisSteps, NUM_AXES>& steps) const;
+
+    /// The time the tower of the axis reaches towerZ between minTime and maxTime
+    static double calculateStepTime(int axis, const DeltaPathConstants& constants, double towerZ, double minTime, double maxTime);
+
+    /**
+     * The same as calculateStepTime for count steps in a row, at firstPosition and every
+     * positionIncrement after it, in steps. Each step is after the one before it, and the
+     * first one after minTime.
+     */
+    static void calculateStepTimes(int axis, const DeltaPathConstants& constants, double firstPosition, double positionIncrement, int count, double minTime, double maxTime, double* times);
 };
 
 #endif
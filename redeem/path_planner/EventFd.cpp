@@ -0,0 +1,118 @@
+#include "EventFd.h"
+
+#include <cerrno>
+#include <chrono>
+#include <cstring>
+
+#ifdef __linux__
+#include <poll.h>
+#include <sys/eventfd.h>
+#include <unistd.h>
+#endif
+
+#include "Logger.h"
+
+#ifdef __linux__
+EventFd::EventFd()
+    : eventFd(eventfd(0, EFD_NONBLOCK | EFD_CLOEXEC))
+{
+    if (eventFd < 0)
+    {
+        LOGERROR("Can't create an eventfd: " << strerror(errno) << std::endl);
+    }
+}
+
+EventFd::~EventFd()
+{
+    if (eventFd >= 0)
+    {
+        close(eventFd);
+    }
+}
+
+void EventFd::signal(uint64_t count)
+{
+    while (write(eventFd, &count, sizeof(count)) < 0 && errno == EINTR)
+    {
+    }
+}
+
+uint64_t EventFd::wait(int timeout)
+{
+    pollfd event = { eventFd, POLLIN, 0 };
+
+    while (poll(&event, 1, timeout) < 0 && errno == EINTR)
+    {
+    }
+
+    return take();
+}
+
+uint64_t EventFd::take()
+{
+    uint64_t count = 0;
+
+    if (read(eventFd, &count, sizeof(count)) != sizeof(count))
+    {
+        return 0;
+    }
+
+    return count;
+}
+
+int EventFd::fd() const
+{
+    return eventFd;
+}
+#else
+EventFd::EventFd()
+    : count(0)
+{
+}
+
+EventFd::~EventFd()
+{
+}
+
+void EventFd::signal(uint64_t count)
+{
+    {
+        std::unique_lock<std::mutex> lock(mutex);
+        this->count += count;
+    }
+
+    signalled.notify_all();
+}
+
+uint64_t EventFd::wait(int timeout)
+{
+    std::unique_lock<std::mutex> lock(mutex);
+
+    if (timeout < 0)
+    {
+        signalled.wait(lock, [this] { return count != 0; });
+    }
+    else
+    {
+        signalled.wait_for(lock, std::chrono::milliseconds(timeout), [this] { return count != 0; });
+    }
+
+    const uint64_t result = count;
+    count = 0;
+    return result;
+}
+
+uint64_t EventFd::take()
+{
+    std::unique_lock<std::mutex> lock(mutex);
+
+    const uint64_t result = count;
+    count = 0;
+    return result;
+}
+
+int EventFd::fd() const
+{
+    return -1;
+}
+#endif
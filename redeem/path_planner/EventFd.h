@@ -0,0 +1,45 @@
+#pragma once
+
+#include <cstdint>
+
+#ifndef __linux__
+#include <condition_variable>
+#include <mutex>
+#endif
+
+/**
+ * A counter that threads add to and one thread waits on, the way the PRU's interrupt wakes up
+ * the thread that retires its blocks. On Linux it's an eventfd, so it can be polled along with
+ * other file descriptors, and signals that arrive before the wait are added up rather than lost,
+ * so one wake-up can take several of them.
+ */
+class EventFd
+{
+private:
+#ifdef __linux__
+    int eventFd;
+#else
+    std::mutex mutex;
+    std::condition_variable signalled;
+    uint64_t count;
+#endif
+
+public:
+    EventFd();
+    ~EventFd();
+
+    EventFd(const EventFd&) = delete;
+    EventFd& operator=(const EventFd&) = delete;
+
+    /// Add count to the counter and wake up the waiting thread
+    void signal(uint64_t count = 1);
+
+    /// Wait up to timeout milliseconds, or forever if it's negative, then return the counter and reset it
+    uint64_t wait(int timeout);
+
+    /// Return the counter and reset it without waiting
+    uint64_t take();
+
+    /// The eventfd to poll, or -1 where there are none
+    int fd() const;
+};
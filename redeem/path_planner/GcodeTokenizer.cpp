@@ -0,0 +1,321 @@
+#include "GcodeTokenizer.h"
+
+#include <algorithm>
+#include <cstdlib>
+#include <stdexcept>
+
+namespace
+{
+
+// The characters Python's str.strip() removes from an ASCII string
+bool isStripSpace(char c)
+{
+    return c == ' ' || c == '\t' || c == '\n' || c == '\r' || c == '\v' || c == '\f' || (c >= 0x1c && c <= 0x1f);
+}
+
+bool isDigit(char c)
+{
+    return c >= '0' && c <= '9';
+}
+
+bool isLetter(char c)
+{
+    return c >= 'A' && c <= 'Z';
+}
+
+char toUpper(char c)
+{
+    return (c >= 'a' && c <= 'z') ? static_cast<char>(c - 'a' + 'A') : c;
+}
+
+// Equivalent of re.sub(r"\(.*\)", "", s): on each line everything from the
+// first '(' up to and including the last ')' is removed.
+std::string stripComments(const std::string& s)
+{
+    std::string out;
+    out.reserve(s.size());
+
+    size_t lineStart = 0;
+    while (lineStart <= s.size())
+    {
+        size_t lineEnd = s.find('\n', lineStart);
+        if (lineEnd == std::string::npos)
+        {
+            lineEnd = s.size();
+        }
+
+        const size_t open = s.find('(', lineStart);
+        const size_t close = open < lineEnd ? s.rfind(')', lineEnd - 1) : std::string::npos;
+
+        if (open < lineEnd && close != std::string::npos && close > open)
+        {
+            out.append(s, lineStart, open - lineStart);
+            out.append(s, close + 1, lineEnd - close - 1);
+        }
+        else
+        {
+            out.append(s, lineStart, lineEnd - lineStart);
+        }
+
+        if (lineEnd < s.size())
+        {
+            out.push_back('\n');
+        }
+        lineStart = lineEnd + 1;
+    }
+
+    return out;
+}
+
+// Equivalent of Python's int() for the checksum field
+long parseChecksum(const std::string& s)
+{
+    size_t begin = 0;
+    size_t end = s.size();
+    while (begin < end && isStripSpace(s[begin]))
+    {
+        begin++;
+    }
+    while (end > begin && isStripSpace(s[end - 1]))
+    {
+        end--;
+    }
+
+    bool negative = false;
+    if (begin < end && (s[begin] == '-' || s[begin] == '+'))
+    {
+        negative = s[begin] == '-';
+        begin++;
+    }
+
+    if (begin == end || !isDigit(s[begin]) || !isDigit(s[end - 1]))
+    {
+        throw std::invalid_argument("invalid checksum: " + s);
+    }
+
+    long value = 0;
+    for (size_t i = begin; i < end; i++)
+    {
+        if (isDigit(s[i]))
+        {
+            value = value * 10 + (s[i] - '0');
+        }
+        else if (s[i] != '_' || s[i + 1] == '_')
+        {
+            throw std::invalid_argument("invalid checksum: " + s);
+        }
+    }
+
+    return negative ? -value : value;
+}
+
+// float(token[1:]), or 0.0 if that would raise a ValueError
+double parseValue(const std::string& token)
+{
+    bool hasDigit = false;
+    for (size_t i = 1; i < token.size(); i++)
+    {
+        if (token[i] == '?')
+        {
+            return 0.0;
+        }
+        hasDigit |= isDigit(token[i]);
+    }
+
+    return hasDigit ? std::strtod(token.c_str() + 1, nullptr) : 0.0;
+}
+
+} // namespace
+
+void tokenizeGcode(const std::string& raw, GcodeTokens* result)
+{
+    *result = GcodeTokens();
+
+    for (const char c : raw)
+    {
+        if (c & 0x80)
+        {
+            return;
+        }
+    }
+    result->valid = true;
+
+    // message = raw.strip().split(";")[0].strip(' \t\n\r')
+    size_t begin = 0;
+    size_t end = raw.size();
+    while (begin < end && isStripSpace(raw[begin]))
+    {
+        begin++;
+    }
+    while (end > begin && isStripSpace(raw[end - 1]))
+    {
+        end--;
+    }
+    end = std::min(end, raw.find(';', begin));
+    while (begin < end && (raw[begin] == ' ' || raw[begin] == '\t' || raw[begin] == '\n' || raw[begin] == '\r'))
+    {
+        begin++;
+    }
+    while (end > begin && (raw[end - 1] == ' ' || raw[end - 1] == '\t' || raw[end - 1] == '\n' || raw[end - 1] == '\r'))
+    {
+        end--;
+    }
+
+    if (begin == end)
+    {
+        return;
+    }
+
+    std::string message = stripComments(raw.substr(begin, end - begin));
+
+    // Tokenize gcode "words" per RS274/NFC v3, ignoring spaces within words.
+    // See Gcode.py for the M117 exception.
+    const size_t length = message.size();
+    auto skipSpaces = [&](size_t i) {
+        while (i < length && message[i] == ' ')
+        {
+            i++;
+        }
+        return i;
+    };
+
+    std::vector<std::string>& tokens = result->tokens;
+    size_t i = skipSpaces(0);
+
+    {
+        size_t j = i;
+        const char* m117 = "M117";
+        int matched = 0;
+        while (matched < 4 && j < length && toUpper(message[j]) == m117[matched])
+        {
+            j = skipSpaces(j + 1);
+            matched++;
+        }
+        if (matched == 4 && (j == length || !isLetter(toUpper(message[j]))))
+        {
+            tokens.emplace_back(m117);
+            i = j;
+        }
+    }
+
+    while (i < length)
+    {
+        const char letter = toUpper(message[i]);
+        i = skipSpaces(i + 1);
+        if (!isLetter(letter))
+        {
+            continue;
+        }
+
+        std::string token(1, letter);
+        if (i < length && (message[i] == '-' || message[i] == '+'))
+        {
+            token.push_back(message[i]);
+            i = skipSpaces(i + 1);
+        }
+        while (i < length && isDigit(message[i]))
+        {
+            token.push_back(message[i]);
+            i = skipSpaces(i + 1);
+        }
+        if (i < length && message[i] == '.')
+        {
+            token.push_back('.');
+            i = skipSpaces(i + 1);
+        }
+        while (i < length && isDigit(message[i]))
+        {
+            token.push_back(message[i]);
+            i = skipSpaces(i + 1);
+        }
+        if (i < length && message[i] == '?')
+        {
+            token.push_back('?');
+            i = skipSpaces(i + 1);
+        }
+        tokens.push_back(std::move(token));
+    }
+
+    if (tokens.empty())
+    {
+        throw std::invalid_argument("no G-code words in message");
+    }
+
+    size_t first = 0;
+
+    // process line numbers and checksum, if present
+    if (tokens[0][0] == 'N')
+    {
+        const std::string& lineToken = tokens[0];
+        const size_t digitsBegin = lineToken.find_first_of("0123456789");
+        if (digitsBegin == std::string::npos)
+        {
+            throw std::invalid_argument("line number missing");
+        }
+        size_t digitsEnd = digitsBegin;
+        while (digitsEnd < lineToken.size() && isDigit(lineToken[digitsEnd]))
+        {
+            digitsEnd++;
+        }
+
+        const size_t star = raw.find('*');
+        if (star == std::string::npos)
+        {
+            throw std::invalid_argument("checksum missing");
+        }
+
+        int checksum = 0;
+        for (size_t c = 0; c < star; c++)
+        {
+            checksum ^= raw[c];
+        }
+
+        const size_t checksumEnd = raw.find_first_of("*;", star + 1);
+        const std::string checksumText = raw.substr(star + 1, checksumEnd == std::string::npos ? std::string::npos : checksumEnd - star - 1);
+        if (parseChecksum(checksumText) != checksum)
+        {
+            throw std::invalid_argument("GCODE message failed CRC check");
+        }
+
+        result->hasLineNumber = true;
+        result->lineNumber = std::stol(lineToken.substr(digitsBegin, digitsEnd - digitsBegin));
+        first = 1;
+
+        // Remove line number and crc from the message
+        message = message.substr(0, message.find('*'));
+        size_t messageBegin = std::min(message.size(), 1 + digitsEnd - digitsBegin);
+        size_t messageEnd = message.size();
+        while (messageBegin < messageEnd && message[messageBegin] == ' ')
+        {
+            messageBegin++;
+        }
+        while (messageEnd > messageBegin && message[messageEnd - 1] == ' ')
+        {
+            messageEnd--;
+        }
+        message = message.substr(messageBegin, messageEnd - messageBegin);
+    }
+
+    if (tokens.size() <= first)
+    {
+        throw std::invalid_argument("no G-code command in message");
+    }
+
+    result->command = tokens[first];
+    for (char& c : result->command)
+    {
+        if (c == '.')
+        {
+            c = '_';
+        }
+    }
+
+    tokens.erase(tokens.begin(), tokens.begin() + first + 1);
+    result->values.reserve(tokens.size());
+    for (const std::string& token : tokens)
+    {
+        result->values.push_back(parseValue(token));
+    }
+
+    result->message = std::move(message);
+}
@@ -0,0 +1,32 @@
+#pragma once
+
+#include <string>
+#include <vector>
+
+struct GcodeTokens
+{
+    // False if the line contains non-ASCII characters. The caller is expected
+    // to fall back to the Python tokenizer in that case, since Python's
+    // whitespace and case rules differ from ours outside of ASCII.
+    bool valid = false;
+
+    // Message minus ;comment, (comment), line number and checksum
+    std::string message;
+
+    // Primary word with '.' replaced by '_', empty for an empty line
+    std::string command;
+
+    // Remaining words, e.g. "X-1.5", and their parsed values (0.0 if the word has no parsable value)
+    std::vector<std::string> tokens;
+    std::vector<double> values;
+
+    bool hasLineNumber = false;
+    long lineNumber = 0;
+};
+
+/**
+ * Tokenize a G-code line in a single scan, with the same semantics as the
+ * regex based tokenizer in Gcode.py. Throws std::invalid_argument if the line
+ * is malformed or fails its checksum.
+ */
+void tokenizeGcode(const std::string& raw, GcodeTokens* tokens);
@@ -0,0 +1,70 @@
+%module GcodeTokenizerNative
+
+%include "std_string.i"
+
+%{
+#include <stdexcept>
+#include "GcodeTokenizer.h"
+%}
+
+// exception handler
+%exception {
+  try {
+  $action
+  }
+  catch (const std::exception& e) {
+    PyErr_SetString(PyExc_ValueError, e.what());
+    return 0;
+  }
+}
+
+%typemap(in, numinputs=0) GcodeTokens* result (GcodeTokens temp) {
+  $1 = &temp;
+}
+
+// Returns None if the line has to be handled by the Python tokenizer,
+// otherwise (message, command, tokens, values, line_number) as in Gcode.py
+%typemap(argout, fragment="SWIG_From_std_string") GcodeTokens* result (PyObject* tokenList, PyObject* valueList) {
+  Py_DECREF($result);
+
+  if (!$1->valid) {
+    Py_INCREF(Py_None);
+    $result = Py_None;
+  }
+  else {
+    tokenList = PyList_New($1->tokens.size());
+    valueList = PyList_New($1->values.size());
+    if (!tokenList || !valueList) {
+      Py_XDECREF(tokenList);
+      Py_XDECREF(valueList);
+      return NULL;
+    }
+
+    for (size_t i = 0; i < $1->tokens.size(); i++) {
+      PyList_SET_ITEM(tokenList, i, SWIG_From_std_string($1->tokens[i]));
+      PyList_SET_ITEM(valueList, i, PyFloat_FromDouble($1->values[i]));
+    }
+
+    PyObject* command = Py_None;
+    if ($1->command.empty()) {
+      Py_INCREF(Py_None);
+    }
+    else {
+      command = SWIG_From_std_string($1->command);
+    }
+
+    PyObject* lineNumber = Py_None;
+    if ($1->hasLineNumber) {
+      lineNumber = PyLong_FromLong($1->lineNumber);
+    }
+    else {
+      Py_INCREF(Py_None);
+    }
+
+    $result = Py_BuildValue("(NNNNN)", SWIG_From_std_string($1->message), command, tokenList, valueList, lineNumber);
+  }
+}
+
+%rename(tokenize) tokenizeGcode;
+
+void tokenizeGcode(const std::string& raw, GcodeTokens* result);
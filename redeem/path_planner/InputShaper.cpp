@@ -0,0 +1,218 @@
+#include "InputShaper.h"
+#include "StepperCommand.h"
+
+#include <algorithm>
+#include <cassert>
+#include <cmath>
+#include <limits>
+
+InputShaper::InputShaper()
+    : advanceCoefficient(0)
+    , advanceSmoothTime(0)
+{
+    reset();
+}
+
+void InputShaper::configure(int type, double frequency, double damping)
+{
+    impulses.clear();
+    reset();
+
+    if (type == INPUT_SHAPER_NONE || frequency <= 0)
+    {
+        updateAdvanceImpulses();
+        return;
+    }
+
+    assert(damping >= 0 && damping < 1);
+
+    const double dampingFactor = std::sqrt(1 - damping * damping);
+    const double dampedPeriod = 1 / (frequency * dampingFactor);
+    const double k = std::exp(-damping * M_PI / dampingFactor);
+
+    switch (type)
+    {
+    case INPUT_SHAPER_ZV:
+        impulses = { { 1, 0 }, { k, 0.5 * dampedPeriod } };
+        break;
+    case INPUT_SHAPER_MZV:
+    {
+        const double mzvK = std::exp(-0.75 * damping * M_PI / dampingFactor);
+        const double a = 1 - 1 / std::sqrt(2);
+        impulses = { { a, 0 }, { (std::sqrt(2) - 1) * mzvK, 0.375 * dampedPeriod }, { a * mzvK * mzvK, 0.75 * dampedPeriod } };
+        break;
+    }
+    case INPUT_SHAPER_EI:
+    {
+        // tolerate 5% of vibration at the resonance in exchange for a wider band around it
+        const double vibrationTolerance = 0.05;
+        const double a = 0.25 * (1 + vibrationTolerance);
+        impulses = { { a, 0 }, { 0.5 * (1 - vibrationTolerance) * k, 0.5 * dampedPeriod }, { a * k * k, dampedPeriod } };
+        break;
+    }
+    default:
+        assert(0);
+    }
+
+    double total = 0;
+    for (const Impulse& impulse : impulses)
+    {
+        total += impulse.amplitude;
+    }
+
+    for (Impulse& impulse : impulses)
+    {
+        impulse.amplitude /= total;
+    }
+
+    updateAdvanceImpulses();
+}
+
+void InputShaper::setPressureAdvance(double coefficient, double smoothTime)
+{
+    assert(coefficient >= 0);
+    assert(coefficient == 0 || smoothTime > 0);
+
+    advanceCoefficient = coefficient;
+    advanceSmoothTime = smoothTime;
+
+    reset();
+    updateAdvanceImpulses();
+}
+
+void InputShaper::updateAdvanceImpulses()
+{
+    advanceImpulses.clear();
+
+    if (advanceCoefficient <= 0)
+    {
+        return;
+    }
+
+    // (e(t) - e(t - smoothTime)) / smoothTime is the extruder speed averaged over the window
+    const double advance = advanceCoefficient / advanceSmoothTime;
+    const std::vector<Impulse> shaperImpulses = impulses.empty() ? std::vector<Impulse>{ { 1, 0 } } : impulses;
+
+    for (const Impulse& impulse : shaperImpulses)
+    {
+        advanceImpulses.push_back(Impulse{ impulse.amplitude * (1 + advance), impulse.delay });
+        advanceImpulses.push_back(Impulse{ -impulse.amplitude * advance, impulse.delay + advanceSmoothTime });
+    }
+}
+
+void InputShaper::reset()
+{
+    pendingSteps = std::priority_queue<FractionalStep>();
+    position = 0;
+    moveStart = 0;
+    lastStepTime = 0;
+}
+
+bool InputShaper::isEnabled() const
+{
+    return !impulses.empty() || !advanceImpulses.empty();
+}
+
+bool InputShaper::hasPendingSteps() const
+{
+    return !pendingSteps.empty();
+}
+
+double InputShaper::getDuration() const
+{
+    double duration = impulses.empty() ? 0 : impulses.back().delay;
+
+    for (const Impulse& impulse : advanceImpulses)
+    {
+        duration = std::max(duration, impulse.delay);
+    }
+
+    return duration;
+}
+
+double InputShaper::shapeSteps(std::vector<Step>& steps, unsigned char axis, double moveEndTime, bool flush, bool advance)
+{
+    if (!isEnabled())
+    {
+        return moveEndTime;
+    }
+
+    static const std::vector<Impulse> unshaped = { { 1, 0 } };
+    const std::vector<Impulse>& shaperImpulses = impulses.empty() ? unshaped : impulses;
+    const std::vector<Impulse>& stepImpulses = advance && !advanceImpulses.empty() ? advanceImpulses : shaperImpulses;
+
+    for (const Step& step : steps)
+    {
+        for (const Impulse& impulse : stepImpulses)
+        {
+            pendingSteps.push(FractionalStep{ moveStart + step.time + impulse.delay, step.direction ? impulse.amplitude : -impulse.amplitude });
+        }
+    }
+
+    steps.clear();
+
+    const int64_t moveEnd = roundStepTime(moveEndTime);
+    const int64_t endTime = flush ? std::numeric_limits<int64_t>::max() : moveEnd;
+
+    // first the steps that didn't fit into the move before
+    takeSteps(steps, axis, 0, endTime);
+
+    while (!pendingSteps.empty())
+    {
+        const FractionalStep next = pendingSteps.top();
+        const double time = next.time - moveStart;
+
+        if (!flush && time >= moveEndTime)
+        {
+            break;
+        }
+
+        pendingSteps.pop();
+        position += next.amount;
+
+        takeSteps(steps, axis, time, endTime);
+    }
+
+    if (flush)
+    {
+        // the amplitudes add up to 1, so every step has been taken
+        assert(std::abs(position) < 1e-6);
+
+        // the next move starts with a wait, but the last step still needs its interval after it
+        const double shapedEndTime = std::max(moveEndTime, (lastStepTime + MINIMUM_STEP_INTERVAL) / F_CPU_FLOAT);
+        reset();
+        return shapedEndTime;
+    }
+
+    moveStart += moveEnd / F_CPU_FLOAT;
+    lastStepTime -= moveEnd;
+
+    return moveEndTime;
+}
+
+void InputShaper::takeSteps(std::vector<Step>& steps, unsigned char axis, double time, int64_t endTime)
+{
+    // Pressure advance can add up to several steps at once. Rounding half steps up keeps the
+    // position in [-0.5, 0.5) after taking them.
+    while (position >= 0.5 || position < -0.5)
+    {
+        // Steps go on the same grid runMove uses and keep at least MINIMUM_STEP_INTERVAL apart,
+        // also from the last step of the move before. Steps that don't fit before the end of the
+        // move are taken in the next one, where runMove needs them at least MINIMUM_STEP_INTERVAL
+        // after its start, as another axis may have stepped right at the end of the move before.
+        const int64_t stepTime = std::max({ static_cast<int64_t>(roundStepTime(std::max(time, 0.0))),
+            lastStepTime + MINIMUM_STEP_INTERVAL,
+            static_cast<int64_t>(MINIMUM_STEP_INTERVAL) });
+
+        if (stepTime >= endTime)
+        {
+            break;
+        }
+
+        const bool direction = position > 0;
+        position += direction ? -1 : 1;
+        lastStepTime = stepTime;
+
+        steps.emplace_back(Step(stepTime / F_CPU_FLOAT, axis, direction));
+    }
+}
@@ -0,0 +1,100 @@
+#pragma once
+
+#include "Path.h"
+#include "config.h"
+
+#include <queue>
+#include <stdint.h>
+#include <vector>
+
+/**
+ * Shapes the steps of one stepper so they don't excite a resonance at the configured
+ * frequency and damping ratio. The commanded motion is convolved with a series of impulses:
+ * every step is split into one fractional step per impulse, delayed by the impulse's delay
+ * and weighted by its amplitude, and a step is taken whenever the fractional steps add up
+ * to half a step.
+ *
+ * Pressure advance for extruders is the same kind of filter. It adds the extruder's speed,
+ * averaged over the smoothing window and multiplied by the advance coefficient, to its
+ * position, which is the same as adding coefficient / window of every step right away and
+ * taking it back a window later. Only moves flagged to use pressure advance get those
+ * impulses, so retracts and other extruder only moves keep their steps.
+ *
+ * Fractional steps that are due after the end of a move carry over into the next move, so
+ * shaping doesn't add time between moves. Only flushing, when the moves run out, extends a
+ * move by up to getDuration().
+ */
+class InputShaper
+{
+private:
+    friend struct InputShaperTests;
+
+    struct Impulse
+    {
+        double amplitude;
+        double delay;
+    };
+
+    struct FractionalStep
+    {
+        double time; /// Seconds since the start of the current run of moves
+        double amount; /// Signed fraction of a step
+
+        bool operator<(FractionalStep const& o) const
+        {
+            return time > o.time;
+        }
+    };
+
+    std::vector<Impulse> impulses; /// The input shaper's impulses, or none without shaping
+    std::vector<Impulse> advanceImpulses; /// The impulses with pressure advance, or none without it
+    std::priority_queue<FractionalStep> pendingSteps;
+
+    double advanceCoefficient;
+    double advanceSmoothTime;
+
+    double position; /// Fractional steps applied but not taken yet
+    double moveStart; /// Start of the current move in seconds since the start of the run
+    int64_t lastStepTime; /// Ticks from the start of the current move to the last step taken
+
+    void updateAdvanceImpulses();
+    void takeSteps(std::vector<Step>& steps, unsigned char axis, double time, int64_t endTime);
+
+public:
+    InputShaper();
+
+    /**
+     * @param type INPUT_SHAPER_NONE, INPUT_SHAPER_ZV, INPUT_SHAPER_MZV or INPUT_SHAPER_EI
+     * @param frequency The resonance frequency in Hz, or 0 to disable shaping
+     * @param damping The damping ratio of the resonance, from 0 up to but excluding 1
+     */
+    void configure(int type, double frequency, double damping);
+
+    /**
+     * @param coefficient The pressure advance in seconds, or 0 to disable it
+     * @param smoothTime The window the extruder speed is averaged over in seconds
+     */
+    void setPressureAdvance(double coefficient, double smoothTime);
+
+    /// Drop all steps that were shaped but not taken yet
+    void reset();
+
+    bool isEnabled() const;
+    bool hasPendingSteps() const;
+
+    /// How long the shaper and pressure advance delay the last part of the motion, in seconds
+    double getDuration() const;
+
+    /**
+     * Replace the steps of a move with the shaped steps that are due before the move ends. With
+     * flush, all remaining steps are taken and the returned end time covers them.
+     *
+     * @param steps The steps of a single axis, in increasing time
+     * @param axis The axis of the steps
+     * @param moveEndTime The end of the move in seconds
+     * @param flush Take all shaped steps, as no move follows this one
+     * @param advance Apply pressure advance to the steps
+     * @return The end of the move in seconds
+     */
+    double shapeSteps(std::vector<Step>& steps, unsigned char axis, double moveEndTime, bool flush, bool advance);
+};
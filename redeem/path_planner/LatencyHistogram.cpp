@@ -0,0 +1,63 @@
+#include "LatencyHistogram.h"
+
+LatencyHistogram::LatencyHistogram()
+{
+    reset();
+}
+
+size_t LatencyHistogram::bucketIndex(uint64_t nanoseconds)
+{
+    uint64_t microseconds = nanoseconds / 1000;
+    size_t index = 0;
+
+    while (microseconds != 0 && index < LATENCY_HISTOGRAM_BUCKETS - 1)
+    {
+        microseconds >>= 1;
+        index++;
+    }
+
+    return index;
+}
+
+void LatencyHistogram::record(Clock::duration duration)
+{
+    const int64_t signedNanoseconds = std::chrono::duration_cast<std::chrono::nanoseconds>(duration).count();
+    const uint64_t nanoseconds = signedNanoseconds > 0 ? signedNanoseconds : 0;
+
+    buckets[bucketIndex(nanoseconds)].fetch_add(1, std::memory_order_relaxed);
+    count.fetch_add(1, std::memory_order_relaxed);
+    totalTime.fetch_add(nanoseconds, std::memory_order_relaxed);
+
+    uint64_t longest = maxTime.load(std::memory_order_relaxed);
+    while (nanoseconds > longest && !maxTime.compare_exchange_weak(longest, nanoseconds, std::memory_order_relaxed))
+    {
+    }
+}
+
+LatencyHistogramStats LatencyHistogram::getStats() const
+{
+    LatencyHistogramStats stats;
+
+    stats.count = count.load(std::memory_order_relaxed);
+    stats.totalTime = totalTime.load(std::memory_order_relaxed);
+    stats.maxTime = maxTime.load(std::memory_order_relaxed);
+
+    for (const std::atomic<uint64_t>& bucket : buckets)
+    {
+        stats.buckets.push_back(bucket.load(std::memory_order_relaxed));
+    }
+
+    return stats;
+}
+
+void LatencyHistogram::reset()
+{
+    for (std::atomic<uint64_t>& bucket : buckets)
+    {
+        bucket.store(0, std::memory_order_relaxed);
+    }
+
+    count.store(0, std::memory_order_relaxed);
+    totalTime.store(0, std::memory_order_relaxed);
+    maxTime.store(0, std::memory_order_relaxed);
+}
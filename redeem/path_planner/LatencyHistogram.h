@@ -0,0 +1,70 @@
+#pragma once
+
+#include <array>
+#include <atomic>
+#include <chrono>
+#include <cstdint>
+#include <vector>
+
+#include "config.h"
+
+struct LatencyHistogramStats
+{
+    uint64_t count; /// Durations recorded
+    uint64_t totalTime; /// Their sum in nanoseconds
+    uint64_t maxTime; /// The longest of them in nanoseconds
+    std::vector<uint64_t> buckets; /// buckets[0] counts durations under 1 us, buckets[i] those from 2^(i-1) up to 2^i us
+};
+
+/**
+ * Counts durations in LATENCY_HISTOGRAM_BUCKETS buckets that double in width, the last of which
+ * also takes everything longer. Recording is a few relaxed atomic operations without a lock, so
+ * it's cheap enough to do for every move and block, from any thread, while another thread reads
+ * or resets the histogram. A read that races with a record may see its count but not its bucket.
+ */
+class LatencyHistogram
+{
+public:
+    typedef std::chrono::steady_clock Clock;
+
+    /// Records the time from its construction to its destruction
+    class ScopedTimer
+    {
+    private:
+        LatencyHistogram& histogram;
+        Clock::time_point start;
+
+    public:
+        explicit ScopedTimer(LatencyHistogram& histogram)
+            : histogram(histogram)
+            , start(Clock::now())
+        {
+        }
+
+        ~ScopedTimer()
+        {
+            histogram.record(Clock::now() - start);
+        }
+    };
+
+private:
+    std::array<std::atomic<uint64_t>, LATENCY_HISTOGRAM_BUCKETS> buckets;
+    std::atomic<uint64_t> count;
+    std::atomic<uint64_t> totalTime;
+    std::atomic<uint64_t> maxTime;
+
+public:
+    LatencyHistogram();
+
+    LatencyHistogram(const LatencyHistogram&) = delete;
+    LatencyHistogram& operator=(const LatencyHistogram&) = delete;
+
+    void record(Clock::duration duration);
+
+    /// The bucket a duration in nanoseconds is counted in
+    static size_t bucketIndex(uint64_t nanoseconds);
+
+    LatencyHistogramStats getStats() const;
+
+    void reset();
+};
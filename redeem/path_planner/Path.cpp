@@ -30,46 +30,321 @@
 #include <cmath>
 #include <numeric>
 
-void calculateLinearMove(const int axis, const int startStep, const int endStep, const double time, std::vector<Step>& steps)
+void calculateLinearMove(const int axis, const int startStep, const int endStep, const double time, AxisSteps& steps)
 {
-    const double distance = endStep - startStep;
+    steps.addLeg(axis, startStep, endStep, 0, time, false);
+}
 
-    const bool direction = startStep < endStep;
-    const int stepIncrement = direction ? 1 : -1;
-    const double stepOffset = stepIncrement / 2.0;
+void calculateXYMove(const IntVector3& start, const IntVector3& end, const Vector3& stepsPerM, double time, std::array<AxisSteps, NUM_AXES>& steps)
+{
+    for (int i = 0; i < NUM_MOVING_AXES; i++)
+    {
+        calculateLinearMove(i, start[i], end[i], time, steps[i]);
+    }
+}
+
+void calculateExtruderMove(const IntVectorN& start, const IntVectorN& end, double time, std::array<AxisSteps, NUM_AXES>& steps)
+{
+    for (int i = NUM_MOVING_AXES; i < NUM_AXES; i++)
+    {
+        calculateLinearMove(i, start[i], end[i], time, steps[i]);
+    }
+}
+
+AxisSteps::AxisSteps()
+{
+    clear();
+}
+
+void AxisSteps::clear()
+{
+    axis = 0;
+    legCount = 0;
+    stepperPath = nullptr;
+    deltaConstants = nullptr;
+    incremental = false;
+    leg = 0;
+    step = 0;
+    lastTime = 0;
+    deltaTimes.clear();
+    deltaTimeIndex = 0;
+}
+
+void AxisSteps::addLeg(unsigned char axis, int startStep, int endStep, double startTime, double endTime, bool delta)
+{
+    assert(legCount < static_cast<int>(legs.size()));
+
+    if (startStep == endStep)
+    {
+        return;
+    }
+
+    this->axis = axis;
+    legs[legCount++] = Leg{ startStep, endStep, startTime, endTime, delta };
+}
+
+void AxisSteps::start(const StepperPathParameters& stepperPath, const DeltaPathConstants& deltaConstants, bool incrementalTiming)
+{
+    this->stepperPath = &stepperPath;
+    this->deltaConstants = &deltaConstants;
+    leg = 0;
+    step = legCount ? legs[0].startStep : 0;
+    lastTime = legCount ? legs[0].startTime : 0;
+    deltaTimes.clear();
+    deltaTimeIndex = 0;
+
+    // S-curves and delta towers don't follow the recurrence
+    incremental = incrementalTiming && stepperPath.jerk == 0 && legCount == 1 && !legs[0].delta;
+
+    if (incremental)
+    {
+        incrementalTimer.start(stepperPath, legs[0].startTime, legs[0].endTime, size());
+    }
+}
+
+size_t AxisSteps::size() const
+{
+    size_t result = 0;
+
+    for (int i = 0; i < legCount; i++)
+    {
+        result += std::abs(legs[i].endStep - legs[i].startStep);
+    }
 
-    int step = startStep;
+    return result;
+}
 
-    steps.reserve(std::abs(endStep - startStep));
+bool AxisSteps::next(Step& result)
+{
+    assert(stepperPath);
 
-    while (step != endStep)
+    if (leg < legCount && step == legs[leg].endStep)
     {
-        const double position = step + stepOffset;
-        const double stepTime = (position - startStep) / distance * time;
+        leg++;
 
-        assert(stepTime > 0 && stepTime < time);
-        assert(steps.empty() || stepTime > steps.back().time);
+        if (leg < legCount)
+        {
+            step = legs[leg].startStep;
+            lastTime = legs[leg].startTime;
+        }
+    }
 
-        steps.emplace_back(Step(stepTime, axis, direction));
+    if (leg == legCount)
+    {
+        return false;
+    }
 
+    const Leg& l = legs[leg];
+    const bool direction = l.startStep < l.endStep;
+    const int stepIncrement = direction ? 1 : -1;
+    const double position = step + stepIncrement / 2.0;
+
+    if (incremental)
+    {
         step += stepIncrement;
+        result = Step(incrementalTimer.next(), axis, direction);
+        return true;
+    }
+
+    double time = NAN;
+
+    if (l.delta)
+    {
+        if (deltaTimeIndex == deltaTimes.size())
+        {
+            // batches end with the leg, so the next leg starts with a fresh one
+            const int count = std::min(DELTA_BATCH_SIZE, std::abs(l.endStep - step));
+            deltaTimes.resize(count);
+            deltaTimeIndex = 0;
+
+            Delta::calculateStepTimes(axis, *deltaConstants, position, stepIncrement, count, lastTime, l.endTime, deltaTimes.data());
+        }
+
+        time = deltaTimes[deltaTimeIndex++];
+
+        assert(!std::isnan(time));
+        assert(time <= l.endTime);
+    }
+    else
+    {
+        time = l.startTime + (position - l.startStep) / (l.endStep - l.startStep) * (l.endTime - l.startTime);
+
+        assert(time > l.startTime && time < l.endTime);
     }
+
+    assert(step == l.startStep || time > lastTime);
+
+    lastTime = time;
+    step += stepIncrement;
+
+    result = Step(stepperPath->dilateTime(time), axis, direction);
+    return true;
 }
 
-void calculateXYMove(const IntVector3& start, const IntVector3& end, const Vector3& stepsPerM, double time, std::array<std::vector<Step>, NUM_AXES>& steps)
+void IncrementalStepTimer::start(const StepperPathParameters& stepperPath, double startTime, double endTime, int stepCount)
 {
-    for (int i = 0; i < NUM_MOVING_AXES; i++)
+    assert(stepperPath.jerk == 0 && stepperPath.accel > 0);
+
+    this->stepperPath = &stepperPath;
+    this->startTime = startTime;
+    this->stepCount = stepCount;
+
+    stepBaseTime = (endTime - startTime) / stepCount;
+    stepsPerSquaredSpeed = 1 / (2 * stepperPath.accel * stepBaseTime * stepperPath.baseSpeed);
+
+    // the phases change where dilateTime switches between them, in base times scaled to the cruise speed
+    const double cruiseScale = stepperPath.cruiseSpeed / stepperPath.baseSpeed;
+    const auto firstStepFrom = [&](double scaledTime) {
+        const double firstStep = std::ceil((scaledTime * cruiseScale - startTime) / stepBaseTime - 0.5);
+        return static_cast<int>(std::min(std::max(firstStep, 0.0), static_cast<double>(stepCount)));
+    };
+
+    accelEndStep = firstStepFrom(stepperPath.baseAccelEnd);
+    cruiseEndStep = std::max(accelEndStep, firstStepFrom(stepperPath.baseCruiseEnd));
+
+    step = -1;
+    nextSyncStep = 0;
+    nextExactStep = -1;
+    nextExactTime = 0;
+    currentPhase = phase(0);
+    time = 0;
+    interval = 0;
+    denominator = 0;
+    correction = 0;
+}
+
+double IncrementalStepTimer::baseTime(int step) const
+{
+    return startTime + (step + 0.5) * stepBaseTime;
+}
+
+double IncrementalStepTimer::stepsFromStandstill(int step) const
+{
+    // a speed of v takes v^2 / 2a to reach from standstill
+    const StepperPathParameters& p = *stepperPath;
+    const double distance = baseTime(step) * p.baseSpeed;
+
+    const double speed2 = phase(step) == DECEL
+        ? p.endSpeed * p.endSpeed + 2 * p.accel * (p.distance - distance)
+        : p.startSpeed * p.startSpeed + 2 * p.accel * distance;
+
+    return speed2 * stepsPerSquaredSpeed;
+}
+
+IncrementalStepTimer::Phase IncrementalStepTimer::phase(int step) const
+{
+    if (step < accelEndStep)
     {
-        calculateLinearMove(i, start[i], end[i], time, steps[i]);
+        return ACCEL;
+    }
+    else if (step < cruiseEndStep)
+    {
+        return CRUISE;
     }
+
+    return DECEL;
 }
 
-void calculateExtruderMove(const IntVectorN& start, const IntVectorN& end, double time, std::array<std::vector<Step>, NUM_AXES>& steps)
+double IncrementalStepTimer::sync()
 {
-    for (int i = NUM_MOVING_AXES; i < NUM_AXES; i++)
+    const double fixedPointCycles = F_CPU_FLOAT * (1 << FRACTION_BITS);
+
+    // steps right after a sync are often synced as well
+    const double exact = nextExactStep == step ? nextExactTime : stepperPath->dilateTime(baseTime(step));
+    const double nextExact = step + 1 < stepCount ? stepperPath->dilateTime(baseTime(step + 1)) : exact;
+    nextExactStep = step + 1;
+    nextExactTime = nextExact;
+
+    time = std::llround(exact * fixedPointCycles);
+    interval = std::llround(nextExact * fixedPointCycles) - time;
+    currentPhase = phase(step);
+
+    // The AVR446 recurrence is the first term of the exact ratio. The second one takes another
+    // 3/4n off the denominator, which keeps the drift below a cycle from n = MIN_RECURRENCE_STEPS.
+    const double n = stepsFromStandstill(step);
+    denominator = std::llround((currentPhase == DECEL ? 4 * n - 1 : 4 * n + 1) * (1 << FRACTION_BITS));
+    correction = std::llround(3 / (4 * n) * (1 << FRACTION_BITS));
+
+    // take the exact times around the phase changes and while the recurrence is too coarse
+    nextSyncStep = step + SYNC_STEPS;
+
+    for (const int phaseChange : { accelEndStep, cruiseEndStep })
     {
-        calculateLinearMove(i, start[i], end[i], time, steps[i]);
+        if (step < phaseChange + 1)
+        {
+            nextSyncStep = std::min(nextSyncStep, std::max(step + 1, phaseChange - 1));
+        }
+    }
+
+    if (currentPhase != CRUISE && n < MIN_RECURRENCE_STEPS)
+    {
+        nextSyncStep = step + 1;
+    }
+    else if (currentPhase == DECEL)
+    {
+        // n goes down by one every step
+        nextSyncStep = std::min(nextSyncStep, step + 1 + static_cast<int>(n - MIN_RECURRENCE_STEPS));
     }
+
+    return exact;
+}
+
+double IncrementalStepTimer::next()
+{
+    assert(step + 1 < stepCount);
+
+    if (++step >= nextSyncStep)
+    {
+        return sync();
+    }
+
+    time += interval;
+
+    // the interval from this step to the next one, with n of this step
+    switch (currentPhase)
+    {
+    case ACCEL:
+        denominator += static_cast<int64_t>(4) << FRACTION_BITS;
+        correction -= ((correction * correction) >> FRACTION_BITS) * 4 / 3;
+        interval -= (interval << (FRACTION_BITS + 1)) / (denominator - correction);
+        break;
+    case DECEL:
+        denominator -= static_cast<int64_t>(4) << FRACTION_BITS;
+        correction += ((correction * correction) >> FRACTION_BITS) * 4 / 3;
+        interval += (interval << (FRACTION_BITS + 1)) / (denominator - correction);
+        break;
+    case CRUISE:
+        break;
+    }
+
+    return time / (F_CPU_FLOAT * (1 << FRACTION_BITS));
+}
+
+// Splits a speed change into the time the S-curve profile spends ramping the acceleration
+// up (and again down) and the time it spends at constant acceleration. Speed changes that
+// are too small to reach full acceleration only ramp.
+static void calculateSCurveRamp(double speedChange, double accel, double jerk, double& jerkTime, double& accelTime)
+{
+    if (speedChange * jerk >= accel * accel)
+    {
+        jerkTime = accel / jerk;
+        accelTime = speedChange / accel - jerkTime;
+    }
+    else
+    {
+        jerkTime = std::sqrt(speedChange / jerk);
+        accelTime = 0;
+    }
+}
+
+static double calculateSCurveDistance(double fromSpeed, double toSpeed, double accel, double jerk)
+{
+    double jerkTime = 0, accelTime = 0;
+    calculateSCurveRamp(std::abs(toSpeed - fromSpeed), accel, jerk, jerkTime, accelTime);
+
+    // The speed is point symmetric around the middle of the ramp, so the ramp covers
+    // as much distance as it would at the average of both speeds.
+    return (fromSpeed + toSpeed) / 2.0 * (2 * jerkTime + accelTime);
 }
 
 void Path::zero()
@@ -88,14 +363,15 @@ void Path::zero()
     startSpeed = 0;
     endSpeed = 0;
     accel = 0;
+    jerk = 0;
     startMachinePos.zero();
+    gcodeLine = 0;
 
     stepperPath.zero();
 
-    for (auto& stepVector : steps)
+    for (auto& axisSteps : steps)
     {
-        std::vector<Step> empty;
-        stepVector.swap(empty);
+        axisSteps.clear();
     }
 
     syncCallback = nullptr;
@@ -130,10 +406,13 @@ Path& Path::operator=(Path&& path)
     startSpeed = path.startSpeed;
     endSpeed = path.endSpeed;
     accel = path.accel;
+    jerk = path.jerk;
     startMachinePos = path.startMachinePos;
+    gcodeLine = path.gcodeLine;
 
     stepperPath = path.stepperPath;
-    steps = std::move(path.steps);
+    deltaConstants = path.deltaConstants;
+    steps = path.steps;
 
     syncCallback = path.syncCallback;
     waitEvent = std::move(path.waitEvent);
@@ -196,6 +475,7 @@ void Path::initialize(const IntVectorN& machineStart,
     const VectorN& stepsPerM,
     const VectorN& maxSpeeds, /// Maximum allowable speeds in m/s
     const VectorN& maxAccelMPerSquareSecond,
+    const VectorN& maxJerkMPerCubicSecond,
     double requestedSpeed,
     double requestedAccel,
     int axisConfig,
@@ -249,9 +529,25 @@ void Path::initialize(const IntVectorN& machineStart,
     // As it turns out, this function can also calculate accel if we give it values that are all derivatives of what it normally wants
     accel = std::min(requestedAccel, calculateMaximumSpeed(speeds, maxAccelMPerSquareSecond, fullSpeed, axisConfig));
 
+    // The same goes for jerk. Axes without a jerk limit don't constrain the move, and if none
+    // of its axes have one the move keeps the trapezoidal profile.
+    VectorN jerkLimits;
+    for (int i = 0; i < NUM_AXES; i++)
+    {
+        jerkLimits[i] = maxJerkMPerCubicSecond[i] > 0 ? maxJerkMPerCubicSecond[i] : INFINITY;
+    }
+
+    jerk = calculateMaximumSpeed(speeds, jerkLimits, fullSpeed, axisConfig);
+    if (!std::isfinite(jerk))
+    {
+        jerk = 0;
+    }
+
     // Calculate whether we're guaranteed to reach cruising speed.
     double maximumAccelTime = fullSpeed / accel; // (m/s) / (m/s^2) = s
-    double maximumAccelDistance = maximumAccelTime * (fullSpeed / 2.0);
+    double maximumAccelDistance = jerk > 0
+        ? calculateSCurveDistance(0, fullSpeed, accel, jerk)
+        : maximumAccelTime * (fullSpeed / 2.0);
     if (2.0 * maximumAccelDistance < distance)
     {
         // This move has enough distance that we can accelerate from 0 to fullSpeed and back to 0.
@@ -264,7 +560,7 @@ void Path::initialize(const IntVectorN& machineStart,
     switch (axisConfig)
     {
     case AXIS_CONFIG_DELTA:
-        delta.calculateMove(machineStart.toIntVector3(), machineEnd.toIntVector3(), stepsPerM.toVector3(), idealTimeForMove, steps);
+        delta.calculateMove(machineStart.toIntVector3(), machineEnd.toIntVector3(), stepsPerM.toVector3(), idealTimeForMove, deltaConstants, steps);
         break;
     case AXIS_CONFIG_XY:
     case AXIS_CONFIG_H_BELT:
@@ -279,7 +575,9 @@ void Path::initialize(const IntVectorN& machineStart,
 
     assert(!steps.empty());
 
-    if ((isAxisMove(E_AXIS) && !isAxisOnlyMove(E_AXIS)) || (isAxisMove(H_AXIS) && !isAxisOnlyMove(H_AXIS)))
+    // pressure builds up in the nozzle while extruding along a move, not in extruder only moves like retracts
+    const int movingAxesMask = (1 << NUM_MOVING_AXES) - 1;
+    if ((moveMask & movingAxesMask) && (moveMask & ~movingAxesMask))
     {
         flags |= FLAG_USE_PRESSURE_ADVANCE;
     }
@@ -287,21 +585,20 @@ void Path::initialize(const IntVectorN& machineStart,
     LOG("Distance in m:     " << distance << std::endl);
     LOG("Speed in m/s:      " << fullSpeed << " requested: " << requestedSpeed << std::endl);
     LOG("Accel in m/s:     " << accel << " requested: " << requestedAccel << std::endl);
+    LOG("Jerk in m/s^3:     " << jerk << std::endl);
     LOG("Ticks :            " << estimatedTime << std::endl);
 
     invalidateStepperPathParameters();
 }
 
-double Path::runFinalStepCalculations()
+double Path::runFinalStepCalculations(bool incrementalStepTiming)
 {
     updateStepperPathParameters();
 
+    // the steps are computed and dilated as they're taken, so they see the final parameters
     for (auto& axisSteps : steps)
     {
-        for (auto& step : axisSteps)
-        {
-            step.time = stepperPath.dilateTime(step.time);
-        }
+        axisSteps.start(stepperPath, deltaConstants, incrementalStepTiming);
     }
 
     LOG("accelSteps: " << stepperPath.accelSteps
@@ -320,6 +617,13 @@ void Path::updateStepperPathParameters()
     if (areParameterUpToDate() || fullSpeed == 0)
         return;
 
+    if (jerk > 0)
+    {
+        updateSCurveStepperPathParameters();
+        joinFlags |= FLAG_JOIN_STEPPARAMS_COMPUTED;
+        return;
+    }
+
     double cruiseSpeed = fullSpeed;
 
     double accelTime = (fullSpeed - startSpeed) / accel;
@@ -440,8 +744,147 @@ void Path::updateStepperPathParameters()
     assert(areParameterUpToDate());
 }
 
+/** Update the parameters of a jerk limited move
+
+The move ramps its acceleration up to accel, holds it and ramps it down again
+until it reaches the cruise speed, and mirrors that to reach the end speed.
+*/
+void Path::updateSCurveStepperPathParameters()
+{
+    auto rampDistance = [this](double cruiseSpeed) {
+        return calculateSCurveDistance(startSpeed, cruiseSpeed, accel, jerk)
+            + calculateSCurveDistance(cruiseSpeed, endSpeed, accel, jerk);
+    };
+
+    double cruiseSpeed = fullSpeed;
+
+    if (rampDistance(cruiseSpeed) > distance)
+    {
+        // The ramps get longer the faster we cruise, so search for the fastest cruise speed
+        // whose ramps still fit in the move.
+        double lowSpeed = std::max(startSpeed, endSpeed);
+        double highSpeed = fullSpeed;
+
+        for (int i = 0; i < 64; i++)
+        {
+            const double speed = (lowSpeed + highSpeed) / 2.0;
+            if (rampDistance(speed) > distance)
+            {
+                highSpeed = speed;
+            }
+            else
+            {
+                lowSpeed = speed;
+            }
+        }
+
+        cruiseSpeed = lowSpeed;
+
+        LOG("Move will not reach full speed" << std::endl);
+    }
+
+    double accelJerkTime = 0, accelTime = 0, decelJerkTime = 0, decelTime = 0;
+    calculateSCurveRamp(cruiseSpeed - startSpeed, accel, jerk, accelJerkTime, accelTime);
+    calculateSCurveRamp(cruiseSpeed - endSpeed, accel, jerk, decelJerkTime, decelTime);
+
+    const double cruiseDistance = distance - rampDistance(cruiseSpeed);
+    // See the comment in updateStepperPathParameters about over-acceleration on short moves
+    assert(cruiseDistance > -NEGLIGIBLE_ERROR);
+    const double cruiseTime = cruiseDistance > 0 ? cruiseDistance / cruiseSpeed : 0;
+
+    LOG("accelTime: " << 2 * accelJerkTime + accelTime << " cruiseTime: " << cruiseTime
+                      << " decelTime: " << 2 * decelJerkTime + decelTime << std::endl);
+
+    const std::array<double, 7> durations = { accelJerkTime, accelTime, accelJerkTime, cruiseTime, decelJerkTime, decelTime, decelJerkTime };
+    const std::array<double, 7> jerks = { jerk, 0, -jerk, 0, -jerk, 0, jerk };
+
+    stepperPath.baseSpeed = fullSpeed;
+    stepperPath.startSpeed = startSpeed;
+    stepperPath.cruiseSpeed = cruiseSpeed;
+    stepperPath.endSpeed = endSpeed;
+    stepperPath.accel = accel;
+    stepperPath.distance = distance;
+    stepperPath.jerk = jerk;
+
+    double time = 0;
+    double position = 0;
+    double speed = startSpeed;
+    double acceleration = 0;
+
+    for (size_t i = 0; i < durations.size(); i++)
+    {
+        const double t = durations[i];
+        const double j = jerks[i];
+
+        stepperPath.segments[i] = SCurveSegment{ time, position, speed, acceleration, j };
+
+        position += speed * t + acceleration * t * t / 2 + j * t * t * t / 6;
+        speed += acceleration * t + j * t * t / 2;
+        acceleration += j * t;
+        time += t;
+    }
+
+    assert(std::abs(position - distance) < NEGLIGIBLE_ERROR);
+    assert(std::abs(speed - endSpeed) < NEGLIGIBLE_ERROR);
+
+    stepperPath.baseMoveEnd = distance / fullSpeed;
+    stepperPath.moveEnd = time;
+}
+
+double Path::getMaxReachableSpeed(double speed) const
+{
+    if (jerk == 0)
+    {
+        // vf^2 = v0^2 + 2*a*d
+        return std::sqrt(speed * speed + getAccelerationDistance2());
+    }
+
+    if (distance == 0)
+    {
+        return speed;
+    }
+
+    // A ramp that reaches full acceleration changes the speed by at least rampSpeed and covers
+    // d = (v0 + vf) / 2 * ((vf - v0) / a + a / j)
+    // -> vf^2 + rampSpeed * vf + rampSpeed * v0 - v0^2 - 2*a*d = 0
+    const double rampSpeed = accel * accel / jerk;
+    const double fullAccelSpeed = (std::sqrt((2 * speed - rampSpeed) * (2 * speed - rampSpeed) + 8 * accel * distance) - rampSpeed) / 2.0;
+
+    if (fullAccelSpeed - speed >= rampSpeed)
+    {
+        return fullAccelSpeed;
+    }
+
+    // Otherwise the ramp only ramps the acceleration up and down, each for t = sqrt((vf - v0) / j),
+    // and covers d = (2 * v0 + j * t^2) * t. Both terms on their own overestimate t, and
+    // Newton's method converges on it from above.
+    double t = std::cbrt(distance / jerk);
+    if (speed > 0)
+    {
+        t = std::min(t, distance / (2 * speed));
+    }
+
+    for (int i = 0; i < 100; i++)
+    {
+        const double step = ((2 * speed + jerk * t * t) * t - distance) / (2 * speed + 3 * jerk * t * t);
+        t -= step;
+
+        if (step <= t * 1e-12)
+        {
+            break;
+        }
+    }
+
+    return speed + jerk * t * t;
+}
+
 double StepperPathParameters::dilateTime(double t) const
 {
+    if (jerk != 0)
+    {
+        return dilateSCurveTime(t);
+    }
+
     const double& Vi = startSpeed;
     const double& Vc = cruiseSpeed;
     const double& Vf = endSpeed;
@@ -483,6 +926,83 @@ double StepperPathParameters::dilateTime(double t) const
     return result;
 }
 
+double StepperPathParameters::dilateSCurveTime(double t) const
+{
+    assert(t >= 0);
+
+    // the base times run the whole move at baseSpeed
+    const double position = t * baseSpeed;
+
+    size_t index = segments.size() - 1;
+    while (index > 0 && segments[index].startDistance > position)
+    {
+        index--;
+    }
+
+    if (index < 3)
+    {
+        accelSteps++;
+    }
+    else if (index == 3)
+    {
+        cruiseSteps++;
+    }
+    else
+    {
+        decelSteps++;
+    }
+
+    const SCurveSegment& segment = segments[index];
+    const double target = position - segment.startDistance;
+    const double duration = (index + 1 < segments.size() ? segments[index + 1].startTime : moveEnd) - segment.startTime;
+
+    // The position is a cubic in the time since the start of the segment and only ever grows,
+    // so use Newton's method and fall back to bisection when it leaves the bracket.
+    double low = 0;
+    double high = duration;
+    double time = segment.startSpeed > 0 ? std::min(target / segment.startSpeed, duration) : duration / 2.0;
+
+    for (int i = 0; i < 100; i++)
+    {
+        const double error = segment.startSpeed * time + segment.startAccel * time * time / 2 + segment.jerk * time * time * time / 6 - target;
+
+        if (error == 0)
+        {
+            break;
+        }
+        else if (error > 0)
+        {
+            high = time;
+        }
+        else
+        {
+            low = time;
+        }
+
+        const double speed = segment.startSpeed + segment.startAccel * time + segment.jerk * time * time / 2;
+        double next = speed > 0 ? time - error / speed : NAN;
+
+        if (!(next > low && next < high))
+        {
+            next = (low + high) / 2.0;
+        }
+
+        if (std::abs(next - time) < 1e-15)
+        {
+            time = next;
+            break;
+        }
+
+        time = next;
+    }
+
+    const double result = segment.startTime + time;
+
+    assert(!std::isnan(result));
+
+    return result;
+}
+
 double StepperPathParameters::finalTime() const
 {
     return moveEnd;
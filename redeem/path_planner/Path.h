@@ -29,6 +29,7 @@
 #include "StepperCommand.h"
 #include "SyncCallback.h"
 #include "config.h"
+#include "vector3.h"
 #include "vectorN.h"
 #include <array>
 #include <assert.h>
@@ -110,6 +111,13 @@ struct Step
     unsigned char axis;
     bool direction;
 
+    Step()
+        : time(0)
+        , axis(0)
+        , direction(false)
+    {
+    }
+
     Step(double time, unsigned char axis, bool direction)
         : time(time)
         , axis(axis)
@@ -123,6 +131,92 @@ struct Step
     }
 };
 
+/// Steps of one axis in increasing time, produced one at a time as they're taken
+class StepSource
+{
+public:
+    virtual ~StepSource()
+    {
+    }
+
+    /// @return false once there are no more steps
+    virtual bool next(Step& step) = 0;
+};
+
+/// Steps that were computed up front
+class VectorStepSource : public StepSource
+{
+private:
+    std::vector<Step> steps;
+    size_t index;
+
+public:
+    VectorStepSource()
+        : index(0)
+    {
+    }
+
+    explicit VectorStepSource(std::vector<Step> steps)
+        : steps(std::move(steps))
+        , index(0)
+    {
+    }
+
+    std::vector<Step>& getSteps()
+    {
+        return steps;
+    }
+
+    /// Take the steps again from the first one
+    void rewind()
+    {
+        index = 0;
+    }
+
+    bool next(Step& step) override
+    {
+        if (index == steps.size())
+        {
+            return false;
+        }
+
+        step = steps[index++];
+        return true;
+    }
+};
+
+struct DeltaPathConstants
+{
+    IntVector3 deltaMotorStart;
+    IntVector3 deltaMotorEnd;
+    Vector3 deltaStart;
+    Vector3 deltaEnd;
+    Vector3 worldStart;
+    Vector3 worldEnd;
+    Vector3 worldStart2;
+    Vector3 stepsPerM;
+    Vector3 axisSpeeds;
+    Vector3 axisSpeeds2;
+    Vector3 axisSpeeds3;
+    Vector3 axisSpeeds4;
+    Vector3 towerX;
+    Vector3 towerY;
+    Vector3 towerX2;
+    Vector3 towerY2;
+    double time;
+    Vector3 axisCore1;
+    Vector3 axisCore2;
+};
+
+struct SCurveSegment
+{
+    double startTime;
+    double startDistance;
+    double startSpeed;
+    double startAccel;
+    double jerk;
+};
+
 struct StepperPathParameters
 {
     double baseSpeed;
@@ -138,6 +232,11 @@ struct StepperPathParameters
 
     double moveEnd;
 
+    // S-curve profile: jerk up, constant acceleration, jerk down, cruise and the same
+    // three segments for deceleration. Only used when jerk isn't 0.
+    double jerk;
+    std::array<SCurveSegment, 7> segments;
+
     mutable unsigned int accelSteps;
     mutable unsigned int cruiseSteps;
     mutable unsigned int decelSteps;
@@ -149,6 +248,7 @@ struct StepperPathParameters
         endSpeed = 0;
         accel = 0;
         distance = 0;
+        jerk = 0;
 
         accelSteps = 0;
         cruiseSteps = 0;
@@ -156,10 +256,122 @@ struct StepperPathParameters
     }
 
     double dilateTime(double t) const;
+    double dilateSCurveTime(double t) const;
 
     double finalTime() const;
 };
 
+/**
+ * Times the steps of a linear leg of a trapezoidal move in fixed-point PRU cycles, without
+ * dilating the time of every step. During acceleration and deceleration, each step interval
+ * follows from the one before with the AVR446 recurrence c' = c * (1 -+ 2 / (4n +- 1)), where
+ * n is the number of steps it takes to reach the current speed from standstill. While cruising
+ * the interval stays the same.
+ *
+ * The recurrence drifts from the exact times, most near standstill, so the timer takes the
+ * exact time every SYNC_STEPS steps, around the changes between phases and while n is below
+ * MIN_RECURRENCE_STEPS.
+ */
+class IncrementalStepTimer
+{
+private:
+    static const int FRACTION_BITS = 16; /// Fixed-point fraction of a PRU cycle
+    static const int SYNC_STEPS = 32;
+    static const int MIN_RECURRENCE_STEPS = 32; /// Smallest n the recurrence is used for
+
+    enum Phase
+    {
+        ACCEL,
+        CRUISE,
+        DECEL
+    };
+
+    const StepperPathParameters* stepperPath;
+    double startTime;
+    double stepBaseTime;
+    double stepsPerSquaredSpeed; /// 1 / 2ad, with d the distance of a step
+    int stepCount;
+    int accelEndStep; /// The first step that isn't accelerating
+    int cruiseEndStep; /// The first step that's decelerating
+
+    int step;
+    int nextSyncStep;
+    int nextExactStep; /// The step nextExactTime is the exact time of
+    double nextExactTime;
+    Phase currentPhase;
+    int64_t time;
+    int64_t interval; /// From the current step to the next one
+    int64_t denominator; /// 4n + 1 while accelerating, 4n - 1 while decelerating
+    int64_t correction; /// 3 / 4n, the next term of the ratio between intervals
+
+    double baseTime(int step) const;
+    double stepsFromStandstill(int step) const;
+    Phase phase(int step) const;
+
+    /// Take the exact time of the current step and restart the recurrence from it
+    double sync();
+
+public:
+    /// Time stepCount steps spread evenly over base times startTime to endTime
+    void start(const StepperPathParameters& stepperPath, double startTime, double endTime, int stepCount);
+
+    /// @return The time of the next step in seconds
+    double next();
+};
+
+/**
+ * The steps one axis takes during a path. Only the legs of the move are stored, and the steps
+ * are computed as they're taken, so a path holds no steps no matter how long it is.
+ */
+class AxisSteps : public StepSource
+{
+private:
+    struct Leg
+    {
+        int startStep;
+        int endStep;
+        double startTime; /// Base times, as if the path ran at full speed all the way
+        double endTime;
+        bool delta; /// Whether the delta tower math places the steps, or they're linear in time
+    };
+
+    unsigned char axis;
+    int legCount;
+    std::array<Leg, 2> legs; /// Delta towers can turn around once during a move
+
+    const StepperPathParameters* stepperPath;
+    const DeltaPathConstants* deltaConstants;
+    IncrementalStepTimer incrementalTimer;
+    bool incremental;
+
+    int leg;
+    int step;
+    double lastTime;
+
+    /// Delta step times are calculated DELTA_BATCH_SIZE at a time and taken from here
+    static constexpr int DELTA_BATCH_SIZE = 32;
+    std::vector<double> deltaTimes;
+    size_t deltaTimeIndex;
+
+public:
+    AxisSteps();
+
+    void clear();
+    void addLeg(unsigned char axis, int startStep, int endStep, double startTime, double endTime, bool delta);
+
+    /**
+     * Start taking the steps. The path must not move while they're taken.
+     *
+     * @param incrementalTiming Time linear legs of trapezoidal moves with IncrementalStepTimer
+     */
+    void start(const StepperPathParameters& stepperPath, const DeltaPathConstants& deltaConstants, bool incrementalTiming);
+
+    /// The number of steps in all legs
+    size_t size() const;
+
+    bool next(Step& step) override;
+};
+
 class Path
 {
 private:
@@ -179,10 +391,13 @@ private:
     double startSpeed; /// Starting speed in m/s
     double endSpeed; /// Exit speed in m/s
     double accel; /// Acceleration in m/s^2
+    double jerk; /// Jerk in m/s^3, or 0 for a trapezoidal profile
     IntVectorN startMachinePos; /// Starting position of the machine
+    int64_t gcodeLine; /// The line of the G-code that queued the move, see PathPlanner::setGcodeLine
 
     StepperPathParameters stepperPath;
-    std::array<std::vector<Step>, NUM_AXES> steps;
+    DeltaPathConstants deltaConstants;
+    std::array<AxisSteps, NUM_AXES> steps;
 
     SyncCallback* syncCallback;
     std::optional<std::future<void>> waitEvent;
@@ -191,6 +406,8 @@ private:
     Path(const Path& path) = delete;
     Path& operator=(const Path&) = delete;
 
+    void updateSCurveStepperPathParameters();
+
 public:
     Path();
     Path(Path&&);
@@ -204,6 +421,7 @@ public:
         const VectorN& stepsPerM,
         const VectorN& maxSpeeds, /// Maximum allowable speeds in m/s
         const VectorN& maxAccelMPerSquareSecond,
+        const VectorN& maxJerkMPerCubicSecond,
         double requestedSpeed,
         double requestedAccel,
         int axisConfig,
@@ -211,7 +429,13 @@ public:
         bool cancelable,
         bool is_probe);
 
-    double runFinalStepCalculations();
+    /**
+     * Fix the speed profile and start the steps
+     *
+     * @param incrementalStepTiming Time linear trapezoidal moves with IncrementalStepTimer
+     * @return The end of the move in seconds
+     */
+    double runFinalStepCalculations(bool incrementalStepTiming = false);
 
     void zero();
 
@@ -346,6 +570,16 @@ public:
         this->syncCallback = &callback;
     }
 
+    inline int64_t getGcodeLine() const
+    {
+        return gcodeLine;
+    }
+
+    inline void setGcodeLine(int64_t line)
+    {
+        gcodeLine = line;
+    }
+
     inline bool willUsePressureAdvance() const
     {
         return flags & FLAG_USE_PRESSURE_ADVANCE;
@@ -451,11 +685,20 @@ public:
         return accel;
     }
 
+    inline double getJerk() const
+    {
+        return jerk;
+    }
+
     inline double getDistance() const
     {
         return distance;
     }
 
+    /// The highest speed the move can reach at one end if it runs at speed at the other
+    /// end and accelerates over its whole distance.
+    double getMaxReachableSpeed(double speed) const;
+
     /// Note: This magical number is present because it's useful in the formula
     /// v^2 = v0^2 + 2 * a * (r - r0)
     /// This determines final velocity from initial velocity, acceleration, and
@@ -470,7 +713,7 @@ public:
         return startMachinePos;
     }
 
-    std::array<std::vector<Step>, NUM_AXES>& getSteps()
+    std::array<AxisSteps, NUM_AXES>& getSteps()
     {
         return steps;
     }
@@ -3,23 +3,11 @@
 #include <cmath>
 #include <tuple>
 
-void sanityCheckStartAndEndSpeeds(double startSpeed, double endSpeed, double distance, double accel)
-{
-    double maxReachableEndSpeed = std::sqrt(startSpeed * startSpeed + 2 * accel * distance);
-    double minReachableEndSpeed = std::sqrt(startSpeed * startSpeed - 2 * accel * distance);
-
-    double maxReachableStartSpeed = std::sqrt(endSpeed * endSpeed + 2 * accel * distance);
-    double minReachableStartSpeed = std::sqrt(endSpeed * endSpeed - 2 * accel * distance);
-
-    assert(APPROX_GREATER_THAN(endSpeed, minReachableEndSpeed) || std::isnan(minReachableEndSpeed));
-    assert(APPROX_LESS_THAN(endSpeed, maxReachableEndSpeed) || std::isnan(maxReachableEndSpeed));
-    assert(APPROX_GREATER_THAN(startSpeed, minReachableStartSpeed) || std::isnan(minReachableStartSpeed));
-    assert(APPROX_LESS_THAN(startSpeed, maxReachableStartSpeed) || std::isnan(maxReachableStartSpeed));
-}
-
 void sanityCheckPathSpeeds(const Path& path)
 {
-    sanityCheckStartAndEndSpeeds(path.getStartSpeed(), path.getEndSpeed(), path.getDistance(), path.getAcceleration());
+    // Each end speed has to be reachable from the other one, whether the move accelerates or decelerates
+    assert(APPROX_LESS_THAN(path.getEndSpeed(), path.getMaxReachableSpeed(path.getStartSpeed())));
+    assert(APPROX_LESS_THAN(path.getStartSpeed(), path.getMaxReachableSpeed(path.getEndSpeed())));
 }
 
 int64_t PathOptimizer::beforePathRemoval(std::vector<Path>& queue, PathQueueIndex first, PathQueueIndex last)
@@ -32,9 +20,8 @@ int64_t PathOptimizer::beforePathRemoval(std::vector<Path>& queue, PathQueueInde
         Path& secondPath = queue[(first + 1).value];
 
         // Calculate the maximum possible end speed for firstPath.
-        // We're using the formula vf^2 = v0^2 + 2*a*d.
-        const double maximumEndSpeed = std::min(firstPath.getFullSpeed(),
-            std::sqrt(firstPath.getStartSpeed() * firstPath.getStartSpeed() + firstPath.getAccelerationDistance2()));
+        // For trapezoidal profiles, this is the formula vf^2 = v0^2 + 2*a*d.
+        const double maximumEndSpeed = std::min(firstPath.getFullSpeed(), firstPath.getMaxReachableSpeed(firstPath.getStartSpeed()));
 
         // The end speed was already set in the onPathAdded loop to be the maximum we could allow
         // while still decelerating when we run out of paths. We may need to lower it here to accelerate
@@ -98,8 +85,8 @@ int64_t PathOptimizer::onPathAdded(std::vector<Path>& queue, PathQueueIndex firs
         }
 
         // Calculate the maximum possible start speed for currentPath.
-        // We're using the formula vf^2 = v0^2 + 2*a*d, but we're working backwards.
-        const double maximumStartSpeed = std::sqrt(currentPath.getEndSpeed() * currentPath.getEndSpeed() + currentPath.getAccelerationDistance2());
+        // For trapezoidal profiles, this is the formula vf^2 = v0^2 + 2*a*d, but we're working backwards.
+        const double maximumStartSpeed = currentPath.getMaxReachableSpeed(currentPath.getEndSpeed());
 
         const double newStartSpeed = std::min(maximumStartSpeed, currentPath.getMaxStartSpeed());
 
@@ -147,6 +134,15 @@ bool PathOptimizer::doesJunctionSpeedViolateMaxSpeedJumps(const VectorN& entrySp
 
 std::tuple<double, double> PathOptimizer::calculateJunctionSpeed(const Path& entryPath, const Path& exitPath)
 {
+    if (junctionDeviation > 0)
+    {
+        // Both paths can always be run at their safe speeds, like with max speed jumps
+        const double junctionSpeed = calculateJunctionDeviationSpeed(entryPath, exitPath);
+
+        return std::tuple<double, double>(std::max(junctionSpeed, calculateSafeSpeed(entryPath)),
+            std::max(junctionSpeed, calculateSafeSpeed(exitPath)));
+    }
+
     double entryFactor = 1;
     double exitFactor = 1;
 
@@ -272,6 +268,13 @@ double PathOptimizer::calculateReachableJunctionSpeed(const Path& firstPath, con
         return 0;
     }
 
+    if (junctionDeviation > 0)
+    {
+        const double junctionSpeed = std::min(firstJunctionSpeed, calculateJunctionDeviationSpeed(firstPath, secondPath));
+
+        return std::max(junctionSpeed, calculateSafeSpeed(secondPath));
+    }
+
     const VectorN firstJunctionSpeeds = firstJunctionSpeed != 0
         ? firstPath.getSpeeds() * (firstJunctionSpeed / firstPath.getFullSpeed())
         : VectorN();
@@ -313,6 +316,40 @@ double PathOptimizer::calculateReachableJunctionSpeed(const Path& firstPath, con
     return secondFactor * secondPath.getFullSpeed();
 }
 
+double PathOptimizer::calculateJunctionDeviationSpeed(const Path& firstPath, const Path& secondPath)
+{
+    if (firstPath.getDistance() == 0 || secondPath.getDistance() == 0)
+    {
+        return 0;
+    }
+
+    const double maxSpeed = std::min(firstPath.getFullSpeed(), secondPath.getFullSpeed());
+
+    // cosine of the angle between the paths - 1 when they continue straight on, -1 for a reversal
+    const double cosTheta = dot(firstPath.getWorldMove(), secondPath.getWorldMove())
+        / (firstPath.getDistance() * secondPath.getDistance());
+
+    if (cosTheta > 0.999999)
+    {
+        return maxSpeed;
+    }
+
+    if (cosTheta < -0.999999)
+    {
+        return 0;
+    }
+
+    // Treat the junction as an arc that is tangent to both paths and passes junctionDeviation from
+    // the corner, and limit the centripetal acceleration on that arc to the acceleration of the paths.
+    // For a corner angle phi (180 degrees - theta) the arc has a radius of
+    // junctionDeviation * sin(phi/2) / (1 - sin(phi/2)), and sin(phi/2) = sqrt((1 + cos(theta)) / 2).
+    const double sinHalfAngle = std::sqrt(0.5 * (1 + cosTheta));
+    const double radius = junctionDeviation * sinHalfAngle / (1 - sinHalfAngle);
+    const double accel = std::min(firstPath.getAcceleration(), secondPath.getAcceleration());
+
+    return std::min(maxSpeed, std::sqrt(accel * radius));
+}
+
 double PathOptimizer::calculateSafeSpeed(const Path& path)
 {
     double safeTime = 0;
@@ -339,3 +376,8 @@ void PathOptimizer::setMaxSpeedJumps(const VectorN& maxSpeedJumps)
 {
     this->maxSpeedJumps = maxSpeedJumps;
 }
+
+void PathOptimizer::setJunctionDeviation(double junctionDeviation)
+{
+    this->junctionDeviation = junctionDeviation;
+}
@@ -9,7 +9,11 @@ private:
 
     VectorN maxSpeedJumps;
 
+    // 0 selects the max speed jumps cornering model
+    double junctionDeviation = 0;
+
     std::tuple<double, double> calculateJunctionSpeed(const Path& previousPath, const Path& newPath);
+    double calculateJunctionDeviationSpeed(const Path& firstPath, const Path& secondPath);
     double calculateReachableJunctionSpeed(const Path& firstPath, const double firstOverallSpeed, const Path& secondSpeeds);
     double calculateSafeSpeed(const Path& path);
     bool doesJunctionSpeedViolateMaxSpeedJumps(const VectorN& entrySpeeds, const VectorN& exitSpeeds);
@@ -18,4 +22,5 @@ public:
     int64_t beforePathRemoval(std::vector<Path>& queue, PathQueueIndex first, PathQueueIndex last) override;
     int64_t onPathAdded(std::vector<Path>& queue, PathQueueIndex first, PathQueueIndex last) override;
     void setMaxSpeedJumps(const VectorN& maxSpeedJumps);
+    void setJunctionDeviation(double junctionDeviation);
 };
\ No newline at end of file
@@ -25,6 +25,7 @@
 
 #include "PathPlanner.h"
 #include "AlarmCallback.h"
+#include "Arc.h"
 #include <algorithm>
 #include <array>
 #include <assert.h>
@@ -62,6 +63,29 @@ PathPlanner::PathPlanner(unsigned int cacheSize, AlarmCallback& alarmCallback, P
     matrix_bed_comp[0] = 1.0;
     matrix_bed_comp[4] = 1.0;
     matrix_bed_comp[8] = 1.0;
+    linear_move_matrix_bed_comp = matrix_bed_comp;
+
+    idealState.zero();
+    arc_chord_tolerance = 0.00001;
+    arc_segment_length = 0.001;
+
+    coalesce_max_angle = 0;
+    coalesce_max_extrusion_error = 0;
+    coalesce_max_moves = 0;
+    open_path_moves = 0;
+
+    incrementalStepTiming = false;
+    stepCommandRepeats = false;
+    stepGenerationWorkers = 0;
+    stepGenerationDepth = 4;
+    memoryLocking = false;
+    emittedPaths = 0;
+    pushBlockWaitTime = LatencyHistogram::Clock::duration::zero();
+    gcodeLine = 0;
+    committedGcodeLine = 0;
+    emittingGcodeLine = 0;
+    pathQueueRanEmpty = false;
+    pruIdleExpected = true;
 
     recomputeParameters();
 
@@ -75,6 +99,12 @@ PathPlanner::PathPlanner(unsigned int cacheSize, AlarmCallback& alarmCallback)
 }
 #endif
 
+PathPlanner::PathPlanner(unsigned int cacheSize, AlarmCallback& alarmCallback, PruEmulator& emulator)
+    : PathPlanner(cacheSize, alarmCallback, static_cast<PruInterface&>(emulator))
+{
+    emulator.setEndstopAlarmCallback([this]() { this->pruAlarmCallback(); });
+}
+
 void PathPlanner::recomputeParameters()
 {
     for (int i = 0; i < NUM_AXES; i++)
@@ -109,6 +139,8 @@ void PathPlanner::queueMove(VectorN endWorldPos,
     // PRE-PROCESSING
     ////////////////////////////////////////////////////////////////////
 
+    LatencyHistogram::ScopedTimer timer(latencies[LATENCY_QUEUE_MOVE]);
+
     queue_move_fail = true;
 
     if (!acceptingPaths)
@@ -220,6 +252,15 @@ void PathPlanner::queueMove(VectorN endWorldPos,
         tweakedEndPos = state + adjustedDeltas;
     }
 
+    const bool canCoalesce = coalesce_max_moves > 1 && !is_probe && tweakedEndPos == endPos;
+
+    if (canCoalesce && coalesceWithOpenPath(startWorldPos, endPos, speed, accel, cancelable))
+    {
+        state = endPos;
+        queue_move_fail = false;
+        return;
+    }
+
     ////////////////////////////////////////////////////////////////////
     // LOAD INTO QUEUE
     ////////////////////////////////////////////////////////////////////
@@ -227,8 +268,9 @@ void PathPlanner::queueMove(VectorN endWorldPos,
     Path p;
 
     p.initialize(state, tweakedEndPos, startWorldPos, machineToWorld(endPos), axisStepsPerM,
-        maxSpeeds, maxAccelerationMPerSquareSecond,
+        maxSpeeds, maxAccelerationMPerSquareSecond, maxJerkMPerCubicSecond,
         speed, accel, axis_config, delta_bot, cancelable, is_probe);
+    p.setGcodeLine(gcodeLine);
 
     if (p.isNoMove())
     {
@@ -273,11 +315,27 @@ void PathPlanner::queueMove(VectorN endWorldPos,
     LOG("done!" << std::endl);
 	*/
 
-    if (!pathQueue.addPath(std::move(p)))
+    if (!(canCoalesce ? pathQueue.addOpenPath(std::move(p)) : pathQueue.addPath(std::move(p))))
     {
         return;
     }
 
+    if (canCoalesce)
+    {
+        open_path_moves = 1;
+        open_path_start = state;
+        open_path_end = endPos;
+        open_path_world_start = startWorldPos;
+        open_path_world_end = machineToWorld(endPos);
+        open_path_speed = speed;
+        open_path_accel = accel;
+        open_path_cancelable = cancelable;
+    }
+    else
+    {
+        open_path_moves = 0;
+    }
+
     // capture state so we can check it after a probe
     const IntVectorN startPos = state;
 
@@ -309,12 +367,205 @@ void PathPlanner::queueMove(VectorN endWorldPos,
     queue_move_fail = false;
 }
 
+bool PathPlanner::coalesceWithOpenPath(const VectorN& startWorldPos, const IntVectorN& endPos,
+    double speed, double accel, bool cancelable)
+{
+    if (open_path_moves == 0 || open_path_moves >= coalesce_max_moves || open_path_end != state
+        || speed != open_path_speed || accel != open_path_accel || cancelable != open_path_cancelable)
+    {
+        return false;
+    }
+
+    const VectorN endWorldPos = machineToWorld(endPos);
+    const VectorN openMove = open_path_world_end - open_path_world_start;
+    const VectorN newMove = endWorldPos - startWorldPos;
+
+    const Vector3 openTravel = openMove.toVector3();
+    const Vector3 newTravel = newMove.toVector3();
+    const double openLength = vabs(openTravel);
+    const double newLength = vabs(newTravel);
+
+    if (openLength == 0 || newLength == 0)
+    {
+        return false;
+    }
+
+    const double cosAngle = dot(openTravel, newTravel) / (openLength * newLength);
+
+    if (cosAngle < std::cos(coalesce_max_angle))
+    {
+        return false;
+    }
+
+    for (int i = 3; i < NUM_AXES; i++)
+    {
+        const double openExtrusion = openMove[i] / openLength;
+        const double newExtrusion = newMove[i] / newLength;
+
+        if (std::abs(newExtrusion - openExtrusion) > coalesce_max_extrusion_error * std::abs(openExtrusion))
+        {
+            return false;
+        }
+    }
+
+    Path p;
+
+    p.initialize(open_path_start, endPos, open_path_world_start, endWorldPos, axisStepsPerM,
+        maxSpeeds, maxAccelerationMPerSquareSecond, maxJerkMPerCubicSecond,
+        speed, accel, axis_config, delta_bot, cancelable, false);
+    p.setGcodeLine(gcodeLine);
+
+    if (!pathQueue.replaceOpenPath(std::move(p)))
+    {
+        return false;
+    }
+
+    open_path_moves++;
+    open_path_end = endPos;
+    open_path_world_end = endWorldPos;
+
+    return true;
+}
+
+void PathPlanner::queueLinearMove(int axisMask, VectorN values, int relativeMask,
+    double feedRate, double speedFactor, double accel,
+    double extrudeFactor, double babystep, int tool_axis)
+{
+    VectorN newIdealState = idealState;
+
+    for (int i = 0; i < NUM_AXES; i++)
+    {
+        if (axisMask & (1 << i))
+        {
+            // E, H, A, B and C are extruders
+            const double value = i >= 3 ? values[i] * extrudeFactor : values[i];
+
+            if (relativeMask & (1 << i))
+            {
+                newIdealState[i] += value;
+            }
+            else
+            {
+                newIdealState[i] = value;
+            }
+        }
+    }
+
+    const bool optimize = relativeMask != (1 << NUM_AXES) - 1;
+
+    queueMove(linearMoveEndPos(newIdealState, babystep), feedRate * speedFactor, accel,
+        false, optimize, true, false, true, false, tool_axis);
+
+    if (!queue_move_fail)
+    {
+        idealState = newIdealState;
+    }
+}
+
+void PathPlanner::queueArc(VectorN endPos, double center0, double center1, double radius,
+    int plane, bool clockwise, double speed, double accel,
+    double babystep, int tool_axis)
+{
+    const Arc arc(idealState, endPos, center0, center1, radius, plane, clockwise,
+        arc_chord_tolerance, arc_segment_length);
+
+    for (int i = 1; i <= arc.getNumSegments(); i++)
+    {
+        if (!acceptingPaths)
+        {
+            LOGWARNING("Rejecting the rest of the arc because path planner is suspended" << std::endl);
+            queue_move_fail = true;
+            return;
+        }
+
+        // Segments too short to take a step are not queued, but the ideal position still
+        // moves along the arc.
+        const VectorN segmentEnd = arc.getSegmentEnd(i);
+        queueMove(linearMoveEndPos(segmentEnd, babystep), speed, accel,
+            false, true, true, false, false, false, tool_axis);
+
+        if (acceptingPaths)
+        {
+            idealState = segmentEnd;
+        }
+    }
+}
+
+VectorN PathPlanner::linearMoveEndPos(const VectorN& idealPos, double babystep)
+{
+    // Path.py applies the matrix as end_pos[:3].dot(matrix_bed_comp)
+    const std::vector<double>& m = linear_move_matrix_bed_comp;
+    VectorN endWorldPos = idealPos;
+    for (int i = 0; i < 3; i++)
+    {
+        endWorldPos[i] = idealPos[0] * m[i] + idealPos[1] * m[3 + i] + idealPos[2] * m[6 + i];
+    }
+    endWorldPos[2] += babystep;
+
+    return endWorldPos;
+}
+
+std::vector<uint8_t> PathPlanner::queueMoves(const double* endWorldPositions, int numMoves, int numAxes,
+    const double* speeds, int numSpeeds, const double* accels, int numAccels,
+    const int* flags, int numFlags, int tool_axis)
+{
+    if (numAxes != NUM_AXES || numSpeeds != numMoves || numAccels != numMoves || numFlags != numMoves)
+    {
+        throw InputSizeError();
+    }
+
+    std::vector<uint8_t> status(numMoves, true);
+
+    for (int i = 0; i < numMoves; i++)
+    {
+        if (!acceptingPaths)
+        {
+            LOGWARNING("Rejecting " << numMoves - i << " paths because path planner is suspended" << std::endl);
+            queue_move_fail = true;
+            break;
+        }
+
+        VectorN endWorldPos;
+        for (int axis = 0; axis < NUM_AXES; axis++)
+        {
+            endWorldPos[axis] = endWorldPositions[i * NUM_AXES + axis];
+        }
+
+        const int moveFlags = flags[i];
+        queueMove(endWorldPos, speeds[i], accels[i],
+            moveFlags & MOVE_FLAG_CANCELABLE,
+            moveFlags & MOVE_FLAG_OPTIMIZE,
+            moveFlags & MOVE_FLAG_SOFT_ENDSTOPS,
+            moveFlags & MOVE_FLAG_BED_MATRIX,
+            moveFlags & MOVE_FLAG_BACKLASH_COMPENSATION,
+            moveFlags & MOVE_FLAG_PROBE,
+            tool_axis);
+
+        status[i] = queue_move_fail;
+    }
+
+    return status;
+}
+
 void PathPlanner::runThread()
 {
     stop = false;
     LOGINFO("PathPlanner: starting thread" << std::endl);
+
+    if (memoryLocking)
+    {
+        ThreadScheduling::lockMemory();
+    }
+
+    pru.setThreadScheduling(pruScheduling);
     pru.runThread();
+    stepGenerator.start(
+        stepGenerationWorkers, stepGenerationDepth, [this](Path& path) {
+            return finalizePath(path);
+        },
+        &latencies[LATENCY_STEP_GENERATION], plannerScheduling);
     runningThread = std::thread([this]() {
+        plannerScheduling.apply("PathPlanner");
         this->run();
     });
 }
@@ -322,9 +573,15 @@ void PathPlanner::runThread()
 void PathPlanner::stopThread(bool join)
 {
     pru.stopThread(join);
-    stop = true;
 
+    {
+        std::unique_lock<std::mutex> lock(emittedPathsMutex);
+        stop = true;
+    }
+
+    pathEmitted.notify_all();
     pathQueue.stop();
+    stepGenerator.stop();
 
     if (join && runningThread.joinable())
     {
@@ -344,10 +601,19 @@ void PathPlanner::waitUntilFinished()
 {
     pathQueue.waitForQueueToEmpty();
 
+    // the last paths taken from the queue may not have reached the PRU yet
+    const uint64_t poppedPaths = pathQueue.getPoppedPaths();
+
+    {
+        std::unique_lock<std::mutex> lock(emittedPathsMutex);
+        pathEmitted.wait(lock, [this, poppedPaths] { return stop || emittedPaths >= poppedPaths; });
+    }
+
     //Wait for PruTimer then
     if (!stop)
     {
         pru.waitUntilFinished();
+        pruIdleExpected = true;
     }
 }
 
@@ -355,6 +621,7 @@ void PathPlanner::reset()
 {
     LOGINFO("path planner resetting" << std::endl);
     pru.reset();
+    pruIdleExpected = true;
     acceptingPaths = true;
 }
 
@@ -363,10 +630,15 @@ void PathPlanner::run()
     LOGINFO("PathPlanner loop starting" << std::endl);
 
     const unsigned int maxCommandsPerBlock = pru.getMaxBytesPerBlock() / sizeof(SteppersCommand);
-    std::unique_ptr<SteppersCommand[]> commandBlock(new SteppersCommand[maxCommandsPerBlock]);
 
     while (!stop)
     {
+        if (stepGenerator.isRunning())
+        {
+            runPipelinedPath(maxCommandsPerBlock);
+            continue;
+        }
+
         auto possiblePath = pathQueue.popPath();
 
         if (!possiblePath)
@@ -377,69 +649,227 @@ void PathPlanner::run()
         }
         Path& cur = possiblePath.value();
 
-        // TODO check for wait events and wait (with tests)
+        const LatencyHistogram::Clock::time_point start = LatencyHistogram::Clock::now();
+        const LatencyHistogram::Clock::duration waitedBefore = pushBlockWaitTime;
 
-        IntVectorN probeDistanceTraveled;
+        const double moveEndTime = finalizePath(cur);
 
-        assert(!cur.isBlocked());
-
-        // Only enable axes that are moving. If the axis doesn't need to move then it can stay disabled depending on configuration.
-        cur.fixStartAndEndSpeed();
-        if (!cur.areParameterUpToDate())
-        { // should never happen, but with bad timings???
-            cur.updateStepperPathParameters();
+        std::array<StepSource*, NUM_AXES> steps;
+        for (int i = 0; i < NUM_AXES; i++)
+        {
+            steps[i] = &cur.getSteps()[i];
         }
 
-        LOG("axis mask:    " << cur.getAxisMoveMask() << std::endl);
-        LOG("startSpeed:   " << cur.getStartSpeed() << std::endl);
-        LOG("fullSpeed:    " << cur.getFullSpeed() << std::endl);
-        LOG("acceleration: " << cur.getAcceleration() << std::endl);
-        LOG("cancellable:  " << cur.isCancelable() << std::endl);
+        emitPath(cur, moveEndTime, steps, pathQueue.hasPaths(), maxCommandsPerBlock);
 
-        const double moveEndTime = cur.runFinalStepCalculations();
+        // wait events and probes wait for other things than the PRU to take their blocks
+        if (!cur.isWaitEvent() && !cur.isProbeMove())
+        {
+            latencies[LATENCY_STEP_GENERATION].record(LatencyHistogram::Clock::now() - start - (pushBlockWaitTime - waitedBefore));
+        }
+    }
+}
+
+void PathPlanner::runPipelinedPath(const size_t maxCommandsPerBlock)
+{
+    // Hand the workers the paths that are already queued. The open path stays in the queue
+    // until the pipeline runs dry, so later moves can still be merged into it.
+    while (!stepGenerator.isFull() && (stepGenerator.size() == 0 || pathQueue.hasClosedPaths()))
+    {
+        auto possiblePath = pathQueue.popPath();
 
-        if (cur.isWaitEvent())
+        if (!possiblePath)
         {
-            LOGINFO("wait event - path planner thread waiting" << std::endl);
-            cur.getWaitEvent().wait();
-            LOGINFO("wait event done - path planner thread continuing" << std::endl);
+            // the queue should only fail to give us a path if we're shutting down
+            assert(stop);
+            return;
         }
 
-        LOG("Sending, Start speed=" << cur.getStartSpeed() << ", end speed=" << cur.getEndSpeed() << std::endl);
+        stepGenerator.addPath(std::move(possiblePath.value()));
+    }
 
-        runMove(cur.getAxisMoveMask(),
-            cur.isCancelable() ? cur.getAxisMoveMask() : 0,
-            cur.isSyncEvent(),
-            cur.isSyncWaitEvent(),
-            moveEndTime,
-            cur.getSteps(),
-            commandBlock,
-            maxCommandsPerBlock,
-            cur.isProbeMove() ? &probeDistanceTraveled : nullptr,
-            cur.getSyncCallback());
+    StepGenerator::Job* job = stepGenerator.waitForNext();
 
-        if (cur.isProbeMove())
-        {
-            const VectorN startPos = machineToWorld(cur.getStartMachinePos());
+    if (!job)
+    {
+        assert(stop);
+        return;
+    }
+
+    std::array<StepSource*, NUM_AXES> steps;
+    for (int i = 0; i < NUM_AXES; i++)
+    {
+        steps[i] = &job->steps[i];
+    }
+
+    emitPath(job->path, job->moveEndTime, steps, stepGenerator.size() > 1 || pathQueue.hasPaths(), maxCommandsPerBlock);
+
+    stepGenerator.finishNext();
+}
+
+void PathPlanner::finishPath()
+{
+    {
+        std::unique_lock<std::mutex> lock(emittedPathsMutex);
+        emittedPaths++;
+    }
+
+    pathEmitted.notify_all();
+}
+
+double PathPlanner::finalizePath(Path& cur)
+{
+    assert(!cur.isBlocked());
+
+    // Only enable axes that are moving. If the axis doesn't need to move then it can stay disabled depending on configuration.
+    cur.fixStartAndEndSpeed();
+    if (!cur.areParameterUpToDate())
+    { // should never happen, but with bad timings???
+        cur.updateStepperPathParameters();
+    }
+
+    LOG("axis mask:    " << cur.getAxisMoveMask() << std::endl);
+    LOG("startSpeed:   " << cur.getStartSpeed() << std::endl);
+    LOG("fullSpeed:    " << cur.getFullSpeed() << std::endl);
+    LOG("acceleration: " << cur.getAcceleration() << std::endl);
+    LOG("cancellable:  " << cur.isCancelable() << std::endl);
+
+    return cur.runFinalStepCalculations(incrementalStepTiming);
+}
+
+void PathPlanner::emitPath(Path& cur, double moveEndTime, std::array<StepSource*, NUM_AXES>& steps, bool hasNextPath, const size_t maxCommandsPerBlock)
+{
+    // TODO check for wait events and wait (with tests)
+
+    IntVectorN probeDistanceTraveled;
+
+    emittingGcodeLine = cur.getGcodeLine();
+
+    // steps the input shapers delayed past the previous moves have to be taken before probing or waiting
+    if (cur.isProbeMove() || cur.isWaitEvent())
+    {
+        runShapedStepsTail(maxCommandsPerBlock);
+    }
+
+    if (cur.isWaitEvent())
+    {
+        // everything before the wait event has been sent, so waitUntilFinished needn't wait for it
+        finishPath();
+
+        LOGINFO("wait event - path planner thread waiting" << std::endl);
+        cur.getWaitEvent().wait();
+        LOGINFO("wait event done - path planner thread continuing" << std::endl);
+        pruIdleExpected = true;
+    }
+
+    // the next move takes over the steps the input shapers delay past the end of this one,
+    // unless there's no next move yet or this one has to finish before a sync event
+    const double shapedMoveEndTime = cur.isProbeMove()
+        ? moveEndTime
+        : shapeSteps(steps, moveEndTime, cur.isSyncEvent() || cur.isSyncWaitEvent() || !hasNextPath, cur.willUsePressureAdvance());
+
+    LOG("Sending, Start speed=" << cur.getStartSpeed() << ", end speed=" << cur.getEndSpeed() << std::endl);
+
+    runMove(cur.getAxisMoveMask(),
+        cur.isCancelable() ? cur.getAxisMoveMask() : 0,
+        cur.isSyncEvent(),
+        cur.isSyncWaitEvent(),
+        shapedMoveEndTime,
+        steps,
+        maxCommandsPerBlock,
+        cur.isProbeMove() ? &probeDistanceTraveled : nullptr,
+        cur.getSyncCallback());
+
+    if (cur.isProbeMove())
+    {
+        const VectorN startPos = machineToWorld(cur.getStartMachinePos());
+
+        assert(state == cur.getStartMachinePos());
+        const IntVectorN endMachinePos = cur.getStartMachinePos() + probeDistanceTraveled;
+        const VectorN endPos = machineToWorld(endMachinePos);
+
+        lastProbeDistance = vabs(endPos - startPos);
+
+        cur.setProbeResult(endMachinePos);
+    }
 
-            assert(state == cur.getStartMachinePos());
-            const IntVectorN endMachinePos = cur.getStartMachinePos() + probeDistanceTraveled;
-            const VectorN endPos = machineToWorld(endMachinePos);
+    if (cur.isProbeMove() || cur.isSyncWaitEvent())
+    {
+        pruIdleExpected = true;
+    }
+
+    if (!hasNextPath)
+    {
+        pathQueueRanEmpty = true;
+        bufferTelemetry.addPathQueueUnderflow();
+    }
+
+    //LOG("Current move time " << pru.getTotalQueuedMovesTime() / (double) F_CPU << std::endl);
+
+    if (!cur.isWaitEvent())
+    {
+        finishPath();
+    }
+
+    LOG("Done sending" << std::endl);
+}
+
+double PathPlanner::shapeSteps(std::array<StepSource*, NUM_AXES>& steps, double moveEndTime, bool flush, bool advance)
+{
+    double shapedMoveEndTime = moveEndTime;
+
+    for (int i = 0; i < NUM_AXES; i++)
+    {
+        if (!inputShapers[i].isEnabled())
+        {
+            continue;
+        }
 
-            lastProbeDistance = vabs(endPos - startPos);
+        // shaping needs all the steps of the move, so only shaped axes are computed up front
+        std::vector<Step>& axisSteps = shapedSteps[i].getSteps();
+        axisSteps.clear();
 
-            cur.setProbeResult(endMachinePos);
+        Step step;
+        while (steps[i]->next(step))
+        {
+            axisSteps.push_back(step);
         }
 
-        //LOG("Current move time " << pru.getTotalQueuedMovesTime() / (double) F_CPU << std::endl);
+        shapedMoveEndTime = std::max(shapedMoveEndTime, inputShapers[i].shapeSteps(axisSteps, i, moveEndTime, flush, advance));
 
-        LOG("Done sending" << std::endl);
+        shapedSteps[i].rewind();
+        steps[i] = &shapedSteps[i];
     }
+
+    return shapedMoveEndTime;
 }
 
-inline uint64_t roundStepTime(double stepTime)
+void PathPlanner::runShapedStepsTail(const size_t maxCommandsPerBlock)
 {
-    return static_cast<uint64_t>(std::llround(stepTime * (F_CPU_FLOAT / MINIMUM_STEP_INTERVAL))) * MINIMUM_STEP_INTERVAL;
+    int moveMask = 0;
+
+    for (int i = 0; i < NUM_AXES; i++)
+    {
+        if (inputShapers[i].hasPendingSteps())
+        {
+            moveMask |= 1 << i;
+        }
+    }
+
+    if (moveMask == 0)
+    {
+        return;
+    }
+
+    VectorStepSource noSteps;
+    std::array<StepSource*, NUM_AXES> steps;
+    steps.fill(&noSteps);
+
+    const double moveEndTime = shapeSteps(steps, 0, true, false);
+
+    LOG("Sending " << moveEndTime << "s of steps delayed by input shaping" << std::endl);
+
+    runMove(moveMask, 0, false, false, moveEndTime, steps, maxCommandsPerBlock);
 }
 
 void PathPlanner::runMove(
@@ -448,15 +878,16 @@ void PathPlanner::runMove(
     const bool sync,
     const bool wait,
     const double moveEndTime,
-    std::array<std::vector<Step>, NUM_AXES>& steps,
-    std::unique_ptr<SteppersCommand[]> const& commands,
-    const size_t commandsLength,
+    std::array<StepSource*, NUM_AXES>& steps,
+    const size_t maxCommandsPerBlock,
     IntVectorN* probeDistanceTraveled,
     SyncCallback* callback)
 {
 
     std::array<unsigned long long, NUM_AXES> finalStepTimes;
-    std::array<size_t, NUM_AXES> stepIndex;
+    std::array<Step, NUM_AXES> nextSteps;
+    SteppersCommand* commands = nullptr;
+    size_t commandsLength = 0;
     size_t commandsIndex = 0;
     std::vector<SteppersCommand> probeSteps;
     unsigned int totalSteps = 0;
@@ -465,26 +896,103 @@ void PathPlanner::runMove(
     // options applied to a normal command (there are extra options for the last command in a list)
     const uint8_t normalStepOptions = probeDistanceTraveled != nullptr ? STEPPER_COMMAND_OPTION_CARRY_BLOCKED_STEPPERS : 0;
 
+    // the PRU counts cancelled commands to find how far a probe got, so those keep one command per step
+    const bool repeatCommands = stepCommandRepeats && cancellableMask == 0 && probeDistanceTraveled == nullptr;
+
     if (probeDistanceTraveled != nullptr)
     {
         pru.resetStepsRemaining();
     }
 
-    assert(commandsLength > 1); // we do not handle single-index command buffers correctly
+    assert(maxCommandsPerBlock > 1); // we do not handle single-index command buffers correctly
 
     finalStepTimes.fill(0);
-    stepIndex.fill(0);
 
-    for (size_t i = 0; i < commandsLength; i++)
+    // The commands are written straight into the memory the PRU reads them from. Each block is
+    // only as long as the PRU has room for in one piece, and every command in it is written
+    // before the block is committed.
+    // the time waited for the PRU to reserve the block that's being written
+    LatencyHistogram::Clock::duration blockWaitTime = LatencyHistogram::Clock::duration::zero();
+
+    const auto reserveBlock = [&]() {
+        size_t blockLen = 0;
+        const LatencyHistogram::Clock::time_point waitStart = LatencyHistogram::Clock::now();
+        commands = reinterpret_cast<SteppersCommand*>(pru.reserveBlock(sizeof(SteppersCommand) * maxCommandsPerBlock, sizeof(SteppersCommand), blockLen));
+        blockWaitTime = LatencyHistogram::Clock::now() - waitStart;
+        commandsLength = blockLen / sizeof(SteppersCommand);
+        commandsIndex = 0;
+
+        assert(commandsLength > 1);
+    };
+
+    const auto commitBlock = [&](uint64_t blockTime, SyncCallback* blockCallback) {
+        if (probeDistanceTraveled)
+        {
+            probeSteps.insert(probeSteps.end(), &commands[0], &commands[commandsIndex]);
+        }
+
+        // an idle PRU has run out of commands since the last block, unless it was allowed to
+        if (!pruIdleExpected.exchange(false) && pru.getTotalQueuedMovesTime() == 0)
+        {
+            bufferTelemetry.addUnderrun(LatencyHistogram::Clock::now(), pathQueueRanEmpty ? UNDERRUN_PATH_QUEUE : UNDERRUN_PRU, committedGcodeLine);
+        }
+
+        const LatencyHistogram::Clock::time_point waitStart = LatencyHistogram::Clock::now();
+        pru.commitBlock(sizeof(SteppersCommand) * commandsIndex, sizeof(SteppersCommand), blockTime, blockCallback);
+        const LatencyHistogram::Clock::time_point committed = LatencyHistogram::Clock::now();
+        blockWaitTime += committed - waitStart;
+
+        latencies[LATENCY_PUSH_BLOCK_WAIT].record(blockWaitTime);
+        pushBlockWaitTime += blockWaitTime;
+
+        committedGcodeLine = emittingGcodeLine;
+        pathQueueRanEmpty = false;
+
+        if (bufferTelemetry.isSampleDue(committed))
+        {
+            bufferTelemetry.addSample(committed, pathQueue.getDepth(), pru.getTotalQueuedMovesTime(), pru.getMemoryUsed());
+        }
+
+        commands = nullptr;
+        commandsLength = 0;
+        commandsIndex = 0;
+    };
+
+    // Each axis computes its steps as they're taken, so only the next one is kept. Their times
+    // are rounded to the step grid once and kept in a min-heap, so finding the earliest doesn't
+    // need to look at every axis.
+    struct AxisStepTime
     {
-        commands[i] = {};
+        uint64_t time;
+        int axis;
+    };
+
+    std::array<AxisStepTime, NUM_AXES> stepTimes;
+    size_t axesWithSteps = 0;
+
+    const auto laterStep = [](const AxisStepTime& l, const AxisStepTime& r) { return l.time > r.time; };
+
+    const auto takeNextStep = [&](int axis) {
+        if (steps[axis]->next(nextSteps[axis]))
+        {
+            stepTimes[axesWithSteps++] = AxisStepTime{ roundStepTime(nextSteps[axis].time), axis };
+            std::push_heap(stepTimes.begin(), stepTimes.begin() + axesWithSteps, laterStep);
+        }
+    };
+
+    for (int i = 0; i < NUM_AXES; i++)
+    {
+        takeNextStep(i);
     }
 
     unsigned long long lastStepTime = 0;
 
+    reserveBlock();
+
     // reserve a command to be an opening delay with no steps
-    uint32_t* lastDelay = &commands[commandsIndex].delay;
+    commands[commandsIndex] = {};
     commands[commandsIndex].options = normalStepOptions;
+    uint32_t* lastDelay = &commands[commandsIndex].delay;
 
     commandsIndex++;
     totalSteps++;
@@ -496,26 +1004,15 @@ void PathPlanner::runMove(
     uint64_t stepTime = 0;
     while (foundStep)
     {
-        foundStep = false;
-
         // find a step time
-        stepTime = UINT64_MAX;
+        foundStep = axesWithSteps != 0;
 
-        for (int i = 0; i < NUM_AXES; i++)
+        if (foundStep)
         {
-            const auto& axisSteps = steps[i];
-            const auto axisStepIndex = stepIndex[i];
-
-            if (axisSteps.size() > axisStepIndex)
-            {
-                stepTime = std::min(stepTime, roundStepTime(axisSteps[axisStepIndex].time));
-                foundStep = true;
-            }
+            stepTime = stepTimes.front().time;
         }
-
-        if (!foundStep)
+        else
         {
-            assert(stepTime == UINT64_MAX);
             stepTime = roundStepTime(moveEndTime);
             LOG("last step - previousStepTime was " << lastStepTime << " and the move should end at " << stepTime << std::endl);
         }
@@ -528,23 +1025,31 @@ void PathPlanner::runMove(
 
         *lastDelay = (uint32_t)(stepTime - lastStepTime);
 
-        // find a command to hold the step we're about to take
-        if (commandsIndex == commandsLength)
+        // fold a finished command into the one before it if it takes the same steps after the same
+        // delay. The last command stays on its own because the sync options go there.
+        if (repeatCommands && foundStep && commandsIndex >= 2)
         {
-            pru.pushBlock((uint8_t*)&commands[0], sizeof(SteppersCommand) * commandsIndex, sizeof(SteppersCommand), stepTime - currentBlockStartTime);
-
-            if (probeDistanceTraveled)
+            SteppersCommand& previous = commands[commandsIndex - 2];
+            SteppersCommand& last = commands[commandsIndex - 1];
+
+            if (previous.step == last.step
+                && previous.direction == last.direction
+                && previous.delay == last.delay
+                && previous.cancellableMask == last.cancellableMask
+                && (previous.options & ~STEPPER_COMMAND_OPTION_REPEAT_MASK) == last.options
+                && stepperCommandRuns(previous) <= STEPPER_COMMAND_MAX_REPEATS)
             {
-                probeSteps.insert(probeSteps.end(), &commands[0], &commands[commandsLength]);
+                previous.options += 1 << STEPPER_COMMAND_OPTION_REPEAT_SHIFT;
+                commandsIndex--;
+                lastDelay = &previous.delay;
             }
+        }
 
-            commandsIndex = 0;
+        // find a command to hold the step we're about to take
+        if (commandsIndex == commandsLength)
+        {
+            commitBlock(stepTime - currentBlockStartTime, nullptr);
             currentBlockStartTime = stepTime;
-
-            for (size_t i = 0; i < commandsLength; i++)
-            {
-                commands[i] = {};
-            }
         }
 
         if (!foundStep)
@@ -552,10 +1057,17 @@ void PathPlanner::runMove(
             break;
         }
 
+        if (commands == nullptr)
+        {
+            reserveBlock();
+        }
+
+        // the reserved memory isn't cleared, so every field of the command gets written
         SteppersCommand& cmd = commands[commandsIndex];
         commandsIndex++;
         totalSteps++;
 
+        cmd = {};
         cmd.cancellableMask = cancellableMask;
         cmd.options = normalStepOptions;
 
@@ -563,24 +1075,20 @@ void PathPlanner::runMove(
         lastStepTime = stepTime;
 
         // add all the axes that can step at this time
-        for (int i = 0; i < NUM_AXES; i++)
+        while (axesWithSteps != 0 && stepTimes.front().time == stepTime)
         {
-            const auto& axisSteps = steps[i];
-            const auto axisStepIndex = stepIndex[i];
-
-            if (axisSteps.size() > axisStepIndex && roundStepTime(axisSteps[axisStepIndex].time) == stepTime)
-            {
-                const auto& step = axisSteps[axisStepIndex];
+            std::pop_heap(stepTimes.begin(), stepTimes.begin() + axesWithSteps, laterStep);
+            const int i = stepTimes[--axesWithSteps].axis;
+            const auto& step = nextSteps[i];
 
-                assert(!(cmd.step & (1 << i))); // this means we're double-stepping an axis
-                assert(step.axis == i);
+            assert(!(cmd.step & (1 << i))); // this means we're double-stepping an axis
+            assert(step.axis == i);
 
-                cmd.step |= axes_stepping_together[i];
-                cmd.direction |= (step.direction ? 0xff : 0) & axes_stepping_together[i];
+            cmd.step |= axes_stepping_together[i];
+            cmd.direction |= (step.direction ? 0xff : 0) & axes_stepping_together[i];
 
-                stepIndex[i]++;
-                finalStepTimes[i] = stepTime;
-            }
+            finalStepTimes[i] = stepTime;
+            takeNextStep(i);
         }
 
         assert(cmd.step != 0);
@@ -591,11 +1099,11 @@ void PathPlanner::runMove(
         // if we have a callback, we need to make sure there's at least one more command to push
         if (commandsIndex == 0)
         {
+            reserveBlock();
+            commands[0] = {};
             commandsIndex = 1;
             totalSteps++;
             LOG("needed a dummy step for synchronization" << std::endl);
-            assert(commandsIndex < commandsLength);
-            assert(commands[commandsIndex].step == 0 && commands[commandsIndex].delay == 0);
         }
 
         assert(commandsIndex > 0 && commandsIndex <= commandsLength);
@@ -617,25 +1125,12 @@ void PathPlanner::runMove(
 
     if (commandsIndex != 0)
     {
-        if (probeDistanceTraveled)
-        {
-            probeSteps.insert(probeSteps.end(), &commands[0], &commands[commandsIndex]);
-        }
-
-        pru.pushBlock((uint8_t*)&commands[0], sizeof(SteppersCommand) * commandsIndex, sizeof(SteppersCommand), stepTime - currentBlockStartTime, callback);
-
-        for (size_t i = 0; i < commandsLength; i++)
-        {
-            commands[i] = {};
-        }
+        commitBlock(stepTime - currentBlockStartTime, callback);
     }
 
     LOG("move needed " << totalSteps << " steps" << std::endl);
 
-    for (int i = 0; i < NUM_AXES; i++)
-    {
-        assert(stepIndex[i] == steps[i].size());
-    }
+    assert(axesWithSteps == 0);
 
     if (probeDistanceTraveled)
     {
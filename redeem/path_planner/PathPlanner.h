@@ -26,15 +26,22 @@
 #ifndef __PathPlanner__PathPlanner__
 #define __PathPlanner__PathPlanner__
 
+#include "BufferTelemetry.h"
 #include "Delta.h"
+#include "InputShaper.h"
+#include "LatencyHistogram.h"
 #include "Path.h"
 #include "PathOptimizer.h"
 #include "PathQueue.h"
+#include "PruEmulator.h"
 #include "PruTimer.h"
+#include "StepGenerator.h"
+#include "ThreadScheduling.h"
 #include "config.h"
 #include "vectorN.h"
 #include <assert.h>
 #include <atomic>
+#include <condition_variable>
 #include <functional>
 #include <future>
 #include <iostream>
@@ -64,7 +71,9 @@ class PathPlanner
 private:
     friend class PathPlannerRunMoveTest;
     friend class PathPlannerTest;
+    friend class RunMoveBenchmark;
 
+    VectorN linearMoveEndPos(const VectorN& idealPos, double babystep);
     VectorN machineToWorld(const IntVectorN& machinePos);
     IntVectorN worldToMachine(const VectorN& worldPos, bool* possible = nullptr);
 
@@ -75,6 +84,7 @@ private:
     VectorN maxSpeeds;
     VectorN maxAccelerationStepsPerSquareSecond;
     VectorN maxAccelerationMPerSquareSecond;
+    VectorN maxJerkMPerCubicSecond;
 
     double minimumSpeed;
     VectorN axisStepsPerM;
@@ -88,6 +98,45 @@ private:
     PathQueue<PathOptimizer> pathQueue;
     void recomputeParameters();
     void run();
+    void runPipelinedPath(const size_t maxCommandsPerBlock);
+    double finalizePath(Path& cur);
+    void emitPath(Path& cur, double moveEndTime, std::array<StepSource*, NUM_AXES>& steps, bool hasNextPath, const size_t maxCommandsPerBlock);
+
+    // step generation worker threads, see setStepGeneration
+    StepGenerator stepGenerator;
+    int stepGenerationWorkers;
+    size_t stepGenerationDepth;
+
+    // see setThreadScheduling and setMemoryLocking
+    ThreadScheduling plannerScheduling;
+    ThreadScheduling pruScheduling;
+    bool memoryLocking;
+
+    // paths the planner thread has passed on to the PRU, so waitUntilFinished can tell when it
+    // has sent every path popped from pathQueue, also those still waiting in stepGenerator
+    std::mutex emittedPathsMutex;
+    std::condition_variable pathEmitted;
+    uint64_t emittedPaths;
+    void finishPath();
+
+    // the stages timed for getLatencyHistogram, except for LATENCY_OPTIMIZER which pathQueue times
+    std::array<LatencyHistogram, NUM_LATENCY_STAGES> latencies;
+    // the time the planner thread has waited for the PRU to take blocks, so it can be left out of
+    // the step generation time
+    LatencyHistogram::Clock::duration pushBlockWaitTime;
+
+    // buffer depths and underruns, see getBufferTelemetryStats
+    BufferTelemetry bufferTelemetry;
+    // the line setGcodeLine gave for the paths queueMove creates
+    std::atomic<int64_t> gcodeLine;
+    // the planner thread's view of the PRU: the line of the last path it committed a block of,
+    // the line of the path it's sending, and whether no path was queued behind the last path
+    int64_t committedGcodeLine;
+    int64_t emittingGcodeLine;
+    bool pathQueueRanEmpty;
+    // set when the PRU may run out of commands without it being an underrun, like after a
+    // probe or waitUntilFinished
+    std::atomic_bool pruIdleExpected;
 
     void runMove(
         const int moveMask,
@@ -95,13 +144,20 @@ private:
         const bool sync,
         const bool wait,
         const double moveEndTime,
-        std::array<std::vector<Step>, NUM_AXES>& steps,
-        std::unique_ptr<SteppersCommand[]> const& commands,
-        const size_t commandsLength,
+        std::array<StepSource*, NUM_AXES>& steps,
+        const size_t maxCommandsPerBlock,
         IntVectorN* probeDistanceTraveled = nullptr,
         SyncCallback* syncCallback = nullptr);
 
+    // input shaping
+    std::array<InputShaper, NUM_AXES> inputShapers;
+    std::array<VectorStepSource, NUM_AXES> shapedSteps; /// Reused by every move to keep their capacity
+    double shapeSteps(std::array<StepSource*, NUM_AXES>& steps, double moveEndTime, bool flush, bool advance);
+    void runShapedStepsTail(const size_t maxCommandsPerBlock);
+
     // pre-processor functions
+    bool coalesceWithOpenPath(const VectorN& startWorldPos, const IntVectorN& endPos,
+        double speed, double accel, bool cancelable);
     int softEndStopApply(const VectorN& endPos);
     void applyBedCompensation(VectorN& endPos);
     void backlashCompensation(IntVectorN& delta);
@@ -116,6 +172,31 @@ private:
 
     // bed compensation
     std::vector<double> matrix_bed_comp;
+    std::vector<double> linear_move_matrix_bed_comp;
+
+    // the ideal position of the last move queued with queueLinearMove or queueArc
+    VectorN idealState;
+
+    // arc segmentation
+    double arc_chord_tolerance;
+    double arc_segment_length;
+
+    // move coalescing
+    double coalesce_max_angle;
+    double coalesce_max_extrusion_error;
+    int coalesce_max_moves;
+    bool incrementalStepTiming;
+    bool stepCommandRepeats;
+
+    // the open path in pathQueue, which later moves in the same direction are merged into
+    int open_path_moves;
+    IntVectorN open_path_start;
+    IntVectorN open_path_end;
+    VectorN open_path_world_start;
+    VectorN open_path_world_end;
+    double open_path_speed;
+    double open_path_accel;
+    bool open_path_cancelable;
 
     // axis configuration (see config.h for options)
     int axis_config;
@@ -153,6 +234,12 @@ public:
     PathPlanner(unsigned int cacheSize, AlarmCallback& alarmCallback, PruInterface& pru);
     PathPlanner(unsigned int cacheSize, AlarmCallback& alarmCallback);
 
+    /**
+   * @brief Create a path planner that sends its steps to an emulated PRU
+   * @details The emulator has to outlive the path planner. Its endstop alarms go to alarmCallback.
+   */
+    PathPlanner(unsigned int cacheSize, AlarmCallback& alarmCallback, PruEmulator& emulator);
+
     /**
    * @brief  Init the internal PRU co-processors
    * @details Init the internal PRU co-processors with the provided firmware
@@ -194,6 +281,68 @@ public:
         bool cancelable, bool optimize,
         bool enable_soft_endstops, bool use_bed_matrix,
         bool use_backlash_compensation, bool is_probe, int tool_axis = 3);
+
+    /**
+   * @brief Queue a G0/G1 move
+   * @details Queue a linear move as parsed from G-code. Unlike queueMove, the path planner
+   * keeps track of the ideal position, the same way Path.py does for the moves it creates.
+   * The end position is the new ideal position with the bed compensation matrix set by
+   * setLinearMoveBedCompensationMatrix applied and the babystep offset added to Z.
+   * The ideal position is only updated if the move is queued successfully.
+   *
+   * @param axisMask bit i is set if axis i is part of the move
+   * @param values The position of each axis in meters, or the distance for relative axes
+   * @param relativeMask bit i is set if axis i moves relative to the ideal position. Moves with
+   * all bits set are not optimized, like a RelativePath.
+   * @param feedRate The feedrate of the move in m/s
+   * @param speedFactor Multiplier for the feedrate
+   * @param accel The acceleration of the move in m/s^2
+   * @param extrudeFactor Multiplier for the E, H, A, B and C values
+   * @param babystep Offset in meters added to the Z end position
+   * @param tool_axis which axis is our tool attached to
+   */
+    void queueLinearMove(int axisMask, VectorN values, int relativeMask,
+        double feedRate, double speedFactor, double accel,
+        double extrudeFactor, double babystep, int tool_axis = 3);
+    /**
+   * @brief Queue a G2/G3 arc
+   * @details Split an arc from the ideal position to endPos into segments and queue them. The
+   * segment count follows from the tolerances set with setArcChordTolerance and
+   * setArcSegmentLength. Like queueLinearMove, each segment end has the bed compensation matrix
+   * and babystep offset applied and the ideal position is updated to the end of the last segment
+   * that was queued.
+   *
+   * @param endPos The ideal end position of the arc
+   * @param center0 The center of the arc on the first axis of the plane
+   * @param center1 The center of the arc on the second axis of the plane
+   * @param radius The radius of the arc
+   * @param plane ARC_PLANE_XY, ARC_PLANE_XZ or ARC_PLANE_YZ
+   * @param clockwise True for G2, false for G3
+   * @param speed The speed of the move in m/s
+   * @param accel The acceleration of the move in m/s^2
+   * @param babystep Offset in meters added to the Z end position
+   * @param tool_axis which axis is our tool attached to
+   */
+    void queueArc(VectorN endPos, double center0, double center1, double radius,
+        int plane, bool clockwise, double speed, double accel,
+        double babystep, int tool_axis = 3);
+    /**
+   * @brief Queue a batch of moves
+   * @details Queue numMoves moves with a single call. Each move is queued as if queueMove had
+   * been called with the matching row of endWorldPositions, speed, accel and flags. Blocks only
+   * while the path queue is full. If the path planner is suspended by one of the moves, the
+   * remaining moves are rejected.
+   *
+   * @param endWorldPositions numMoves x numAxes end positions, row major. numAxes must be NUM_AXES.
+   * @param speeds The speed of each move in m/s
+   * @param accels The acceleration of each move in m/s^2
+   * @param flags MOVE_FLAG_* bits for each move, see config.h
+   * @param tool_axis which axis is our tool attached to
+   * @return For each move, true if it was not queued (see getLastQueueMoveStatus)
+   */
+    std::vector<uint8_t> queueMoves(const double* endWorldPositions, int numMoves, int numAxes,
+        const double* speeds, int numSpeeds, const double* accels, int numAccels,
+        const int* flags, int numFlags, int tool_axis = 3);
     /**
    * @brief Run the path planner thread
    * @details Run the path planner thread that is in charge to compute the different delays and submit it to the PRU for execution.
@@ -238,6 +387,16 @@ public:
    */
     void setAcceleration(VectorN accel);
 
+    /**
+   * @brief Set the max jerk for all moves
+   * @details Moves that are jerk limited ramp their acceleration up and down following an
+   * S-curve instead of switching it on and off, which excites less ringing. Axes with a jerk
+   * of 0 don't limit the jerk, and moves with only those axes keep the trapezoidal profile.
+   *
+   * @param jerk The jerk in m/s^3
+   */
+    void setJerk(VectorN jerk);
+
     /**
    * @brief Set the maximum speed that can be used when in a corner
    * @details The speed jump determines your start speed and the maximum speed at the join of two segments.
@@ -251,6 +410,148 @@ public:
    */
     void setMaxSpeedJumps(VectorN speedJumps);
 
+    /**
+   * @brief Set the junction deviation used to limit the speed in corners
+   * @details When set, the speed at the join of two segments is limited by the acceleration
+   * needed to follow an arc that is tangent to both segments and passes this close to the corner,
+   * instead of by the max speed jumps. The max speed jumps still set the start and stop speeds.
+   *
+   * @param deviation the junction deviation in m, or 0 to use the max speed jumps in corners
+   */
+    void setJunctionDeviation(double deviation);
+
+    /**
+   * @brief Choose how the steps of linear trapezoidal moves are timed
+   * @details Incremental timing works out each step interval from the one before in fixed-point
+   * PRU cycles, taking the exact time every few steps, instead of mapping every step through
+   * the speed profile. S-curve moves and delta towers are always timed exactly.
+   *
+   * @param incremental true for incremental timing, false for exact timing
+   */
+    void setIncrementalStepTiming(bool incremental);
+
+    /**
+   * @brief Generate the steps of the next paths on worker threads
+   * @details The planner thread normally generates the steps of each path while it pushes the
+   * blocks of that path to the PRU, so a path that takes long to step can hold up the PRU.
+   * With workers, the steps of up to depth paths that are already queued behind the current
+   * one are generated ahead of time. Takes effect when the path planner thread is started.
+   *
+   * @param workers The number of worker threads, or 0 to generate steps on the planner thread
+   * @param depth The number of paths the workers may run ahead
+   */
+    void setStepGeneration(int workers, int depth);
+
+    /**
+   * @brief Send runs of identical step commands to the PRU as one command with a repeat count
+   * @details Moving at a constant speed often gives long runs of commands that step the same
+   * axes after the same delay. Each such run takes one command, which runs up to 32 times, so
+   * fewer commands have to be written to the PRU. Probing and other cancellable moves always
+   * send a command per step.
+   *
+   * @param repeats true to send repeated commands, false to send every command on its own
+   */
+    void setStepCommandRepeats(bool repeats);
+
+    /**
+   * @brief Get the counters of the step generation workers
+   */
+    StepGeneratorStats getStepGeneratorStats();
+
+    /**
+   * @brief Get the histogram of the time taken by a stage of the planner
+   * @details The stages are:
+   * - LATENCY_QUEUE_MOVE: each call to queueMove, including waiting for room in the path queue
+   * - LATENCY_OPTIMIZER: each time the optimizer plans the queue after a path is added or removed
+   * - LATENCY_STEP_GENERATION: for each path, the time taken to finalize it and turn it into step
+   *   commands on the planner thread without waiting for the PRU, or to generate its steps on a
+   *   worker thread if there are any (see setStepGeneration)
+   * - LATENCY_PUSH_BLOCK_WAIT: for each block of step commands, the time waiting to reserve and
+   *   commit it in the PRU's memory
+   * - LATENCY_PRU_COMPLETION: for each block the PRU finished, the time until its memory is freed
+   *   and its sync callback called, see PruInterface::getCompletionLatency
+   *
+   * @param stage One of the LATENCY_* stages in config.h
+   */
+    LatencyHistogramStats getLatencyHistogram(int stage);
+
+    /**
+   * @brief Empty the histograms of all stages, and the PRU completion stats
+   */
+    void resetLatencyHistograms();
+
+    /// How many of the blocks the PRU finished were retired at each wake-up
+    PruCompletionStats getPruCompletionStats();
+
+    /**
+   * @brief Set the G-code line of the moves queued from now on
+   * @details Underrun events report the line of the last move the PRU ran before it ran out of
+   * step commands.
+   *
+   * @param line The line number of the G-code, or any other number that identifies it
+   */
+    void setGcodeLine(int64_t line);
+
+    /**
+   * @brief Set how the depth of the buffers between the path queue and the PRU is sampled
+   * @details After committing a block to the PRU, the planner thread samples the number of
+   * paths in the path queue, the move time queued in the PRU and the bytes of PRU memory in
+   * use, at most once per sampleInterval. Resets the telemetry.
+   *
+   * @param sampleInterval The least time between samples in seconds
+   * @param maxSamples The number of samples kept, the oldest are dropped first. 0 disables sampling.
+   */
+    void setBufferTelemetry(double sampleInterval, int maxSamples);
+
+    /**
+   * @brief Get the underrun counts and the largest sampled buffer depths
+   * @details The PRU underruns when it runs out of step commands while it isn't expected to,
+   * which it is after a probe, a wait event, a blocking sync event, waitUntilFinished or reset.
+   * An underrun is found when the next block is committed and the PRU is idle. Its cause is
+   * UNDERRUN_PATH_QUEUE if no path was queued behind the last path sent, so the moves didn't
+   * arrive fast enough, which includes the end of a print not followed by a wait for the moves
+   * to finish, and UNDERRUN_PRU if the planner thread didn't send the steps fast enough.
+   */
+    BufferTelemetryStats getBufferTelemetryStats();
+
+    /// The buffer depths sampled since the telemetry was reset, oldest first
+    std::vector<BufferSample> getBufferSamples();
+
+    /// The last BUFFER_TELEMETRY_UNDERRUN_EVENTS underruns, oldest first
+    std::vector<UnderrunEvent> getUnderrunEvents();
+
+    void resetBufferTelemetry();
+
+    /**
+   * @brief Set the real-time priority and CPU of a thread
+   * @details Takes effect when the path planner thread is started. The step generation workers
+   * are scheduled the same way as the planner thread.
+   *
+   * @param thread THREAD_PLANNER or THREAD_PRU
+   * @param policy THREAD_POLICY_FIFO or THREAD_POLICY_RR
+   * @param priority 1 to 99 for a real-time priority, or 0 for the normal scheduling
+   * @param cpu The CPU the thread runs on, or -1 for any
+   */
+    void setThreadScheduling(int thread, int policy, int priority, int cpu);
+
+    /**
+   * @brief Lock the memory of the process into RAM when the path planner thread is started
+   * @details This keeps the real-time threads from waiting for memory that was paged out. It
+   * locks all of the memory of the process, including what's allocated later.
+   */
+    void setMemoryLocking(bool lock);
+
+    /**
+   * @brief Measure how late a thread scheduled like one of the planner's threads wakes up
+   * @details Starts a thread with the scheduling of the planner or PRU thread that sleeps until
+   * wakeups points in time interval seconds apart, and records how late it wakes up each time.
+   * The spread of the latencies is the scheduling jitter the thread would see. Returns after
+   * about interval * wakeups seconds.
+   *
+   * @param thread THREAD_PLANNER or THREAD_PRU
+   */
+    LatencyHistogramStats measureWakeupLatency(int thread, double interval, int wakeups);
+
     void suspend()
     {
         pru.suspend();
@@ -266,6 +567,50 @@ public:
     void setStopPrintOnSoftEndstopHit(bool stop);
     void setStopPrintOnPhysicalEndstopHit(bool stop);
     void setBedCompensationMatrix(std::vector<double> matrix);
+    void setLinearMoveBedCompensationMatrix(std::vector<double> matrix);
+    void setArcChordTolerance(double tolerance);
+    void setArcSegmentLength(double length);
+    /**
+   * @brief Merge consecutive moves that continue in the same direction
+   * @details A move is merged into the move before it if their XYZ directions differ by at
+   * most maxAngle, the extrusion per meter of XYZ travel of each extruder differs by at most
+   * maxExtrusionError times that of the move before, and they share speed, acceleration and
+   * flags. Probe moves and moves with backlash compensation are never merged. The last move
+   * is held back only while the path queue has other paths to run.
+   *
+   * @param maxAngle The maximum change in direction in radians
+   * @param maxExtrusionError The maximum relative change in extrusion per meter
+   * @param maxMoves The maximum number of moves merged into one path. 0 or 1 disables merging.
+   */
+    void setMoveCoalescing(double maxAngle, double maxExtrusionError, int maxMoves);
+    /**
+   * @brief Shape the steps of an axis to cancel ringing at a resonance
+   * @details The steps of the axis are convolved with the impulses of the input shaper, which
+   * delays part of every step by up to one period of the resonance. Moves stay as long as
+   * they were, except for the last move before the path queue runs empty, a probe or a wait
+   * event, which is extended to take the remaining steps. Probe moves aren't shaped. The axis
+   * is a stepper, so on CoreXY, H-belt and delta machines the coupled steppers should share a
+   * shaper. Only change the shapers while the planner is idle.
+   *
+   * @param axis The axis to shape
+   * @param type INPUT_SHAPER_NONE, INPUT_SHAPER_ZV, INPUT_SHAPER_MZV or INPUT_SHAPER_EI
+   * @param frequency The resonance frequency in Hz, or 0 to disable shaping
+   * @param damping The damping ratio of the resonance, from 0 up to but excluding 1
+   */
+    void setInputShaper(int axis, int type, double frequency, double damping);
+    /**
+   * @brief Advance an extruder by its speed to make up for the pressure in the nozzle
+   * @details The extruder position of moves that also move X, Y or Z gets the extruder speed,
+   * averaged over the last smoothTime seconds, times the coefficient added to it. The
+   * averaging keeps the extruder from jumping at changes in speed, and like input shaping
+   * extends the last move before the path queue runs empty by up to smoothTime. Only change
+   * the pressure advance while the planner is idle.
+   *
+   * @param axis The extruder axis to advance
+   * @param coefficient The pressure advance in seconds, or 0 to disable it
+   * @param smoothTime The window the extruder speed is averaged over in seconds
+   */
+    void setPressureAdvance(int axis, double coefficient, double smoothTime);
     void setAxisConfig(int axis);
     void setState(VectorN set);
     void enableSlaves(bool enable);
@@ -274,6 +619,8 @@ public:
     void resetBacklash();
 
     VectorN getState();
+    void setIdealState(VectorN set);
+    VectorN getIdealState();
     bool getLastQueueMoveStatus();
 
     double getLastProbeDistance();
@@ -9,17 +9,25 @@
 
 
 %{
+#define SWIG_FILE_WITH_INIT
 #include "PathPlanner.h"
 #include "Delta.h"
 #include "AlarmCallback.h"
 %}
 
+%include "numpy.i"
+
+%init %{
+  import_array();
+%}
+
 %include "config.h"
 
 %rename(PathPlannerNative) PathPlanner;
 %rename(AlarmCallbackNative) AlarmCallback;
 %rename(SyncCallbackNative) SyncCallback;
 %rename(WaitEventNative) WaitEvent;
+%rename(PruEmulatorNative) PruEmulator;
 
 // exception handler
 %exception {
@@ -35,6 +43,7 @@
 // Instantiate template for vector<>
 namespace std {
   %template(vector_double) vector<double>;
+  %template(vector_uint64) vector<uint64_t>;
 }
 
 %apply double *OUTPUT { double* offset };
@@ -71,6 +80,23 @@ namespace std {
   }
 }
 
+%apply (double* IN_ARRAY2, int DIM1, int DIM2) { (const double* endWorldPositions, int numMoves, int numAxes) };
+%apply (double* IN_ARRAY1, int DIM1) { (const double* speeds, int numSpeeds), (const double* accels, int numAccels) };
+%apply (int* IN_ARRAY1, int DIM1) { (const int* flags, int numFlags) };
+
+%typemap(out) std::vector<uint8_t> (PyObject* array) {
+  npy_intp size = $1.size();
+  array = PyArray_SimpleNew(1, &size, NPY_BOOL);
+
+  if(!array) {
+    PyErr_SetString(PyExc_RuntimeError, "Failed to allocate array for move status");
+    return NULL;
+  }
+
+  std::copy($1.begin(), $1.end(), (uint8_t*)PyArray_DATA((PyArrayObject*)array));
+  $result = array;
+}
+
 %typemap(out) VectorN (PyObject* list, PyObject* element) {
   list = PyList_New(NUM_AXES);
 
@@ -139,10 +165,94 @@ public:
   void signalWaitComplete();
 };
 
+struct StepGeneratorStats
+{
+  uint64_t pathsPrepared;
+  uint64_t stepsPrepared;
+  uint64_t emitterStalls;
+  uint64_t queuedPaths;
+  uint64_t maxQueuedPaths;
+};
+
+struct LatencyHistogramStats
+{
+  uint64_t count;
+  uint64_t totalTime;
+  uint64_t maxTime;
+  std::vector<uint64_t> buckets;
+};
+
+struct PruCompletionStats
+{
+  uint64_t wakeups;
+  uint64_t blocks;
+  uint64_t maxBatch;
+};
+
+struct BufferSample
+{
+  double time;
+  uint64_t pathQueueDepth;
+  uint64_t queuedMoveTime;
+  uint64_t pruMemoryUsed;
+};
+
+struct UnderrunEvent
+{
+  double time;
+  int cause;
+  int64_t gcodeLine;
+};
+
+struct BufferTelemetryStats
+{
+  uint64_t samples;
+  uint64_t pathQueueUnderruns;
+  uint64_t pruUnderruns;
+  uint64_t pathQueueUnderflows;
+  uint64_t maxPathQueueDepth;
+  uint64_t maxQueuedMoveTime;
+  uint64_t maxPruMemoryUsed;
+};
+
+namespace std {
+  %template(vector_buffer_sample) vector<BufferSample>;
+  %template(vector_underrun_event) vector<UnderrunEvent>;
+}
+
+struct PruEmulatorStats
+{
+  uint64_t blocks;
+  uint64_t commands;
+  uint64_t cancelledCommands;
+  uint64_t virtualTime;
+  uint64_t underruns;
+  uint64_t starvedTime;
+  uint64_t stretchedCommands;
+  uint64_t maxJitter;
+  uint64_t totalJitter;
+  uint32_t endstopsTriggered;
+};
+
+class PruEmulator
+{
+public:
+  PruEmulator();
+  virtual ~PruEmulator();
+  void setSpeed(double speed);
+  void setEndstopMask(int mask);
+  void setStepTiming(int dirToStep, int stepToClear, int afterStep);
+  PruEmulatorStats getStats();
+  VectorN getStepCounts();
+  VectorN getPosition();
+  void resetStats();
+};
+
 class PathPlanner {
  public:
   Delta delta_bot;
   PathPlanner(unsigned int cacheSize, AlarmCallback& alarmCallback);
+  PathPlanner(unsigned int cacheSize, AlarmCallback& alarmCallback, PruEmulator& emulator);
   bool initPRU(const std::string& firmware_stepper, const std::string& firmware_endstops);
   void queueSyncEvent(SyncCallback& callback, bool isBlocking = true);
   %newobject queueWaitEvent;
@@ -152,18 +262,51 @@ class PathPlanner {
 		 bool cancelable, bool optimize,
 		 bool enable_soft_endstops, bool use_bed_matrix,
 		 bool use_backlash_compensation, bool is_probe, int tool_axis);
+  void queueArc(VectorN endPos, double center0, double center1, double radius,
+		 int plane, bool clockwise, double speed, double accel,
+		 double babystep, int tool_axis);
+  std::vector<uint8_t> queueMoves(const double* endWorldPositions, int numMoves, int numAxes,
+		 const double* speeds, int numSpeeds, const double* accels, int numAccels,
+		 const int* flags, int numFlags, int tool_axis);
+  void queueLinearMove(int axisMask, VectorN values, int relativeMask,
+		 double feedRate, double speedFactor, double accel,
+		 double extrudeFactor, double babystep, int tool_axis);
   void runThread();
   void stopThread(bool join);
   void waitUntilFinished();
   void setMaxSpeeds(VectorN speeds);
   void setAxisStepsPerMeter(VectorN stepPerM);
   void setAcceleration(VectorN accel);
+  void setJerk(VectorN jerk);
   void setMaxSpeedJumps(VectorN speedJumps);
+  void setJunctionDeviation(double deviation);
+  void setIncrementalStepTiming(bool incremental);
+  void setStepGeneration(int workers, int depth);
+  void setThreadScheduling(int thread, int policy, int priority, int cpu);
+  void setMemoryLocking(bool lock);
+  LatencyHistogramStats measureWakeupLatency(int thread, double interval, int wakeups);
+  void setStepCommandRepeats(bool repeats);
+  StepGeneratorStats getStepGeneratorStats();
+  LatencyHistogramStats getLatencyHistogram(int stage);
+  void resetLatencyHistograms();
+  PruCompletionStats getPruCompletionStats();
+  void setGcodeLine(int64_t line);
+  void setBufferTelemetry(double sampleInterval, int maxSamples);
+  BufferTelemetryStats getBufferTelemetryStats();
+  std::vector<BufferSample> getBufferSamples();
+  std::vector<UnderrunEvent> getUnderrunEvents();
+  void resetBufferTelemetry();
   void setSoftEndstopsMin(VectorN stops);
   void setSoftEndstopsMax(VectorN stops);
   void setStopPrintOnSoftEndstopHit(bool stop);
   void setStopPrintOnPhysicalEndstopHit(bool stop);
   void setBedCompensationMatrix(std::vector<double> matrix);
+  void setLinearMoveBedCompensationMatrix(std::vector<double> matrix);
+  void setArcChordTolerance(double tolerance);
+  void setArcSegmentLength(double length);
+  void setMoveCoalescing(double maxAngle, double maxExtrusionError, int maxMoves);
+  void setInputShaper(int axis, int type, double frequency, double damping);
+  void setPressureAdvance(int axis, double coefficient, double smoothTime);
   void setAxisConfig(int axis);
   void setState(VectorN set);
   void enableSlaves(bool enable);
@@ -171,6 +314,8 @@ class PathPlanner {
   void setBacklashCompensation(VectorN set);
   void resetBacklash();
   VectorN getState();
+  void setIdealState(VectorN set);
+  VectorN getIdealState();
   bool getLastQueueMoveStatus();
   double getLastProbeDistance();
   void suspend();
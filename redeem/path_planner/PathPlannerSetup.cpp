@@ -25,6 +25,7 @@
 
 #include "AlarmCallback.h"
 #include "PathPlanner.h"
+#include <algorithm>
 
 // Speeds / accels
 void PathPlanner::setMaxSpeeds(VectorN speeds)
@@ -39,11 +40,129 @@ void PathPlanner::setAcceleration(VectorN accel)
     recomputeParameters();
 }
 
+void PathPlanner::setJerk(VectorN jerk)
+{
+    maxJerkMPerCubicSecond = jerk;
+}
+
 void PathPlanner::setMaxSpeedJumps(VectorN speedJumps)
 {
     optimizer.setMaxSpeedJumps(speedJumps);
 }
 
+void PathPlanner::setJunctionDeviation(double deviation)
+{
+    optimizer.setJunctionDeviation(deviation);
+}
+
+void PathPlanner::setIncrementalStepTiming(bool incremental)
+{
+    incrementalStepTiming = incremental;
+}
+
+void PathPlanner::setStepCommandRepeats(bool repeats)
+{
+    stepCommandRepeats = repeats;
+}
+
+void PathPlanner::setStepGeneration(int workers, int depth)
+{
+    assert(workers >= 0 && depth > 0);
+
+    stepGenerationWorkers = workers;
+    stepGenerationDepth = depth;
+}
+
+void PathPlanner::setThreadScheduling(int thread, int policy, int priority, int cpu)
+{
+    assert(thread == THREAD_PLANNER || thread == THREAD_PRU);
+
+    (thread == THREAD_PRU ? pruScheduling : plannerScheduling) = ThreadScheduling(policy, priority, cpu);
+}
+
+void PathPlanner::setMemoryLocking(bool lock)
+{
+    memoryLocking = lock;
+}
+
+LatencyHistogramStats PathPlanner::measureWakeupLatency(int thread, double interval, int wakeups)
+{
+    assert(thread == THREAD_PLANNER || thread == THREAD_PRU);
+
+    LatencyHistogram histogram;
+    (thread == THREAD_PRU ? pruScheduling : plannerScheduling).measureWakeupLatency(std::chrono::duration_cast<std::chrono::nanoseconds>(std::chrono::duration<double>(interval)), wakeups, histogram);
+
+    return histogram.getStats();
+}
+
+PruCompletionStats PathPlanner::getPruCompletionStats()
+{
+    return pru.getCompletionStats();
+}
+
+StepGeneratorStats PathPlanner::getStepGeneratorStats()
+{
+    return stepGenerator.getStats();
+}
+
+LatencyHistogramStats PathPlanner::getLatencyHistogram(int stage)
+{
+    assert(stage >= 0 && stage < NUM_LATENCY_STAGES);
+
+    if (stage == LATENCY_OPTIMIZER)
+    {
+        return pathQueue.getOptimizerLatency().getStats();
+    }
+
+    if (stage == LATENCY_PRU_COMPLETION)
+    {
+        return pru.getCompletionLatency().getStats();
+    }
+
+    return latencies[stage].getStats();
+}
+
+void PathPlanner::resetLatencyHistograms()
+{
+    for (LatencyHistogram& latency : latencies)
+    {
+        latency.reset();
+    }
+
+    pathQueue.getOptimizerLatency().reset();
+    pru.resetCompletionStats();
+}
+
+void PathPlanner::setGcodeLine(int64_t line)
+{
+    gcodeLine = line;
+}
+
+void PathPlanner::setBufferTelemetry(double sampleInterval, int maxSamples)
+{
+    bufferTelemetry.configure(sampleInterval, std::max(maxSamples, 0));
+}
+
+BufferTelemetryStats PathPlanner::getBufferTelemetryStats()
+{
+    return bufferTelemetry.getStats();
+}
+
+std::vector<BufferSample> PathPlanner::getBufferSamples()
+{
+    return bufferTelemetry.getSamples();
+}
+
+std::vector<UnderrunEvent> PathPlanner::getUnderrunEvents()
+{
+    return bufferTelemetry.getUnderruns();
+}
+
+void PathPlanner::resetBufferTelemetry()
+{
+    bufferTelemetry.reset();
+}
+
 void PathPlanner::setAxisStepsPerMeter(VectorN stepsPerM)
 {
     VectorN stateBefore = getState();
@@ -79,6 +198,48 @@ void PathPlanner::setBedCompensationMatrix(std::vector<double> matrix)
     matrix_bed_comp = matrix;
 }
 
+void PathPlanner::setLinearMoveBedCompensationMatrix(std::vector<double> matrix)
+{
+    if (matrix.size() != 9)
+    {
+        throw InputSizeError();
+    }
+
+    linear_move_matrix_bed_comp = matrix;
+}
+
+// arc segmentation
+void PathPlanner::setArcChordTolerance(double tolerance)
+{
+    arc_chord_tolerance = tolerance;
+}
+
+void PathPlanner::setArcSegmentLength(double length)
+{
+    arc_segment_length = length;
+}
+
+// move coalescing
+void PathPlanner::setMoveCoalescing(double maxAngle, double maxExtrusionError, int maxMoves)
+{
+    coalesce_max_angle = maxAngle;
+    coalesce_max_extrusion_error = maxExtrusionError;
+    coalesce_max_moves = maxMoves;
+}
+
+// input shaping
+void PathPlanner::setInputShaper(int axis, int type, double frequency, double damping)
+{
+    assert(axis >= 0 && axis < NUM_AXES);
+    inputShapers[axis].configure(type, frequency, damping);
+}
+
+void PathPlanner::setPressureAdvance(int axis, double coefficient, double smoothTime)
+{
+    assert(axis >= NUM_MOVING_AXES && axis < NUM_AXES);
+    inputShapers[axis].setPressureAdvance(coefficient, smoothTime);
+}
+
 // axis configuration
 void PathPlanner::setAxisConfig(int axis)
 {
@@ -150,6 +311,18 @@ void PathPlanner::setState(VectorN set)
     }
 
     state = newState;
+    open_path_moves = 0;
+}
+
+// the ideal position tracked by queueLinearMove
+void PathPlanner::setIdealState(VectorN set)
+{
+    idealState = set;
+}
+
+VectorN PathPlanner::getIdealState()
+{
+    return idealState;
 }
 
 // slaves
@@ -13,6 +13,7 @@ using namespace experimental;
 #endif
 #include <vector>
 
+#include "LatencyHistogram.h"
 #include "Logger.h"
 #include "Path.h"
 
@@ -79,8 +80,16 @@ private:
     PathQueueIndex writeIndex;
     PathQueueIndex readIndex;
     size_t availableSlots;
+    uint64_t poppedPaths;
     bool running;
 
+    // time spent in the optimizer hooks
+    LatencyHistogram optimizerLatency;
+
+    // The newest path, kept out of the queue so it can still be replaced with a longer one.
+    // It's added to the queue once another path arrives or the queue runs out of paths.
+    std::optional<Path> openPath;
+
     bool doesQueueHaveSpace()
     {
         return availableSlots != 0 && (curTime < maxTime || availableSlots == queue.size() - 1);
@@ -111,7 +120,10 @@ private:
 
         queue[writeIndex.value] = std::move(path);
 
-        curTime += optimizer.onPathAdded(queue, readIndex, writeIndex);
+        {
+            LatencyHistogram::ScopedTimer timer(optimizerLatency);
+            curTime += optimizer.onPathAdded(queue, readIndex, writeIndex);
+        }
 
         writeIndex++;
         availableSlots--;
@@ -124,6 +136,24 @@ private:
         return true;
     }
 
+    bool isEmpty()
+    {
+        return availableSlots == queue.size() && !openPath;
+    }
+
+    bool closeOpenPath(std::unique_lock<std::mutex>& lock)
+    {
+        if (!openPath)
+        {
+            return true;
+        }
+
+        Path path = std::move(openPath.value());
+        openPath.reset();
+
+        return addPathInternal(lock, std::move(path));
+    }
+
 public:
     PathQueue(PathOptimizerType& optimizer, size_t size, uint64_t maxTime)
         : optimizer(optimizer)
@@ -133,6 +163,7 @@ public:
         , writeIndex(0, size)
         , readIndex(0, size)
         , availableSlots(size)
+        , poppedPaths(0)
         , running(true)
     {
     }
@@ -151,18 +182,107 @@ public:
         return availableSlots;
     }
 
+    /// The number of paths waiting to be popped, including the open path
+    size_t getDepth()
+    {
+        std::unique_lock<std::mutex> lock(mutex);
+
+        return queue.size() - availableSlots + (openPath ? 1 : 0);
+    }
+
+    /// Whether popPath has a path to return right away
+    bool hasPaths()
+    {
+        std::unique_lock<std::mutex> lock(mutex);
+
+        return !isEmpty();
+    }
+
+    /// Whether popPath has a path to return right away without closing the open path
+    bool hasClosedPaths()
+    {
+        std::unique_lock<std::mutex> lock(mutex);
+
+        return availableSlots != queue.size();
+    }
+
+    /// The number of paths popPath has returned so far
+    uint64_t getPoppedPaths()
+    {
+        std::unique_lock<std::mutex> lock(mutex);
+
+        return poppedPaths;
+    }
+
+    /// The time spent in onPathAdded and beforePathRemoval of the optimizer
+    LatencyHistogram& getOptimizerLatency()
+    {
+        return optimizerLatency;
+    }
+
     bool addPath(Path&& path)
     {
         std::unique_lock<std::mutex> lock(mutex);
 
+        if (!closeOpenPath(lock))
+        {
+            return false;
+        }
+
         return addPathInternal(lock, std::move(path));
     }
 
+    /// Add a path that can be replaced with replaceOpenPath until the next path is added
+    bool addOpenPath(Path&& path)
+    {
+        std::unique_lock<std::mutex> lock(mutex);
+
+        if (!closeOpenPath(lock))
+        {
+            return false;
+        }
+
+        if (!running)
+        {
+            return false;
+        }
+
+        openPath = std::move(path);
+
+        if (availableSlots == queue.size())
+        {
+            queueHasPaths.notify_all();
+        }
+
+        return true;
+    }
+
+    /// Replace the path added with addOpenPath. Returns false if it was already added to the queue.
+    bool replaceOpenPath(Path&& path)
+    {
+        std::unique_lock<std::mutex> lock(mutex);
+
+        if (!running || !openPath)
+        {
+            return false;
+        }
+
+        openPath = std::move(path);
+
+        return true;
+    }
+
     std::optional<Path> popPath()
     {
         std::unique_lock<std::mutex> lock(mutex);
 
-        queueHasPaths.wait(lock, [this] { return !running || availableSlots != queue.size(); });
+        queueHasPaths.wait(lock, [this] { return !running || !isEmpty(); });
+
+        // don't hold back the open path when there's nothing else to do
+        if (availableSlots == queue.size() && !closeOpenPath(lock))
+        {
+            return std::optional<Path>();
+        }
 
         if (!running)
         {
@@ -172,11 +292,15 @@ public:
         const PathQueueIndex currentReadIndex = readIndex;
         const bool addPathMightBeBlocking = !doesQueueHaveSpace();
 
-        // subtract one because the optimizer does touch the last index
-        curTime += optimizer.beforePathRemoval(queue, readIndex, writeIndex - 1);
+        {
+            LatencyHistogram::ScopedTimer timer(optimizerLatency);
+            // subtract one because the optimizer does touch the last index
+            curTime += optimizer.beforePathRemoval(queue, readIndex, writeIndex - 1);
+        }
 
         readIndex++;
         availableSlots++;
+        poppedPaths++;
 
         if (addPathMightBeBlocking && doesQueueHaveSpace())
         {
@@ -196,7 +320,7 @@ public:
     {
         std::unique_lock<std::mutex> lock(mutex);
 
-        if (!running)
+        if (!running || !closeOpenPath(lock))
         {
             return false;
         }
@@ -223,6 +347,11 @@ public:
     {
         std::unique_lock<std::mutex> lock(mutex);
 
+        if (!closeOpenPath(lock))
+        {
+            return false;
+        }
+
         Path dummyPath;
         dummyPath.setWaitEvent(std::move(future));
         return addPathInternal(lock, std::move(dummyPath));
@@ -232,7 +361,7 @@ public:
     {
         std::unique_lock<std::mutex> lock(mutex);
 
-        queueIsEmpty.wait(lock, [this] { return !running || availableSlots == queue.size(); });
+        queueIsEmpty.wait(lock, [this] { return !running || isEmpty(); });
 
         return running;
     }
@@ -0,0 +1,519 @@
+#include "PruEmulator.h"
+
+#include <algorithm>
+#include <cassert>
+
+#include "Logger.h"
+
+PruEmulator::PruEmulator()
+    : stop(false)
+    , finishedBlocks(0)
+    , memorySize(0x40000)
+    , memoryUsed(0)
+    , totalQueuedMovesTime(0)
+    , maxQueuedMovesTime(2 * F_CPU)
+    , stepperMask(0xffff)
+    , carriedBlockedSteppers(0)
+    , directions(0)
+    , stepsRemaining(0)
+    , suspended(false)
+    , halted(false)
+    , resets(0)
+    , delayBetweenDirAndStep(4)
+    , delayBetweenStepAndClear(20)
+    , minimumDelayAfterStep(24)
+    , speed(0)
+    , pacingStart()
+    , pacingStartTime(0)
+    , stats()
+    , stepCounts()
+    , position()
+{
+    resetStats();
+}
+
+PruEmulator::~PruEmulator()
+{
+    stopThread(true);
+}
+
+void PruEmulator::setEndstopAlarmCallback(std::function<void()> callback)
+{
+    std::unique_lock<std::mutex> lock(mutex);
+
+    endstopAlarmCallback = callback;
+}
+
+bool PruEmulator::initPRU(const std::string&, const std::string&)
+{
+    return true;
+}
+
+void PruEmulator::runThread()
+{
+    std::unique_lock<std::mutex> lock(mutex);
+
+    if (runningThread.joinable())
+    {
+        return;
+    }
+
+    stop = false;
+    runningThread = std::thread([this]() {
+        threadScheduling.apply("PruEmulator");
+        this->run();
+    });
+    completionThread = std::thread([this]() {
+        threadScheduling.apply("PruEmulator completions");
+        retireFinishedBlocks();
+    });
+}
+
+void PruEmulator::stopThread(bool join)
+{
+    {
+        std::unique_lock<std::mutex> lock(mutex);
+        stop = true;
+    }
+
+    blockAdded.notify_all();
+    blockDone.notify_all();
+    resumed.notify_all();
+    blocksFinished.signal();
+
+    if (join && runningThread.joinable())
+    {
+        runningThread.join();
+    }
+
+    if (join && completionThread.joinable())
+    {
+        completionThread.join();
+    }
+}
+
+void PruEmulator::waitUntilFinished()
+{
+    std::unique_lock<std::mutex> lock(mutex);
+
+    blockDone.wait(lock, [this] { return stop || blocks.empty(); });
+}
+
+size_t PruEmulator::getFreeMemory()
+{
+    std::unique_lock<std::mutex> lock(mutex);
+
+    return memorySize - memoryUsed - 4;
+}
+
+size_t PruEmulator::getMemoryUsed()
+{
+    std::unique_lock<std::mutex> lock(mutex);
+
+    return memoryUsed;
+}
+
+uint64_t PruEmulator::getTotalQueuedMovesTime()
+{
+    std::unique_lock<std::mutex> lock(mutex);
+
+    return totalQueuedMovesTime;
+}
+
+size_t PruEmulator::getMaxBytesPerBlock()
+{
+    return (memorySize / 4) - 12;
+}
+
+void PruEmulator::suspend()
+{
+    std::unique_lock<std::mutex> lock(mutex);
+
+    suspended = true;
+}
+
+void PruEmulator::resume()
+{
+    {
+        std::unique_lock<std::mutex> lock(mutex);
+        suspended = false;
+    }
+
+    resumed.notify_all();
+}
+
+void PruEmulator::reset()
+{
+    {
+        std::unique_lock<std::mutex> lock(mutex);
+
+        // like restarting the firmware, which drops whatever it was running
+        blocks.clear();
+        finishedBlocks = 0;
+        memoryUsed = 0;
+        totalQueuedMovesTime = 0;
+        carriedBlockedSteppers = 0;
+        suspended = false;
+        halted = false;
+        resets++;
+    }
+
+    blockDone.notify_all();
+    resumed.notify_all();
+}
+
+bool PruEmulator::isMemoryAvailable(size_t blockLen)
+{
+    // the same limits PruTimer has, so the planner is held back the same way
+    const bool memoryAvailable = memorySize - memoryUsed - 8 >= blockLen + 12;
+    const bool queueFullByTime = totalQueuedMovesTime >= maxQueuedMovesTime && blocks.size() > 1;
+
+    return stop || (memoryAvailable && !queueFullByTime);
+}
+
+void PruEmulator::pushBlock(uint8_t* blockMemory, size_t blockLen, unsigned int unit, uint64_t totalTime, SyncCallback* callback)
+{
+    assert(unit == sizeof(SteppersCommand) && blockLen % unit == 0);
+    assert(blockLen <= getMaxBytesPerBlock());
+
+    std::unique_lock<std::mutex> lock(mutex);
+
+    blockDone.wait(lock, [this, blockLen] { return isMemoryAvailable(blockLen); });
+
+    if (stop)
+    {
+        return;
+    }
+
+    const SteppersCommand* commands = reinterpret_cast<const SteppersCommand*>(blockMemory);
+
+    // a time of 0 is bumped to 1 like PruTimer does, so the queue time only runs out with the queue
+    blocks.push_back(Block{ std::vector<SteppersCommand>(commands, commands + blockLen / unit), std::max<uint64_t>(totalTime, 1), callback, LatencyHistogram::Clock::time_point() });
+    memoryUsed += blockLen + 4;
+    totalQueuedMovesTime += blocks.back().totalTime;
+
+    blockAdded.notify_all();
+}
+
+void PruEmulator::run()
+{
+    std::unique_lock<std::mutex> lock(mutex);
+
+    restartPacing();
+
+    while (!stop)
+    {
+        if (finishedBlocks == blocks.size() || halted)
+        {
+            blockAdded.wait(lock, [this] { return stop || (finishedBlocks != blocks.size() && !halted); });
+
+            if (speed > 0)
+            {
+                // the virtual clock kept running while there was nothing to do
+                const double realTime = std::chrono::duration<double>(std::chrono::steady_clock::now() - pacingStart).count();
+                const uint64_t now = pacingStartTime + static_cast<uint64_t>(realTime * speed * F_CPU);
+
+                if (now > stats.virtualTime)
+                {
+                    stats.starvedTime += now - stats.virtualTime;
+                    stats.virtualTime = now;
+                }
+            }
+
+            continue;
+        }
+
+        Block& block = blocks[finishedBlocks];
+
+        if (!runBlock(lock, block))
+        {
+            // stopped, reset or halted by an endstop
+            continue;
+        }
+
+        block.finishTime = LatencyHistogram::Clock::now();
+        finishedBlocks++;
+        stats.blocks++;
+
+        if (finishedBlocks == blocks.size())
+        {
+            stats.underruns++;
+        }
+
+        blocksFinished.signal();
+    }
+}
+
+void PruEmulator::retireFinishedBlocks()
+{
+    std::vector<Block> retired;
+
+    while (true)
+    {
+        blocksFinished.wait(-1);
+
+        bool stopping;
+
+        {
+            std::unique_lock<std::mutex> lock(mutex);
+
+            // the eventfd only wakes this thread up, the blocks to retire are those finished by now
+            for (; finishedBlocks != 0; finishedBlocks--)
+            {
+                Block& block = blocks.front();
+
+                memoryUsed -= block.commands.size() * sizeof(SteppersCommand) + 4;
+                totalQueuedMovesTime -= block.totalTime;
+                retired.push_back(std::move(block));
+                blocks.pop_front();
+            }
+
+            stopping = stop;
+        }
+
+        if (!retired.empty())
+        {
+            for (Block& block : retired)
+            {
+                if (block.callback != nullptr)
+                {
+                    block.callback->syncComplete();
+                }
+            }
+
+            blockDone.notify_all();
+
+            const LatencyHistogram::Clock::time_point now = LatencyHistogram::Clock::now();
+
+            for (Block& block : retired)
+            {
+                completionLatency.record(now - block.finishTime);
+            }
+
+            recordCompletionBatch(retired.size());
+            retired.clear();
+        }
+
+        if (stopping)
+        {
+            break;
+        }
+    }
+}
+
+bool PruEmulator::runBlock(std::unique_lock<std::mutex>& lock, Block& block)
+{
+    const uint64_t resetsBefore = resets;
+    const std::vector<SteppersCommand>& commands = block.commands;
+
+    if (commands.empty() || !(commands[0].options & STEPPER_COMMAND_OPTION_CARRY_BLOCKED_STEPPERS))
+    {
+        // don't carry blocked steppers
+        carriedBlockedSteppers = 0;
+    }
+
+    for (size_t i = 0; i < commands.size(); i++)
+    {
+        const SteppersCommand& command = commands[i];
+
+        for (unsigned int run = 0; run < stepperCommandRuns(command); run++)
+        {
+            const uint32_t directionsAllowedMask = stepperMask & ~carriedBlockedSteppers;
+            const uint8_t positiveDirectionsAllowed = command.direction & ((directionsAllowedMask >> 8) & 0xff);
+            const uint8_t negativeDirectionsAllowed = ~command.direction & (directionsAllowedMask & 0xff);
+            const uint8_t allDirectionsAllowed = positiveDirectionsAllowed | negativeDirectionsAllowed;
+            const uint8_t blocked = command.step & ~allDirectionsAllowed;
+
+            stats.endstopsTriggered |= ((command.direction & blocked) << 8) | (~command.direction & blocked);
+
+            if (command.options & STEPPER_COMMAND_OPTION_CARRY_BLOCKED_STEPPERS)
+            {
+                carriedBlockedSteppers |= ~directionsAllowedMask;
+            }
+
+            if (command.cancellableMask != 0 && (allDirectionsAllowed & command.cancellableMask) == 0)
+            {
+                // the firmware counts the commands it skips, so probing can tell how far it got
+                stepsRemaining += commands.size() - i;
+                stats.cancelledCommands += commands.size() - i;
+                return true;
+            }
+            else if (command.cancellableMask == 0 && blocked)
+            {
+                // the firmware stops until it's reset
+                LOGERROR("PRU emulator: stepper blocked by an endstop during a move that can't be cancelled" << std::endl);
+                halted = true;
+
+                if (endstopAlarmCallback)
+                {
+                    lock.unlock();
+                    endstopAlarmCallback();
+                    lock.lock();
+                }
+
+                return false;
+            }
+
+            runCommand(command, allDirectionsAllowed);
+        }
+
+        if (i + 1 < commands.size() && (commands[i + 1].options & STEPPER_COMMAND_OPTION_SYNC_EVENT)
+            && (commands[i + 1].options & STEPPER_COMMAND_OPTION_SYNCWAIT_EVENT))
+        {
+            suspended = true;
+        }
+
+        if (speed > 0)
+        {
+            pace(lock);
+        }
+
+        if (suspended)
+        {
+            resumed.wait(lock, [this] { return stop || !suspended; });
+            restartPacing();
+        }
+
+        if (stop || resets != resetsBefore)
+        {
+            return false;
+        }
+    }
+
+    return true;
+}
+
+void PruEmulator::runCommand(const SteppersCommand& command, uint8_t allDirectionsAllowed)
+{
+    const uint8_t steps = command.step & allDirectionsAllowed;
+    const uint8_t directionUpdates = (command.direction ^ directions) & command.step;
+
+    directions = (directions & ~directionUpdates) | (command.direction & directionUpdates);
+
+    // the firmware holds the step pins for a while and waits a minimum time after each step
+    const uint64_t stepTime = (directionUpdates ? delayBetweenDirAndStep : 0) + delayBetweenStepAndClear + minimumDelayAfterStep;
+
+    if (stepTime > command.delay)
+    {
+        const uint64_t jitter = stepTime - command.delay;
+
+        stats.stretchedCommands++;
+        stats.maxJitter = std::max(stats.maxJitter, jitter);
+        stats.totalJitter += jitter;
+    }
+
+    for (int axis = 0; axis < NUM_AXES; axis++)
+    {
+        if (steps & (1 << axis))
+        {
+            stepCounts[axis]++;
+            position[axis] += (command.direction & (1 << axis)) ? 1 : -1;
+        }
+    }
+
+    stats.commands++;
+    stats.virtualTime += std::max<uint64_t>(stepTime, command.delay);
+}
+
+void PruEmulator::pace(std::unique_lock<std::mutex>& lock)
+{
+    const double virtualSeconds = (stats.virtualTime - pacingStartTime) / (speed * F_CPU);
+    const auto due = pacingStart + std::chrono::duration_cast<std::chrono::steady_clock::duration>(std::chrono::duration<double>(virtualSeconds));
+
+    // sleeping for every command would take longer than the commands do
+    if (due - std::chrono::steady_clock::now() > std::chrono::milliseconds(1))
+    {
+        lock.unlock();
+        std::this_thread::sleep_until(due);
+        lock.lock();
+    }
+}
+
+void PruEmulator::restartPacing()
+{
+    pacingStart = std::chrono::steady_clock::now();
+    pacingStartTime = stats.virtualTime;
+}
+
+uint32_t PruEmulator::getStepsRemaining()
+{
+    std::unique_lock<std::mutex> lock(mutex);
+
+    return stepsRemaining;
+}
+
+void PruEmulator::resetStepsRemaining()
+{
+    std::unique_lock<std::mutex> lock(mutex);
+
+    stepsRemaining = 0;
+}
+
+void PruEmulator::setSpeed(double speed)
+{
+    assert(speed >= 0);
+
+    std::unique_lock<std::mutex> lock(mutex);
+
+    this->speed = speed;
+    restartPacing();
+}
+
+void PruEmulator::setEndstopMask(int mask)
+{
+    std::unique_lock<std::mutex> lock(mutex);
+
+    stepperMask = mask & 0xffff;
+}
+
+void PruEmulator::setStepTiming(int dirToStep, int stepToClear, int afterStep)
+{
+    std::unique_lock<std::mutex> lock(mutex);
+
+    delayBetweenDirAndStep = dirToStep;
+    delayBetweenStepAndClear = stepToClear;
+    minimumDelayAfterStep = afterStep;
+}
+
+PruEmulatorStats PruEmulator::getStats()
+{
+    std::unique_lock<std::mutex> lock(mutex);
+
+    return stats;
+}
+
+VectorN PruEmulator::getStepCounts()
+{
+    std::unique_lock<std::mutex> lock(mutex);
+
+    VectorN result;
+    for (int i = 0; i < NUM_AXES; i++)
+    {
+        result[i] = static_cast<double>(stepCounts[i]);
+    }
+
+    return result;
+}
+
+VectorN PruEmulator::getPosition()
+{
+    std::unique_lock<std::mutex> lock(mutex);
+
+    VectorN result;
+    for (int i = 0; i < NUM_AXES; i++)
+    {
+        result[i] = static_cast<double>(position[i]);
+    }
+
+    return result;
+}
+
+void PruEmulator::resetStats()
+{
+    std::unique_lock<std::mutex> lock(mutex);
+
+    stats = PruEmulatorStats();
+    stepCounts.fill(0);
+    position.fill(0);
+    restartPacing();
+}
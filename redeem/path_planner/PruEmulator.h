@@ -0,0 +1,174 @@
+#pragma once
+
+#include <array>
+#include <chrono>
+#include <condition_variable>
+#include <cstdint>
+#include <deque>
+#include <functional>
+#include <mutex>
+#include <thread>
+#include <vector>
+
+#include "EventFd.h"
+#include "PruInterface.h"
+#include "StepperCommand.h"
+#include "config.h"
+#include "vectorN.h"
+
+struct PruEmulatorStats
+{
+    uint64_t blocks; /// Blocks the emulator ran
+    uint64_t commands; /// Commands it ran, counting every repeat
+    uint64_t cancelledCommands; /// Commands skipped because an endstop cancelled their move
+    uint64_t virtualTime; /// PRU cycles on the virtual clock, running or waiting for commands
+    uint64_t underruns; /// Times it ran out of commands
+    uint64_t starvedTime; /// PRU cycles it waited for commands after running out, when paced
+    uint64_t stretchedCommands; /// Commands that took longer than their delay to meet the step timing
+    uint64_t maxJitter; /// The most PRU cycles a command took longer than its delay
+    uint64_t totalJitter; /// PRU cycles all of the commands took longer than their delays
+    uint32_t endstopsTriggered; /// Stepper directions the endstop mask blocked while stepping, in its layout
+};
+
+/**
+ * Runs step command blocks like the PRU firmware does, against a virtual clock instead of
+ * stepper hardware, so the planner can be run and measured on any machine.
+ *
+ * Blocks are taken in order by a thread of their own. Each command advances the virtual clock
+ * by its delay, or by the time the firmware needs to take its steps if that's longer. The
+ * clock can be paced to real time with setSpeed, or run as fast as blocks arrive.
+ *
+ * Like the PRU raising its interrupt, that thread signals an eventfd for every block it
+ * finishes. A second thread waits on it and retires all of the blocks finished by then at
+ * once: it frees their memory, calls their sync callbacks and wakes up the threads waiting.
+ */
+class PruEmulator : public PruInterface
+{
+private:
+    struct Block
+    {
+        std::vector<SteppersCommand> commands;
+        uint64_t totalTime;
+        SyncCallback* callback;
+        LatencyHistogram::Clock::time_point finishTime;
+    };
+
+    std::mutex mutex;
+    std::condition_variable blockAdded;
+    std::condition_variable blockDone;
+    std::condition_variable resumed;
+
+    std::thread runningThread;
+    std::thread completionThread;
+    bool stop;
+
+    // signalled for each block finished, and to stop completionThread
+    EventFd blocksFinished;
+
+    std::function<void()> endstopAlarmCallback;
+
+    // the blocks finished but not retired yet, then those running or waiting to run, and the
+    // memory and time they would take on the PRU
+    std::deque<Block> blocks;
+    size_t finishedBlocks;
+    size_t memorySize;
+    size_t memoryUsed;
+    uint64_t totalQueuedMovesTime;
+    uint64_t maxQueuedMovesTime;
+
+    // firmware state
+    uint32_t stepperMask;
+    uint32_t carriedBlockedSteppers;
+    uint8_t directions;
+    uint32_t stepsRemaining;
+    bool suspended;
+    bool halted;
+    uint64_t resets;
+
+    // firmware step timing in PRU cycles, see PruFirmware.py
+    uint32_t delayBetweenDirAndStep;
+    uint32_t delayBetweenStepAndClear;
+    uint32_t minimumDelayAfterStep;
+
+    double speed;
+    std::chrono::steady_clock::time_point pacingStart;
+    uint64_t pacingStartTime;
+
+    PruEmulatorStats stats;
+    std::array<uint64_t, NUM_AXES> stepCounts;
+    std::array<int64_t, NUM_AXES> position;
+
+    bool isMemoryAvailable(size_t blockLen);
+    bool runBlock(std::unique_lock<std::mutex>& lock, Block& block);
+    void runCommand(const SteppersCommand& command, uint8_t allDirectionsAllowed);
+    void pace(std::unique_lock<std::mutex>& lock);
+    void restartPacing();
+    void retireFinishedBlocks();
+
+public:
+    PruEmulator();
+    virtual ~PruEmulator();
+
+    /// Called when a move that can't be cancelled runs into the endstop mask
+    void setEndstopAlarmCallback(std::function<void()> callback);
+
+    bool initPRU(const std::string& firmware_stepper, const std::string& firmware_endstops) override;
+
+    void run() override;
+
+    void runThread() override;
+    void stopThread(bool join) override;
+    void waitUntilFinished() override;
+
+    size_t getFreeMemory() override;
+
+    size_t getMemoryUsed() override;
+
+    uint64_t getTotalQueuedMovesTime() override;
+
+    size_t getMaxBytesPerBlock() override;
+
+    void suspend() override;
+
+    void resume() override;
+
+    void reset() override;
+
+    void pushBlock(uint8_t* blockMemory, size_t blockLen, unsigned int unit, uint64_t totalTime, SyncCallback* callback = nullptr) override;
+
+    uint32_t getStepsRemaining() override;
+
+    void resetStepsRemaining() override;
+
+    /**
+     * @brief Pace the virtual clock to real time
+     *
+     * @param speed Virtual seconds per real second, or 0 to run blocks as fast as they arrive
+     */
+    void setSpeed(double speed);
+
+    /**
+     * @brief Set which directions the steppers may move in, like the endstop firmware does
+     *
+     * @param mask Bit i allows stepper i to move in the negative direction, bit i + 8 in the
+     * positive direction
+     */
+    void setEndstopMask(int mask);
+
+    /**
+     * @brief Set the firmware step timing in PRU cycles
+     * @details Defaults to the timing of the TMC2100 Replicapes.
+     */
+    void setStepTiming(int dirToStep, int stepToClear, int afterStep);
+
+    PruEmulatorStats getStats();
+
+    /// The steps each stepper took
+    VectorN getStepCounts();
+
+    /// The position of each stepper in steps, relative to where it started
+    VectorN getPosition();
+
+    /// Clear the statistics, step counts and position
+    void resetStats();
+};
@@ -1,13 +1,57 @@
 #pragma once
 
+#include <atomic>
 #include <cstdint>
 #include <string>
+#include <vector>
 
+#include "LatencyHistogram.h"
 #include "SyncCallback.h"
+#include "ThreadScheduling.h"
+
+struct PruCompletionStats
+{
+    uint64_t wakeups; /// Times the thread retiring the PRU's blocks woke up and found finished blocks
+    uint64_t blocks; /// Blocks it retired
+    uint64_t maxBatch; /// The most blocks it retired at one wake-up
+};
 
 class PruInterface
 {
+private:
+    std::vector<uint8_t> stagingBlock;
+
+    std::atomic<uint64_t> completionWakeups;
+    std::atomic<uint64_t> completedBlocks;
+    std::atomic<uint64_t> maxCompletionBatch;
+
+protected:
+    // applied by the threads runThread starts
+    ThreadScheduling threadScheduling;
+
+    // the time from the PRU finishing each block to it being retired, see getCompletionLatency
+    LatencyHistogram completionLatency;
+
+    /// Count a wake-up of the thread retiring the PRU's blocks, which is the only thread calling it
+    void recordCompletionBatch(uint64_t blocks)
+    {
+        completionWakeups.fetch_add(1, std::memory_order_relaxed);
+        completedBlocks.fetch_add(blocks, std::memory_order_relaxed);
+
+        if (blocks > maxCompletionBatch.load(std::memory_order_relaxed))
+        {
+            maxCompletionBatch.store(blocks, std::memory_order_relaxed);
+        }
+    }
+
 public:
+    PruInterface()
+        : completionWakeups(0)
+        , completedBlocks(0)
+        , maxCompletionBatch(0)
+    {
+    }
+
     virtual ~PruInterface()
     {
     }
@@ -16,11 +60,21 @@ public:
     virtual void run() = 0;
 
     virtual void runThread() = 0;
+
+    /// Schedule the thread started by runThread this way
+    void setThreadScheduling(const ThreadScheduling& scheduling)
+    {
+        threadScheduling = scheduling;
+    }
+
     virtual void stopThread(bool join) = 0;
     virtual void waitUntilFinished() = 0;
 
     virtual size_t getFreeMemory() = 0;
 
+    /// Bytes of the PRU's memory holding blocks it has yet to finish
+    virtual size_t getMemoryUsed() = 0;
+
     virtual uint64_t getTotalQueuedMovesTime() = 0;
 
     virtual size_t getMaxBytesPerBlock() = 0;
@@ -33,6 +87,50 @@ public:
 
     virtual void pushBlock(uint8_t* blockMemory, size_t blockLen, unsigned int unit, uint64_t totalTime, SyncCallback* callback = nullptr) = 0;
 
+    /**
+     * Reserve memory to write the commands of the next block into, so they don't have to be
+     * copied by pushBlock. Up to maxBlockLen bytes are reserved - blockLen is set to the number
+     * actually reserved, which is a multiple of unit and holds at least two units. Write the
+     * block and pass it on with commitBlock before reserving another one.
+     *
+     * The default reserves a buffer that commitBlock hands to pushBlock.
+     */
+    virtual uint8_t* reserveBlock(size_t maxBlockLen, unsigned int, size_t& blockLen)
+    {
+        stagingBlock.resize(maxBlockLen);
+        blockLen = maxBlockLen;
+        return stagingBlock.data();
+    }
+
+    /// Pass on the first blockLen bytes of the block from reserveBlock
+    virtual void commitBlock(size_t blockLen, unsigned int unit, uint64_t totalTime, SyncCallback* callback = nullptr)
+    {
+        pushBlock(stagingBlock.data(), blockLen, unit, totalTime, callback);
+    }
+
+    /**
+     * The time from the PRU finishing each block to its memory being freed, its sync callback
+     * called and the threads waiting for it woken up. The hardware PRU only tells when it
+     * raised the interrupt for the blocks it finished, so this is the time from the interrupt.
+     */
+    LatencyHistogram& getCompletionLatency()
+    {
+        return completionLatency;
+    }
+
+    PruCompletionStats getCompletionStats()
+    {
+        return PruCompletionStats{ completionWakeups.load(std::memory_order_relaxed), completedBlocks.load(std::memory_order_relaxed), maxCompletionBatch.load(std::memory_order_relaxed) };
+    }
+
+    void resetCompletionStats()
+    {
+        completionLatency.reset();
+        completionWakeups = 0;
+        completedBlocks = 0;
+        maxCompletionBatch = 0;
+    }
+
     virtual uint32_t getStepsRemaining() = 0;
 
     virtual void resetStepsRemaining() = 0;
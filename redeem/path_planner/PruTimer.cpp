@@ -25,10 +25,12 @@
 #include "config.h"
 #include "pruss_intc_mapping.h"
 #include "prussdrv.h"
+#include <algorithm>
 #include <assert.h>
 #include <cmath>
 #include <fcntl.h>
 #include <fstream>
+#include <poll.h>
 #include <stdio.h>
 #include <stdlib.h>
 #include <sys/mman.h>
@@ -56,6 +58,9 @@ PruTimer::PruTimer(std::function<void()> endstopAlarmCallback)
     ddr_size = 0;
     totalQueuedMovesTime = 0;
     ddr_mem_used = 0;
+    reservedBlockLen = 0;
+    blockReservedInDdr = false;
+    currentNbEvents = 0;
     stop = false;
 }
 
@@ -284,6 +289,7 @@ void PruTimer::runThread()
     }
 
     runningThread = std::thread([this]() {
+        threadScheduling.apply("PruTimer");
         this->run();
     });
 }
@@ -294,6 +300,7 @@ void PruTimer::stopThread(bool join)
         std::lock_guard<std::mutex> lk(mutex_memory);
         LOG("Stopping PruTimer..." << std::endl);
         stop = true;
+        stopEvent.signal();
 
         /* Disable PRU and close memory mapping*/
         prussdrv_pru_disable(PRU_NUM0);
@@ -386,26 +393,8 @@ void PruTimer::pushBlock(uint8_t* blockMemory, size_t blockLen, unsigned int uni
             //LOG( "Waiting for " << std::dec << currentBlockSize+12 << " bytes available. Currently: " << getFreeMemory() << std::endl);
 
             std::unique_lock<std::mutex> lk(mutex_memory);
-            blockSizeToWaitFor = currentBlockSize;
-            pruMemoryAvailable.wait(lk, [this] { return isPruMemoryAvailable(); });
-
-            static int logBlock = 10;
-            bool logged = false;
-            if (logBlock && isPruQueueFullByTime())
-            {
-                LOG("PRU Queue is full by time - " << totalQueuedMovesTime << "/" << maxQueuedMovesTime << std::endl);
-                logBlock--;
-                logged = true;
-            }
-
-            pruQueueIsntFullByTime.wait(lk, [this] { return !isPruQueueFullByTime(); });
 
-            if (logged)
-            {
-                LOG("PRU Queue has space again" << std::endl);
-            }
-
-            if (!ddr_mem || stop)
+            if (!waitForBlockSpace(lk, currentBlockSize))
                 return;
 
             //Copy at the right location
@@ -601,6 +590,126 @@ void PruTimer::pushBlock(uint8_t* blockMemory, size_t blockLen, unsigned int uni
     assert(nbStepsWritten == blockLen / unit);
 }
 
+bool PruTimer::waitForBlockSpace(std::unique_lock<std::mutex>& lk, size_t blockSize)
+{
+    blockSizeToWaitFor = blockSize;
+    pruMemoryAvailable.wait(lk, [this] { return isPruMemoryAvailable(); });
+
+    static int logBlock = 10;
+    bool logged = false;
+    if (logBlock && isPruQueueFullByTime())
+    {
+        LOG("PRU Queue is full by time - " << totalQueuedMovesTime << "/" << maxQueuedMovesTime << std::endl);
+        logBlock--;
+        logged = true;
+    }
+
+    pruQueueIsntFullByTime.wait(lk, [this] { return !isPruQueueFullByTime(); });
+
+    if (logged)
+    {
+        LOG("PRU Queue has space again" << std::endl);
+    }
+
+    return ddr_mem && !stop;
+}
+
+/**
+maxBlockLen - the most bytes the caller wants to write.
+unit - stepSize in bytes.
+blockLen - set to the number of bytes reserved.
+*/
+uint8_t* PruTimer::reserveBlock(size_t maxBlockLen, unsigned int unit, size_t& blockLen)
+{
+    assert(maxBlockLen >= 2 * unit && ddr_size >= maxBlockLen + 12);
+
+    std::unique_lock<std::mutex> lk(mutex_memory);
+
+    blockReservedInDdr = false;
+
+    while (ddr_write_location && waitForBlockSpace(lk, maxBlockLen))
+    {
+        // The commands are written in place, so they have to fit between the write location and the end
+        // of the DDR. Take what's left up to there, unless that's less than two commands.
+        if (ddr_write_location + 2 * unit + 12 <= ddr_mem_end)
+        {
+            const size_t spaceLeft = ((ddr_mem_end - ddr_write_location - 12) / unit) * unit;
+
+            reservedBlockLen = blockLen = std::min(maxBlockLen, spaceLeft);
+            blockReservedInDdr = true;
+
+            // the PRU waits at the write location until commitBlock writes the number of commands
+            return ddr_write_location + 4;
+        }
+
+        // Start over at the beginning of the DDR. The PRU only gets there once it's done with the
+        // last block, so that block holds on to the memory that's skipped until then.
+        const size_t skipped = ddr_mem_end - ddr_write_location;
+        uint32_t nb = 0;
+
+        memcpy(ddr_mem, &nb, sizeof(nb));
+        msync(ddr_mem, sizeof(nb), MS_SYNC);
+
+        nb = DDR_MAGIC;
+        memcpy(ddr_write_location, &nb, sizeof(nb));
+        msync(ddr_write_location, sizeof(nb), MS_SYNC);
+
+        ddr_write_location = ddr_mem;
+
+        if (!blocksID.empty())
+        {
+            blocksID.back().size += skipped;
+            ddr_mem_used += skipped;
+        }
+
+        // wait again, the PRU may still be using the beginning
+    }
+
+    // Stopped - hand out memory that's never sent
+    lk.unlock();
+    return PruInterface::reserveBlock(maxBlockLen, unit, blockLen);
+}
+
+/**
+blockLen - number of data bytes written to the reserved block.
+unit - stepSize in bytes.
+totalTime - time it takes to complete the current block, in ticks.
+*/
+void PruTimer::commitBlock(size_t blockLen, unsigned int unit, uint64_t totalTime, SyncCallback* callback)
+{
+    std::unique_lock<std::mutex> lk(mutex_memory);
+
+    if (!blockReservedInDdr || !ddr_mem || stop)
+        return;
+
+    assert(blockLen > 0 && blockLen <= reservedBlockLen && blockLen % unit == 0);
+
+    blockReservedInDdr = false;
+
+    // If the caller specified a time of 0, bump it to 1 like pushBlock does
+    if (totalTime == 0)
+    {
+        totalTime = 1;
+    }
+
+    blocksID.emplace(blockLen + 4, totalTime, callback);
+    ddr_mem_used += blockLen + 4;
+    totalQueuedMovesTime += totalTime;
+
+    // The data is already there - write on the next free area that there is no command to execute
+    uint32_t nb = 0;
+    assert(ddr_write_location + blockLen + sizeof(nb) * 2 <= ddr_mem_end);
+    memcpy(ddr_write_location + blockLen + sizeof(nb), &nb, sizeof(nb));
+    msync(ddr_write_location + sizeof(nb), blockLen + sizeof(nb), MS_SYNC);
+
+    // Then signal how much data we have to the PRU
+    nb = (uint32_t)blockLen / unit;
+    memcpy(ddr_write_location, &nb, sizeof(nb));
+    msync(ddr_write_location, sizeof(nb), MS_SYNC);
+
+    ddr_write_location += blockLen + sizeof(nb);
+}
+
 void PruTimer::waitUntilFinished()
 {
     std::unique_lock<std::mutex> lk(mutex_memory);
@@ -610,6 +719,7 @@ void PruTimer::waitUntilFinished()
 void PruTimer::run()
 {
     LOG("Starting PruTimer thread..." << std::endl);
+
     while (!stop)
     {
 #ifdef DEMO_PRU
@@ -622,7 +732,7 @@ void PruTimer::run()
         FLOAT_T totalWait = 0;
         for (int i = 0; i < (int)*nbCommand; i++)
         {
-            totalWait += cmd->delay / 200000.0;
+            totalWait += stepperCommandRuns(*cmd) * cmd->delay / 200000.0;
             cmd++;
         }
 
@@ -635,27 +745,34 @@ void PruTimer::run()
         }
         *ddr_nr_events = (*ddr_nr_events) + 1;
 #else
-        unsigned int nbWaitedEvent = prussdrv_pru_wait_event(PRU_EVTOUT_0, 1000); // 250ms timeout
+        // wait for the PRU's interrupt, or for stopThread - the timeout only catches lost interrupts
+        pollfd events[2] = { { prussdrv_pru_event_fd(PRU_EVTOUT_0), POLLIN, 0 }, { stopEvent.fd(), POLLIN, 0 } };
+        const int ready = poll(events, 2, 1000);
 #endif
+        const LatencyHistogram::Clock::time_point wakeup = LatencyHistogram::Clock::now();
 
         if (stop)
             break;
 
-#if 0
-        if (nbWaitedEvent)
-          LOG( ("\tINFO: PRU0 completed transfer.\r\n"));
-        else
-          LOG( ("\tINFO: PRU0 transfer timeout.\r\n"));
-#endif
-
 #ifndef DEMO_PRU
-        if (nbWaitedEvent)
-            prussdrv_pru_clear_event(PRU_EVTOUT_0, PRU0_ARM_INTERRUPT);
+        if (ready > 0 && (events[0].revents & POLLIN))
+        {
+            // what prussdrv_pru_wait_event reads, the number of interrupts so far
+            unsigned int interrupts;
+            if (read(events[0].fd, &interrupts, sizeof(interrupts)) == sizeof(interrupts))
+                prussdrv_pru_clear_event(PRU_EVTOUT_0, PRU0_ARM_INTERRUPT);
+        }
 #endif
-        msync(ddr_nr_events, 4, MS_SYNC);
-        uint32_t nb = *ddr_nr_events;
+        // the DDR is mapped with O_SYNC, so it isn't cached and needs no msync to read
+        const uint32_t nb = *(volatile uint32_t*)ddr_nr_events;
         bool underflowOccurred = false;
 
+        if (nb == currentNbEvents)
+        {
+            // nothing finished since the blocks were last retired, so there's no need to lock
+            continue;
+        }
+
         if (nb == 0xFFFFFFFF)
         {
             // The PRU has stopped due to an endstop alarm.
@@ -664,6 +781,7 @@ void PruTimer::run()
         else
         {
             std::lock_guard<std::mutex> lk(mutex_memory);
+            uint64_t retiredBlocks = 0;
 
             const bool wasMemoryAvailable = isPruMemoryAvailable();
             const bool wasMemoryEmpty = isPruMemoryEmpty();
@@ -691,6 +809,7 @@ void PruTimer::run()
                 //				LOG( "Block of size " << std::dec << front.size << " and time " << front.totalTime << " done." << std::endl);
                 blocksID.pop();
                 currentNbEvents++;
+                retiredBlocks++;
             }
             currentNbEvents = nb;
 
@@ -716,6 +835,18 @@ void PruTimer::run()
             }
 
             underflowOccurred = isPruMemoryEmpty() && !wasMemoryEmpty;
+
+            if (retiredBlocks != 0)
+            {
+                const LatencyHistogram::Clock::duration latency = LatencyHistogram::Clock::now() - wakeup;
+
+                for (uint64_t i = 0; i < retiredBlocks; i++)
+                {
+                    completionLatency.record(latency);
+                }
+
+                recordCompletionBatch(retiredBlocks);
+            }
         }
 
         if (underflowOccurred)
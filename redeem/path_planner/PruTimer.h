@@ -9,9 +9,11 @@
 #ifndef __PathPlanner__PruTimer__
 #define __PathPlanner__PruTimer__
 
+#include "EventFd.h"
 #include "Logger.h"
 #include "PruInterface.h"
 #include "config.h"
+#include <atomic>
 #include <condition_variable>
 #include <cstdint>
 #include <functional>
@@ -62,7 +64,8 @@ class PruTimer : public PruInterface
     uint32_t* ddr_nr_events; //location of number of events returned by the PRU
     uint32_t* pru_control;
 
-    uint32_t currentNbEvents;
+    // the PRU's counter of finished blocks as of when they were last retired, read without the lock
+    std::atomic<uint32_t> currentNbEvents;
 
     std::function<void()> endstopAlarmCallback;
 
@@ -71,6 +74,10 @@ class PruTimer : public PruInterface
     std::condition_variable pruMemoryAvailable;
     size_t blockSizeToWaitFor;
 
+    /* The block handed out by reserveBlock, unless it isn't in the DDR */
+    size_t reservedBlockLen;
+    bool blockReservedInDdr;
+
     inline bool isPruMemoryAvailable()
     {
         return stop || ddr_size - ddr_mem_used - 8 >= blockSizeToWaitFor + 12;
@@ -117,12 +124,18 @@ class PruTimer : public PruInterface
     std::thread runningThread;
     bool stop;
 
+    // wakes up the thread waiting for the PRU's interrupt when it should stop
+    EventFd stopEvent;
+
 #ifdef DEMO_PRU
     uint8_t* currentReadingAddress;
 #endif
 
     void initalizePRURegisters();
 
+    /* Wait until a block of blockSize bytes fits - returns false if the PRU was stopped */
+    bool waitForBlockSpace(std::unique_lock<std::mutex>& lk, size_t blockSize);
+
 public:
     PruTimer(std::function<void()> endstopAlarmCallback);
     virtual ~PruTimer();
@@ -140,6 +153,12 @@ public:
         return ddr_size - ddr_mem_used - 4;
     }
 
+    size_t getMemoryUsed() override
+    {
+        std::lock_guard<std::mutex> lk(mutex_memory);
+        return ddr_mem_used;
+    }
+
     uint64_t getTotalQueuedMovesTime() override
     {
         std::lock_guard<std::mutex> lk(mutex_memory);
@@ -159,6 +178,9 @@ public:
 
     void pushBlock(uint8_t* blockMemory, size_t blockLen, unsigned int unit, uint64_t totalTime, SyncCallback* callback = nullptr) override;
 
+    uint8_t* reserveBlock(size_t maxBlockLen, unsigned int unit, size_t& blockLen) override;
+    void commitBlock(size_t blockLen, unsigned int unit, uint64_t totalTime, SyncCallback* callback = nullptr) override;
+
     uint32_t getStepsRemaining() override;
     void resetStepsRemaining() override;
 };
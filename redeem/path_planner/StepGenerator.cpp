@@ -0,0 +1,216 @@
+#include "StepGenerator.h"
+
+#include <algorithm>
+#include <cassert>
+
+PreparedStepSource::PreparedStepSource()
+    : index(0)
+    , rest(nullptr)
+{
+}
+
+size_t PreparedStepSource::prepare(StepSource& source, size_t maxSteps)
+{
+    steps.clear();
+    index = 0;
+    rest = &source;
+
+    Step step;
+    while (steps.size() < maxSteps && source.next(step))
+    {
+        steps.push_back(step);
+    }
+
+    return steps.size();
+}
+
+bool PreparedStepSource::next(Step& step)
+{
+    if (index < steps.size())
+    {
+        step = steps[index++];
+        return true;
+    }
+
+    return rest && rest->next(step);
+}
+
+StepGenerator::StepGenerator()
+    : latency(nullptr)
+    , running(false)
+    , readIndex(0)
+    , prepareIndex(0)
+    , writeIndex(0)
+    , stats()
+{
+}
+
+StepGenerator::~StepGenerator()
+{
+    stop();
+}
+
+void StepGenerator::start(int workerCount, size_t depth, const PrepareFunction& prepare, LatencyHistogram* latency, const ThreadScheduling& scheduling)
+{
+    assert(workers.empty());
+
+    if (workerCount <= 0)
+    {
+        return;
+    }
+
+    assert(depth > 0);
+
+    jobs = std::vector<Job>(depth);
+    this->prepare = prepare;
+    this->latency = latency;
+    running = true;
+    readIndex = prepareIndex = writeIndex = 0;
+    stats.queuedPaths = 0;
+
+    for (int i = 0; i < workerCount; i++)
+    {
+        workers.emplace_back([this, scheduling]() {
+            scheduling.apply("StepGenerator");
+            runWorker();
+        });
+    }
+}
+
+void StepGenerator::stop()
+{
+    {
+        std::unique_lock<std::mutex> lock(mutex);
+        running = false;
+    }
+
+    jobAdded.notify_all();
+    jobReady.notify_all();
+
+    for (std::thread& worker : workers)
+    {
+        worker.join();
+    }
+
+    workers.clear();
+}
+
+bool StepGenerator::isRunning()
+{
+    std::unique_lock<std::mutex> lock(mutex);
+
+    return running;
+}
+
+size_t StepGenerator::size()
+{
+    std::unique_lock<std::mutex> lock(mutex);
+
+    return writeIndex - readIndex;
+}
+
+bool StepGenerator::isFull()
+{
+    std::unique_lock<std::mutex> lock(mutex);
+
+    return writeIndex - readIndex == jobs.size();
+}
+
+void StepGenerator::addPath(Path&& path)
+{
+    std::unique_lock<std::mutex> lock(mutex);
+
+    assert(writeIndex - readIndex < jobs.size());
+
+    Job& job = jobs[writeIndex % jobs.size()];
+    job.path = std::move(path);
+    job.ready = false;
+    writeIndex++;
+
+    stats.queuedPaths = writeIndex - readIndex;
+    stats.maxQueuedPaths = std::max(stats.maxQueuedPaths, stats.queuedPaths);
+
+    jobAdded.notify_one();
+}
+
+StepGenerator::Job* StepGenerator::waitForNext()
+{
+    std::unique_lock<std::mutex> lock(mutex);
+
+    assert(readIndex != writeIndex);
+
+    Job& job = jobs[readIndex % jobs.size()];
+
+    if (!job.ready)
+    {
+        stats.emitterStalls++;
+    }
+
+    jobReady.wait(lock, [this, &job] { return !running || job.ready; });
+
+    return running ? &job : nullptr;
+}
+
+void StepGenerator::finishNext()
+{
+    std::unique_lock<std::mutex> lock(mutex);
+
+    assert(readIndex != writeIndex);
+
+    // let go of the callbacks and events the path holds
+    jobs[readIndex % jobs.size()].path = Path();
+    readIndex++;
+
+    stats.queuedPaths = writeIndex - readIndex;
+}
+
+StepGeneratorStats StepGenerator::getStats()
+{
+    std::unique_lock<std::mutex> lock(mutex);
+
+    return stats;
+}
+
+void StepGenerator::runWorker()
+{
+    std::unique_lock<std::mutex> lock(mutex);
+
+    while (true)
+    {
+        jobAdded.wait(lock, [this] { return !running || prepareIndex != writeIndex; });
+
+        if (!running)
+        {
+            return;
+        }
+
+        Job& job = jobs[prepareIndex % jobs.size()];
+        prepareIndex++;
+
+        lock.unlock();
+
+        const LatencyHistogram::Clock::time_point start = LatencyHistogram::Clock::now();
+
+        job.moveEndTime = prepare(job.path);
+
+        uint64_t stepCount = 0;
+
+        for (int i = 0; i < NUM_AXES; i++)
+        {
+            stepCount += job.steps[i].prepare(job.path.getSteps()[i], STEP_GENERATOR_WINDOW);
+        }
+
+        if (latency)
+        {
+            latency->record(LatencyHistogram::Clock::now() - start);
+        }
+
+        lock.lock();
+
+        job.ready = true;
+        stats.pathsPrepared++;
+        stats.stepsPrepared += stepCount;
+
+        jobReady.notify_all();
+    }
+}
@@ -0,0 +1,117 @@
+#pragma once
+
+#include <array>
+#include <condition_variable>
+#include <cstdint>
+#include <functional>
+#include <mutex>
+#include <thread>
+#include <vector>
+
+#include "LatencyHistogram.h"
+#include "Path.h"
+#include "ThreadScheduling.h"
+#include "config.h"
+
+struct StepGeneratorStats
+{
+    uint64_t pathsPrepared; /// Paths whose steps the workers generated
+    uint64_t stepsPrepared; /// Steps the workers took from those paths, up to STEP_GENERATOR_WINDOW per axis
+    uint64_t emitterStalls; /// Times the next path wasn't ready when the emitter asked for it
+    uint64_t queuedPaths; /// Paths in the pipeline right now, ready or not
+    uint64_t maxQueuedPaths; /// The most paths the pipeline has held at once
+};
+
+/**
+ * The first steps of a StepSource, taken ahead of time into a buffer that is reused from path to
+ * path, followed by the rest of the source as it is asked for.
+ */
+class PreparedStepSource : public StepSource
+{
+private:
+    std::vector<Step> steps;
+    size_t index;
+    StepSource* rest;
+
+public:
+    PreparedStepSource();
+
+    /// Take up to maxSteps steps from source now, and the rest later. Returns the steps taken.
+    size_t prepare(StepSource& source, size_t maxSteps);
+
+    bool next(Step& step) override;
+};
+
+/**
+ * Generates the steps of the next few paths on worker threads, while the thread that pushes
+ * blocks to the PRU (the emitter) works on the path before them. The workers take up to
+ * STEP_GENERATOR_WINDOW steps of each axis, and the emitter generates any after those. Paths come out in the order
+ * they were added, and only the emitter may add and take them.
+ */
+class StepGenerator
+{
+public:
+    struct Job
+    {
+        Path path;
+        double moveEndTime;
+        std::array<PreparedStepSource, NUM_AXES> steps;
+        bool ready;
+    };
+
+    /// Finalizes a path before its steps are taken and returns the end time of its move
+    typedef std::function<double(Path&)> PrepareFunction;
+
+private:
+    std::mutex mutex;
+    std::condition_variable jobAdded;
+    std::condition_variable jobReady;
+
+    std::vector<Job> jobs;
+    std::vector<std::thread> workers;
+    PrepareFunction prepare;
+    LatencyHistogram* latency;
+    bool running;
+
+    // Sequence numbers of the jobs, which go to jobs[number % jobs.size()]. Jobs from readIndex up
+    // to prepareIndex are being prepared or ready, those up to writeIndex wait for a worker.
+    uint64_t readIndex;
+    uint64_t prepareIndex;
+    uint64_t writeIndex;
+
+    StepGeneratorStats stats;
+
+    void runWorker();
+
+public:
+    StepGenerator();
+    ~StepGenerator();
+
+    /**
+     * Start workerCount threads that prepare up to depth paths ahead of the emitter. Does nothing
+     * if workerCount is 0. The time taken to prepare each path is recorded in latency, if given.
+     * The workers are scheduled the way scheduling says.
+     */
+    void start(int workerCount, size_t depth, const PrepareFunction& prepare, LatencyHistogram* latency = nullptr, const ThreadScheduling& scheduling = ThreadScheduling());
+
+    /// Stop the workers. Jobs that were never taken are dropped.
+    void stop();
+
+    bool isRunning();
+
+    /// The number of paths added but not finished with finishNext
+    size_t size();
+
+    bool isFull();
+
+    /// Add a path for the workers to prepare. The pipeline must not be full.
+    void addPath(Path&& path);
+
+    /// Wait for the steps of the oldest path. Returns nullptr if the workers were stopped.
+    Job* waitForNext();
+
+    /// Free the oldest path once the emitter is done with it
+    void finishNext();
+
+    StepGeneratorStats getStats();
+};
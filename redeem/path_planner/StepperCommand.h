@@ -22,12 +22,19 @@
 #ifndef PathPlanner_StepperCommand_h
 #define PathPlanner_StepperCommand_h
 
+#include "config.h"
+#include <cmath>
 #include <stdint.h>
 
 #define STEPPER_COMMAND_OPTION_SYNC_EVENT 1
 #define STEPPER_COMMAND_OPTION_SYNCWAIT_EVENT 3
 #define STEPPER_COMMAND_OPTION_CARRY_BLOCKED_STEPPERS 4
 
+// The upper bits of the options are the number of times the command runs again after it ran once
+#define STEPPER_COMMAND_OPTION_REPEAT_SHIFT 3
+#define STEPPER_COMMAND_OPTION_REPEAT_MASK 0xf8
+#define STEPPER_COMMAND_MAX_REPEATS (STEPPER_COMMAND_OPTION_REPEAT_MASK >> STEPPER_COMMAND_OPTION_REPEAT_SHIFT)
+
 struct SteppersCommand
 {
     uint8_t step; //Steppers are defined as 0b000HEZYX - A 1 for a stepper means we will do a step for this stepper
@@ -39,4 +46,16 @@ struct SteppersCommand
 
 static_assert(sizeof(SteppersCommand) == 8, "Invalid stepper command size");
 
+/** The number of times the PRU runs a command, counting its repeats */
+inline unsigned int stepperCommandRuns(const SteppersCommand& command)
+{
+    return (command.options >> STEPPER_COMMAND_OPTION_REPEAT_SHIFT) + 1;
+}
+
+/** Round a time in seconds to the MINIMUM_STEP_INTERVAL grid that steps are sent on, in PRU cycles */
+inline uint64_t roundStepTime(double stepTime)
+{
+    return static_cast<uint64_t>(std::llround(stepTime * (F_CPU_FLOAT / MINIMUM_STEP_INTERVAL))) * MINIMUM_STEP_INTERVAL;
+}
+
 #endif
@@ -0,0 +1,134 @@
+#include "ThreadScheduling.h"
+
+#include <cerrno>
+#include <cstring>
+#include <thread>
+
+#ifdef __linux__
+#include <pthread.h>
+#include <sched.h>
+#include <sys/mman.h>
+#include <time.h>
+#endif
+
+#include "Logger.h"
+
+ThreadScheduling::ThreadScheduling()
+    : policy(THREAD_POLICY_FIFO)
+    , priority(0)
+    , cpu(-1)
+{
+}
+
+ThreadScheduling::ThreadScheduling(int policy, int priority, int cpu)
+    : policy(policy)
+    , priority(priority)
+    , cpu(cpu)
+{
+}
+
+bool ThreadScheduling::apply(const char* threadName) const
+{
+    bool applied = true;
+
+#ifdef __linux__
+    if (cpu >= 0)
+    {
+        cpu_set_t cpus;
+        CPU_ZERO(&cpus);
+        CPU_SET(cpu, &cpus);
+
+        const int error = pthread_setaffinity_np(pthread_self(), sizeof(cpus), &cpus);
+
+        if (error)
+        {
+            LOGERROR(threadName << ": can't run on CPU " << cpu << ": " << strerror(error) << std::endl);
+            applied = false;
+        }
+    }
+
+    if (priority > 0)
+    {
+        sched_param param = {};
+        param.sched_priority = priority;
+
+        const int error = pthread_setschedparam(pthread_self(), policy == THREAD_POLICY_RR ? SCHED_RR : SCHED_FIFO, &param);
+
+        if (error)
+        {
+            LOGERROR(threadName << ": can't set real-time priority " << priority << ": " << strerror(error) << std::endl);
+            applied = false;
+        }
+    }
+#else
+    if (cpu >= 0 || priority > 0)
+    {
+        LOGERROR(threadName << ": thread scheduling is only supported on Linux" << std::endl);
+        applied = false;
+    }
+#endif
+
+    if (applied && (cpu >= 0 || priority > 0))
+    {
+        LOGINFO(threadName << ": running with priority " << priority << " on CPU " << cpu << std::endl);
+    }
+
+    return applied;
+}
+
+void ThreadScheduling::measureWakeupLatency(std::chrono::nanoseconds interval, int wakeups, LatencyHistogram& histogram) const
+{
+    std::thread thread([this, interval, wakeups, &histogram]() {
+        apply("Wake-up latency");
+
+#ifdef __linux__
+        // clock_nanosleep sleeps until an absolute time, which sleep_until doesn't promise to do
+        timespec wakeup;
+        clock_gettime(CLOCK_MONOTONIC, &wakeup);
+
+        for (int i = 0; i < wakeups; i++)
+        {
+            const long long nanoseconds = wakeup.tv_nsec + interval.count();
+            wakeup.tv_sec += nanoseconds / 1000000000;
+            wakeup.tv_nsec = nanoseconds % 1000000000;
+
+            while (clock_nanosleep(CLOCK_MONOTONIC, TIMER_ABSTIME, &wakeup, nullptr) == EINTR)
+            {
+            }
+
+            timespec now;
+            clock_gettime(CLOCK_MONOTONIC, &now);
+
+            histogram.record(std::chrono::seconds(now.tv_sec - wakeup.tv_sec) + std::chrono::nanoseconds(now.tv_nsec - wakeup.tv_nsec));
+        }
+#else
+        LatencyHistogram::Clock::time_point wakeup = LatencyHistogram::Clock::now();
+
+        for (int i = 0; i < wakeups; i++)
+        {
+            wakeup += std::chrono::duration_cast<LatencyHistogram::Clock::duration>(interval);
+            std::this_thread::sleep_until(wakeup);
+            histogram.record(LatencyHistogram::Clock::now() - wakeup);
+        }
+#endif
+    });
+
+    thread.join();
+}
+
+bool ThreadScheduling::lockMemory()
+{
+#ifdef __linux__
+    if (mlockall(MCL_CURRENT | MCL_FUTURE) != 0)
+    {
+        LOGERROR("Can't lock memory: " << strerror(errno) << std::endl);
+        return false;
+    }
+
+    LOGINFO("Memory locked" << std::endl);
+    return true;
+#else
+    LOGERROR("Locking memory is only supported on Linux" << std::endl);
+    return false;
+#endif
+}
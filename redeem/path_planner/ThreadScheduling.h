@@ -0,0 +1,34 @@
+#pragma once
+
+#include <chrono>
+
+#include "LatencyHistogram.h"
+#include "config.h"
+
+/**
+ * How a native thread is scheduled: with a real-time policy and priority so that Python and
+ * other processes can't preempt it, and on which CPU. The default leaves the thread as it was
+ * created. Each thread applies its scheduling to itself when it starts.
+ */
+class ThreadScheduling
+{
+public:
+    int policy; /// THREAD_POLICY_FIFO or THREAD_POLICY_RR, only used when priority is set
+    int priority; /// 1 to 99 for a real-time priority, 0 for the normal scheduling
+    int cpu; /// The CPU to run on, or -1 for any
+
+    ThreadScheduling();
+    ThreadScheduling(int policy, int priority, int cpu);
+
+    /// Schedule the calling thread this way. Logs and returns false if any of it can't be done.
+    bool apply(const char* threadName) const;
+
+    /**
+     * Start a thread scheduled this way that sleeps until wakeups points in time interval apart,
+     * and record how late it wakes up each time in histogram. Returns once it's done.
+     */
+    void measureWakeupLatency(std::chrono::nanoseconds interval, int wakeups, LatencyHistogram& histogram) const;
+
+    /// Lock the memory of the process, now and in the future, so it's never paged out
+    static bool lockMemory();
+};
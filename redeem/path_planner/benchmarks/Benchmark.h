@@ -0,0 +1,117 @@
+#pragma once
+
+#include <chrono>
+#include <cstdio>
+#include <cstring>
+#include <functional>
+#include <string>
+
+#include "PruInterface.h"
+#include "StepperCommand.h"
+
+/**
+ * A PRU that throws the commands away as soon as they're pushed, so benchmarks measure
+ * the path planner and nothing else.
+ */
+class NullPru : public PruInterface
+{
+public:
+    uint64_t commandsPushed = 0;
+
+    bool initPRU(const std::string&, const std::string&) override
+    {
+        return true;
+    }
+
+    void run() override
+    {
+    }
+
+    void runThread() override
+    {
+    }
+
+    void stopThread(bool) override
+    {
+    }
+
+    void waitUntilFinished() override
+    {
+    }
+
+    size_t getFreeMemory() override
+    {
+        return SIZE_MAX;
+    }
+
+    size_t getMemoryUsed() override
+    {
+        return 0;
+    }
+
+    uint64_t getTotalQueuedMovesTime() override
+    {
+        return 0;
+    }
+
+    size_t getMaxBytesPerBlock() override
+    {
+        return 0x10000;
+    }
+
+    void suspend() override
+    {
+    }
+
+    void resume() override
+    {
+    }
+
+    void reset() override
+    {
+    }
+
+    void pushBlock(uint8_t* blockMemory, size_t blockLen, unsigned int unit, uint64_t, SyncCallback* callback) override
+    {
+        commandsPushed += blockLen / unit;
+        std::memset(blockMemory, 0, blockLen);
+
+        if (callback != nullptr)
+        {
+            callback->syncComplete();
+        }
+    }
+
+    uint32_t getStepsRemaining() override
+    {
+        return 0;
+    }
+
+    void resetStepsRemaining() override
+    {
+    }
+};
+
+/**
+ * Run fn until at least minimumSeconds have passed and print how many units (as counted by fn)
+ * were processed per second.
+ */
+inline double runBenchmark(const std::string& name, const char* unit, const std::function<uint64_t()>& fn, double minimumSeconds = 1.0)
+{
+    // warm up caches and allocations before measuring
+    fn();
+
+    uint64_t units = 0;
+    const auto start = std::chrono::steady_clock::now();
+    std::chrono::duration<double> elapsed;
+
+    do
+    {
+        units += fn();
+        elapsed = std::chrono::steady_clock::now() - start;
+    } while (elapsed.count() < minimumSeconds);
+
+    const double rate = units / elapsed.count();
+    std::printf("%-40s %14.0f %s/s\n", name.c_str(), rate, unit);
+    return rate;
+}
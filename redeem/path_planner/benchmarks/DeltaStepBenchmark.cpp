@@ -0,0 +1,174 @@
+#include <algorithm>
+#include <cmath>
+#include <cstdio>
+#include <string>
+#include <vector>
+
+#include "Benchmark.h"
+#include "Delta.h"
+#include "Path.h"
+
+/**
+ * Compares the batched delta step time evaluator against calculating the step times one by one,
+ * for accuracy and for how many step times per second each calculates.
+ */
+class DeltaStepBenchmark
+{
+private:
+    const Vector3 stepsPerM;
+    const double moveTime;
+
+    Delta delta;
+    DeltaPathConstants constants;
+    std::array<AxisSteps, NUM_AXES> steps;
+    StepperPathParameters stepperPath;
+    IntVector3 start;
+    IntVector3 end;
+
+    std::vector<double> times;
+
+public:
+    DeltaStepBenchmark()
+        : stepsPerM(80000, 80000, 80000)
+        , moveTime(1.7)
+    {
+        delta.setMainDimensions(0.29, 0.16);
+
+        // a path that runs at full speed all the way, so step times are base times
+        stepperPath.zero();
+        stepperPath.baseSpeed = stepperPath.cruiseSpeed = stepperPath.startSpeed = stepperPath.endSpeed = 1;
+        stepperPath.accel = 1;
+        stepperPath.baseAccelEnd = 0;
+        stepperPath.baseCruiseEnd = stepperPath.baseMoveEnd = moveTime;
+    }
+
+    /// The towers must move in one direction only, so every step is in the same leg
+    void prepare(const Vector3& worldStart, const Vector3& worldEnd)
+    {
+        start = delta.worldToDeltaMotorPos(worldStart, stepsPerM);
+        end = delta.worldToDeltaMotorPos(worldEnd, stepsPerM);
+
+        for (AxisSteps& axisSteps : steps)
+        {
+            axisSteps.clear();
+        }
+
+        delta.calculateMove(start, end, stepsPerM, moveTime, constants, steps);
+
+        size_t mostSteps = 0;
+        for (int axis = 0; axis < 3; axis++)
+        {
+            mostSteps = std::max(mostSteps, static_cast<size_t>(std::abs(end[axis] - start[axis])));
+        }
+
+        times.resize(mostSteps);
+    }
+
+    uint64_t runScalar()
+    {
+        uint64_t count = 0;
+
+        for (int axis = 0; axis < 3; axis++)
+        {
+            const int stepIncrement = start[axis] < end[axis] ? 1 : -1;
+            double lastTime = 0;
+
+            for (int step = start[axis]; step != end[axis]; step += stepIncrement)
+            {
+                const double position = step + stepIncrement / 2.0;
+                lastTime = Delta::calculateStepTime(axis, constants, position / stepsPerM[axis], lastTime, moveTime);
+                times[count++ % times.size()] = lastTime;
+            }
+        }
+
+        return count;
+    }
+
+    uint64_t runBatched()
+    {
+        uint64_t count = 0;
+
+        for (int axis = 0; axis < 3; axis++)
+        {
+            const int stepIncrement = start[axis] < end[axis] ? 1 : -1;
+            const int axisCount = std::abs(end[axis] - start[axis]);
+
+            Delta::calculateStepTimes(axis, constants, start[axis] + stepIncrement / 2.0, stepIncrement, axisCount, 0, moveTime, times.data());
+            count += axisCount;
+        }
+
+        return count;
+    }
+
+    /// All of the steps through AxisSteps, which calculates them in batches
+    uint64_t runAxisSteps()
+    {
+        uint64_t count = 0;
+        Step step;
+
+        for (int axis = 0; axis < 3; axis++)
+        {
+            steps[axis].start(stepperPath, constants, false);
+
+            while (steps[axis].next(step))
+            {
+                count++;
+            }
+        }
+
+        return count;
+    }
+
+    /// The largest difference between the step times of both evaluators, in seconds
+    double maxDifference()
+    {
+        double result = 0;
+        std::vector<double> batchedTimes;
+
+        for (int axis = 0; axis < 3; axis++)
+        {
+            const int stepIncrement = start[axis] < end[axis] ? 1 : -1;
+            const int axisCount = std::abs(end[axis] - start[axis]);
+
+            batchedTimes.resize(axisCount);
+            Delta::calculateStepTimes(axis, constants, start[axis] + stepIncrement / 2.0, stepIncrement, axisCount, 0, moveTime, batchedTimes.data());
+
+            double lastTime = 0;
+            for (int i = 0; i < axisCount; i++)
+            {
+                const double position = start[axis] + i * stepIncrement + stepIncrement / 2.0;
+                lastTime = Delta::calculateStepTime(axis, constants, position / stepsPerM[axis], lastTime, moveTime);
+                result = std::max(result, std::abs(lastTime - batchedTimes[i]));
+            }
+        }
+
+        return result;
+    }
+};
+
+int main()
+{
+    DeltaStepBenchmark benchmark;
+
+    const struct
+    {
+        const char* name;
+        Vector3 start;
+        Vector3 end;
+    } moves[] = {
+        { "steep", Vector3(0, 0, 0.01), Vector3(0.01, 0.005, 0.07) },
+        { "diagonal", Vector3(-0.02, -0.02, 0.01), Vector3(0.01, 0.02, 0.08) },
+    };
+
+    for (const auto& move : moves)
+    {
+        benchmark.prepare(move.start, move.end);
+
+        std::printf("%s move: largest difference %g s\n", move.name, benchmark.maxDifference());
+        runBenchmark(std::string(move.name) + " scalar", "steps", [&benchmark]() { return benchmark.runScalar(); });
+        runBenchmark(std::string(move.name) + " batched", "steps", [&benchmark]() { return benchmark.runBatched(); });
+        runBenchmark(std::string(move.name) + " AxisSteps", "steps", [&benchmark]() { return benchmark.runAxisSteps(); });
+    }
+
+    return 0;
+}
@@ -0,0 +1,55 @@
+#include <string>
+#include <thread>
+
+#include "Benchmark.h"
+#include "PathOptimizerInterface.h"
+#include "PathQueue.h"
+
+class NullPathOptimizer : public PathOptimizerInterface
+{
+public:
+    int64_t onPathAdded(std::vector<Path>& queue, PathQueueIndex, PathQueueIndex finish)
+    {
+        return queue[finish.value].getEstimatedTime();
+    }
+
+    int64_t beforePathRemoval(std::vector<Path>& queue, PathQueueIndex start, PathQueueIndex)
+    {
+        return -queue[start.value].getEstimatedTime();
+    }
+};
+
+/**
+ * Measures how many paths per second one thread can push through a PathQueue to another, which
+ * pops them as fast as it can, so the two threads contend for the queue on every path.
+ */
+uint64_t pushPaths(size_t queueSize, uint64_t paths)
+{
+    NullPathOptimizer optimizer;
+    PathQueue<NullPathOptimizer> queue(optimizer, queueSize, 1ll << 62);
+
+    std::thread producer([&queue, paths]() {
+        for (uint64_t i = 0; i < paths; i++)
+        {
+            queue.addPath(Path());
+        }
+    });
+
+    for (uint64_t i = 0; i < paths; i++)
+    {
+        queue.popPath();
+    }
+
+    producer.join();
+    return paths;
+}
+
+int main()
+{
+    for (size_t queueSize : { 4, 64 })
+    {
+        runBenchmark("PathQueue " + std::to_string(queueSize) + " slots", "paths", [queueSize]() { return pushPaths(queueSize, 100000); });
+    }
+
+    return 0;
+}
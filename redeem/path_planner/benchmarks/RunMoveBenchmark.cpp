@@ -0,0 +1,89 @@
+#include <cstdio>
+#include <string>
+
+#include "AlarmCallback.h"
+#include "Benchmark.h"
+#include "PathPlanner.h"
+
+/**
+ * Measures how many commands per second PathPlanner::runMove merges out of the steps of
+ * several axes, which is the innermost loop of step generation.
+ */
+class RunMoveBenchmark
+{
+private:
+    AlarmCallback alarmCallback;
+    NullPru pru;
+    PathPlanner planner;
+
+    std::array<VectorStepSource, NUM_AXES> sources;
+    std::array<StepSource*, NUM_AXES> steps;
+    int moveMask;
+    double moveEndTime;
+
+public:
+    RunMoveBenchmark()
+        : planner(1024, alarmCallback, pru)
+        , moveMask(0)
+        , moveEndTime(0)
+    {
+    }
+
+    /// Each moving axis steps at its own rate, or all of them at the same rate when together is set
+    void prepare(int movingAxes, bool together)
+    {
+        const double duration = 0.2;
+        moveMask = 0;
+        moveEndTime = duration;
+
+        for (int i = 0; i < NUM_AXES; i++)
+        {
+            std::vector<Step>& axisSteps = sources[i].getSteps();
+            axisSteps.clear();
+            steps[i] = &sources[i];
+
+            if (i >= movingAxes)
+            {
+                continue;
+            }
+
+            moveMask |= 1 << i;
+
+            const double interval = together ? 40e-6 : 40e-6 * (1 + 0.13 * i);
+            for (double time = interval / 2; time < duration; time += interval)
+            {
+                axisSteps.push_back(Step(time, i, i % 2 == 0));
+            }
+        }
+    }
+
+    uint64_t run()
+    {
+        const size_t maxCommandsPerBlock = pru.getMaxBytesPerBlock() / sizeof(SteppersCommand);
+
+        for (auto& source : sources)
+        {
+            source.rewind();
+        }
+
+        const uint64_t commandsBefore = pru.commandsPushed;
+        planner.runMove(moveMask, 0, false, false, moveEndTime, steps, maxCommandsPerBlock);
+        return pru.commandsPushed - commandsBefore;
+    }
+};
+
+int main()
+{
+    RunMoveBenchmark benchmark;
+
+    for (int movingAxes : { 1, 3, 5, NUM_AXES })
+    {
+        benchmark.prepare(movingAxes, false);
+        runBenchmark("runMove " + std::to_string(movingAxes) + " axes", "commands", [&benchmark]() { return benchmark.run(); });
+    }
+
+    benchmark.prepare(3, true);
+    runBenchmark("runMove 3 axes stepping together", "commands", [&benchmark]() { return benchmark.run(); });
+
+    return 0;
+}
@@ -0,0 +1,46 @@
+#include <cstdio>
+#include <string>
+
+#include "Benchmark.h"
+#include "TestUtils.h"
+
+/**
+ * Measures how many steps per second AxisSteps times for linear trapezoidal moves, with exact
+ * and with incremental step timing.
+ */
+static uint64_t timeSteps(Path& path, bool incremental)
+{
+    uint64_t steps = 0;
+    Step step;
+
+    path.runFinalStepCalculations(incremental);
+
+    while (path.getSteps()[X_AXIS].next(step))
+    {
+        steps++;
+    }
+
+    return steps;
+}
+
+int main()
+{
+    PathBuilder builder(VectorN(80000, 80000, 80000, 80000, 80000, 80000, 80000, 80000),
+        VectorN(0.01, 0.01, 0.01, 0.01, 0.01, 0.01, 0.01, 0.01),
+        VectorN(1.0, 1.0, 1.0, 1.0, 1.0, 1.0, 1.0, 1.0),
+        VectorN(3.0, 3.0, 3.0, 3.0, 3.0, 3.0, 3.0, 3.0));
+
+    // a long move spends most of its steps cruising, a short one accelerating and decelerating
+    for (double distance : { 0.3, 0.01 })
+    {
+        Path path = builder.makePath(distance, 0, 0, 0.2);
+
+        for (bool incremental : { false, true })
+        {
+            const std::string name = std::to_string(static_cast<int>(distance * 1000)) + "mm move, " + (incremental ? "incremental" : "exact");
+            runBenchmark(name, "steps", [&path, incremental]() { return timeSteps(path, incremental); });
+        }
+    }
+
+    return 0;
+}
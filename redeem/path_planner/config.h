@@ -57,4 +57,53 @@
 
 #define MINIMUM_STEP_INTERVAL 1000
 
+/* Planes for PathPlanner::queueArc, the same values as Path.X_Y_ARC_PLANE etc. */
+#define ARC_PLANE_XY 0
+#define ARC_PLANE_XZ 1
+#define ARC_PLANE_YZ 2
+
+/* Input shapers for PathPlanner::setInputShaper, the same values as Printer.INPUT_SHAPERS */
+#define INPUT_SHAPER_NONE 0
+#define INPUT_SHAPER_ZV 1
+#define INPUT_SHAPER_MZV 2
+#define INPUT_SHAPER_EI 3
+
+/* Per move flags for PathPlanner::queueMoves, see Path.MOVE_FLAG_* */
+#define MOVE_FLAG_CANCELABLE (1 << 0)
+#define MOVE_FLAG_OPTIMIZE (1 << 1)
+#define MOVE_FLAG_SOFT_ENDSTOPS (1 << 2)
+#define MOVE_FLAG_BED_MATRIX (1 << 3)
+#define MOVE_FLAG_BACKLASH_COMPENSATION (1 << 4)
+#define MOVE_FLAG_PROBE (1 << 5)
+
+/* Steps of each axis a StepGenerator worker takes from the start of a path ahead of the emitter.
+   The emitter takes the rest of a longer path itself, so memory doesn't grow with path length */
+#define STEP_GENERATOR_WINDOW 1024
+
+/* Buckets of a LatencyHistogram, which double in width from 1 us */
+#define LATENCY_HISTOGRAM_BUCKETS 32
+
+/* Stages timed by PathPlanner::getLatencyHistogram */
+#define LATENCY_QUEUE_MOVE 0
+#define LATENCY_OPTIMIZER 1
+#define LATENCY_STEP_GENERATION 2
+#define LATENCY_PUSH_BLOCK_WAIT 3
+#define LATENCY_PRU_COMPLETION 4
+#define NUM_LATENCY_STAGES 5
+
+/* Why the PRU ran out of step commands, see PathPlanner::getUnderrunEvents */
+#define UNDERRUN_PATH_QUEUE 0
+#define UNDERRUN_PRU 1
+
+/* Underrun events kept by BufferTelemetry, the oldest are dropped first */
+#define BUFFER_TELEMETRY_UNDERRUN_EVENTS 64
+
+/* Real-time scheduling policies of ThreadScheduling */
+#define THREAD_POLICY_FIFO 0
+#define THREAD_POLICY_RR 1
+
+/* Threads of PathPlanner::setThreadScheduling, THREAD_PLANNER includes the step generation workers */
+#define THREAD_PLANNER 0
+#define THREAD_PRU 1
+
 #endif
@@ -14,38 +14,45 @@
 
 /* Macros to extract array attributes.
  */
-#define is_array(a)            ((a) && PyArray_Check((PyArrayObject *)a))
-#define array_type(a)          (int)(PyArray_TYPE(a))
-#define array_dimensions(a)    (((PyArrayObject *)a)->nd)
-#define array_size(a,i)        (((PyArrayObject *)a)->dimensions[i])
-#define array_is_contiguous(a) (PyArray_ISCONTIGUOUS(a))
+#define is_array(a)            ((a) && PyArray_Check(a))
+#define array_type(a)          (int)(PyArray_TYPE((PyArrayObject *)a))
+#define array_dimensions(a)    (PyArray_NDIM((PyArrayObject *)a))
+#define array_size(a,i)        (int)(PyArray_DIM((PyArrayObject *)a,i))
+#define array_data(a)          (PyArray_DATA((PyArrayObject *)a))
+#define array_is_contiguous(a) (PyArray_ISCONTIGUOUS((PyArrayObject *)a))
 
 /* Given a PyObject, return a string describing its type.
  */
-char* pytype_string(PyObject* py_obj) {
+const char* pytype_string(PyObject* py_obj) {
   if (py_obj == NULL          ) return "C NULL value";
   if (PyCallable_Check(py_obj)) return "callable"    ;
+#if PY_MAJOR_VERSION < 3
   if (PyString_Check(  py_obj)) return "string"      ;
   if (PyInt_Check(     py_obj)) return "int"         ;
+#else
+  if (PyUnicode_Check( py_obj)) return "string"      ;
+  if (PyLong_Check(    py_obj)) return "int"         ;
+#endif
   if (PyFloat_Check(   py_obj)) return "float"       ;
   if (PyDict_Check(    py_obj)) return "dict"        ;
   if (PyList_Check(    py_obj)) return "list"        ;
   if (PyTuple_Check(   py_obj)) return "tuple"       ;
+#if PY_MAJOR_VERSION < 3
   if (PyFile_Check(    py_obj)) return "file"        ;
-  if (PyModule_Check(  py_obj)) return "module"      ;
   if (PyInstance_Check(py_obj)) return "instance"    ;
+#endif
+  if (PyModule_Check(  py_obj)) return "module"      ;
 
   return "unkown type";
 }
 
 /* Given a Numeric typecode, return a string describing the type.
  */
-char* typecode_string(int typecode) {
-  char* type_names[20] = {"char","unsigned byte","byte","short",
-			  "unsigned short","int","unsigned int","long",
-			  "float","double","complex float","complex double",
-			  "object","ntype","unkown"};
-  return type_names[typecode];
+const char* typecode_string(int typecode) {
+  PyArray_Descr* descr = PyArray_DescrFromType(typecode);
+  const char* name = descr ? descr->typeobj->tp_name : "unknown";
+  Py_XDECREF(descr);
+  return name;
 }
 
 /* Make sure input has correct numeric type.  Allow character and byte
@@ -61,22 +68,22 @@ int type_match(int actual_type, int desired_type) {
  */
 PyArrayObject* obj_to_array_no_conversion(PyObject* input, int typecode) {
   PyArrayObject* ary = NULL;
-  if (is_array(input) && (typecode == PyArray_NOTYPE || 
+  if (is_array(input) && (typecode == NPY_NOTYPE || 
 			  PyArray_EquivTypenums(array_type(input), 
 						typecode))) {
         ary = (PyArrayObject*) input;
     }
     else if is_array(input) {
-      char* desired_type = typecode_string(typecode);
-      char* actual_type = typecode_string(array_type(input));
+      const char* desired_type = typecode_string(typecode);
+      const char* actual_type = typecode_string(array_type(input));
       PyErr_Format(PyExc_TypeError, 
 		   "Array of type '%s' required.  Array of type '%s' given", 
 		   desired_type, actual_type);
       ary = NULL;
     }
     else {
-      char * desired_type = typecode_string(typecode);
-      char * actual_type = pytype_string(input);
+      const char* desired_type = typecode_string(typecode);
+      const char* actual_type = pytype_string(input);
       PyErr_Format(PyExc_TypeError, 
 		   "Array of type '%s' required.  A %s was given", 
 		   desired_type, actual_type);
@@ -95,7 +102,7 @@ PyArrayObject* obj_to_array_allow_conversion(PyObject* input, int typecode,
 {
   PyArrayObject* ary = NULL;
   PyObject* py_obj;
-  if (is_array(input) && (typecode == PyArray_NOTYPE || type_match(array_type(input),typecode))) {
+  if (is_array(input) && (typecode == NPY_NOTYPE || type_match(array_type(input),typecode))) {
     ary = (PyArrayObject*) input;
     *is_new_object = 0;
   }
@@ -288,8 +295,8 @@ int require_size(PyArrayObject* ary, int* size, int n) {
   int size[1] = {-1};
   array = obj_to_array_contiguous_allow_conversion($input, typecode, &is_new_object);
   if (!array || !require_dimensions(array,1) || !require_size(array,size,1)) SWIG_fail;
-  $1 = (type*) array->data;
-  $2 = array->dimensions[0];
+  $1 = (type*) array_data(array);
+  $2 = array_size(array,0);
 }
 %typemap(freearg) (type* IN_ARRAY1, int DIM1) {
   if (is_new_object$argnum && array$argnum) Py_DECREF(array$argnum);
@@ -297,15 +304,15 @@ int require_size(PyArrayObject* ary, int* size, int n) {
 %enddef
 
 /* Define concrete examples of the TYPEMAP_IN1 macros */
-TYPEMAP_IN1(char,          PyArray_CHAR  )
-TYPEMAP_IN1(unsigned char, PyArray_UBYTE )
-TYPEMAP_IN1(signed char,   PyArray_SBYTE )
-TYPEMAP_IN1(short,         PyArray_SHORT )
-TYPEMAP_IN1(int,           PyArray_INT   )
-TYPEMAP_IN1(long,          PyArray_LONG  )
-TYPEMAP_IN1(float,         PyArray_FLOAT )
-TYPEMAP_IN1(double,        PyArray_DOUBLE)
-TYPEMAP_IN1(PyObject,      PyArray_OBJECT)
+TYPEMAP_IN1(char,          NPY_BYTE     )
+TYPEMAP_IN1(unsigned char, NPY_UBYTE    )
+TYPEMAP_IN1(signed char,   NPY_BYTE     )
+TYPEMAP_IN1(short,         NPY_SHORT    )
+TYPEMAP_IN1(int,           NPY_INT      )
+TYPEMAP_IN1(long,          NPY_LONG     )
+TYPEMAP_IN1(float,         NPY_FLOAT    )
+TYPEMAP_IN1(double,        NPY_DOUBLE   )
+TYPEMAP_IN1(PyObject,      NPY_OBJECT   )
 
 #undef TYPEMAP_IN1
 
@@ -316,9 +323,9 @@ TYPEMAP_IN1(PyObject,      PyArray_OBJECT)
   int size[2] = {-1,-1};
   array = obj_to_array_contiguous_allow_conversion($input, typecode, &is_new_object);
   if (!array || !require_dimensions(array,2) || !require_size(array,size,1)) SWIG_fail;
-  $1 = (type*) array->data;
-  $2 = array->dimensions[0];
-  $3 = array->dimensions[1];
+  $1 = (type*) array_data(array);
+  $2 = array_size(array,0);
+  $3 = array_size(array,1);
 }
 %typemap(freearg) (type* IN_ARRAY2, int DIM1, int DIM2) {
   if (is_new_object$argnum && array$argnum) Py_DECREF(array$argnum);
@@ -326,15 +333,15 @@ TYPEMAP_IN1(PyObject,      PyArray_OBJECT)
 %enddef
 
 /* Define concrete examples of the TYPEMAP_IN2 macros */
-TYPEMAP_IN2(char,          PyArray_CHAR  )
-TYPEMAP_IN2(unsigned char, PyArray_UBYTE )
-TYPEMAP_IN2(signed char,   PyArray_SBYTE )
-TYPEMAP_IN2(short,         PyArray_SHORT )
-TYPEMAP_IN2(int,           PyArray_INT   )
-TYPEMAP_IN2(long,          PyArray_LONG  )
-TYPEMAP_IN2(float,         PyArray_FLOAT )
-TYPEMAP_IN2(double,        PyArray_DOUBLE)
-TYPEMAP_IN2(PyObject,      PyArray_OBJECT)
+TYPEMAP_IN2(char,          NPY_BYTE     )
+TYPEMAP_IN2(unsigned char, NPY_UBYTE    )
+TYPEMAP_IN2(signed char,   NPY_BYTE     )
+TYPEMAP_IN2(short,         NPY_SHORT    )
+TYPEMAP_IN2(int,           NPY_INT      )
+TYPEMAP_IN2(long,          NPY_LONG     )
+TYPEMAP_IN2(float,         NPY_FLOAT    )
+TYPEMAP_IN2(double,        NPY_DOUBLE   )
+TYPEMAP_IN2(PyObject,      NPY_OBJECT   )
 
 #undef TYPEMAP_IN2
 
@@ -368,22 +375,22 @@ TYPEMAP_IN2(PyObject,      PyArray_OBJECT)
   int i;
   temp = obj_to_array_no_conversion($input,typecode);
   if (!temp  || !require_contiguous(temp)) SWIG_fail;
-  $1 = (type*) temp->data;
+  $1 = (type*) array_data(temp);
   $2 = 1;
-  for (i=0; i<temp->nd; ++i) $2 *= temp->dimensions[i];
+  for (i=0; i<array_dimensions(temp); ++i) $2 *= array_size(temp,i);
 }
 %enddef
 
 /* Define concrete examples of the TYPEMAP_INPLACE1 macro */
-TYPEMAP_INPLACE1(char,          PyArray_CHAR  )
-TYPEMAP_INPLACE1(unsigned char, PyArray_UBYTE )
-TYPEMAP_INPLACE1(signed char,   PyArray_SBYTE )
-TYPEMAP_INPLACE1(short,         PyArray_SHORT )
-TYPEMAP_INPLACE1(int,           PyArray_INT   )
-TYPEMAP_INPLACE1(long,          PyArray_LONG  )
-TYPEMAP_INPLACE1(float,         PyArray_FLOAT )
-TYPEMAP_INPLACE1(double,        PyArray_DOUBLE)
-TYPEMAP_INPLACE1(PyObject,      PyArray_OBJECT)
+TYPEMAP_INPLACE1(char,          NPY_BYTE     )
+TYPEMAP_INPLACE1(unsigned char, NPY_UBYTE    )
+TYPEMAP_INPLACE1(signed char,   NPY_BYTE     )
+TYPEMAP_INPLACE1(short,         NPY_SHORT    )
+TYPEMAP_INPLACE1(int,           NPY_INT      )
+TYPEMAP_INPLACE1(long,          NPY_LONG     )
+TYPEMAP_INPLACE1(float,         NPY_FLOAT    )
+TYPEMAP_INPLACE1(double,        NPY_DOUBLE   )
+TYPEMAP_INPLACE1(PyObject,      NPY_OBJECT   )
 
 #undef TYPEMAP_INPLACE1
 
@@ -392,22 +399,22 @@ TYPEMAP_INPLACE1(PyObject,      PyArray_OBJECT)
   %typemap(in) (type* INPLACE_ARRAY2, int DIM1, int DIM2) (PyArrayObject* temp=NULL) {
   temp = obj_to_array_no_conversion($input,typecode);
   if (!temp || !require_contiguous(temp)) SWIG_fail;
-  $1 = (type*) temp->data;
-  $2 = temp->dimensions[0];
-  $3 = temp->dimensions[1];
+  $1 = (type*) array_data(temp);
+  $2 = array_size(temp,0);
+  $3 = array_size(temp,1);
 }
 %enddef
 
 /* Define concrete examples of the TYPEMAP_INPLACE2 macro */
-TYPEMAP_INPLACE2(char,          PyArray_CHAR  )
-TYPEMAP_INPLACE2(unsigned char, PyArray_UBYTE )
-TYPEMAP_INPLACE2(signed char,   PyArray_SBYTE )
-TYPEMAP_INPLACE2(short,         PyArray_SHORT )
-TYPEMAP_INPLACE2(int,           PyArray_INT   )
-TYPEMAP_INPLACE2(long,          PyArray_LONG  )
-TYPEMAP_INPLACE2(float,         PyArray_FLOAT )
-TYPEMAP_INPLACE2(double,        PyArray_DOUBLE)
-TYPEMAP_INPLACE2(PyObject,      PyArray_OBJECT)
+TYPEMAP_INPLACE2(char,          NPY_BYTE     )
+TYPEMAP_INPLACE2(unsigned char, NPY_UBYTE    )
+TYPEMAP_INPLACE2(signed char,   NPY_BYTE     )
+TYPEMAP_INPLACE2(short,         NPY_SHORT    )
+TYPEMAP_INPLACE2(int,           NPY_INT      )
+TYPEMAP_INPLACE2(long,          NPY_LONG     )
+TYPEMAP_INPLACE2(float,         NPY_FLOAT    )
+TYPEMAP_INPLACE2(double,        NPY_DOUBLE   )
+TYPEMAP_INPLACE2(PyObject,      NPY_OBJECT   )
 
 #undef TYPEMAP_INPLACE2
 
@@ -445,21 +452,23 @@ TYPEMAP_INPLACE2(PyObject,      PyArray_OBJECT)
   }
 }
 %typemap(argout) ARGOUT_ARRAY[ANY] {
-  int dimensions[1] = {$1_dim0};
-  PyObject* outArray = PyArray_FromDimsAndData(1, dimensions, typecode, (char*)$1);
+  npy_intp dimensions[1] = {$1_dim0};
+  PyObject* outArray = PyArray_SimpleNewFromData(1, dimensions, typecode, (void*)$1);
+  PyArray_ENABLEFLAGS((PyArrayObject*)outArray, NPY_ARRAY_OWNDATA);
+  $result = SWIG_Python_AppendOutput($result, outArray);
 }
 %enddef
 
 /* Define concrete examples of the TYPEMAP_ARGOUT1 macro */
-TYPEMAP_ARGOUT1(char,          PyArray_CHAR  )
-TYPEMAP_ARGOUT1(unsigned char, PyArray_UBYTE )
-TYPEMAP_ARGOUT1(signed char,   PyArray_SBYTE )
-TYPEMAP_ARGOUT1(short,         PyArray_SHORT )
-TYPEMAP_ARGOUT1(int,           PyArray_INT   )
-TYPEMAP_ARGOUT1(long,          PyArray_LONG  )
-TYPEMAP_ARGOUT1(float,         PyArray_FLOAT )
-TYPEMAP_ARGOUT1(double,        PyArray_DOUBLE)
-TYPEMAP_ARGOUT1(PyObject,      PyArray_OBJECT)
+TYPEMAP_ARGOUT1(char,          NPY_BYTE     )
+TYPEMAP_ARGOUT1(unsigned char, NPY_UBYTE    )
+TYPEMAP_ARGOUT1(signed char,   NPY_BYTE     )
+TYPEMAP_ARGOUT1(short,         NPY_SHORT    )
+TYPEMAP_ARGOUT1(int,           NPY_INT      )
+TYPEMAP_ARGOUT1(long,          NPY_LONG     )
+TYPEMAP_ARGOUT1(float,         NPY_FLOAT    )
+TYPEMAP_ARGOUT1(double,        NPY_DOUBLE   )
+TYPEMAP_ARGOUT1(PyObject,      NPY_OBJECT   )
 
 #undef TYPEMAP_ARGOUT1
 
@@ -468,21 +477,21 @@ TYPEMAP_ARGOUT1(PyObject,      PyArray_OBJECT)
   %typemap(in) (type* ARGOUT_ARRAY2, int DIM1, int DIM2) (PyArrayObject* temp=NULL) {
   temp = obj_to_array_no_conversion($input,typecode);
   if (!temp || !require_contiguous(temp)) SWIG_fail;
-  $1 = (type*) temp->data;
-  $2 = temp->dimensions[0];
-  $3 = temp->dimensions[1];
+  $1 = (type*) array_data(temp);
+  $2 = array_size(temp,0);
+  $3 = array_size(temp,1);
 }
 %enddef
 
 /* Define concrete examples of the TYPEMAP_ARGOUT2 macro */
-TYPEMAP_ARGOUT2(char,          PyArray_CHAR  )
-TYPEMAP_ARGOUT2(unsigned char, PyArray_UBYTE )
-TYPEMAP_ARGOUT2(signed char,   PyArray_SBYTE )
-TYPEMAP_ARGOUT2(short,         PyArray_SHORT )
-TYPEMAP_ARGOUT2(int,           PyArray_INT   )
-TYPEMAP_ARGOUT2(long,          PyArray_LONG  )
-TYPEMAP_ARGOUT2(float,         PyArray_FLOAT )
-TYPEMAP_ARGOUT2(double,        PyArray_DOUBLE)
-TYPEMAP_ARGOUT2(PyObject,      PyArray_OBJECT)
+TYPEMAP_ARGOUT2(char,          NPY_BYTE     )
+TYPEMAP_ARGOUT2(unsigned char, NPY_UBYTE    )
+TYPEMAP_ARGOUT2(signed char,   NPY_BYTE     )
+TYPEMAP_ARGOUT2(short,         NPY_SHORT    )
+TYPEMAP_ARGOUT2(int,           NPY_INT      )
+TYPEMAP_ARGOUT2(long,          NPY_LONG     )
+TYPEMAP_ARGOUT2(float,         NPY_FLOAT    )
+TYPEMAP_ARGOUT2(double,        NPY_DOUBLE   )
+TYPEMAP_ARGOUT2(PyObject,      NPY_OBJECT   )
 
 #undef TYPEMAP_ARGOUT2
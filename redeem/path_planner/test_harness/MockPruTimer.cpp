@@ -86,7 +86,12 @@ void PruTimer::push_block(uint8_t* blockMemory, size_t blockLen, unsigned int un
     renderedPath.stepperCommands.reserve(blockLen / sizeof(SteppersCommand));
     for (size_t i = 0; i < blockLen / sizeof(SteppersCommand); i++)
     {
-        renderedPath.stepperCommands.push_back(commands[i]);
+        // expand repeated commands so every step shows up in the dump
+        SteppersCommand command = commands[i];
+        const unsigned int runs = stepperCommandRuns(command);
+        command.options &= ~STEPPER_COMMAND_OPTION_REPEAT_MASK;
+
+        renderedPath.stepperCommands.insert(renderedPath.stepperCommands.end(), runs, command);
     }
 
     PruDump::get()->dumpPath(renderedPath);
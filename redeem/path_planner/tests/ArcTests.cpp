@@ -0,0 +1,147 @@
+#include "gmock/gmock.h"
+#include "gtest/gtest.h"
+
+#include "Arc.h"
+
+#include <cmath>
+
+namespace
+{
+
+void expectOnCircle(const Arc& arc, int axis0, int axis1, double center0, double center1, double radius,
+    double tolerance = 1e-9)
+{
+    for (int i = 1; i <= arc.getNumSegments(); i++)
+    {
+        const VectorN point = arc.getSegmentEnd(i);
+        EXPECT_NEAR(std::hypot(point[axis0] - center0, point[axis1] - center1), radius, tolerance);
+    }
+}
+
+// the signed angle the arc sweeps, summed over its segments
+double sweptAngle(const Arc& arc, const VectorN& start, double center0, double center1)
+{
+    double swept = 0;
+    double previous = std::atan2(start[1] - center1, start[0] - center0);
+    for (int i = 1; i <= arc.getNumSegments(); i++)
+    {
+        const VectorN point = arc.getSegmentEnd(i);
+        const double angle = std::atan2(point[1] - center1, point[0] - center0);
+        double step = angle - previous;
+        if (step > M_PI)
+        {
+            step -= 2 * M_PI;
+        }
+        else if (step < -M_PI)
+        {
+            step += 2 * M_PI;
+        }
+        swept += step;
+        previous = angle;
+    }
+    return swept;
+}
+
+} // namespace
+
+TEST(ArcTests, EndsAtEndPosition)
+{
+    const VectorN start(0, 0.010, 0);
+    const VectorN end(0.012803, 0.015303, 0);
+    const Arc arc(start, end, 0.0075, 0.010, 0.0075, ARC_PLANE_XY, false, 0.00001, 0.001);
+
+    EXPECT_GT(arc.getNumSegments(), 1);
+    EXPECT_EQ(arc.getSegmentEnd(arc.getNumSegments()), end);
+    // the end position is rounded to a micron
+    expectOnCircle(arc, 0, 1, 0.0075, 0.010, 0.0075, 0.000001);
+}
+
+TEST(ArcTests, FollowsDirection)
+{
+    const VectorN start(0, 0.012, 0);
+    const VectorN end(0.012, 0, 0);
+
+    const Arc clockwise(start, end, 0, 0, 0.012, ARC_PLANE_XY, true, 0.00001, 0);
+    EXPECT_NEAR(sweptAngle(clockwise, start, 0, 0), -M_PI / 2, 1e-9);
+
+    const Arc counterClockwise(start, end, 0, 0, 0.012, ARC_PLANE_XY, false, 0.00001, 0);
+    EXPECT_NEAR(sweptAngle(counterClockwise, start, 0, 0), 3 * M_PI / 2, 1e-9);
+}
+
+TEST(ArcTests, TreatsSameStartAndEndAsFullCircle)
+{
+    const VectorN start(0, 0.010, 0);
+
+    const Arc clockwise(start, start, 0.0075, 0.010, 0.0075, ARC_PLANE_XY, true, 0.00001, 0);
+    EXPECT_NEAR(sweptAngle(clockwise, start, 0.0075, 0.010), -2 * M_PI, 1e-9);
+    expectOnCircle(clockwise, 0, 1, 0.0075, 0.010, 0.0075);
+
+    const Arc counterClockwise(start, start, 0.0075, 0.010, 0.0075, ARC_PLANE_XY, false, 0.00001, 0);
+    EXPECT_NEAR(sweptAngle(counterClockwise, start, 0.0075, 0.010), 2 * M_PI, 1e-9);
+}
+
+TEST(ArcTests, MovesOtherAxesLinearly)
+{
+    const VectorN start(0.007, -0.002, 0.002, 0.00125);
+    const VectorN end(-0.007, -0.006, -0.0135, 0.00255);
+    const Arc arc(start, end, -0.002, 0.003, std::hypot(0.009, 0.005), ARC_PLANE_XY, false, 0.00001, 0.001);
+
+    VectorN previous = start;
+    for (int i = 1; i <= arc.getNumSegments(); i++)
+    {
+        const VectorN point = arc.getSegmentEnd(i);
+        EXPECT_NEAR(point[2] - previous[2], (end[2] - start[2]) / arc.getNumSegments(), 1e-12);
+        EXPECT_NEAR(point[3] - previous[3], (end[3] - start[3]) / arc.getNumSegments(), 1e-12);
+        previous = point;
+    }
+}
+
+TEST(ArcTests, KeepsChordsWithinTolerance)
+{
+    const double radius = 0.01;
+    const double tolerance = 0.000001;
+    const VectorN start(radius, 0, 0);
+    const Arc arc(start, start, 0, 0, radius, ARC_PLANE_XY, false, tolerance, 0);
+
+    // a chord spanning angle a deviates r * (1 - cos(a / 2)) from the arc
+    const double angle = 2 * M_PI / arc.getNumSegments();
+    EXPECT_LE(radius * (1 - std::cos(angle / 2)), tolerance);
+
+    const double coarserAngle = 2 * M_PI / (arc.getNumSegments() - 1);
+    EXPECT_GT(radius * (1 - std::cos(coarserAngle / 2)), tolerance);
+}
+
+TEST(ArcTests, LimitsSegmentLength)
+{
+    const double radius = 0.01;
+    const VectorN start(radius, 0, 0);
+
+    const Arc arc(start, start, 0, 0, radius, ARC_PLANE_XY, false, 0.001, 0.0001);
+    EXPECT_EQ(arc.getNumSegments(), static_cast<int>(std::ceil(2 * M_PI * radius / 0.0001)));
+}
+
+TEST(ArcTests, UsesSingleSegmentForTinyArcs)
+{
+    const Arc arc(VectorN(0.0001, 0, 0), VectorN(0, 0.0001, 0), 0, 0, 0.0001, ARC_PLANE_XY, false, 0.001, 0);
+    EXPECT_EQ(arc.getNumSegments(), 1);
+    EXPECT_EQ(arc.getSegmentEnd(1), VectorN(0, 0.0001, 0));
+}
+
+TEST(ArcTests, UsesActivePlane)
+{
+    const VectorN start(0, 0.005, 0.010);
+
+    const Arc xz(start, VectorN(0.010, 0.005, 0), 0, 0, 0.010, ARC_PLANE_XZ, true, 0.00001, 0);
+    expectOnCircle(xz, 0, 2, 0, 0, 0.010);
+    for (int i = 1; i <= xz.getNumSegments(); i++)
+    {
+        EXPECT_EQ(xz.getSegmentEnd(i)[1], 0.005);
+    }
+
+    const Arc yz(start, VectorN(0, 0.015, 0), 0.005, 0, 0.010, ARC_PLANE_YZ, true, 0.00001, 0);
+    expectOnCircle(yz, 1, 2, 0.005, 0, 0.010);
+    for (int i = 1; i <= yz.getNumSegments(); i++)
+    {
+        EXPECT_EQ(yz.getSegmentEnd(i)[0], 0);
+    }
+}
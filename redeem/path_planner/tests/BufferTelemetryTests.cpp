@@ -0,0 +1,119 @@
+#include "gmock/gmock.h"
+#include "gtest/gtest.h"
+
+#include "BufferTelemetry.h"
+
+TEST(BufferTelemetry, DoesNotSampleByDefault)
+{
+    BufferTelemetry telemetry;
+
+    const BufferTelemetry::Clock::time_point now = BufferTelemetry::Clock::now();
+    EXPECT_FALSE(telemetry.isSampleDue(now));
+
+    telemetry.addSample(now, 1, 2, 3);
+    EXPECT_EQ(telemetry.getStats().samples, 0);
+    EXPECT_TRUE(telemetry.getSamples().empty());
+}
+
+TEST(BufferTelemetry, SamplesOncePerInterval)
+{
+    BufferTelemetry telemetry;
+    telemetry.configure(1, 10);
+
+    const BufferTelemetry::Clock::time_point now = BufferTelemetry::Clock::now();
+    ASSERT_TRUE(telemetry.isSampleDue(now));
+
+    telemetry.addSample(now, 4, 1000, 96);
+
+    EXPECT_FALSE(telemetry.isSampleDue(now + std::chrono::milliseconds(999)));
+    EXPECT_TRUE(telemetry.isSampleDue(now + std::chrono::seconds(1)));
+
+    const std::vector<BufferSample> samples = telemetry.getSamples();
+    ASSERT_EQ(samples.size(), 1);
+    EXPECT_EQ(samples[0].pathQueueDepth, 4);
+    EXPECT_EQ(samples[0].queuedMoveTime, 1000);
+    EXPECT_EQ(samples[0].pruMemoryUsed, 96);
+    EXPECT_GE(samples[0].time, 0);
+}
+
+TEST(BufferTelemetry, KeepsTheLastSamples)
+{
+    BufferTelemetry telemetry;
+    telemetry.configure(0, 3);
+
+    const BufferTelemetry::Clock::time_point now = BufferTelemetry::Clock::now();
+    for (uint64_t depth = 1; depth <= 5; depth++)
+    {
+        telemetry.addSample(now, depth, 10 - depth, depth * 12);
+    }
+
+    const std::vector<BufferSample> samples = telemetry.getSamples();
+    ASSERT_EQ(samples.size(), 3);
+    EXPECT_EQ(samples[0].pathQueueDepth, 3);
+    EXPECT_EQ(samples[1].pathQueueDepth, 4);
+    EXPECT_EQ(samples[2].pathQueueDepth, 5);
+
+    const BufferTelemetryStats stats = telemetry.getStats();
+    EXPECT_EQ(stats.samples, 5);
+    EXPECT_EQ(stats.maxPathQueueDepth, 5);
+    EXPECT_EQ(stats.maxQueuedMoveTime, 9);
+    EXPECT_EQ(stats.maxPruMemoryUsed, 60);
+}
+
+TEST(BufferTelemetry, CountsUnderrunsByCause)
+{
+    BufferTelemetry telemetry;
+
+    const BufferTelemetry::Clock::time_point now = BufferTelemetry::Clock::now();
+    telemetry.addUnderrun(now, UNDERRUN_PATH_QUEUE, 12);
+    telemetry.addUnderrun(now, UNDERRUN_PRU, 34);
+    telemetry.addUnderrun(now, UNDERRUN_PATH_QUEUE, 56);
+    telemetry.addPathQueueUnderflow();
+
+    const BufferTelemetryStats stats = telemetry.getStats();
+    EXPECT_EQ(stats.pathQueueUnderruns, 2);
+    EXPECT_EQ(stats.pruUnderruns, 1);
+    EXPECT_EQ(stats.pathQueueUnderflows, 1);
+
+    const std::vector<UnderrunEvent> underruns = telemetry.getUnderruns();
+    ASSERT_EQ(underruns.size(), 3);
+    EXPECT_EQ(underruns[0].cause, UNDERRUN_PATH_QUEUE);
+    EXPECT_EQ(underruns[0].gcodeLine, 12);
+    EXPECT_EQ(underruns[1].cause, UNDERRUN_PRU);
+    EXPECT_EQ(underruns[1].gcodeLine, 34);
+    EXPECT_EQ(underruns[2].gcodeLine, 56);
+}
+
+TEST(BufferTelemetry, KeepsTheLastUnderruns)
+{
+    BufferTelemetry telemetry;
+
+    const BufferTelemetry::Clock::time_point now = BufferTelemetry::Clock::now();
+    for (int64_t line = 0; line < BUFFER_TELEMETRY_UNDERRUN_EVENTS + 2; line++)
+    {
+        telemetry.addUnderrun(now, UNDERRUN_PRU, line);
+    }
+
+    const std::vector<UnderrunEvent> underruns = telemetry.getUnderruns();
+    ASSERT_EQ(underruns.size(), BUFFER_TELEMETRY_UNDERRUN_EVENTS);
+    EXPECT_EQ(underruns.front().gcodeLine, 2);
+    EXPECT_EQ(underruns.back().gcodeLine, BUFFER_TELEMETRY_UNDERRUN_EVENTS + 1);
+    EXPECT_EQ(telemetry.getStats().pruUnderruns, BUFFER_TELEMETRY_UNDERRUN_EVENTS + 2);
+}
+
+TEST(BufferTelemetry, Resets)
+{
+    BufferTelemetry telemetry;
+    telemetry.configure(0, 10);
+
+    const BufferTelemetry::Clock::time_point now = BufferTelemetry::Clock::now();
+    telemetry.addSample(now, 1, 2, 3);
+    telemetry.addUnderrun(now, UNDERRUN_PRU, 1);
+    telemetry.reset();
+
+    EXPECT_TRUE(telemetry.getSamples().empty());
+    EXPECT_TRUE(telemetry.getUnderruns().empty());
+    EXPECT_EQ(telemetry.getStats().samples, 0);
+    EXPECT_EQ(telemetry.getStats().pruUnderruns, 0);
+    EXPECT_EQ(telemetry.getStats().maxPathQueueDepth, 0);
+}
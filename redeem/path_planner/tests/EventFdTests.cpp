@@ -0,0 +1,40 @@
+#include "gmock/gmock.h"
+#include "gtest/gtest.h"
+
+#include <thread>
+
+#include "EventFd.h"
+
+TEST(EventFd, AddsUpSignalsBeforeTheWait)
+{
+    EventFd event;
+
+    event.signal();
+    event.signal(2);
+
+    EXPECT_EQ(event.wait(-1), 3);
+    EXPECT_EQ(event.take(), 0);
+}
+
+TEST(EventFd, TimesOutWithoutSignals)
+{
+    EventFd event;
+
+    EXPECT_EQ(event.wait(1), 0);
+}
+
+TEST(EventFd, WakesUpAWaitingThread)
+{
+    EventFd event;
+    uint64_t count = 0;
+
+    std::thread waiter([&event, &count]() {
+        count = event.wait(-1);
+    });
+
+    std::this_thread::sleep_for(std::chrono::milliseconds(1));
+    event.signal();
+    waiter.join();
+
+    EXPECT_EQ(count, 1);
+}
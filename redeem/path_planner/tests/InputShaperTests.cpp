@@ -0,0 +1,317 @@
+#include "gtest/gtest.h"
+
+#include <cmath>
+
+#include "InputShaper.h"
+#include "StepperCommand.h"
+
+struct InputShaperTests : ::testing::Test
+{
+    InputShaper shaper;
+
+    // the vibration the impulses leave of a resonance at frequency, relative to a single impulse
+    double residualVibration(double frequency, double damping)
+    {
+        const double omega = 2 * M_PI * frequency;
+        const double dampedOmega = omega * std::sqrt(1 - damping * damping);
+        const double lastDelay = shaper.impulses.back().delay;
+
+        double c = 0, s = 0;
+        for (const auto& impulse : shaper.impulses)
+        {
+            const double decay = std::exp(-damping * omega * (lastDelay - impulse.delay));
+            c += impulse.amplitude * decay * std::cos(dampedOmega * impulse.delay);
+            s += impulse.amplitude * decay * std::sin(dampedOmega * impulse.delay);
+        }
+
+        return std::hypot(c, s);
+    }
+
+    double totalAmplitude()
+    {
+        double total = 0;
+        for (const auto& impulse : shaper.impulses)
+        {
+            total += impulse.amplitude;
+        }
+        return total;
+    }
+
+    static std::vector<Step> makeSteps(int count, double interval, bool direction = true, unsigned char axis = X_AXIS)
+    {
+        std::vector<Step> steps;
+        for (int i = 0; i < count; i++)
+        {
+            steps.emplace_back(Step((i + 0.5) * interval, axis, direction));
+        }
+        return steps;
+    }
+
+    static int netSteps(const std::vector<Step>& steps)
+    {
+        int net = 0;
+        for (const Step& step : steps)
+        {
+            net += step.direction ? 1 : -1;
+        }
+        return net;
+    }
+
+    static void expectValidStepTimes(const std::vector<Step>& steps, double moveEndTime)
+    {
+        uint64_t lastStepTime = 0;
+        for (const Step& step : steps)
+        {
+            const uint64_t stepTime = roundStepTime(step.time);
+            EXPECT_EQ(step.axis, steps.front().axis);
+            EXPECT_NEAR(step.time * F_CPU_FLOAT, static_cast<double>(stepTime), 1e-3);
+            EXPECT_GE(stepTime, lastStepTime + MINIMUM_STEP_INTERVAL);
+            EXPECT_LE(stepTime, roundStepTime(moveEndTime));
+            lastStepTime = stepTime;
+        }
+    }
+};
+
+TEST_F(InputShaperTests, DisabledShaperKeepsSteps)
+{
+    shaper.configure(INPUT_SHAPER_NONE, 40, 0.1);
+    EXPECT_FALSE(shaper.isEnabled());
+
+    std::vector<Step> steps = makeSteps(10, 0.001);
+    EXPECT_EQ(shaper.shapeSteps(steps, X_AXIS, 0.01, false, false), 0.01);
+    EXPECT_EQ(steps.size(), 10);
+    EXPECT_FALSE(shaper.hasPendingSteps());
+}
+
+TEST_F(InputShaperTests, ZeroFrequencyDisablesShaper)
+{
+    shaper.configure(INPUT_SHAPER_ZV, 0, 0.1);
+    EXPECT_FALSE(shaper.isEnabled());
+}
+
+TEST_F(InputShaperTests, ShapersCancelResonance)
+{
+    shaper.configure(INPUT_SHAPER_ZV, 40, 0.1);
+    EXPECT_NEAR(totalAmplitude(), 1, 1e-12);
+    EXPECT_NEAR(residualVibration(40, 0.1), 0, 1e-12);
+    EXPECT_NEAR(shaper.getDuration(), 0.5 / (40 * std::sqrt(1 - 0.01)), 1e-12);
+
+    shaper.configure(INPUT_SHAPER_MZV, 40, 0.1);
+    EXPECT_NEAR(totalAmplitude(), 1, 1e-12);
+    EXPECT_NEAR(residualVibration(40, 0.1), 0, 1e-12);
+    EXPECT_NEAR(shaper.getDuration(), 0.75 / (40 * std::sqrt(1 - 0.01)), 1e-12);
+
+    // EI trades some vibration at the resonance for less vibration around it
+    shaper.configure(INPUT_SHAPER_EI, 40, 0.1);
+    EXPECT_NEAR(totalAmplitude(), 1, 1e-12);
+    EXPECT_LT(residualVibration(40, 0.1), 0.05);
+    EXPECT_LT(residualVibration(36, 0.1), 0.05);
+    EXPECT_LT(residualVibration(44, 0.1), 0.05);
+    EXPECT_NEAR(shaper.getDuration(), 1 / (40 * std::sqrt(1 - 0.01)), 1e-12);
+}
+
+TEST_F(InputShaperTests, FlushTakesEveryStep)
+{
+    shaper.configure(INPUT_SHAPER_ZV, 50, 0);
+
+    std::vector<Step> steps = makeSteps(100, 0.001);
+    const double moveEndTime = shaper.shapeSteps(steps, X_AXIS, 0.1, true, false);
+
+    // the last step is taken with the delayed half of the second to last step, as the delayed
+    // half of the last step only makes up for the half step the first step took too early
+    EXPECT_NEAR(moveEndTime, 0.0985 + 0.01 + MINIMUM_STEP_INTERVAL / F_CPU_FLOAT, 1e-9);
+    EXPECT_EQ(steps.size(), 100);
+    EXPECT_EQ(netSteps(steps), 100);
+    expectValidStepTimes(steps, moveEndTime);
+    EXPECT_FALSE(shaper.hasPendingSteps());
+}
+
+TEST_F(InputShaperTests, HalvesSpeedWhileImpulsesOverlap)
+{
+    // with no damping, ZV splits every step in half, so it takes two steps to take one
+    // until the delayed halves start arriving after half a period
+    shaper.configure(INPUT_SHAPER_ZV, 50, 0);
+
+    std::vector<Step> steps = makeSteps(100, 0.001);
+    shaper.shapeSteps(steps, X_AXIS, 0.1, true, false);
+
+    int stepsBeforeDelay = 0;
+    for (const Step& step : steps)
+    {
+        stepsBeforeDelay += step.time < 0.01 ? 1 : 0;
+    }
+    EXPECT_EQ(stepsBeforeDelay, 5);
+}
+
+TEST_F(InputShaperTests, CarriesStepsIntoNextMove)
+{
+    shaper.configure(INPUT_SHAPER_MZV, 40, 0.1);
+
+    std::vector<Step> first = makeSteps(100, 0.001);
+    EXPECT_EQ(shaper.shapeSteps(first, X_AXIS, 0.1, false, false), 0.1);
+    EXPECT_LT(first.size(), 100);
+    EXPECT_TRUE(shaper.hasPendingSteps());
+    expectValidStepTimes(first, 0.1);
+
+    std::vector<Step> second = makeSteps(50, 0.001);
+    EXPECT_EQ(shaper.shapeSteps(second, X_AXIS, 0.05, false, false), 0.05);
+    expectValidStepTimes(second, 0.05);
+
+    std::vector<Step> tail;
+    const double tailEndTime = shaper.shapeSteps(tail, X_AXIS, 0, true, false);
+    EXPECT_GT(tailEndTime, 0);
+    EXPECT_LE(tailEndTime, shaper.getDuration() + MINIMUM_STEP_INTERVAL / F_CPU_FLOAT + 1e-9);
+    expectValidStepTimes(tail, tailEndTime);
+
+    EXPECT_EQ(netSteps(first) + netSteps(second) + netSteps(tail), 150);
+    EXPECT_FALSE(shaper.hasPendingSteps());
+}
+
+TEST_F(InputShaperTests, TakesCarriedStepsAfterStartOfNextMove)
+{
+    shaper.configure(INPUT_SHAPER_ZV, 40, 0);
+
+    // the second step's first half rounds to the end of the move, so its step is carried over
+    std::vector<Step> first = { Step(0.001, X_AXIS, true), Step(0.014999, X_AXIS, true) };
+    shaper.shapeSteps(first, X_AXIS, 0.015, false, false);
+    EXPECT_EQ(first.size(), 1);
+    expectValidStepTimes(first, 0.015);
+
+    std::vector<Step> second;
+    const double moveEndTime = shaper.shapeSteps(second, X_AXIS, 0.05, true, false);
+    ASSERT_FALSE(second.empty());
+    EXPECT_EQ(roundStepTime(second.front().time), MINIMUM_STEP_INTERVAL);
+    expectValidStepTimes(second, moveEndTime);
+
+    EXPECT_EQ(netSteps(first) + netSteps(second), 2);
+}
+
+TEST_F(InputShaperTests, KeepsMinimumStepInterval)
+{
+    shaper.configure(INPUT_SHAPER_EI, 100, 0.05);
+
+    // steps as fast as the PRU can take them
+    const double interval = MINIMUM_STEP_INTERVAL / F_CPU_FLOAT;
+    std::vector<Step> steps = makeSteps(1000, interval);
+    const double moveEndTime = shaper.shapeSteps(steps, X_AXIS, 1000 * interval, true, false);
+
+    EXPECT_EQ(netSteps(steps), 1000);
+    expectValidStepTimes(steps, moveEndTime);
+}
+
+TEST_F(InputShaperTests, FollowsDirectionChanges)
+{
+    shaper.configure(INPUT_SHAPER_ZV, 40, 0.1);
+
+    std::vector<Step> forward = makeSteps(20, 0.001);
+    shaper.shapeSteps(forward, X_AXIS, 0.02, false, false);
+
+    std::vector<Step> backward = makeSteps(20, 0.001, false);
+    const double moveEndTime = shaper.shapeSteps(backward, X_AXIS, 0.02, true, false);
+    expectValidStepTimes(backward, moveEndTime);
+
+    EXPECT_EQ(netSteps(forward) + netSteps(backward), 0);
+}
+
+TEST_F(InputShaperTests, ReconfiguringDropsPendingSteps)
+{
+    shaper.configure(INPUT_SHAPER_ZV, 40, 0.1);
+
+    std::vector<Step> steps = makeSteps(100, 0.001);
+    shaper.shapeSteps(steps, X_AXIS, 0.1, false, false);
+    EXPECT_TRUE(shaper.hasPendingSteps());
+
+    shaper.configure(INPUT_SHAPER_ZV, 40, 0.1);
+    EXPECT_FALSE(shaper.hasPendingSteps());
+}
+
+TEST_F(InputShaperTests, ZeroCoefficientDisablesPressureAdvance)
+{
+    shaper.setPressureAdvance(0, 0.04);
+    EXPECT_FALSE(shaper.isEnabled());
+
+    shaper.setPressureAdvance(0.02, 0.04);
+    EXPECT_TRUE(shaper.isEnabled());
+    EXPECT_NEAR(shaper.getDuration(), 0.04, 1e-12);
+}
+
+TEST_F(InputShaperTests, AdvancesSteadyExtrusion)
+{
+    shaper.setPressureAdvance(0.02, 0.04);
+
+    // at 1000 steps/s, the extruder runs 0.02s * 1000 steps/s = 20 steps ahead once the window is full
+    std::vector<Step> steps = makeSteps(200, 0.001, true, E_AXIS);
+    EXPECT_EQ(shaper.shapeSteps(steps, E_AXIS, 0.2, false, true), 0.2);
+    EXPECT_NEAR(netSteps(steps), 220, 1);
+    expectValidStepTimes(steps, 0.2);
+
+    // and takes those steps back after the extrusion stops
+    std::vector<Step> tail;
+    const double tailEndTime = shaper.shapeSteps(tail, E_AXIS, 0, true, true);
+    EXPECT_NEAR(netSteps(tail), -20, 1);
+    EXPECT_EQ(netSteps(steps) + netSteps(tail), 200);
+    EXPECT_LE(tailEndTime, 0.04 + MINIMUM_STEP_INTERVAL / F_CPU_FLOAT + 1e-9);
+    expectValidStepTimes(tail, tailEndTime);
+}
+
+TEST_F(InputShaperTests, AdvanceRampsUpOverSmoothTime)
+{
+    shaper.setPressureAdvance(0.02, 0.04);
+
+    std::vector<Step> steps = makeSteps(200, 0.001, true, E_AXIS);
+    shaper.shapeSteps(steps, E_AXIS, 0.2, true, true);
+
+    // halfway through the window, the extruder is half of the advance ahead
+    int stepsBeforeHalfWindow = 0;
+    for (const Step& step : steps)
+    {
+        stepsBeforeHalfWindow += step.time < 0.02 ? (step.direction ? 1 : -1) : 0;
+    }
+    EXPECT_NEAR(stepsBeforeHalfWindow, 20 + 10, 1);
+}
+
+TEST_F(InputShaperTests, OnlyAdvancesFlaggedMoves)
+{
+    shaper.setPressureAdvance(0.02, 0.04);
+
+    // a retract keeps its steps
+    std::vector<Step> steps = makeSteps(10, 0.001, false, E_AXIS);
+    const double moveEndTime = shaper.shapeSteps(steps, E_AXIS, 0.01, true, false);
+
+    EXPECT_EQ(moveEndTime, 0.01);
+    ASSERT_EQ(steps.size(), 10);
+    for (int i = 0; i < 10; i++)
+    {
+        EXPECT_EQ(steps[i].time, roundStepTime((i + 0.5) * 0.001) / F_CPU_FLOAT);
+        EXPECT_FALSE(steps[i].direction);
+    }
+}
+
+TEST_F(InputShaperTests, TakesSeveralAdvancedStepsAtOnce)
+{
+    // every step adds 2.25 steps right away and takes 1.25 back 40ms later
+    shaper.setPressureAdvance(0.05, 0.04);
+
+    std::vector<Step> steps = makeSteps(100, 0.001, true, E_AXIS);
+    const double moveEndTime = shaper.shapeSteps(steps, E_AXIS, 0.1, true, true);
+
+    EXPECT_EQ(netSteps(steps), 100);
+    expectValidStepTimes(steps, moveEndTime);
+}
+
+TEST_F(InputShaperTests, AdvancesShapedSteps)
+{
+    shaper.configure(INPUT_SHAPER_ZV, 50, 0);
+    shaper.setPressureAdvance(0.02, 0.04);
+    EXPECT_NEAR(shaper.getDuration(), 0.01 + 0.04, 1e-12);
+
+    std::vector<Step> steps = makeSteps(200, 0.001, true, E_AXIS);
+    EXPECT_EQ(shaper.shapeSteps(steps, E_AXIS, 0.2, false, true), 0.2);
+
+    // the shaper holds back half of the last 10ms of steps
+    EXPECT_NEAR(netSteps(steps), 220 - 5, 1);
+
+    // reconfiguring the shaper keeps the pressure advance
+    shaper.configure(INPUT_SHAPER_MZV, 40, 0.1);
+    EXPECT_NEAR(shaper.getDuration(), 0.75 / (40 * std::sqrt(1 - 0.01)) + 0.04, 1e-12);
+}
@@ -0,0 +1,57 @@
+#include "gmock/gmock.h"
+#include "gtest/gtest.h"
+
+#include "LatencyHistogram.h"
+
+TEST(LatencyHistogram, CountsDurationsInDoublingBuckets)
+{
+    EXPECT_EQ(LatencyHistogram::bucketIndex(0), 0);
+    EXPECT_EQ(LatencyHistogram::bucketIndex(999), 0);
+    EXPECT_EQ(LatencyHistogram::bucketIndex(1000), 1);
+    EXPECT_EQ(LatencyHistogram::bucketIndex(1999), 1);
+    EXPECT_EQ(LatencyHistogram::bucketIndex(2000), 2);
+    EXPECT_EQ(LatencyHistogram::bucketIndex(1000000), 10);
+    EXPECT_EQ(LatencyHistogram::bucketIndex(UINT64_MAX), LATENCY_HISTOGRAM_BUCKETS - 1);
+}
+
+TEST(LatencyHistogram, RecordsDurations)
+{
+    LatencyHistogram histogram;
+
+    histogram.record(std::chrono::microseconds(3));
+    histogram.record(std::chrono::microseconds(3));
+    histogram.record(std::chrono::milliseconds(1));
+
+    const LatencyHistogramStats stats = histogram.getStats();
+    EXPECT_EQ(stats.count, 3);
+    EXPECT_EQ(stats.totalTime, 1006000);
+    EXPECT_EQ(stats.maxTime, 1000000);
+    ASSERT_EQ(stats.buckets.size(), LATENCY_HISTOGRAM_BUCKETS);
+    EXPECT_EQ(stats.buckets[2], 2);
+    EXPECT_EQ(stats.buckets[10], 1);
+}
+
+TEST(LatencyHistogram, Resets)
+{
+    LatencyHistogram histogram;
+
+    histogram.record(std::chrono::microseconds(3));
+    histogram.reset();
+
+    const LatencyHistogramStats stats = histogram.getStats();
+    EXPECT_EQ(stats.count, 0);
+    EXPECT_EQ(stats.totalTime, 0);
+    EXPECT_EQ(stats.maxTime, 0);
+    EXPECT_EQ(stats.buckets[2], 0);
+}
+
+TEST(LatencyHistogram, TimesScopes)
+{
+    LatencyHistogram histogram;
+
+    {
+        LatencyHistogram::ScopedTimer timer(histogram);
+    }
+
+    EXPECT_EQ(histogram.getStats().count, 1);
+}
@@ -2,6 +2,7 @@
 
 #include "gtest/gtest.h"
 
+#include <cmath>
 #include <numeric>
 
 #include "PathOptimizer.h"
@@ -53,6 +54,11 @@ struct PathOptimizerTests : ::testing::Test
     {
         return optimizer.calculateJunctionSpeed(firstPath, secondPath);
     }
+
+    double calculateSafeSpeed(const Path& path)
+    {
+        return optimizer.calculateSafeSpeed(path);
+    }
 };
 
 TEST_F(PathOptimizerTests, OneMoveAtHalfMaxSpeedJump)
@@ -359,3 +365,180 @@ TEST_F(PathOptimizerTests, 135DegreeAngle)
     EXPECT_DOUBLE_EQ(firstSpeed, 0.005);
     EXPECT_DOUBLE_EQ(secondSpeed, 0.0070710678118654762);
 }
+
+TEST_F(PathOptimizerTests, JunctionDeviationStraightJunction)
+{
+    optimizer.setJunctionDeviation(0.001);
+
+    Path firstPath = builder.makePath(0.2, 0, 0, 0.2);
+    Path secondPath = builder.makePath(0.2, 0, 0, 0.1);
+
+    auto [firstSpeed, secondSpeed] = calculateJunctionSpeed(firstPath, secondPath);
+
+    EXPECT_DOUBLE_EQ(firstSpeed, 0.1);
+    EXPECT_DOUBLE_EQ(secondSpeed, 0.1);
+}
+
+TEST_F(PathOptimizerTests, JunctionDeviationReversal)
+{
+    optimizer.setJunctionDeviation(0.001);
+
+    Path firstPath = builder.makePath(0.2, 0, 0, 0.2);
+    Path secondPath = builder.makePath(-0.2, 0, 0, 0.2);
+
+    auto [firstSpeed, secondSpeed] = calculateJunctionSpeed(firstPath, secondPath);
+
+    EXPECT_DOUBLE_EQ(firstSpeed, 0.005);
+    EXPECT_DOUBLE_EQ(secondSpeed, 0.005);
+}
+
+TEST_F(PathOptimizerTests, JunctionDeviationRightAngle)
+{
+    optimizer.setJunctionDeviation(0.001);
+
+    Path firstPath = builder.makePath(0.2, 0, 0, 0.2);
+    Path secondPath = builder.makePath(0, 0.2, 0, 0.2);
+
+    auto [firstSpeed, secondSpeed] = calculateJunctionSpeed(firstPath, secondPath);
+
+    // sqrt(accel * deviation * sin(45) / (1 - sin(45)))
+    EXPECT_DOUBLE_EQ(firstSpeed, 0.015537739740300375);
+    EXPECT_DOUBLE_EQ(secondSpeed, 0.015537739740300375);
+}
+
+TEST_F(PathOptimizerTests, JunctionDeviationIsFasterOnShallowAngles)
+{
+    Path firstPath = builder.makePath(0.1, 0, 0, 0.2);
+    Path secondPath = builder.makePath(0.1, 0.01, 0, 0.2);
+
+    auto [speedJumpsSpeed, speedJumpsSecondSpeed] = calculateJunctionSpeed(firstPath, secondPath);
+    EXPECT_DOUBLE_EQ(speedJumpsSecondSpeed, speedJumpsSpeed);
+
+    optimizer.setJunctionDeviation(0.001);
+
+    auto [junctionDeviationSpeed, junctionDeviationSecondSpeed] = calculateJunctionSpeed(firstPath, secondPath);
+
+    // the max speed jumps limit Y to 0.01m/s, which halves the speed
+    EXPECT_DOUBLE_EQ(speedJumpsSpeed, 0.1004987562112089);
+    EXPECT_DOUBLE_EQ(junctionDeviationSpeed, 0.2);
+    EXPECT_DOUBLE_EQ(junctionDeviationSecondSpeed, 0.2);
+}
+
+TEST_F(PathOptimizerTests, ThreeMovesThatFormSCurve)
+{
+    builder.maxJerkMPerCubicSecond = VectorN(1.0, 1.0, 1.0, 1.0, 1.0, 1.0, 1.0, 1.0);
+
+    addPath(builder.makePath(0.1, 0, 0, 1.0));
+    addPath(builder.makePath(0.1, 0, 0, 1.0));
+    addPath(builder.makePath(0.1, 0, 0, 1.0));
+    run();
+
+    // ramping the acceleration takes a / j = 0.1s longer, so instead of sqrt(v0^2 + 2*a*d) we reach
+    // the solution of vf^2 + (a^2 / j) * vf + (a^2 / j) * v0 - v0^2 - 2*a*d = 0
+    const double reachableSpeed = (std::sqrt(0.08) - 0.01) / 2;
+
+    EXPECT_DOUBLE_EQ(paths[0].getStartSpeed(), 0.005);
+    EXPECT_DOUBLE_EQ(paths[0].getEndSpeed(), reachableSpeed);
+    EXPECT_DOUBLE_EQ(paths[1].getStartSpeed(), reachableSpeed + 0.01);
+    EXPECT_DOUBLE_EQ(paths[1].getEndSpeed(), reachableSpeed + 0.01);
+    EXPECT_DOUBLE_EQ(paths[2].getStartSpeed(), reachableSpeed);
+    EXPECT_DOUBLE_EQ(paths[2].getEndSpeed(), 0.005);
+}
+
+struct PathOptimizerModelTests : PathOptimizerTests, ::testing::WithParamInterface<std::tuple<double, double>>
+{
+    PathOptimizerModelTests()
+    {
+        optimizer.setJunctionDeviation(std::get<0>(GetParam()));
+
+        const double jerk = std::get<1>(GetParam());
+        builder.maxJerkMPerCubicSecond = VectorN(jerk, jerk, jerk, jerk, jerk, jerk, jerk, jerk);
+    }
+
+    void addPaths(const std::vector<Vector3>& moves, double speed)
+    {
+        for (const Vector3& move : moves)
+        {
+            addPath(builder.makePath(move.x, move.y, move.z, speed));
+        }
+    }
+
+    void checkInvariants(size_t numPaths)
+    {
+        run();
+
+        EXPECT_DOUBLE_EQ(paths[0].getStartSpeed(), calculateSafeSpeed(paths[0]));
+        EXPECT_DOUBLE_EQ(paths[numPaths - 1].getEndSpeed(), calculateSafeSpeed(paths[numPaths - 1]));
+
+        for (size_t i = 0; i < numPaths; i++)
+        {
+            const Path& path = paths[i];
+            const double accelDistance2 = 2 * path.getAcceleration() * path.getDistance();
+
+            EXPECT_GE(path.getStartSpeed(), calculateSafeSpeed(path) - NEGLIGIBLE_ERROR);
+            EXPECT_GE(path.getEndSpeed(), calculateSafeSpeed(path) - NEGLIGIBLE_ERROR);
+            EXPECT_LE(path.getStartSpeed(), path.getFullSpeed() + NEGLIGIBLE_ERROR);
+            EXPECT_LE(path.getEndSpeed(), path.getFullSpeed() + NEGLIGIBLE_ERROR);
+
+            // each path can reach its end speed from its start speed
+            EXPECT_LE(path.getEndSpeed() * path.getEndSpeed(), path.getStartSpeed() * path.getStartSpeed() + accelDistance2 + NEGLIGIBLE_ERROR);
+            EXPECT_LE(path.getStartSpeed() * path.getStartSpeed(), path.getEndSpeed() * path.getEndSpeed() + accelDistance2 + NEGLIGIBLE_ERROR);
+            EXPECT_LE(path.getEndSpeed(), path.getMaxReachableSpeed(path.getStartSpeed()) + NEGLIGIBLE_ERROR);
+            EXPECT_LE(path.getStartSpeed(), path.getMaxReachableSpeed(path.getEndSpeed()) + NEGLIGIBLE_ERROR);
+        }
+
+        for (size_t i = 1; i < numPaths; i++)
+        {
+            // junctions are never faster than the junction speed calculation allows
+            auto [entrySpeed, exitSpeed] = calculateJunctionSpeed(paths[i - 1], paths[i]);
+            EXPECT_LE(paths[i - 1].getEndSpeed(), entrySpeed + NEGLIGIBLE_ERROR);
+            EXPECT_LE(paths[i].getStartSpeed(), exitSpeed + NEGLIGIBLE_ERROR);
+        }
+
+        for (size_t i = 0; i < numPaths; i++)
+        {
+            // the profile fits the move's speeds
+            EXPECT_GT(paths[i].runFinalStepCalculations(), 0);
+        }
+    }
+};
+
+TEST_P(PathOptimizerModelTests, StraightLine)
+{
+    addPaths({ Vector3(0.1, 0, 0), Vector3(0.1, 0, 0), Vector3(0.1, 0, 0), Vector3(0.1, 0, 0) }, 1.0);
+    checkInvariants(4);
+}
+
+TEST_P(PathOptimizerModelTests, Reversal)
+{
+    addPaths({ Vector3(0.1, 0, 0), Vector3(-0.1, 0, 0), Vector3(0.1, 0, 0) }, 0.2);
+    checkInvariants(3);
+}
+
+TEST_P(PathOptimizerModelTests, Zigzag)
+{
+    addPaths({ Vector3(0.05, 0.05, 0), Vector3(0.05, -0.05, 0), Vector3(0.05, 0.05, 0), Vector3(0.05, -0.05, 0), Vector3(0.05, 0.05, 0) }, 0.5);
+    checkInvariants(5);
+}
+
+TEST_P(PathOptimizerModelTests, Polygon)
+{
+    std::vector<Vector3> moves;
+    for (int i = 0; i < 9; i++)
+    {
+        const double angle = 2 * M_PI * i / 9;
+        moves.push_back(Vector3(0.01 * std::cos(angle), 0.01 * std::sin(angle), 0));
+    }
+
+    addPaths(moves, 0.5);
+    checkInvariants(9);
+}
+
+TEST_P(PathOptimizerModelTests, ShortAndLongMoves)
+{
+    addPaths({ Vector3(0.001, 0, 0), Vector3(0.2, 0.01, 0), Vector3(0.001, 0.001, 0), Vector3(0, 0.2, 0.01) }, 1.0);
+    checkInvariants(4);
+}
+
+INSTANTIATE_TEST_SUITE_P(CorneringModels, PathOptimizerModelTests,
+    ::testing::Combine(::testing::Values(0.0, 0.00005, 0.001), ::testing::Values(0.0, 1.0)));
@@ -3,6 +3,7 @@
 #include "gmock/gmock.h"
 #include "gtest/gtest.h"
 
+#include <algorithm>
 #include <condition_variable>
 #include <cstring>
 #include <mutex>
@@ -35,11 +36,19 @@ public:
     uint64_t totalTime = 0;
     uint32_t numberOfBlocksPushed = 0;
 
+    // blocks from reserveBlock have an extra command at the end that mustn't be written to
+    std::vector<SteppersCommand> reservedBlock;
+    size_t maxCommandsPerReservation = SIZE_MAX;
+    bool wroteOutsideBlock = false;
+
+    // what the PRU reports as queued, it never runs anything
+    std::atomic<uint64_t> queuedMovesTime{ 0 };
+    std::atomic<size_t> memoryUsed{ 0 };
+
     MOCK_METHOD2(initPRU, bool(const std::string&, const std::string&));
     MOCK_METHOD0(run, void());
 
     MOCK_METHOD0(getFreeMemory, size_t());
-    MOCK_METHOD0(getTotalQueuedMovesTime, uint64_t());
     MOCK_METHOD0(suspend, void());
     MOCK_METHOD0(resume, void());
     MOCK_METHOD0(reset, void());
@@ -71,6 +80,24 @@ public:
         onBlockPushed.notify_all();
     }
 
+    uint8_t* reserveBlock(size_t maxBlockLen, unsigned int unit, size_t& blockLen) override
+    {
+        blockLen = std::min(maxBlockLen, maxCommandsPerReservation * unit);
+
+        SteppersCommand guard;
+        std::memset(&guard, 0xff, sizeof(guard));
+        reservedBlock.assign(blockLen / unit + 1, guard);
+
+        return reinterpret_cast<uint8_t*>(reservedBlock.data());
+    }
+
+    void commitBlock(size_t blockLen, unsigned int unit, uint64_t time, SyncCallback* callback) override
+    {
+        wroteOutsideBlock |= reservedBlock.back().step != 0xff || reservedBlock.back().delay != 0xffffffff;
+
+        pushBlock(reinterpret_cast<uint8_t*>(reservedBlock.data()), blockLen, unit, time, callback);
+    }
+
     void runThread() override
     {
     }
@@ -88,6 +115,16 @@ public:
         return 128;
     }
 
+    uint64_t getTotalQueuedMovesTime() override
+    {
+        return queuedMovesTime;
+    }
+
+    size_t getMemoryUsed() override
+    {
+        return memoryUsed;
+    }
+
     void waitForBlock()
     {
         std::unique_lock<std::mutex> lock(mutex);
@@ -118,11 +155,19 @@ public:
         const bool wait,
         const double moveEndTime,
         std::array<std::vector<Step>, NUM_AXES>& steps,
-        std::unique_ptr<SteppersCommand[]> const& commands,
-        const size_t commandsLength,
+        const size_t maxCommandsPerBlock,
         IntVectorN* probeDistanceTraveled)
     {
-        planner.runMove(moveMask, cancellableMask, sync, wait, moveEndTime, steps, commands, commandsLength, probeDistanceTraveled);
+        std::array<VectorStepSource, NUM_AXES> sources;
+        std::array<StepSource*, NUM_AXES> sourcePointers;
+
+        for (int i = 0; i < NUM_AXES; i++)
+        {
+            sources[i] = VectorStepSource(steps[i]);
+            sourcePointers[i] = &sources[i];
+        }
+
+        planner.runMove(moveMask, cancellableMask, sync, wait, moveEndTime, sourcePointers, maxCommandsPerBlock, probeDistanceTraveled);
     }
 };
 
@@ -158,13 +203,11 @@ TEST_F(PathPlannerRunMoveTest, WritesWithinBufferLength)
     steps[X_AXIS].push_back(Step(0.2, X_AXIS, true));
 
     const size_t commandLength = 2;
-    std::unique_ptr<SteppersCommand[]> commands = std::make_unique<SteppersCommand[]>(commandLength + 1);
 
-    std::memset(&commands[commandLength], 0xffffffff, sizeof(SteppersCommand));
+    runMove(1, 0, false, false, 0.3, steps, commandLength, nullptr);
 
-    runMove(1, 0, false, false, 0.3, steps, commands, commandLength, nullptr);
-
-    EXPECT_EQ(commands[commandLength].step, 0xff);
+    EXPECT_EQ(pru.numberOfBlocksPushed, 2);
+    EXPECT_FALSE(pru.wroteOutsideBlock);
 }
 
 TEST_F(PathPlannerRunMoveTest, PushesCorrectNumberOfBlocks)
@@ -175,9 +218,8 @@ TEST_F(PathPlannerRunMoveTest, PushesCorrectNumberOfBlocks)
     steps[X_AXIS].push_back(Step(0.2, X_AXIS, true));
 
     const size_t commandLength = 2;
-    std::unique_ptr<SteppersCommand[]> commands = std::make_unique<SteppersCommand[]>(commandLength);
 
-    runMove(1, 0, false, false, 0.3, steps, commands, commandLength, nullptr);
+    runMove(1, 0, false, false, 0.3, steps, commandLength, nullptr);
 
     EXPECT_EQ(pru.stepperCommands.size(), 3); // one for opening wait, then two steps
 }
@@ -193,9 +235,8 @@ TEST_F(PathPlannerRunMoveTest, CalculatesWaitsCorrectly)
     steps[X_AXIS].push_back(Step(0.15, X_AXIS, true));
 
     const size_t commandLength = 2;
-    std::unique_ptr<SteppersCommand[]> commands = std::make_unique<SteppersCommand[]>(commandLength);
 
-    runMove(1, 0, false, false, 0.21, steps, commands, commandLength, nullptr);
+    runMove(1, 0, false, false, 0.21, steps, commandLength, nullptr);
 
     auto& stepsTaken = pru.stepperCommands;
     ASSERT_EQ(stepsTaken.size(), 6);
@@ -226,9 +267,8 @@ TEST_F(PathPlannerRunMoveTest, WrapsStepListsCorrectly)
     EXPECT_EQ(steps[X_AXIS].size(), 100);
 
     const size_t commandLength = 10;
-    std::unique_ptr<SteppersCommand[]> commands = std::make_unique<SteppersCommand[]>(commandLength);
 
-    runMove(0x1, 0, false, false, 1.0, steps, commands, commandLength, nullptr);
+    runMove(0x1, 0, false, false, 1.0, steps, commandLength, nullptr);
 
     // we're moving at one step every 0.01 seconds, which is 2,000,000 PRU cycles
     const SteppersCommand openingWait = { 0, 0, 0, 0, 1000000 };
@@ -251,6 +291,76 @@ TEST_F(PathPlannerRunMoveTest, WrapsStepListsCorrectly)
     }
 }
 
+TEST_F(PathPlannerRunMoveTest, FillsShorterReservedBlocks)
+{
+    std::array<std::vector<Step>, NUM_AXES> steps;
+
+    steps[X_AXIS].push_back(Step(0.01, X_AXIS, true));
+    steps[X_AXIS].push_back(Step(0.03, X_AXIS, true));
+    steps[X_AXIS].push_back(Step(0.06, X_AXIS, true));
+    steps[X_AXIS].push_back(Step(0.10, X_AXIS, true));
+    steps[X_AXIS].push_back(Step(0.15, X_AXIS, true));
+
+    // the PRU has less room in one piece than the planner asks for
+    pru.maxCommandsPerReservation = 4;
+
+    runMove(1, 0, false, false, 0.21, steps, 10, nullptr);
+
+    ASSERT_EQ(pru.stepperCommands.size(), 6);
+    EXPECT_EQ(pru.numberOfBlocksPushed, 2);
+    EXPECT_FALSE(pru.wroteOutsideBlock);
+    EXPECT_EQ(pru.stepperCommands[5].delay, 0.06 * F_CPU);
+    EXPECT_DOUBLE_EQ(static_cast<double>(pru.blockTimes[0]), (0.01 + 0.02 + 0.03 + 0.04) * F_CPU);
+}
+
+TEST_F(PathPlannerRunMoveTest, RepeatsIdenticalCommands)
+{
+    std::array<std::vector<Step>, NUM_AXES> steps;
+
+    for (int stepIndex = 0; stepIndex < 100; stepIndex++)
+    {
+        steps[X_AXIS].push_back(Step(0.01 * stepIndex + 0.005, X_AXIS, true));
+    }
+
+    const size_t commandLength = 10;
+
+    planner.setStepCommandRepeats(true);
+    runMove(0x1, 0, false, false, 1.0, steps, commandLength, nullptr);
+
+    // the 99 steps between the opening wait and the last step run as 32 + 32 + 32 + 3
+    const SteppersCommand openingWait = { 0, 0, 0, 0, 1000000 };
+    const SteppersCommand fullRun = { 1, 1, 0, 31 << STEPPER_COMMAND_OPTION_REPEAT_SHIFT, 2000000 };
+    const SteppersCommand shortRun = { 1, 1, 0, 2 << STEPPER_COMMAND_OPTION_REPEAT_SHIFT, 2000000 };
+    const SteppersCommand endStep = { 1, 1, 0, 0, 1000000 };
+
+    auto& stepCommands = pru.stepperCommands;
+
+    ASSERT_EQ(stepCommands.size(), 6);
+    EXPECT_EQ(stepCommands[0], openingWait);
+    EXPECT_EQ(stepCommands[1], fullRun);
+    EXPECT_EQ(stepCommands[2], fullRun);
+    EXPECT_EQ(stepCommands[3], fullRun);
+    EXPECT_EQ(stepCommands[4], shortRun);
+    EXPECT_EQ(stepCommands[5], endStep);
+}
+
+TEST_F(PathPlannerRunMoveTest, DoesNotRepeatCancellableCommands)
+{
+    std::array<std::vector<Step>, NUM_AXES> steps;
+
+    for (int stepIndex = 0; stepIndex < 10; stepIndex++)
+    {
+        steps[X_AXIS].push_back(Step(0.01 * stepIndex + 0.005, X_AXIS, true));
+    }
+
+    const size_t commandLength = 20;
+
+    planner.setStepCommandRepeats(true);
+    runMove(0x1, 0x1, false, false, 0.1, steps, commandLength, nullptr);
+
+    EXPECT_EQ(pru.stepperCommands.size(), 11);
+}
+
 TEST_F(PathPlannerRunMoveTest, SpecifiesCorrectBlockTimes)
 {
     std::array<std::vector<Step>, NUM_AXES> steps;
@@ -262,9 +372,8 @@ TEST_F(PathPlannerRunMoveTest, SpecifiesCorrectBlockTimes)
     steps[X_AXIS].push_back(Step(0.15, X_AXIS, true));
 
     const size_t commandLength = 2;
-    std::unique_ptr<SteppersCommand[]> commands = std::make_unique<SteppersCommand[]>(commandLength);
 
-    runMove(1, 0, false, false, 0.21, steps, commands, commandLength, nullptr);
+    runMove(1, 0, false, false, 0.21, steps, commandLength, nullptr);
 
     auto& blockTimes = pru.blockTimes;
     ASSERT_EQ(blockTimes.size(), 3);
@@ -285,6 +394,11 @@ public:
         : alarmCallback()
         , pru()
         , planner(1024, alarmCallback, pru)
+    {
+        configure(planner);
+    }
+
+    static void configure(PathPlanner& planner)
     {
         planner.setState(VectorN());
         planner.setMaxSpeeds(VectorN(1.0, 1.0, 1.0, 1.0, 1.0, 1.0, 1.0, 1.0));
@@ -297,6 +411,11 @@ public:
     {
         return planner.pathQueue.getQueuedMoveTime();
     }
+
+    size_t getAvailablePathSlots()
+    {
+        return planner.pathQueue.availablePathSlots();
+    }
 };
 
 TEST_F(PathPlannerTest, RunsSimplePath)
@@ -518,4 +637,439 @@ TEST_F(PathPlannerTest, SetsCarryBlockedSteppersFlag)
     }
 
     planner.stopThread(true);
-}
\ No newline at end of file
+}
+
+TEST_F(PathPlannerTest, TracksIdealStateOfLinearMoves)
+{
+    planner.setSoftEndstopsMin(VectorN(-1, -1, -1, -1, -1, -1, -1, -1));
+    planner.setSoftEndstopsMax(VectorN(1, 1, 1, 1, 1, 1, 1, 1));
+
+    // absolute X and E, with the extrude factor applied to E
+    planner.queueLinearMove(0b1001, VectorN(0.0005, 0, 0, 0.0002), 0, 0.001, 1.0, 1.0, 0.5, 0);
+    EXPECT_FALSE(planner.getLastQueueMoveStatus());
+    EXPECT_EQ(planner.getIdealState(), VectorN(0.0005, 0, 0, 0.0001));
+
+    // relative Y, absolute X
+    planner.queueLinearMove(0b011, VectorN(0.0003, 0.0002, 0), 0b010, 0.001, 1.0, 1.0, 1.0, 0);
+    planner.queueLinearMove(0b010, VectorN(0, 0.0002, 0), 0b010, 0.001, 1.0, 1.0, 1.0, 0);
+    EXPECT_EQ(planner.getIdealState(), VectorN(0.0003, 0.0004, 0, 0.0001));
+
+    // babystepping moves Z without changing the ideal position
+    planner.queueLinearMove(0b100, VectorN(0, 0, 0.0001), 0, 0.001, 1.0, 1.0, 1.0, 0.0001);
+    EXPECT_EQ(planner.getIdealState(), VectorN(0.0003, 0.0004, 0.0001, 0.0001));
+    EXPECT_EQ(planner.getState(), VectorN(0.0003, 0.0004, 0.0002, 0.0001));
+
+    // a rejected move leaves the ideal position alone
+    EXPECT_CALL(alarmCallback, call(8, ::testing::_, ::testing::_));
+    planner.queueLinearMove(0b001, VectorN(2, 0, 0), 0, 0.001, 1.0, 1.0, 1.0, 0);
+    EXPECT_TRUE(planner.getLastQueueMoveStatus());
+    EXPECT_EQ(planner.getIdealState(), VectorN(0.0003, 0.0004, 0.0001, 0.0001));
+}
+
+TEST_F(PathPlannerTest, QueuesBatchOfMoves)
+{
+    planner.setSoftEndstopsMin(VectorN(-1, -1, -1, -1, -1, -1, -1, -1));
+    planner.setSoftEndstopsMax(VectorN(1, 1, 1, 1, 1, 1, 1, 1));
+
+    std::vector<double> positions;
+    for (const VectorN& position : {
+             VectorN(0.0005, 0, 0),
+             VectorN(0.0005, 0, 0), // no move
+             VectorN(0.0005, 0.0005, 0),
+             VectorN(2, 0, 0), // outside the soft endstops
+             VectorN(0, 0, 0),
+         })
+    {
+        positions.insert(positions.end(), position.values, position.values + NUM_AXES);
+    }
+    const double speeds[] = { 0.001, 0.001, 0.001, 0.001, 0.001 };
+    const double accels[] = { 1, 1, 1, 1, 1 };
+    const int flags[] = { MOVE_FLAG_SOFT_ENDSTOPS, MOVE_FLAG_SOFT_ENDSTOPS, MOVE_FLAG_SOFT_ENDSTOPS,
+        MOVE_FLAG_SOFT_ENDSTOPS, MOVE_FLAG_SOFT_ENDSTOPS };
+
+    EXPECT_CALL(alarmCallback, call(8, ::testing::_, ::testing::_));
+    const auto status = planner.queueMoves(positions.data(), 5, NUM_AXES, speeds, 5, accels, 5, flags, 5);
+
+    EXPECT_EQ(status, std::vector<uint8_t>({ false, true, false, true, true }));
+    EXPECT_TRUE(planner.getLastQueueMoveStatus());
+    EXPECT_EQ(planner.getState(), VectorN(0.0005, 0.0005, 0));
+    EXPECT_EQ(getQueuedMoveTime(), 1.0 * F_CPU);
+}
+
+TEST_F(PathPlannerTest, RejectsMismatchedBatchSizes)
+{
+    const double positions[NUM_AXES * 2] = { 0 };
+    const double values[] = { 1, 1 };
+    const int flags[] = { 0, 0 };
+
+    EXPECT_THROW(planner.queueMoves(positions, 2, NUM_AXES - 1, values, 2, values, 2, flags, 2), InputSizeError);
+    EXPECT_THROW(planner.queueMoves(positions, 2, NUM_AXES, values, 1, values, 2, flags, 2), InputSizeError);
+    EXPECT_THROW(planner.queueMoves(positions, 2, NUM_AXES, values, 2, values, 2, flags, 1), InputSizeError);
+}
+
+TEST_F(PathPlannerTest, QueuesArcFromIdealState)
+{
+    planner.setSoftEndstopsMin(VectorN(-1, -1, -1, -1, -1, -1, -1, -1));
+    planner.setSoftEndstopsMax(VectorN(1, 1, 1, 1, 1, 1, 1, 1));
+    planner.setArcSegmentLength(0);
+
+    // quarter circle with a helical Z move and babystepping
+    planner.setIdealState(VectorN(0.01, 0, 0));
+    planner.setState(VectorN(0.01, 0, 0));
+    planner.queueArc(VectorN(0, 0.01, 0.001), 0, 0, 0.01, ARC_PLANE_XY, false, 0.01, 1.0, 0.0001);
+    EXPECT_FALSE(planner.getLastQueueMoveStatus());
+    EXPECT_EQ(planner.getIdealState(), VectorN(0, 0.01, 0.001));
+    EXPECT_NEAR(planner.getState()[0], 0, 1e-9);
+    EXPECT_NEAR(planner.getState()[1], 0.01, 1e-9);
+    EXPECT_NEAR(planner.getState()[2], 0.0011, 1e-9);
+}
+
+TEST_F(PathPlannerTest, CoalescesMovesInSameDirection)
+{
+    planner.setSoftEndstopsMin(VectorN(-1, -1, -1, -1, -1, -1, -1, -1));
+    planner.setSoftEndstopsMax(VectorN(1, 1, 1, 1, 1, 1, 1, 1));
+    planner.setMoveCoalescing(0.01, 0.01, 4);
+
+    // three moves along X with the same extrusion per meter are merged into one open path
+    for (int i = 1; i <= 3; i++)
+    {
+        planner.queueMove(VectorN(0.0001 * i, 0, 0, 0.00001 * i), 0.01, 1.0, false, true, true, false, false, false);
+        EXPECT_FALSE(planner.getLastQueueMoveStatus());
+    }
+    EXPECT_EQ(getAvailablePathSlots(), 1024);
+    EXPECT_EQ(planner.getState(), VectorN(0.0003, 0, 0, 0.00003));
+
+    // more extrusion per meter starts a new path
+    planner.queueMove(VectorN(0.0004, 0, 0, 0.00005), 0.01, 1.0, false, true, true, false, false, false);
+    EXPECT_EQ(getAvailablePathSlots(), 1023);
+
+    // so does a change in direction
+    planner.queueMove(VectorN(0.0004, 0.0001, 0, 0.00006), 0.01, 1.0, false, true, true, false, false, false);
+    EXPECT_EQ(getAvailablePathSlots(), 1022);
+
+    // the merged path covers all three moves
+    const double mergedTime = std::hypot(0.0003, 0.00003) / 0.01;
+    const double fourthTime = std::hypot(0.0001, 0.00002) / 0.01;
+    EXPECT_NEAR(static_cast<double>(getQueuedMoveTime()), (mergedTime + fourthTime) * F_CPU, 2);
+
+    planner.runThread();
+    planner.waitUntilFinished();
+    planner.stopThread(true);
+
+    EXPECT_EQ(getQueuedMoveTime(), 0);
+}
+
+TEST_F(PathPlannerTest, ShapesStepsOfLastMove)
+{
+    // half of every step is delayed by 1/60s
+    planner.setInputShaper(X_AXIS, INPUT_SHAPER_ZV, 30, 0);
+
+    planner.queueMove(VectorN(0.001, 0, 0), 0.001, 1.0, false, false, false, false, false, false);
+
+    planner.runThread();
+    planner.waitUntilFinished();
+    planner.stopThread(true);
+
+    auto& commands = pru.stepperCommands;
+
+    int steps = 0;
+    uint64_t totalDelay = 0;
+    for (const SteppersCommand& command : commands)
+    {
+        steps += command.step & 1;
+        totalDelay += command.delay;
+
+        EXPECT_GE(command.delay, MINIMUM_STEP_INTERVAL);
+    }
+
+    // as there's no move after this one, the move runs until the delayed half of the
+    // second to last step, which is the last step taken
+    EXPECT_EQ(steps, 100);
+    EXPECT_EQ(totalDelay, roundStepTime(0.985 + 1.0 / 60) + MINIMUM_STEP_INTERVAL);
+}
+
+TEST_F(PathPlannerTest, ShapesStepsAcrossManyShortMoves)
+{
+    for (const int type : { INPUT_SHAPER_ZV, INPUT_SHAPER_MZV })
+    {
+        SCOPED_TRACE(type);
+
+        MockPru pru;
+        PathPlanner planner(1024, alarmCallback, pru);
+        configure(planner);
+        planner.setInputShaper(X_AXIS, type, 40, 0.1);
+        planner.setInputShaper(Y_AXIS, type, 40, 0.1);
+
+        // short segments back and forth, most of them shorter than the shaper delays steps by
+        VectorN position;
+        for (int i = 0; i < 200; i++)
+        {
+            position[X_AXIS] += 0.000125 * ((i % 7) - 3);
+            position[Y_AXIS] += 0.000125 * ((i % 5) - 2);
+            planner.queueMove(position, 0.03 + 0.0013 * (i % 11), 1.0, false, true, false, false, false, false);
+        }
+
+        planner.runThread();
+        planner.waitUntilFinished();
+        planner.stopThread(true);
+
+        // every command after the opening delay of a move steps at least one axis, and steps
+        // come at least MINIMUM_STEP_INTERVAL after the step before them
+        uint64_t time = 0;
+        uint64_t lastStepTime = 0;
+        bool stepped = false;
+        IntVectorN steps;
+        for (const SteppersCommand& command : pru.stepperCommands)
+        {
+            if (command.step)
+            {
+                EXPECT_TRUE(!stepped || time - lastStepTime >= MINIMUM_STEP_INTERVAL) << time;
+                lastStepTime = time;
+                stepped = true;
+            }
+
+            for (int axis = 0; axis < NUM_AXES; axis++)
+            {
+                if (command.step & (1 << axis))
+                {
+                    steps[axis] += (command.direction & (1 << axis)) ? 1 : -1;
+                }
+            }
+
+            time += command.delay;
+        }
+
+        // every step was taken once, in the right direction
+        EXPECT_EQ(steps[X_AXIS], std::lround(position[X_AXIS] * 100000));
+        EXPECT_EQ(steps[Y_AXIS], std::lround(position[Y_AXIS] * 100000));
+    }
+}
+
+TEST_F(PathPlannerTest, AdvancesExtruderAlongMoves)
+{
+    planner.setPressureAdvance(E_AXIS, 0.02, 0.04);
+
+    // X and E both take 100 steps in about 1.4 seconds
+    planner.queueMove(VectorN(0.001, 0, 0, 0.001), 0.001, 1.0, false, false, false, false, false, false);
+
+    planner.runThread();
+    planner.waitUntilFinished();
+    planner.stopThread(true);
+
+    int xSteps = 0;
+    int eSteps = 0;
+    int eStepsInFirstHalf = 0;
+    uint64_t time = 0;
+    const uint64_t moveTime = static_cast<uint64_t>(std::sqrt(2) * F_CPU);
+    for (const SteppersCommand& command : pru.stepperCommands)
+    {
+        const int eStep = (command.step >> E_AXIS) & 1 ? ((command.direction >> E_AXIS) & 1 ? 1 : -1) : 0;
+
+        xSteps += command.step & 1;
+        eSteps += eStep;
+        eStepsInFirstHalf += time < moveTime / 2 ? eStep : 0;
+
+        time += command.delay;
+    }
+
+    EXPECT_EQ(xSteps, 100);
+    EXPECT_EQ(eSteps, 100);
+
+    // the extruder runs 0.02s * 70 steps/s ahead of the 50 steps X took
+    EXPECT_NEAR(eStepsInFirstHalf, 50 + 1.4, 1);
+
+    // and takes the advance back within the smoothing window after the move
+    EXPECT_GT(time, moveTime);
+    EXPECT_LE(time, moveTime + 0.0401 * F_CPU);
+}
+
+TEST_F(PathPlannerTest, GeneratesStepsOnWorkerThreads)
+{
+    const auto queueMoves = [](PathPlanner& planner) {
+        for (int i = 1; i <= 6; i++)
+        {
+            planner.queueMove(VectorN(0.0001 * i, 0.00005 * (i % 2), 0), 0.01, 1.0, false, false, false, false, false, false);
+        }
+    };
+
+    queueMoves(planner);
+
+    planner.runThread();
+    planner.waitUntilFinished();
+    planner.stopThread(true);
+
+    MockPru pipelinedPru;
+    PathPlanner pipelinedPlanner(1024, alarmCallback, pipelinedPru);
+    configure(pipelinedPlanner);
+    pipelinedPlanner.setStepGeneration(2, 2);
+
+    queueMoves(pipelinedPlanner);
+
+    pipelinedPlanner.runThread();
+    pipelinedPlanner.waitUntilFinished();
+    pipelinedPlanner.stopThread(true);
+
+    // the workers only change which thread generates the steps
+    EXPECT_EQ(pipelinedPru.stepperCommands, pru.stepperCommands);
+    EXPECT_EQ(pipelinedPru.blockTimes, pru.blockTimes);
+
+    int steps = 0;
+    for (const SteppersCommand& command : pru.stepperCommands)
+    {
+        steps += (command.step & 1) + ((command.step >> 1) & 1);
+    }
+
+    const StepGeneratorStats stats = pipelinedPlanner.getStepGeneratorStats();
+    EXPECT_EQ(stats.pathsPrepared, 6);
+    EXPECT_EQ(stats.stepsPrepared, steps);
+    EXPECT_EQ(stats.queuedPaths, 0);
+    EXPECT_GE(stats.maxQueuedPaths, 1);
+    EXPECT_LE(stats.maxQueuedPaths, 2);
+}
+
+TEST_F(PathPlannerTest, WorkersPrepareABoundedWindowOfSteps)
+{
+    // twice as many X steps as a worker takes ahead of the emitter
+    const VectorN end(2.0 * STEP_GENERATOR_WINDOW / 100000, 0.5 * STEP_GENERATOR_WINDOW / 100000, 0);
+
+    planner.queueMove(end, 0.1, 1.0, false, false, false, false, false, false);
+
+    planner.runThread();
+    planner.waitUntilFinished();
+    planner.stopThread(true);
+
+    MockPru pipelinedPru;
+    PathPlanner pipelinedPlanner(1024, alarmCallback, pipelinedPru);
+    configure(pipelinedPlanner);
+    pipelinedPlanner.setStepGeneration(2, 2);
+
+    pipelinedPlanner.queueMove(end, 0.1, 1.0, false, false, false, false, false, false);
+
+    pipelinedPlanner.runThread();
+    pipelinedPlanner.waitUntilFinished();
+    pipelinedPlanner.stopThread(true);
+
+    // the emitter generates the steps after the window itself
+    EXPECT_EQ(pipelinedPru.stepperCommands, pru.stepperCommands);
+
+    const StepGeneratorStats stats = pipelinedPlanner.getStepGeneratorStats();
+    EXPECT_EQ(stats.pathsPrepared, 1);
+    EXPECT_EQ(stats.stepsPrepared, STEP_GENERATOR_WINDOW + STEP_GENERATOR_WINDOW / 2);
+}
+
+TEST_F(PathPlannerTest, RecordsLatencyHistograms)
+{
+    for (int i = 1; i <= 3; i++)
+    {
+        planner.queueMove(VectorN(0.0001 * i, 0, 0), 0.01, 1.0, false, false, false, false, false, false);
+    }
+
+    planner.runThread();
+    planner.waitUntilFinished();
+    planner.stopThread(true);
+
+    EXPECT_EQ(planner.getLatencyHistogram(LATENCY_QUEUE_MOVE).count, 3);
+    // each path is planned once when it's added and once when it's removed
+    EXPECT_EQ(planner.getLatencyHistogram(LATENCY_OPTIMIZER).count, 6);
+    EXPECT_EQ(planner.getLatencyHistogram(LATENCY_STEP_GENERATION).count, 3);
+    EXPECT_EQ(planner.getLatencyHistogram(LATENCY_PUSH_BLOCK_WAIT).count, pru.blockTimes.size());
+
+    planner.resetLatencyHistograms();
+
+    for (int stage = 0; stage < NUM_LATENCY_STAGES; stage++)
+    {
+        EXPECT_EQ(planner.getLatencyHistogram(stage).count, 0);
+    }
+}
+
+TEST_F(PathPlannerTest, SamplesBufferDepths)
+{
+    planner.setBufferTelemetry(0, 100);
+    pru.queuedMovesTime = 5 * F_CPU;
+    pru.memoryUsed = 64;
+
+    for (int i = 1; i <= 3; i++)
+    {
+        planner.queueMove(VectorN(0.0001 * i, 0, 0), 0.01, 1.0, false, false, false, false, false, false);
+    }
+
+    planner.runThread();
+    planner.waitUntilFinished();
+    planner.stopThread(true);
+
+    const std::vector<BufferSample> samples = planner.getBufferSamples();
+    ASSERT_EQ(samples.size(), pru.blockTimes.size());
+    EXPECT_LE(samples.front().pathQueueDepth, 2);
+    EXPECT_EQ(samples.back().pathQueueDepth, 0);
+
+    for (const BufferSample& sample : samples)
+    {
+        EXPECT_EQ(sample.queuedMoveTime, 5 * F_CPU);
+        EXPECT_EQ(sample.pruMemoryUsed, 64);
+    }
+
+    // the PRU always had moves left, so it never ran out
+    const BufferTelemetryStats stats = planner.getBufferTelemetryStats();
+    EXPECT_EQ(stats.samples, samples.size());
+    EXPECT_EQ(stats.pathQueueUnderruns + stats.pruUnderruns, 0);
+    EXPECT_EQ(stats.pathQueueUnderflows, 1);
+    EXPECT_EQ(stats.maxPruMemoryUsed, 64);
+}
+
+TEST_F(PathPlannerTest, RecordsPruUnderrunsWithTheirGcodeLine)
+{
+    // the PRU is always idle, so it has run out whenever a block is committed
+    planner.setGcodeLine(7);
+    planner.queueMove(VectorN(0.0001, 0, 0), 0.01, 1.0, false, false, false, false, false, false);
+    planner.setGcodeLine(8);
+    planner.queueMove(VectorN(0.0002, 0, 0), 0.01, 1.0, false, false, false, false, false, false);
+
+    planner.runThread();
+    planner.waitUntilFinished();
+    planner.stopThread(true);
+
+    // the second path was queued all along, so the planner thread was too slow
+    const std::vector<UnderrunEvent> underruns = planner.getUnderrunEvents();
+    ASSERT_FALSE(underruns.empty());
+    EXPECT_EQ(underruns.front().gcodeLine, 7);
+
+    for (const UnderrunEvent& underrun : underruns)
+    {
+        EXPECT_EQ(underrun.cause, UNDERRUN_PRU);
+    }
+
+    const BufferTelemetryStats stats = planner.getBufferTelemetryStats();
+    EXPECT_EQ(stats.pruUnderruns, underruns.size());
+    EXPECT_EQ(stats.pathQueueUnderruns, 0);
+}
+
+TEST_F(PathPlannerTest, RecordsPathQueueUnderruns)
+{
+    planner.setGcodeLine(1);
+    planner.queueMove(VectorN(0.00003, 0, 0), 0.01, 1.0, false, false, false, false, false, false);
+    planner.runThread();
+
+    while (planner.getBufferTelemetryStats().pathQueueUnderflows == 0)
+    {
+        std::this_thread::sleep_for(std::chrono::milliseconds(1));
+    }
+
+    // the path queue ran empty before this move was queued
+    planner.setGcodeLine(2);
+    planner.queueMove(VectorN(0.00006, 0, 0), 0.01, 1.0, false, false, false, false, false, false);
+    planner.waitUntilFinished();
+
+    // the PRU is allowed to run out after waitUntilFinished
+    planner.setGcodeLine(3);
+    planner.queueMove(VectorN(0.00009, 0, 0), 0.01, 1.0, false, false, false, false, false, false);
+    planner.waitUntilFinished();
+    planner.stopThread(true);
+
+    const std::vector<UnderrunEvent> underruns = planner.getUnderrunEvents();
+    ASSERT_EQ(underruns.size(), 1);
+    EXPECT_EQ(underruns[0].cause, UNDERRUN_PATH_QUEUE);
+    EXPECT_EQ(underruns[0].gcodeLine, 1);
+
+    EXPECT_EQ(planner.getBufferTelemetryStats().pathQueueUnderruns, 1);
+    EXPECT_EQ(planner.getBufferTelemetryStats().pathQueueUnderflows, 3);
+}
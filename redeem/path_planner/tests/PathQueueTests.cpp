@@ -605,4 +605,93 @@ TEST(PathQueueBasics, SignalsEmptyAfterOneBigPath)
     queue.popPath();
 
     thread.waitAndJoin();
-}
\ No newline at end of file
+}
+TEST(PathQueueBasics, ReplacesOpenPath)
+{
+    DummyPathOptimizer optimizer;
+    SimplePathQueue queue(optimizer, 15, 100);
+
+    Path path;
+    ASSERT_TRUE(queue.addPath(std::move(path)));
+
+    path.zero();
+    ASSERT_TRUE(queue.addOpenPath(std::move(path)));
+    EXPECT_EQ(queue.availablePathSlots(), 14);
+
+    path.zero();
+    path.fixStartAndEndSpeed();
+    ASSERT_TRUE(queue.replaceOpenPath(std::move(path)));
+
+    path.zero();
+    ASSERT_TRUE(queue.addPath(std::move(path)));
+    EXPECT_EQ(queue.availablePathSlots(), 12);
+
+    path.zero();
+    EXPECT_FALSE(queue.replaceOpenPath(std::move(path)));
+
+    EXPECT_EQ(queue.popPath().value().isStartSpeedFixed(), false);
+    EXPECT_EQ(queue.popPath().value().isStartSpeedFixed(), true);
+    EXPECT_EQ(queue.popPath().value().isStartSpeedFixed(), false);
+}
+
+TEST(PathQueueBasics, PopsOpenPathWhenEmpty)
+{
+    DummyPathOptimizer optimizer;
+    SimplePathQueue queue(optimizer, 3, 100);
+
+    WorkerThread worker([&queue]() {
+        EXPECT_EQ(queue.popPath().value().isStartSpeedFixed(), true);
+    });
+
+    EXPECT_FALSE(worker.isFinished());
+
+    Path path;
+    path.fixStartAndEndSpeed();
+    ASSERT_TRUE(queue.addOpenPath(std::move(path)));
+
+    worker.waitAndJoin();
+
+    path.zero();
+    EXPECT_FALSE(queue.replaceOpenPath(std::move(path)));
+    EXPECT_EQ(queue.availablePathSlots(), 3);
+}
+
+TEST(PathQueueBasics, AddsSyncEventToOpenPath)
+{
+    DummyPathOptimizer optimizer;
+    SimplePathQueue queue(optimizer, 4, 100);
+    DummySyncCallback callback;
+
+    Path path;
+    ASSERT_TRUE(queue.addOpenPath(std::move(path)));
+
+    queue.queueSyncEvent(callback, false);
+    EXPECT_EQ(queue.availablePathSlots(), 3);
+
+    path.zero();
+    EXPECT_FALSE(queue.replaceOpenPath(std::move(path)));
+
+    Path result = queue.popPath().value();
+
+    EXPECT_EQ(result.isSyncEvent(), true);
+    EXPECT_EQ(result.getSyncCallback(), &callback);
+}
+
+TEST(PathQueueBasics, WaitsForOpenPathBeforeSignalingEmpty)
+{
+    DummyPathOptimizer optimizer;
+    SimplePathQueue queue(optimizer, 4, 100);
+
+    Path path;
+    ASSERT_TRUE(queue.addOpenPath(std::move(path)));
+
+    WorkerThread thread([&queue]() {
+        EXPECT_TRUE(queue.waitForQueueToEmpty());
+    });
+
+    EXPECT_FALSE(thread.isFinished());
+
+    queue.popPath();
+
+    thread.waitAndJoin();
+}
@@ -0,0 +1,282 @@
+#include "gtest/gtest.h"
+
+#include <cmath>
+
+#include "Delta.h"
+#include "Path.h"
+#include "TestUtils.h"
+
+struct PathTests : ::testing::Test
+{
+    PathBuilder builder;
+
+    PathTests()
+        : builder(PathBuilder::CartesianBuilder())
+    {
+        builder.maxJerkMPerCubicSecond = VectorN(1.0, 1.0, 1.0, 1.0, 1.0, 1.0, 1.0, 1.0);
+    }
+
+    Path makePath(double x, double speed, double startSpeed, double endSpeed)
+    {
+        Path path = builder.makePath(x, 0, 0, speed);
+        path.setStartSpeed(startSpeed);
+        path.setEndSpeed(endSpeed);
+        return path;
+    }
+
+    static std::vector<Step> takeSteps(Path& path, int axis)
+    {
+        std::vector<Step> steps;
+        Step step;
+
+        while (path.getSteps()[axis].next(step))
+        {
+            steps.push_back(step);
+        }
+
+        return steps;
+    }
+
+    static void expectIncreasingTimes(const std::vector<Step>& steps, double finalTime)
+    {
+        ASSERT_FALSE(steps.empty());
+        EXPECT_GT(steps.front().time, 0);
+        EXPECT_LT(steps.back().time, finalTime);
+
+        for (size_t i = 1; i < steps.size(); i++)
+        {
+            EXPECT_GT(steps[i].time, steps[i - 1].time);
+        }
+    }
+
+    // moves that start and end at the same speed run the same forwards and backwards
+    static void expectSymmetricTimes(const std::vector<Step>& steps, double finalTime)
+    {
+        for (size_t i = 0; i < steps.size(); i++)
+        {
+            EXPECT_NEAR(steps[i].time + steps[steps.size() - 1 - i].time, finalTime, 1e-9);
+        }
+    }
+};
+
+TEST_F(PathTests, UsesTrapezoidWithoutJerk)
+{
+    builder.maxJerkMPerCubicSecond = VectorN();
+    Path path = makePath(0.1, 0.05, 0, 0);
+    EXPECT_EQ(path.getJerk(), 0);
+
+    // 2s cruising plus the 0.5s it takes to accelerate to and from 0.05m/s at 0.1m/s^2
+    EXPECT_DOUBLE_EQ(path.runFinalStepCalculations(), 2.5);
+}
+
+TEST_F(PathTests, SCurveAddsRampTime)
+{
+    Path path = makePath(0.1, 0.05, 0, 0);
+    EXPECT_EQ(path.getJerk(), 1.0);
+
+    // each ramp takes accel/jerk longer than the trapezoid's, but covers accel/jerk * speed/2 more distance
+    const double finalTime = path.runFinalStepCalculations();
+    EXPECT_DOUBLE_EQ(finalTime, 2.6);
+
+    const std::vector<Step> steps = takeSteps(path, X_AXIS);
+    expectIncreasingTimes(steps, finalTime);
+    expectSymmetricTimes(steps, finalTime);
+}
+
+TEST_F(PathTests, SCurveStartsWithoutAcceleration)
+{
+    Path path = makePath(0.1, 0.05, 0, 0);
+    path.runFinalStepCalculations();
+
+    // the first step is half a step into the move, which the jerk alone takes cbrt(6 * d / j) to cover
+    EXPECT_NEAR(takeSteps(path, X_AXIS).front().time, std::cbrt(6 * 0.00005 / 1.0), 1e-12);
+}
+
+TEST_F(PathTests, SCurveWithoutFullAcceleration)
+{
+    // accelerating to 0.005m/s doesn't take long enough to ramp the acceleration all the way up
+    Path path = makePath(0.01, 0.005, 0, 0);
+    const double finalTime = path.runFinalStepCalculations();
+
+    // 2 * 2 * sqrt(v / j) ramping, plus cruising what the ramps don't cover
+    const double rampTime = 2 * std::sqrt(0.005 / 1.0);
+    EXPECT_NEAR(finalTime, 2 * rampTime + (0.01 - 2 * 0.005 / 2 * rampTime) / 0.005, 1e-12);
+
+    const std::vector<Step> steps = takeSteps(path, X_AXIS);
+    expectIncreasingTimes(steps, finalTime);
+    expectSymmetricTimes(steps, finalTime);
+}
+
+TEST_F(PathTests, SCurveThatDoesNotReachFullSpeed)
+{
+    Path path = makePath(0.01, 1.0, 0, 0);
+    const double finalTime = path.runFinalStepCalculations();
+
+    // ramping up to the full speed and back would take longer than a trapezoid at the same speed
+    EXPECT_GT(finalTime, 2 * std::sqrt(0.01 / 0.1));
+
+    const std::vector<Step> steps = takeSteps(path, X_AXIS);
+    expectIncreasingTimes(steps, finalTime);
+    expectSymmetricTimes(steps, finalTime);
+}
+
+TEST_F(PathTests, SCurveBetweenDifferentSpeeds)
+{
+    Path path = makePath(0.1, 0.05, 0.02, 0.005);
+    const double finalTime = path.runFinalStepCalculations();
+
+    // ramp times are (v1 - v0) / a + a / j and the ramps cover (v0 + v1) / 2 * time
+    const double accelTime = 0.03 / 0.1 + 0.1;
+    const double decelTime = 0.045 / 0.1 + 0.1;
+    const double cruiseDistance = 0.1 - 0.035 * accelTime - 0.0275 * decelTime;
+    EXPECT_NEAR(finalTime, accelTime + cruiseDistance / 0.05 + decelTime, 1e-12);
+
+    expectIncreasingTimes(takeSteps(path, X_AXIS), finalTime);
+}
+
+TEST_F(PathTests, ComputesStepsAsTheyAreTaken)
+{
+    Path path = makePath(0.01, 0.05, 0, 0);
+    AxisSteps& axisSteps = path.getSteps()[X_AXIS];
+    EXPECT_EQ(axisSteps.size(), 100u);
+
+    // the steps are dilated when they're taken, so a later change to the speeds still applies
+    path.setEndSpeed(0.01);
+    const double finalTime = path.runFinalStepCalculations();
+
+    Step step;
+    ASSERT_TRUE(axisSteps.next(step));
+    EXPECT_EQ(step.axis, X_AXIS);
+    EXPECT_TRUE(step.direction);
+
+    const std::vector<Step> rest = takeSteps(path, X_AXIS);
+    EXPECT_EQ(rest.size(), 99u);
+    EXPECT_GT(rest.front().time, step.time);
+    expectIncreasingTimes(rest, finalTime);
+
+    EXPECT_FALSE(axisSteps.next(step));
+    EXPECT_EQ(path.getSteps()[Y_AXIS].size(), 0u);
+    EXPECT_FALSE(path.getSteps()[Y_AXIS].next(step));
+}
+
+TEST_F(PathTests, IncrementalStepTimingMatchesExactTiming)
+{
+    builder.maxJerkMPerCubicSecond = VectorN();
+
+    struct Profile
+    {
+        double distance;
+        double speed;
+        double startSpeed;
+        double endSpeed;
+    };
+
+    // from and to standstill, between different speeds, without cruising and only cruising
+    const Profile profiles[] = {
+        { 0.1, 0.05, 0, 0 },
+        { 0.1, 0.05, 0.02, 0.005 },
+        { 0.01, 1.0, 0, 0 },
+        { 0.05, 0.2, 0.2, 0.2 },
+    };
+
+    for (const Profile& profile : profiles)
+    {
+        Path exactPath = makePath(profile.distance, profile.speed, profile.startSpeed, profile.endSpeed);
+        Path incrementalPath = makePath(profile.distance, profile.speed, profile.startSpeed, profile.endSpeed);
+
+        const double finalTime = exactPath.runFinalStepCalculations(false);
+        EXPECT_EQ(incrementalPath.runFinalStepCalculations(true), finalTime);
+
+        const std::vector<Step> exact = takeSteps(exactPath, X_AXIS);
+        const std::vector<Step> incremental = takeSteps(incrementalPath, X_AXIS);
+        ASSERT_EQ(incremental.size(), exact.size());
+        expectIncreasingTimes(incremental, finalTime);
+
+        for (size_t i = 0; i < exact.size(); i++)
+        {
+            // within a few PRU cycles, so the steps land on the same grid as the exact ones
+            EXPECT_NEAR(incremental[i].time, exact[i].time, 10 * CPU_CYCLE_LENGTH) << "step " << i;
+            EXPECT_EQ(roundStepTime(incremental[i].time), roundStepTime(exact[i].time)) << "step " << i;
+            EXPECT_EQ(incremental[i].direction, exact[i].direction);
+        }
+    }
+}
+
+TEST_F(PathTests, IncrementalStepTimingLeavesSCurvesExact)
+{
+    Path exactPath = makePath(0.01, 0.05, 0, 0);
+    Path incrementalPath = makePath(0.01, 0.05, 0, 0);
+    exactPath.runFinalStepCalculations(false);
+    incrementalPath.runFinalStepCalculations(true);
+
+    const std::vector<Step> exact = takeSteps(exactPath, X_AXIS);
+    const std::vector<Step> incremental = takeSteps(incrementalPath, X_AXIS);
+    ASSERT_EQ(incremental.size(), exact.size());
+
+    for (size_t i = 0; i < exact.size(); i++)
+    {
+        EXPECT_EQ(incremental[i].time, exact[i].time);
+    }
+}
+
+TEST_F(PathTests, BatchedDeltaStepTimesMatchScalar)
+{
+    Delta delta;
+    delta.setMainDimensions(0.29, 0.16);
+
+    const Vector3 stepsPerM(80000, 80000, 80000);
+    const IntVector3 start = delta.worldToDeltaMotorPos(Vector3(-0.02, -0.02, 0.01), stepsPerM);
+    const IntVector3 end = delta.worldToDeltaMotorPos(Vector3(0.01, 0.02, 0.08), stepsPerM);
+
+    DeltaPathConstants constants;
+    std::array<AxisSteps, NUM_AXES> steps;
+    delta.calculateMove(start, end, stepsPerM, 1.7, constants, steps);
+
+    for (int axis = 0; axis < 3; axis++)
+    {
+        const int stepIncrement = start[axis] < end[axis] ? 1 : -1;
+        const int count = std::abs(end[axis] - start[axis]);
+
+        // spans several of the batches calculateStepTimes works through
+        std::vector<double> times(count);
+        Delta::calculateStepTimes(axis, constants, start[axis] + stepIncrement / 2.0, stepIncrement, count, 0, 1.7, times.data());
+
+        double lastTime = 0;
+        for (int i = 0; i < count; i++)
+        {
+            const double position = start[axis] + i * stepIncrement + stepIncrement / 2.0;
+            lastTime = Delta::calculateStepTime(axis, constants, position / stepsPerM[axis], lastTime, 1.7);
+            ASSERT_EQ(times[i], lastTime);
+        }
+    }
+}
+
+TEST_F(PathTests, MaxReachableSpeedWithoutJerk)
+{
+    builder.maxJerkMPerCubicSecond = VectorN();
+    Path path = builder.makePath(0.1, 0, 0, 1.0);
+
+    EXPECT_DOUBLE_EQ(path.getMaxReachableSpeed(0.005), std::sqrt(0.005 * 0.005 + 2 * 0.1 * 0.1));
+}
+
+TEST_F(PathTests, MaxReachableSpeedWithFullAcceleration)
+{
+    Path path = builder.makePath(0.01, 0, 0, 1.0);
+
+    // v/2 * (v / a + a / j) = d, so v^2 + 0.01 * v - 0.002 = 0
+    EXPECT_NEAR(path.getMaxReachableSpeed(0), 0.04, 1e-12);
+}
+
+TEST_F(PathTests, MaxReachableSpeedWithoutFullAcceleration)
+{
+    Path path = builder.makePath(0.0001, 0, 0, 1.0);
+
+    // ramping for t = cbrt(d / j) on each side reaches j * t^2
+    EXPECT_NEAR(path.getMaxReachableSpeed(0), std::pow(0.0001, 2.0 / 3.0), 1e-12);
+
+    // from a higher speed, the ramp covers (2 * v0 + j * t^2) * t with t = sqrt((v - v0) / j)
+    const double speed = path.getMaxReachableSpeed(0.01);
+    const double t = std::sqrt(speed - 0.01);
+    EXPECT_LT(speed - 0.01, 0.01);
+    EXPECT_NEAR((2 * 0.01 + t * t) * t, 0.0001, 1e-15);
+}
@@ -0,0 +1,206 @@
+#include "gmock/gmock.h"
+#include "gtest/gtest.h"
+
+#include <vector>
+
+#include "AlarmCallback.h"
+#include "PathPlanner.h"
+#include "PruEmulator.h"
+
+class EmulatorAlarmCallback : public AlarmCallback
+{
+public:
+    MOCK_METHOD3(call, void(int type, std::string message, std::string shortMessage));
+};
+
+struct CountingSyncCallback : public SyncCallback
+{
+    int calls = 0;
+
+    void syncComplete() override
+    {
+        calls++;
+    }
+};
+
+class PruEmulatorTest : public ::testing::Test
+{
+protected:
+    PruEmulator emulator;
+
+    void push(std::vector<SteppersCommand> commands, SyncCallback* callback = nullptr)
+    {
+        uint64_t time = 0;
+        for (const SteppersCommand& command : commands)
+        {
+            time += command.delay;
+        }
+
+        emulator.pushBlock(reinterpret_cast<uint8_t*>(commands.data()), commands.size() * sizeof(SteppersCommand), sizeof(SteppersCommand), time, callback);
+    }
+
+    void runAll()
+    {
+        emulator.runThread();
+        emulator.waitUntilFinished();
+        emulator.stopThread(true);
+    }
+};
+
+TEST_F(PruEmulatorTest, RunsCommandsOnVirtualClock)
+{
+    push({ { 0, 0, 0, 0, 1000 }, { 0x1, 0x1, 0, 0, 2000 }, { 0x3, 0x1, 0, 0, 3000 } });
+    push({ { 0x2, 0x0, 0, 0, 4000 } });
+
+    runAll();
+
+    const PruEmulatorStats stats = emulator.getStats();
+    EXPECT_EQ(stats.blocks, 2);
+    EXPECT_EQ(stats.commands, 4);
+    EXPECT_EQ(stats.virtualTime, 10000);
+    EXPECT_EQ(stats.stretchedCommands, 0);
+
+    const VectorN stepCounts = emulator.getStepCounts();
+    const VectorN position = emulator.getPosition();
+    EXPECT_EQ(stepCounts[0], 2);
+    EXPECT_EQ(stepCounts[1], 2);
+    EXPECT_EQ(position[0], 2);
+    EXPECT_EQ(position[1], -2);
+}
+
+TEST_F(PruEmulatorTest, RunsRepeatedCommands)
+{
+    push({ { 0x1, 0x1, 0, 9 << STEPPER_COMMAND_OPTION_REPEAT_SHIFT, 1000 }, { 0x1, 0x1, 0, 0, 500 } });
+
+    runAll();
+
+    EXPECT_EQ(emulator.getStats().commands, 11);
+    EXPECT_EQ(emulator.getStats().virtualTime, 10500);
+    EXPECT_EQ(emulator.getPosition()[0], 11);
+}
+
+TEST_F(PruEmulatorTest, StretchesCommandsShorterThanStepTiming)
+{
+    emulator.setStepTiming(10, 100, 100);
+
+    // the first step changes direction, the second doesn't
+    push({ { 0x1, 0x1, 0, 0, 150 }, { 0x1, 0x1, 0, 0, 150 }, { 0x1, 0x1, 0, 0, 1000 } });
+
+    runAll();
+
+    const PruEmulatorStats stats = emulator.getStats();
+    EXPECT_EQ(stats.stretchedCommands, 2);
+    EXPECT_EQ(stats.maxJitter, 60);
+    EXPECT_EQ(stats.totalJitter, 110);
+    EXPECT_EQ(stats.virtualTime, 210 + 200 + 1000);
+}
+
+TEST_F(PruEmulatorTest, CancelsMovesBlockedByEndstops)
+{
+    // X may only move in the negative direction
+    emulator.setEndstopMask(0xffff & ~(1 << 8));
+
+    push({ { 0x1, 0x0, 0x1, 0, 1000 }, { 0x1, 0x1, 0x1, 0, 1000 }, { 0x1, 0x1, 0x1, 0, 1000 }, { 0x1, 0x1, 0x1, 0, 1000 } });
+
+    runAll();
+
+    const PruEmulatorStats stats = emulator.getStats();
+    EXPECT_EQ(emulator.getStepsRemaining(), 3);
+    EXPECT_EQ(stats.cancelledCommands, 3);
+    EXPECT_EQ(stats.endstopsTriggered, 1 << 8);
+    EXPECT_EQ(emulator.getPosition()[0], -1);
+}
+
+TEST_F(PruEmulatorTest, HaltsOnBlockedMoveThatCantBeCancelled)
+{
+    int alarms = 0;
+    emulator.setEndstopAlarmCallback([&alarms]() { alarms++; });
+    emulator.setEndstopMask(0xffff & ~1);
+
+    push({ { 0x1, 0x1, 0, 0, 1000 }, { 0x1, 0x0, 0, 0, 1000 }, { 0x1, 0x1, 0, 0, 1000 } });
+
+    emulator.runThread();
+
+    // the block never finishes, so wait for the reset that the alarm would lead to
+    while (emulator.getStats().endstopsTriggered == 0)
+    {
+        std::this_thread::yield();
+    }
+
+    emulator.reset();
+    emulator.waitUntilFinished();
+    emulator.stopThread(true);
+
+    EXPECT_EQ(alarms, 1);
+    EXPECT_EQ(emulator.getStats().blocks, 0);
+    EXPECT_EQ(emulator.getPosition()[0], 1);
+}
+
+TEST_F(PruEmulatorTest, CountsUnderrunsAndCallsSyncCallbacks)
+{
+    CountingSyncCallback callback;
+
+    emulator.runThread();
+
+    push({ { 0x1, 0x1, 0, 0, 1000 } }, &callback);
+    emulator.waitUntilFinished();
+    push({ { 0x1, 0x1, 0, 0, 1000 } }, &callback);
+    emulator.waitUntilFinished();
+
+    emulator.stopThread(true);
+
+    EXPECT_EQ(callback.calls, 2);
+    EXPECT_EQ(emulator.getStats().underruns, 2);
+    EXPECT_EQ(emulator.getTotalQueuedMovesTime(), 0);
+}
+
+TEST_F(PruEmulatorTest, RetiresFinishedBlocksInBatches)
+{
+    CountingSyncCallback callback;
+
+    for (int i = 0; i < 20; i++)
+    {
+        push({ { 0x1, 0x1, 0, 0, 1000 } }, &callback);
+    }
+
+    runAll();
+
+    EXPECT_EQ(callback.calls, 20);
+    EXPECT_EQ(emulator.getMemoryUsed(), 0);
+
+    const PruCompletionStats stats = emulator.getCompletionStats();
+    EXPECT_EQ(stats.blocks, 20);
+    EXPECT_GE(stats.wakeups, 1);
+    EXPECT_LE(stats.wakeups, 20);
+    EXPECT_GE(stats.maxBatch, 1);
+    EXPECT_EQ(emulator.getCompletionLatency().getStats().count, 20);
+
+    emulator.resetCompletionStats();
+    EXPECT_EQ(emulator.getCompletionStats().blocks, 0);
+    EXPECT_EQ(emulator.getCompletionLatency().getStats().count, 0);
+}
+
+TEST_F(PruEmulatorTest, RunsPathPlannerOutput)
+{
+    EmulatorAlarmCallback alarmCallback;
+    PathPlanner planner(1024, alarmCallback, emulator);
+
+    planner.setState(VectorN());
+    planner.setMaxSpeeds(VectorN(1.0, 1.0, 1.0, 1.0, 1.0, 1.0, 1.0, 1.0));
+    planner.setAxisStepsPerMeter(VectorN(100000, 100000, 100000, 100000, 100000, 100000, 100000, 100000));
+    planner.setAcceleration(VectorN(1, 1, 1, 1, 1, 1, 1, 1));
+    planner.setMaxSpeedJumps(VectorN(0.01, 0.01, 0.01, 0.01, 0.01, 0.01, 0.01, 0.01));
+
+    planner.queueMove(VectorN(0.01, 0.005, 0), 0.1, 1.0, false, false, false, false, false, false);
+    planner.queueMove(VectorN(0, 0.005, 0), 0.1, 1.0, false, false, false, false, false, false);
+
+    planner.runThread();
+    planner.waitUntilFinished();
+    planner.stopThread(true);
+
+    const VectorN position = emulator.getPosition();
+    EXPECT_EQ(position[0], 0);
+    EXPECT_EQ(position[1], 500);
+    EXPECT_EQ(emulator.getStepCounts()[0], 2000);
+    EXPECT_EQ(emulator.getStats().cancelledCommands, 0);
+}
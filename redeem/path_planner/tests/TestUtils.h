@@ -13,6 +13,7 @@ struct PathBuilder
     VectorN maxSpeedJumps;
     VectorN maxSpeeds;
     VectorN maxAccelMPerSquareSecond;
+    VectorN maxJerkMPerCubicSecond;
 
     static PathBuilder CartesianBuilder()
     {
@@ -58,6 +59,7 @@ struct PathBuilder
             stepsPerM,
             maxSpeeds,
             maxAccelMPerSquareSecond,
+            maxJerkMPerCubicSecond,
             speed,
             std::numeric_limits<double>::infinity(),
             AXIS_CONFIG_XY,
@@ -0,0 +1,59 @@
+#include "gmock/gmock.h"
+#include "gtest/gtest.h"
+
+#include <thread>
+
+#ifdef __linux__
+#include <pthread.h>
+#include <sched.h>
+#endif
+
+#include "ThreadScheduling.h"
+
+TEST(ThreadScheduling, LeavesThreadsAloneByDefault)
+{
+    std::thread thread([]() {
+        EXPECT_TRUE(ThreadScheduling().apply("test"));
+    });
+
+    thread.join();
+}
+
+#ifdef __linux__
+TEST(ThreadScheduling, PinsThreadsToACpu)
+{
+    cpu_set_t allowed;
+    ASSERT_EQ(sched_getaffinity(0, sizeof(allowed), &allowed), 0);
+
+    int cpu = 0;
+    while (!CPU_ISSET(cpu, &allowed))
+    {
+        cpu++;
+    }
+
+    std::thread thread([cpu]() {
+        ASSERT_TRUE(ThreadScheduling(THREAD_POLICY_FIFO, 0, cpu).apply("test"));
+
+        cpu_set_t cpus;
+        ASSERT_EQ(pthread_getaffinity_np(pthread_self(), sizeof(cpus), &cpus), 0);
+        EXPECT_EQ(CPU_COUNT(&cpus), 1);
+        EXPECT_TRUE(CPU_ISSET(cpu, &cpus));
+    });
+
+    thread.join();
+}
+#endif
+
+TEST(ThreadScheduling, MeasuresWakeupLatency)
+{
+    LatencyHistogram histogram;
+
+    const auto start = LatencyHistogram::Clock::now();
+    ThreadScheduling().measureWakeupLatency(std::chrono::milliseconds(1), 20, histogram);
+
+    EXPECT_GE(LatencyHistogram::Clock::now() - start, std::chrono::milliseconds(20));
+
+    const LatencyHistogramStats stats = histogram.getStats();
+    EXPECT_EQ(stats.count, 20);
+    EXPECT_LT(stats.maxTime, 1000000000);
+}
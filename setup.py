@@ -2,6 +2,8 @@
 import numpy as np
 import os
 import pip
+import struct
+import sys
 
 from distutils.sysconfig import get_config_vars
 from setuptools import setup, find_packages, Extension
@@ -11,11 +13,21 @@ from setuptools import setup, find_packages, Extension
 os.environ['OPT'] = " ".join(flag for flag in opt.split() if flag != '-Wstrict-prototypes')
 
 # yapf: disable
+# SWIG takes uint64_t to be unsigned long long, unless it's told that long has 64 bits as on
+# x86-64 and the other LP64 Linux platforms, where uint64_t is unsigned long
+swig_word_size = ['-DSWIGWORDSIZE64'] if sys.platform.startswith('linux') and struct.calcsize('l') == 8 else []
+
 pathplanner = Extension(
     '_PathPlannerNative',
     sources=[
         'redeem/path_planner/PathPlannerNative.i',
         'redeem/path_planner/PathPlanner.cpp',
+        'redeem/path_planner/Arc.cpp',
+        'redeem/path_planner/InputShaper.cpp',
+        'redeem/path_planner/LatencyHistogram.cpp',
+        'redeem/path_planner/BufferTelemetry.cpp',
+        'redeem/path_planner/ThreadScheduling.cpp',
+        'redeem/path_planner/EventFd.cpp',
         'redeem/path_planner/PathPlannerSetup.cpp',
         'redeem/path_planner/Preprocessor.cpp',
         'redeem/path_planner/Path.cpp',
@@ -23,23 +35,38 @@ pathplanner = Extension(
         'redeem/path_planner/vector3.cpp',
         'redeem/path_planner/vectorN.cpp',
         'redeem/path_planner/PruTimer.cpp',
+        'redeem/path_planner/PruEmulator.cpp',
         'redeem/path_planner/prussdrv.c',
         'redeem/path_planner/Logger.cpp',
         'redeem/path_planner/PathOptimizer.cpp',
-        'redeem/path_planner/PathQueue.cpp'],
-    swig_opts=['-c++', '-builtin', '-threads'],
+        'redeem/path_planner/PathQueue.cpp',
+        'redeem/path_planner/StepGenerator.cpp'],
+    swig_opts=['-c++', '-builtin', '-threads'] + swig_word_size,
     include_dirs=[np.get_include()],
     extra_compile_args=[
         '-std=c++17',
         '-g',
         '-O3',
         '-flto',
+        '-fno-math-errno',
         '-DBUILD_PYTHON_EXT=1',
         '-Wall',
         '-DLOGLEVEL=20',
         '-UNDEBUG',
     ])
 
+gcodetokenizer = Extension(
+    '_GcodeTokenizerNative',
+    sources=[
+        'redeem/path_planner/GcodeTokenizerNative.i',
+        'redeem/path_planner/GcodeTokenizer.cpp'],
+    swig_opts=['-c++', '-builtin'],
+    extra_compile_args=[
+        '-std=c++17',
+        '-O3',
+        '-Wall',
+    ])
+
 from redeem.__init__ import __url__
 import versioneer
 
@@ -104,10 +131,11 @@ setup(
       'evdev',
     ],
     url=__url__,
-    ext_modules=[pathplanner],
+    ext_modules=[pathplanner, gcodetokenizer],
     entry_points= {
         'console_scripts': [
             'redeem = redeem.Redeem:main',
+            'redeem-benchmark = redeem.Benchmark:main',
             'update-redeem = updater:perform_update',
         ]
     },
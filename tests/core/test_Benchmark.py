@@ -0,0 +1,44 @@
+from __future__ import absolute_import
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+REDEEM_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def run_python(code):
+  """ Run code in a new interpreter, as the gcode tests mock the native path planner in this one """
+  with open(os.devnull, "w") as devnull:
+    return subprocess.call([sys.executable, "-c", code], cwd=REDEEM_ROOT, stdout=devnull)
+
+
+class BenchmarkTests(unittest.TestCase):
+  def setUp(self):
+    if run_python("import redeem.path_planner.PathPlannerNative") != 0:
+      self.skipTest("the native path planner isn't built")
+    self.directory = tempfile.mkdtemp()
+
+  def tearDown(self):
+    shutil.rmtree(self.directory)
+
+  def test_benchmark_runs_every_corpus(self):
+    output = os.path.join(self.directory, "results.json")
+    code = "from redeem.Benchmark import main; main(['--lines', '200', '--output', {!r}])"
+    self.assertEqual(run_python(code.format(output)), 0)
+
+    with open(output) as f:
+      results = json.load(f)
+    self.assertEqual([corpus["corpus"] for corpus in results["corpora"]],
+                     ["cartesian_small_segments", "delta", "arcs", "retract_heavy"])
+    for corpus in results["corpora"]:
+      self.assertEqual(corpus["lines"], 200)
+      self.assertGreater(corpus["moves"], 0)
+      self.assertGreater(corpus["steps"], 0)
+      self.assertGreater(corpus["step_commands"], 0)
+      for stage in ["execute", "queue_move", "optimizer", "step_generation", "push_block_wait"]:
+        self.assertIn(stage, corpus["stage_time"])
@@ -1,55 +1,72 @@
 from __future__ import absolute_import
 
 from .MockPrinter import MockPrinter
-from redeem.Path import *
+from redeem.Path import Path
 
 
 class G1_G0_Tests(MockPrinter):
   """
-  The following tests check that the path object that is sent to self.printer.path_planner
+  The following tests check that the move that is sent to self.printer.path_planner
   matches what is expected, for [several variants of] each Gcode command
   """
 
+  def assert_linear_move(self, axes, relative_mask, feed_rate, accel):
+    axis_mask = 0
+    values = [0.0] * 8
+    for axis, value in axes.items():
+      index = "XYZEHABC".index(axis)
+      axis_mask |= 1 << index
+      values[index] = value
+    args = self.printer.path_planner.add_linear_move.call_args[0]
+    self.assertEqual(args[0], axis_mask)
+    for value, expected in zip(args[1], values):
+      self.assertAlmostEqual(value, expected)
+    self.assertEqual(args[2], relative_mask)
+    self.assertAlmostEqual(args[3], feed_rate)
+    self.assertAlmostEqual(args[4], accel)
+
   def test_gcodes_G1_G0_absolute(self):
     self.printer.movement = Path.ABSOLUTE
     """ specifying feed rate and acceleration """
     self.execute_gcode("G1 X10 Y10 E3.1 F3000 Q3000")
-    expected_path = AbsolutePath({
+    self.assert_linear_move({
         "X": 0.010 * self.f,
         "Y": 0.010 * self.f,
         "E": 0.0031 * self.f
-    }, 3000.0 / 60000 * self.f, 3000.0 * self.f / 3600000)
-    self.printer.path_planner.add_path.called_with(expected_path)
+    }, 0, 3000.0 / 60000 * self.f, 3000.0 * self.f / 3600000)
     """ test that we maintain current printer feed rate and accel, when not specified """
     self.printer.feed_rate = 0.100
     self.printer.accel = 0.025 / 60
     self.execute_gcode("G1 X20 Y20")
-    expected_path = AbsolutePath({
+    self.assert_linear_move({
         "X": 0.020 * self.f,
         "Y": 0.020 * self.f
-    }, self.printer.feed_rate, self.printer.accel)
-    self.printer.path_planner.add_path.called_with(expected_path)
+    }, 0, self.printer.feed_rate, self.printer.accel)
 
   def test_gcodes_G1_G0_relative(self):
     self.printer.movement = Path.RELATIVE
 
-    expected_path = RelativePath({
+    self.execute_gcode("G1 X10 Y10 E10")
+    self.assert_linear_move({
         "X": 0.010 * self.f,
         "Y": 0.010 * self.f,
         "E": 0.010 * self.f
-    }, self.printer.feed_rate, self.printer.accel)
-    self.printer.path_planner.add_path.called_with(expected_path)
+    }, 0xff, self.printer.feed_rate, self.printer.accel)
 
   def test_gcodes_G1_G0_mixed(self):
     self.printer.movement = Path.MIXED
+    self.printer.axes_absolute = ["X", "Y", "Z"]
+    self.printer.axes_relative = ["E"]
 
-    self.execute_gcode("G1 X10 Y10 E10")
-    expected_path = MixedPath({
+    self.execute_gcode("G1 X10 Y10 E10 H10")
+    self.assert_linear_move({
         "X": 0.010 * self.f,
         "Y": 0.010 * self.f,
         "E": 0.010 * self.f
-    }, self.printer.feed_rate, self.printer.accel)
-    self.printer.path_planner.add_path.called_with(expected_path)
+    }, 1 << 3, self.printer.feed_rate, self.printer.accel)
+
+    self.printer.axes_absolute = ["X", "Y", "Z", "E", "H", "A", "B", "C"]
+    self.printer.axes_relative = []
 
   def test_gcodes_G1_G0_syntax(self):
     g = self.execute_gcode("G1X1Y2.3 z-0.456E+7.89ab c")
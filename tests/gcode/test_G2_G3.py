@@ -1,22 +1,43 @@
 from __future__ import absolute_import
 
-import itertools
 import logging
 import numpy as np
 import os
 from mock import Mock
-from six.moves import zip
 from .MockPrinter import MockPrinter
-
-show_plots = False
-try:
-  import pygal
-except:
-  show_plots = False
+from redeem.Path import Path
 
 base_dir = os.path.dirname(os.path.dirname(__file__))
 
 
+def mock_native_planner():
+  """ A native planner mock that keeps track of the ideal position, like the real one """
+  native_planner = Mock(**{'getLastQueueMoveStatus.return_value': False})
+  ideal_state = [0.0] * 8
+
+  def queue_linear_move(axis_mask, values, relative_mask, feed_rate, speed_factor, accel,
+                        extrude_factor, babystep, tool_axis):
+    for i in range(8):
+      if axis_mask & (1 << i):
+        ideal_state[i] = ideal_state[i] + values[i] if relative_mask & (1 << i) else values[i]
+    native_planner.queueMove(
+        tuple(ideal_state), feed_rate * speed_factor, accel, False, True, True, False, True, False,
+        tool_axis)
+
+  def queue_arc(end_pos, center0, center1, radius, plane, clockwise, speed, accel, babystep,
+                tool_axis):
+    ideal_state[:] = end_pos
+
+  def set_ideal_state(state):
+    ideal_state[:] = state
+
+  native_planner.queueLinearMove.side_effect = queue_linear_move
+  native_planner.queueArc.side_effect = queue_arc
+  native_planner.getIdealState.side_effect = lambda: tuple(ideal_state)
+  native_planner.setIdealState.side_effect = set_ideal_state
+  return native_planner
+
+
 class G2G3CircleTests(MockPrinter):
 
   CW = 1
@@ -24,27 +45,12 @@ class G2G3CircleTests(MockPrinter):
 
   @classmethod
   def setUpPatch(cls):
-    attrs = {'getLastQueueMoveStatus.return_value': False}
-    cls.printer.path_planner.native_planner = Mock(**attrs)
+    cls.printer.path_planner.native_planner = mock_native_planner()
     cls.printer.ensure_steppers_enabled = Mock()
 
   def setUp(self):
     self.printer.unit_factor = self.f = 1
 
-  def _show_plot(self, start, finish, center, points, title):
-
-    from pygal.style import Style
-
-    custom_style = Style(colors=('#aaaaaa', '#00ff00', '#ff0000', '#0000ff'))
-
-    xy_chart = pygal.XY(stroke=False, style=custom_style)
-    xy_chart.title = title
-    xy_chart.add('path', points)
-    xy_chart.add('start', [(start['X'], start['Y'])])
-    xy_chart.add('finish', [(finish['X'], finish['Y'])])
-    xy_chart.add('center', [(center['X'], center['Y'])])
-    xy_chart.render_to_file('{}.svg'.format(title))
-
   def _build_start_code(self, start):
     gcode = 'G1'
     for axis, val in start.items():
@@ -77,45 +83,26 @@ class G2G3CircleTests(MockPrinter):
     for gcode in gcodes:
       self.execute_gcode(gcode)
 
-    queue_mock = self.printer.path_planner.native_planner.queueMove
-
-    queued_points = [args[0][0] for args in queue_mock.call_args_list]
-
-    for point in queued_points:
-      logging.debug("queued point: {}".format(point))
-
-    # pop the G1 positioning command (start point)
-    initial = queued_points.pop(0)
-
-    points = [(point[0] * 1000, (point[1] * 1000)) for point in queued_points]
-
-    if show_plots:
-      self._show_plot(start, finish, center, points, title)
-
-    logging.debug("initial: {}".format(initial))
-    logging.debug("start: {}".format(start))
+    native_planner = self.printer.path_planner.native_planner
 
+    # the G1 positioning command (start point)
+    initial = native_planner.queueMove.call_args[0][0]
     self.assertCloseTo(initial[0], start['X'] / 1000)
     self.assertCloseTo(initial[1], start['Y'] / 1000)
 
-    radius = np.sqrt((offset['I'] / 1000)**2 + (offset['J'] / 1000)**2)
-
-    for idx, point in enumerate(queued_points):
+    self.assertEqual(native_planner.queueArc.call_count, 1)
+    end_pos, center0, center1, radius, plane, clockwise = native_planner.queueArc.call_args[0][:6]
 
-      x = point[0]
-      y = point[1]
-      xc = center['X'] / 1000
-      yc = center['Y'] / 1000
+    self.assertCloseTo(end_pos[0], finish['X'] / 1000)
+    self.assertCloseTo(end_pos[1], finish['Y'] / 1000)
+    self.assertCloseTo(center0, center['X'] / 1000)
+    self.assertCloseTo(center1, center['Y'] / 1000)
+    self.assertCloseTo(radius, np.sqrt((offset['I'] / 1000)**2 + (offset['J'] / 1000)**2))
+    self.assertEqual(plane, Path.X_Y_ARC_PLANE)
+    self.assertEqual(clockwise, direction is self.CW)
 
-      circle = (x - xc)**2 + (y - yc)**2
-      rsquared = radius**2
-      self.assertCloseTo(rsquared, circle)
-
-    final = queued_points[-1]
-    self.assertCloseTo(final[0], finish['X'] / 1000)
-    self.assertCloseTo(final[1], finish['Y'] / 1000)
-
-    queue_mock.reset_mock()
+    native_planner.queueMove.reset_mock()
+    native_planner.queueArc.reset_mock()
 
   def test_very_small_arc(self):
     start = {'X': 0.0, 'Y': 1.0}
@@ -266,44 +253,26 @@ class G2G3CircleTests(MockPrinter):
 class G2G3ExtrusionTests(MockPrinter):
   @classmethod
   def setUpPatch(cls):
-    attrs = {'getLastQueueMoveStatus.return_value': False}
-    cls.printer.path_planner.native_planner = Mock(**attrs)
+    cls.printer.path_planner.native_planner = mock_native_planner()
     cls.printer.ensure_steppers_enabled = Mock()
 
   def setUp(self):
     self.printer.unit_factor = self.f = 1
 
-  def pairwise(self, iterable):
-    """s -> (s0,s1), (s1,s2), (s2, s3), ..."""
-    a, b = itertools.tee(iterable)
-    next(b, None)
-    return zip(a, b)
-
   def _test_linear_dimensions(self, gcodes, dim, start, end):
 
     for gcode in gcodes:
       self.execute_gcode(gcode)
 
-    queue_mock = self.printer.path_planner.native_planner.queueMove
-    queued_points = [args[0][0] for args in queue_mock.call_args_list]
-
-    extrusion_points = [point[self.printer.axes_absolute.index(dim)] for point in queued_points]
-
-    extrusion_point_pairs = self.pairwise(extrusion_points)
-
-    # assert start and end
-    self.assertEqual(extrusion_points[0], start)
-    self.assertEqual(extrusion_points[-1], end)
+    native_planner = self.printer.path_planner.native_planner
+    index = self.printer.axes_absolute.index(dim)
 
-    # assert equal distance between the points
-    diff = None
-    for pair in extrusion_point_pairs:
-      d = pair[1] - pair[0]
-      if diff:
-        self.assertCloseTo(diff, d)
-      diff = d
+    # the arc starts where the G1 command ends and moves the other axes to their end position
+    self.assertEqual(native_planner.queueMove.call_args[0][0][index], start)
+    self.assertEqual(native_planner.queueArc.call_args[0][0][index], end)
 
-    queue_mock.reset_mock()
+    native_planner.queueMove.reset_mock()
+    native_planner.queueArc.reset_mock()
 
   def test_linear_e_extrusion(self):
 
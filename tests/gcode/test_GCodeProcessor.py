@@ -0,0 +1,159 @@
+from __future__ import absolute_import
+
+import mock
+from six.moves import queue
+from .MockPrinter import MockPrinter
+from redeem.Gcode import Gcode
+from redeem.GCodeProcessor import CommandQueue, GCodeProcessor
+
+
+class GCodeProcessor_Tests(MockPrinter):
+  def setUp(self):
+    self.printer.commands = queue.Queue()
+    self.printer.unbuffered_commands = queue.Queue()
+    self.printer.processor.execute = mock.Mock()
+    self.printer.processor.sync_event_needed = False
+
+  def tearDown(self):
+    del self.printer.processor.execute
+
+  def drain(self, the_queue):
+    items = []
+    while not the_queue.empty():
+      item = the_queue.get()
+      items.append([g.message for g in item] if isinstance(item, list) else item.message)
+    return items
+
+  def test_enqueue_many_groups_buffered_runs(self):
+    messages = ["M104 S200", "M106 S255", "M105", "M107", "G1 X1", "G4 P1", "M104 S0"]
+    self.printer.processor.enqueue_many(Gcode({"message": m}) for m in messages)
+
+    self.assertEqual(
+        self.drain(self.printer.commands),
+        [["M104 S200", "M106 S255"], "M107", "SyncBufferedToAsync_Buffered", ["G4 P1", "M104 S0"]])
+    self.assertEqual(self.drain(self.printer.unbuffered_commands), ["M105"])
+    self.assertEqual(self.printer.processor.execute.call_args[0][0].message, "G1 X1")
+    self.assertFalse(self.printer.processor.sync_event_needed)
+
+  def test_enqueue_many_max_run_length(self):
+    messages = ["M106 S{}".format(i) for i in range(5)]
+    self.printer.processor.enqueue_many((Gcode({"message": m}) for m in messages), max_run_length=2)
+    self.assertEqual(
+        self.drain(self.printer.commands),
+        [["M106 S0", "M106 S1"], ["M106 S2", "M106 S3"], "M106 S4"])
+
+  def test_enqueue_many_flushes_run_before_unbuffered_gcode(self):
+    calls = mock.Mock()
+    self.printer.commands.put = calls.buffered
+    self.printer.unbuffered_commands.put = calls.unbuffered
+    messages = ["M106 S1", "M106 S2", "M105", "M106 S3"]
+    self.printer.processor.enqueue_many(Gcode({"message": m}) for m in messages)
+
+    put = [(name, [g.message for g in item] if isinstance(item, list) else item.message)
+           for name, (item, ), _ in calls.mock_calls]
+    self.assertEqual(put, [("buffered", ["M106 S1", "M106 S2"]), ("unbuffered", "M105"),
+                           ("buffered", "M106 S3")])
+
+  def test_enqueue_many_runs_fit_the_buffered_queue(self):
+    self.printer.commands = CommandQueue(3)
+    self.printer.commands.put = mock.Mock()
+    messages = ["M106 S{}".format(i) for i in range(5)]
+    self.printer.processor.enqueue_many(Gcode({"message": m}) for m in messages)
+
+    runs = [len(c[0][0]) for c in self.printer.commands.put.call_args_list]
+    self.assertEqual(runs, [3, 2])
+
+  def test_command_queue_counts_gcodes(self):
+    commands = CommandQueue(3)
+    commands.put([Gcode({"message": "M106 S1"}), Gcode({"message": "M106 S2"})])
+    self.assertEqual(commands.qsize(), 2)
+    commands.put(Gcode({"message": "M107"}))
+    self.assertTrue(commands.full())
+    self.assertRaises(queue.Full, commands.put, Gcode({"message": "M105"}), False)
+
+    self.assertEqual(len(commands.get()), 2)
+    self.assertEqual(commands.qsize(), 1)
+    # the run keeps its room until it has been executed
+    self.assertRaises(queue.Full, commands.put, Gcode({"message": "M105"}), False)
+    commands.task_done()
+    commands.put(Gcode({"message": "M105"}))
+
+    # a run bigger than the free space waits for it
+    commands.get()
+    commands.task_done()
+    self.assertRaises(queue.Full, commands.put, [Gcode({"message": "M105"})] * 3, True, 0.01)
+    commands.get()
+    commands.task_done()
+    commands.put([Gcode({"message": "M105"})] * 3)
+    self.assertTrue(commands.full())
+
+  def test_consume_executes_runs_in_order(self):
+    gcodes = [Gcode({"message": m}) for m in ["M106 S1", "M106 S2", "M107"]]
+    commands = self.printer.commands
+    commands.put(gcodes[:2])
+    commands.put(gcodes[2])
+    self.printer.processor.consume(commands, "buffered", lambda: commands.unfinished_tasks > 0)
+
+    executed = [c[0][0] for c in self.printer.processor.execute.call_args_list]
+    self.assertEqual(executed, gcodes)
+    self.assertTrue(commands.empty())
+
+  def test_consume_queues_runs_of_moves_together(self):
+    gcodes = [Gcode({"message": m}) for m in ["G1 X1", "G1 X2 F600", "M106 S1", "G1 X3"]]
+    for gcode in gcodes:
+      self.printer.processor.resolve(gcode)
+    commands = self.printer.commands
+    commands.put(gcodes)
+    path_planner = self.printer.path_planner
+    path_planner.reset_mock()
+    self.printer.processor.consume(commands, "buffered", lambda: commands.unfinished_tasks > 0)
+
+    moves = path_planner.add_linear_moves.call_args[0][0]
+    self.assertEqual([move[1][0] for move in moves], [0.001 * self.f, 0.002 * self.f])
+    self.assertAlmostEqual(moves[1][3], 600 / 60000. * self.f)
+    executed = [c[0][0] for c in self.printer.processor.execute.call_args_list]
+    self.assertEqual(executed, gcodes[2:])
+
+  def test_enqueue_single_gcode(self):
+    self.printer.processor.enqueue(Gcode({"message": "M106 S1"}))
+    self.assertEqual(self.drain(self.printer.commands), ["M106 S1"])
+
+  def test_enqueue_records_parse_and_enqueue_times(self):
+    counters = self.printer.processor.counters
+    counters.reset_histograms()
+    self.printer.processor.enqueue_many(Gcode({"message": m}) for m in ["M106 S1", "M107"])
+    self.assertEqual(counters.parse.count, 2)
+    self.assertEqual(counters.enqueue_wait.count, 1)
+    item = self.printer.commands.get()
+    self.assertTrue(all(g.queued_time is not None for g in item))
+
+  def test_enqueue_M1500_replies_without_queueing(self):
+    self.printer.path_planner.get_latency_histograms.return_value = []
+    g = Gcode({"message": "M1500"})
+    with mock.patch.object(self.printer, "reply") as reply:
+      self.printer.processor.enqueue(g)
+    reply.assert_called_once_with(g)
+    self.assertEqual(self.drain(self.printer.commands), [])
+    self.assertEqual(self.drain(self.printer.unbuffered_commands), [])
+
+  def test_execute_tags_moves_with_the_gcode_line(self):
+    execute = GCodeProcessor.execute
+    set_gcode_line = self.printer.path_planner.set_gcode_line
+    set_gcode_line.reset_mock()
+
+    line = "N12 G90"
+    checksum = 0
+    for c in line:
+      checksum ^= ord(c)
+    execute(self.printer.processor, Gcode({"message": "{}*{}".format(line, checksum)}))
+    set_gcode_line.assert_called_once_with(12)
+
+    # without a line number, the count of G-codes executed stands in for it
+    set_gcode_line.reset_mock()
+    execute(self.printer.processor, Gcode({"message": "G90"}))
+    set_gcode_line.assert_called_once_with(self.printer.processor.counters.gcodes_executed)
+
+    # unbuffered G-codes don't queue moves
+    set_gcode_line.reset_mock()
+    execute(self.printer.processor, Gcode({"message": "M220 S100"}))
+    set_gcode_line.assert_not_called()
@@ -1,6 +1,7 @@
 from __future__ import absolute_import
 
 from .MockPrinter import MockPrinter
+from redeem import Gcode as gcode_module
 from redeem.Gcode import Gcode
 """ 
 We want to keeps our tests within the scope of just the file we're testing,
@@ -139,3 +140,51 @@ class GcodeTest(MockPrinter):
     self.assertEqual(self.g.is_info_command(), False)
     g = Gcode({"message": "G28?"})
     self.assertEqual(g.is_info_command(), True)
+
+  def test_gcode_tokenize(self):
+    message, command, tokens, values, line_number = gcode_module.tokenize(
+        "N99  G2 8 x0 Y-0.2345 z +12.345 67 ab C(comment)*92; noise")
+    self.assertEqual(message, "G2 8 x0 Y-0.2345 z +12.345 67 ab C")
+    self.assertEqual(command, "G28")
+    self.assertEqual(tokens, ["X0", "Y-0.2345", "Z+12.34567", "A", "B", "C"])
+    self.assertEqual(values, [0.0, -0.2345, 12.34567, 0.0, 0.0, 0.0])
+    self.assertEqual(line_number, 99)
+
+    self.assertEqual(
+        gcode_module.tokenize("G29.1 X1?"), ("G29.1 X1?", "G29_1", ["X1?"], [0.0], None))
+    self.assertEqual(gcode_module.tokenize("M1170"), ("M1170", "M117", [], [], None))
+    self.assertEqual(gcode_module.tokenize("  ; noise")[1], None)
+    self.assertRaises(Exception, gcode_module.tokenize, "(comment)")
+    self.assertRaises(Exception, gcode_module.tokenize, "N99  G28*60")
+
+  def test_gcode_tokenize_matches_regex_tokenizer(self):
+    lines = [
+        "N99  G2 8 x0 Y-0.2345 z +12.345 67 ab C(comment)*92; noise",
+        "M117     123G1X1Y2.3 z-0.456E+7.89ab c",
+        "M117 Hello (world)",
+        "m 1 1 7.5",
+        "G1 X1(comment)2 Y-. Z+ E.5",
+        "G28?",
+        "N7 G1 X1 (a) (b)*101",
+        "\tG1\tX1 ;comment",
+    ]
+    for line in lines:
+      self.assertEqual(gcode_module.tokenize(line), gcode_module._regex_tokenize(line))
+
+  def test_gcode_letter_index(self):
+    g = Gcode({"message": "G1 X1 Y2 X3 E"})
+    self.assertFalse(hasattr(g, "__dict__"))
+    self.assertEqual(g.get_token_index_by_letter("X"), 0)
+    self.assertEqual(g.get_float_by_letter("X"), 1.0)
+    self.assertEqual(g.get_float_by_letter("E", 5.0), 5.0)
+    self.assertEqual(g.has_letter_value("E"), False)
+
+    g.remove_token_by_letter("Y")
+    self.assertEqual(g.get_token_index_by_letter("X"), 0)
+    self.assertEqual(g.get_token_index_by_letter("E"), 2)
+    self.assertEqual(g.get_float_by_letter("Y", 7.0), 7.0)
+
+    g.set_tokens(["Y4", "Z"])
+    self.assertEqual(g.has_letter("X"), False)
+    self.assertEqual(g.get_float_by_letter("Y"), 4.0)
+    self.assertEqual(g.get_token_index_by_letter("Z"), 1)
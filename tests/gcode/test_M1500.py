@@ -0,0 +1,57 @@
+from __future__ import absolute_import
+
+import mock
+from .MockPrinter import MockPrinter
+from redeem.LatencyHistogram import LatencyHistogram
+
+
+class M1500_Tests(MockPrinter):
+  def setUp(self):
+    self.printer.send_message.reset_mock()
+    self.printer.processor.counters.reset_histograms()
+    self.printer.path_planner.get_latency_histograms = mock.Mock(return_value=[])
+    self.printer.path_planner.reset_latency_histograms = mock.Mock()
+    self.printer.path_planner.get_pru_completion_stats = mock.Mock(return_value=None)
+
+  def test_gcodes_M1500_reports_histograms(self):
+    optimizer = LatencyHistogram()
+    optimizer.record(0.0001)
+    self.printer.path_planner.get_latency_histograms.return_value = [("optimizer", optimizer)]
+    self.printer.processor.counters.execute.record(0.003)
+
+    g = self.execute_gcode("M1500")
+
+    messages = [c[0][1] for c in self.printer.send_message.call_args_list]
+    self.assertEqual([m.split(":")[0] for m in messages],
+                     ["parse", "enqueue_wait", "queue_residency", "execute", "optimizer"])
+    self.assertIn("n=1 ", messages[3])
+    self.assertIn("max=100us", messages[4])
+    self.assertTrue(g.answer.startswith("ok G-codes executed: "))
+    self.printer.path_planner.reset_latency_histograms.assert_not_called()
+
+  def test_gcodes_M1500_reports_pru_completion_batches(self):
+    self.printer.path_planner.get_pru_completion_stats.return_value = mock.Mock(
+        wakeups=4, blocks=10, maxBatch=5)
+
+    self.execute_gcode("M1500")
+
+    messages = [c[0][1] for c in self.printer.send_message.call_args_list]
+    self.assertEqual(messages[-1],
+                     "pru_completion_batches: 10 blocks in 4 wake-ups, at most 5 at once")
+
+  def test_gcodes_M1500_resets_histograms(self):
+    self.printer.processor.counters.execute.record(0.003)
+    self.execute_gcode("M1500 R")
+    self.assertEqual(self.printer.processor.counters.execute.count, 0)
+    self.printer.path_planner.reset_latency_histograms.assert_called_once()
+
+  def test_latency_histogram_buckets(self):
+    histogram = LatencyHistogram()
+    for seconds in [0.0000005, 0.000003, 0.000003, 0.001, 10000.0]:
+      histogram.record(seconds)
+    self.assertEqual(histogram.buckets[0], 1)
+    self.assertEqual(histogram.buckets[2], 2)
+    self.assertEqual(histogram.buckets[10], 1)
+    self.assertEqual(histogram.buckets[-1], 1)
+    self.assertEqual(histogram.percentile(0.5), 0.000004)
+    self.assertEqual(histogram.percentile(1.0), 10000.0)
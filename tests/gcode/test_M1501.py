@@ -0,0 +1,48 @@
+from __future__ import absolute_import
+
+import mock
+from .MockPrinter import MockPrinter
+
+
+class M1501_Tests(MockPrinter):
+  def setUp(self):
+    self.printer.send_message.reset_mock()
+    stats = mock.Mock(samples=3, pathQueueUnderruns=1, pruUnderruns=0, pathQueueUnderflows=2)
+    samples = [
+        mock.Mock(
+            time=0.1 * i, pathQueueDepth=depth, queuedMoveTime=move_time, pruMemoryUsed=memory)
+        for i, (depth, move_time, memory) in enumerate([(2, 20000000, 96), (4, 40000000, 192)])
+    ]
+    underruns = [mock.Mock(time=1.5, cause=0, gcodeLine=42)]
+    self.printer.path_planner.get_buffer_telemetry = mock.Mock(
+        return_value=(stats, samples, underruns))
+    self.printer.path_planner.reset_buffer_telemetry = mock.Mock()
+
+  def messages(self):
+    return [c[0][1] for c in self.printer.send_message.call_args_list]
+
+  def test_gcodes_M1501_reports_telemetry(self):
+    self.execute_gcode("M1501")
+
+    messages = self.messages()
+    self.assertIn("1 waiting for moves, 0 waiting for steps", messages[0])
+    self.assertIn("2 of 3 kept", messages[1])
+    self.assertIn("2/3.0/4 moves", messages[2])
+    self.assertIn("100.0/150.0/200.0 ms", messages[3])
+    self.assertIn("96/144/192 bytes", messages[4])
+    self.assertEqual(messages[5], "Underrun at 1.500s: path_queue after line 42")
+    self.assertEqual(len(messages), 6)
+    self.printer.path_planner.reset_buffer_telemetry.assert_not_called()
+
+  def test_gcodes_M1501_lists_samples_and_resets(self):
+    self.execute_gcode("M1501 S R")
+
+    messages = self.messages()
+    self.assertEqual(messages[-1], "Sample at 0.100s: 4 moves, 200.0 ms, 192 bytes")
+    self.assertEqual(len(messages), 8)
+    self.printer.path_planner.reset_buffer_telemetry.assert_called_once()
+
+  def test_gcodes_M1501_without_native_planner(self):
+    self.printer.path_planner.get_buffer_telemetry.return_value = None
+    g = self.execute_gcode("M1501")
+    self.assertIn("no native path planner", g.answer)
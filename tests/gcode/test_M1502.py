@@ -0,0 +1,36 @@
+from __future__ import absolute_import
+
+import mock
+from .MockPrinter import MockPrinter
+from redeem.LatencyHistogram import LatencyHistogram
+
+
+class M1502_Tests(MockPrinter):
+  def setUp(self):
+    self.printer.send_message.reset_mock()
+    histogram = LatencyHistogram()
+    histogram.record(0.00005)
+    self.printer.path_planner.measure_wakeup_latency = mock.Mock(
+        return_value=[("planner", histogram), ("pru", histogram)])
+
+  def messages(self):
+    return [c[0][1] for c in self.printer.send_message.call_args_list]
+
+  def test_gcodes_M1502_reports_both_threads(self):
+    self.execute_gcode("M1502")
+
+    self.printer.path_planner.measure_wakeup_latency.assert_called_with(0.001, 1000)
+    messages = self.messages()
+    self.assertEqual(len(messages), 2)
+    self.assertTrue(messages[0].startswith("planner thread wake-up latency: n=1 mean=50us"))
+    self.assertTrue(messages[1].startswith("pru thread wake-up latency: n=1"))
+
+  def test_gcodes_M1502_takes_wakeups_and_interval(self):
+    self.execute_gcode("M1502 P200 I0.5")
+
+    self.printer.path_planner.measure_wakeup_latency.assert_called_with(0.0005, 200)
+
+  def test_gcodes_M1502_rejects_a_zero_interval(self):
+    self.execute_gcode("M1502 I0")
+
+    self.printer.path_planner.measure_wakeup_latency.assert_not_called()
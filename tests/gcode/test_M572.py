@@ -0,0 +1,57 @@
+from __future__ import absolute_import
+
+from .MockPrinter import MockPrinter
+import mock
+from six import get_unbound_function
+from redeem.PathPlanner import PathPlanner
+
+
+class M572_Tests(MockPrinter):
+  def setUp(self):
+    self.printer.path_planner.update_pressure_advance = mock.Mock()
+    self.printer.pressure_advance = [0.0] * self.printer.num_axes
+    self.printer.pressure_advance_smooth_time = [0.04] * self.printer.num_axes
+
+  def test_gcodes_M572_sets_pressure_advance(self):
+    self.execute_gcode("M572 E0.05 H0.02")
+    self.assertEqual(self.printer.pressure_advance, [0, 0, 0, 0.05, 0.02, 0, 0, 0])
+    self.assertEqual(self.printer.pressure_advance_smooth_time, [0.04] * self.printer.num_axes)
+    self.printer.path_planner.update_pressure_advance.assert_called_once()
+
+  def test_gcodes_M572_sets_smooth_time_of_given_extruders(self):
+    self.execute_gcode("M572 E0.05 S0.02")
+    self.assertEqual(self.printer.pressure_advance[3], 0.05)
+    self.assertEqual(self.printer.pressure_advance_smooth_time,
+                     [0.04, 0.04, 0.04, 0.02, 0.04, 0.04, 0.04, 0.04])
+
+  def test_gcodes_M572_sets_smooth_time_of_all_extruders(self):
+    self.execute_gcode("M572 S0.03")
+    self.assertEqual(self.printer.pressure_advance, [0.0] * self.printer.num_axes)
+    self.assertEqual(self.printer.pressure_advance_smooth_time,
+                     [0.04, 0.04, 0.04, 0.03, 0.03, 0.03, 0.03, 0.03])
+    self.printer.path_planner.update_pressure_advance.assert_called_once()
+
+  def test_gcodes_M572_ignores_moving_axes(self):
+    self.execute_gcode("M572 X0.05 E0.01")
+    self.assertEqual(self.printer.pressure_advance, [0, 0, 0, 0.01, 0, 0, 0, 0])
+
+  def test_gcodes_M572_invalid_values(self):
+    self.execute_gcode("M572 E-0.05")
+    self.execute_gcode("M572 E0.05 S0")
+    self.assertEqual(self.printer.pressure_advance, [0.0] * self.printer.num_axes)
+    self.assertEqual(self.printer.pressure_advance_smooth_time, [0.04] * self.printer.num_axes)
+    self.printer.path_planner.update_pressure_advance.assert_not_called()
+
+  def test_gcodes_M572_no_args(self):
+    self.printer.pressure_advance[3] = 0.05
+    g = self.execute_gcode("M572")
+    self.assertEqual(g.answer.split(", ")[0], "ok E: 0.05s smoothed over 0.04s")
+    self.printer.path_planner.update_pressure_advance.assert_not_called()
+
+  def test_gcodes_M572_passes_extruders_to_native_planner(self):
+    self.printer.pressure_advance[4] = 0.02
+    planner = mock.Mock(printer=self.printer)
+    get_unbound_function(PathPlanner.update_pressure_advance)(planner)
+    calls = [c[0] for c in planner.native_planner.setPressureAdvance.call_args_list]
+    self.assertEqual(calls, [(3, 0.0, 0.04), (4, 0.02, 0.04), (5, 0.0, 0.04), (6, 0.0, 0.04),
+                             (7, 0.0, 0.04)])
@@ -0,0 +1,77 @@
+from __future__ import absolute_import
+
+from .MockPrinter import MockPrinter
+import mock
+from six import get_unbound_function
+from redeem.PathPlanner import PathPlanner
+
+
+class M593_Tests(MockPrinter):
+  def setUp(self):
+    self.printer.path_planner.update_input_shapers = mock.Mock()
+    self.printer.axis_config = self.printer.AXIS_CONFIG_XY
+    self.printer.input_shaper = [0] * self.printer.num_axes
+    self.printer.input_shaper_frequency = [0.0] * self.printer.num_axes
+    self.printer.input_shaper_damping = [0.1] * self.printer.num_axes
+
+  def test_gcodes_M593_defaults_to_X_and_Y(self):
+    self.execute_gcode("M593 P1 F40 D0.05")
+    self.assertEqual(self.printer.input_shaper, [1, 1, 0, 0, 0, 0, 0, 0])
+    self.assertEqual(self.printer.input_shaper_frequency, [40.0, 40.0, 0, 0, 0, 0, 0, 0])
+    self.assertEqual(self.printer.input_shaper_damping, [0.05, 0.05, 0.1, 0.1, 0.1, 0.1, 0.1, 0.1])
+    self.printer.path_planner.update_input_shapers.assert_called_once()
+
+  def test_gcodes_M593_given_axes(self):
+    self.execute_gcode("M593 Z E P3 F25.5")
+    self.assertEqual(self.printer.input_shaper, [0, 0, 3, 3, 0, 0, 0, 0])
+    self.assertEqual(self.printer.input_shaper_frequency, [0, 0, 25.5, 25.5, 0, 0, 0, 0])
+    self.assertEqual(self.printer.input_shaper_damping, [0.1] * self.printer.num_axes)
+    self.printer.path_planner.update_input_shapers.assert_called_once()
+
+  def test_gcodes_M593_invalid_shaper(self):
+    self.execute_gcode("M593 X P4 F40")
+    self.assertEqual(self.printer.input_shaper, [0] * self.printer.num_axes)
+    self.assertEqual(self.printer.input_shaper_frequency, [0.0] * self.printer.num_axes)
+    self.printer.path_planner.update_input_shapers.assert_not_called()
+
+  def test_gcodes_M593_invalid_damping(self):
+    self.execute_gcode("M593 X P1 D1")
+    self.assertEqual(self.printer.input_shaper, [0] * self.printer.num_axes)
+    self.printer.path_planner.update_input_shapers.assert_not_called()
+
+  def test_gcodes_M593_no_args(self):
+    self.printer.input_shaper[0] = 2
+    self.printer.input_shaper_frequency[0] = 40.0
+    g = self.execute_gcode("M593")
+    self.assertEqual(g.answer.split(", ")[0], "ok X: mzv 40.0Hz damping 0.1")
+    self.printer.path_planner.update_input_shapers.assert_not_called()
+
+  def _native_input_shapers(self):
+    planner = mock.Mock(printer=self.printer)
+    get_unbound_function(PathPlanner.update_input_shapers)(planner)
+    return [c[0] for c in planner.native_planner.setInputShaper.call_args_list]
+
+  def test_gcodes_M593_passes_shapers_to_native_planner(self):
+    self.printer.input_shaper[1] = 1
+    self.printer.input_shaper_frequency[1] = 40.0
+    shapers = self._native_input_shapers()
+    self.assertEqual(len(shapers), self.printer.num_axes)
+    self.assertEqual(shapers[0], (0, 0, 0.0, 0.1))
+    self.assertEqual(shapers[1], (1, 1, 40.0, 0.1))
+
+  def test_gcodes_M593_CoreXY_shares_X_shaper(self):
+    self.printer.axis_config = self.printer.AXIS_CONFIG_CORE_XY
+    self.printer.input_shaper[0] = 2
+    self.printer.input_shaper_frequency[0] = 40.0
+    shapers = self._native_input_shapers()
+    self.assertEqual(shapers[1], (1, 2, 40.0, 0.1))
+    self.assertEqual(shapers[2], (2, 0, 0.0, 0.1))
+
+  def test_gcodes_M593_Delta_shares_X_shaper(self):
+    self.printer.axis_config = self.printer.AXIS_CONFIG_DELTA
+    self.printer.input_shaper[0] = 3
+    self.printer.input_shaper_frequency[0] = 60.0
+    shapers = self._native_input_shapers()
+    self.assertEqual(shapers[1], (1, 3, 60.0, 0.1))
+    self.assertEqual(shapers[2], (2, 3, 60.0, 0.1))
+    self.assertEqual(shapers[3], (3, 0, 0.0, 0.1))